@@ -0,0 +1,2 @@
+# Benchmarks y pruebas de carga que se ejecutan sin red
+# Ejecutar desde la raíz del repositorio: python -m benchmarks.<nombre>
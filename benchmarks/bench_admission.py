@@ -0,0 +1,98 @@
+"""
+Benchmark: control de admisión frente a un usuario que satura el asistente
+
+1. Abuso: un chat envía muchas consultas seguidas y después llegan varios
+   usuarios normales. Sin control, todos esperan detrás del primero; con
+   el cubo por chat, sus consultas sobrantes se rechazan al momento.
+2. Turnos: con un límite global bajo, un chat con ráfaga permitida llena
+   la cola; los turnos entre chats (round-robin) evitan que los demás
+   esperen detrás de toda su cola, como ocurriría atendiendo en orden de
+   llegada.
+
+Uso:
+    python -m benchmarks.bench_admission --spam 40 --users 10 --latency 1.0
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def scenario(controller, spam: int, users: int, generate_response) -> dict:
+    from utils.admission import AdmissionRejected
+
+    result = {"spam_calls": 0, "spam_rejected": 0, "user_latency": [], "user_rejected": 0}
+
+    async def ask(chat_id: int, is_spammer: bool) -> None:
+        start = time.perf_counter()
+        if controller is not None:
+            try:
+                await controller.acquire(chat_id)
+            except AdmissionRejected:
+                result["spam_rejected" if is_spammer else "user_rejected"] += 1
+                return
+        await generate_response(f"Pregunta {chat_id} {time.perf_counter()}", use_cache=False)
+        if is_spammer:
+            result["spam_calls"] += 1
+        else:
+            result["user_latency"].append(time.perf_counter() - start)
+
+    spam_tasks = [asyncio.create_task(ask(1, True)) for _ in range(spam)]
+    await asyncio.sleep(0.2)
+    await asyncio.gather(*(ask(100 + i, False) for i in range(users)), *spam_tasks)
+    return result
+
+
+def report(label: str, result: dict, controller) -> None:
+    latencies = result["user_latency"]
+    print(f"  {label}")
+    print(f"    Usuarios normales: p50 {percentile(latencies, 0.5):.2f} s, "
+          f"máx {max(latencies, default=0):.2f} s, rechazados {result['user_rejected']}")
+    print(f"    Chat abusivo: {result['spam_calls']} llamadas a OpenAI, {result['spam_rejected']} rechazadas")
+    if controller is not None:
+        print(f"    Métricas: {controller.stats()}")
+
+
+async def run(spam: int, users: int, latency: float) -> None:
+    server = FakeOpenAIServer(latency=latency)
+    os.environ["OPENAI_BASE_URL"] = await server.start()
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    from utils.admission import AdmissionController
+    from utils.openai import client, generate_response
+
+    try:
+        print("Abuso de un chat")
+        report("Sin control de admisión", await scenario(None, spam, users, generate_response), None)
+        controller = AdmissionController(chat_rate=6 / 60, chat_burst=3, global_rate=8, global_burst=8)
+        report("Con control de admisión", await scenario(controller, spam, users, generate_response), controller)
+
+        print("Cola con turnos entre chats (límite global de 4 consultas/s)")
+        for label, chat_burst in (("Cola en orden de llegada (un chat puede llenarla)", None),
+                                  ("Turnos entre chats", spam)):
+            controller = AdmissionController(chat_rate=100, chat_burst=spam, global_rate=4, global_burst=4,
+                                             max_queue=spam + users, max_wait=120)
+            if chat_burst is None:
+                # Orden de llegada: todas las consultas comparten la misma cola
+                original = controller.acquire
+                controller.acquire = lambda chat_id, cost=1.0: original(0, cost)
+            report(label, await scenario(controller, spam, users, generate_response), controller)
+    finally:
+        await client.close()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del control de admisión")
+    parser.add_argument("--spam", type=int, default=40)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.spam, args.users, args.latency))
@@ -0,0 +1,106 @@
+"""
+Benchmark: instantánea incremental frente a releer los cuatro registros
+
+Genera registros CSV sintéticos y compara el coste por clic en
+"📊 Análisis de datos" de releer todos los archivos con el del almacén
+incremental, además del tamaño del prompt resultante.
+
+Uso:
+    python -m benchmarks.bench_aggregates --rows 100000
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from utils.aggregates import AggregationStore
+from utils.ledger import GROUP_FIELDS
+
+HEADERS = {
+    "compras": ["fecha", "proveedor", "tipo_cafe", "cantidad", "precio", "total"],
+    "proceso": ["fecha", "origen", "destino", "cantidad", "merma"],
+    "ventas": ["fecha", "cliente", "tipo_cafe", "cantidad", "precio", "total"],
+    "gastos": ["fecha", "categoria", "monto", "descripcion"],
+}
+
+
+def synthetic_row(name: str, day: date) -> list:
+    quantity = round(random.uniform(5, 500), 1)
+    price = round(random.uniform(2, 12), 2)
+    if name == "compras":
+        return [day.isoformat(), f"Proveedor {random.randint(1, 40)}", "arabica", quantity, price, round(quantity * price, 2)]
+    if name == "proceso":
+        return [day.isoformat(), "cereza", random.choice(["pergamino", "oro"]), quantity, round(quantity * 0.05, 1)]
+    if name == "ventas":
+        return [day.isoformat(), f"Cliente {random.randint(1, 80)}", "oro", quantity, price, round(quantity * price, 2)]
+    return [day.isoformat(), random.choice(["transporte", "mano de obra", "insumos"]), price * 10, "gasto"]
+
+
+def write_ledgers(directory: str, rows: int) -> dict:
+    start = date.today() - timedelta(days=3 * 365)
+    files = {}
+    for name, header in HEADERS.items():
+        path = os.path.join(directory, f"{name}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for i in range(rows):
+                writer.writerow(synthetic_row(name, start + timedelta(days=i * 3 * 365 // rows)))
+        files[name] = path
+    return files
+
+
+def full_reload(files: dict) -> dict:
+    """Comportamiento anterior: leer todo y quedarse con las últimas 50 filas"""
+    data = {}
+    for name, path in files.items():
+        with open(path, newline="", encoding="utf-8") as f:
+            records = list(csv.DictReader(f))
+        data[name] = records[-50:]
+    return data
+
+
+def main(rows: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        files = write_ledgers(directory, rows)
+        store = AggregationStore({name: {"file": path, "group_by": GROUP_FIELDS[name]} for name, path in files.items()})
+
+        start = time.perf_counter()
+        old_data = full_reload(files)
+        reload_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store.snapshot()
+        warmup_time = time.perf_counter() - start
+
+        with open(files["ventas"], "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(synthetic_row("ventas", date.today()))
+
+        start = time.perf_counter()
+        new_data = store.snapshot()
+        incremental_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store.snapshot()
+        memo_time = time.perf_counter() - start
+
+    old_prompt = json.dumps(old_data, indent=2, ensure_ascii=False)
+    new_prompt = json.dumps(new_data, indent=2, ensure_ascii=False)
+    print(f"Filas por registro: {rows}")
+    print(f"Releer los cuatro registros:        {reload_time * 1000:9.1f} ms por clic")
+    print(f"Carga inicial del almacén:          {warmup_time * 1000:9.1f} ms (una sola vez, con la importación)")
+    print(f"Instantánea tras añadir una venta:  {incremental_time * 1000:9.3f} ms")
+    print(f"Instantánea sin cambios:            {memo_time * 1000:9.3f} ms")
+    print(f"Tamaño del prompt: {len(old_prompt)} -> {len(new_prompt)} caracteres")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los agregados incrementales")
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.rows)
@@ -0,0 +1,52 @@
+"""
+Benchmark: preguntas repetidas con la caché de respuestas
+
+La primera pregunta llega al servidor falso de OpenAI; las repeticiones y
+variantes casi idénticas deben responderse desde la caché en milisegundos.
+
+Uso:
+    python -m benchmarks.bench_cache --latency 1.0
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+QUESTIONS = [
+    "¿Cuánto tiempo debe fermentar el café lavado?",
+    "cuánto tiempo debe fermentar el café lavado",
+    "  ¿Cuánto  tiempo debe fermentar el café LAVADO?  ",
+]
+
+
+async def run(latency: float) -> None:
+    server = FakeOpenAIServer(latency=latency)
+    base_url = await server.start()
+
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_CACHE_ENABLED"] = "true"
+    from utils.openai import client, generate_response, response_cache
+
+    try:
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            await generate_response(question)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{elapsed:9.2f} ms  {question.strip()!r}")
+    finally:
+        await client.close()
+        await server.stop()
+
+    print(f"Llamadas a la API: {server.requests}")
+    print(f"Estadísticas de la caché: {response_cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la caché de respuestas de OpenAI")
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.latency))
@@ -0,0 +1,55 @@
+"""
+Prueba de carga: N chats concurrentes contra un servidor falso de OpenAI
+
+Con el cliente asíncrono y el semáforo, N consultas simultáneas deben
+terminar en aproximadamente el tiempo de una sola.
+
+Uso:
+    python -m benchmarks.bench_concurrency --chats 20 --latency 1.0
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+async def run(chats: int, latency: float) -> None:
+    server = FakeOpenAIServer(latency=latency)
+    base_url = await server.start()
+
+    # La configuración se lee al importar, así que se define antes de importar utils.openai
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ.setdefault("OPENAI_MAX_CONCURRENCY", str(chats))
+    from utils.openai import client, generate_response
+
+    try:
+        start = time.perf_counter()
+        await generate_response("¿Cómo se fermenta el café?")
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        answers = await asyncio.gather(*(
+            generate_response(f"Pregunta {i} sobre el secado del café") for i in range(chats)
+        ))
+        concurrent = time.perf_counter() - start
+    finally:
+        await client.close()
+        await server.stop()
+
+    failed = sum(1 for answer in answers if answer.startswith("Lo siento"))
+    print(f"Una consulta:              {single:.2f} s")
+    print(f"{chats} consultas concurrentes: {concurrent:.2f} s ({concurrent / single:.2f}x una consulta)")
+    print(f"Máximo en paralelo en el servidor: {server.max_in_flight}")
+    print(f"Respuestas con error: {failed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga del cliente asíncrono de OpenAI")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.chats, args.latency))
@@ -0,0 +1,153 @@
+"""
+Benchmark: índice semántico de preguntas frecuentes
+
+1. Búsqueda top-k en matrices de embeddings sintéticas (10k y 100k
+   preguntas, 1536 dimensiones como text-embedding-3-small): producto
+   matriz-vector con argpartition frente a ordenar todas las similitudes, y
+   tiempo de apertura del índice con mmap.
+2. De punta a punta contra el servidor falso de OpenAI: reconstrucción del
+   índice con data/faq.json, preguntas que aciertan y que no alcanzan el
+   umbral, y latencia de una respuesta del índice frente a una del modelo de
+   chat.
+
+Uso:
+    python -m benchmarks.bench_faq --sizes 10000 100000 --dims 1536 --latency 1.0
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+# Preguntas de prueba: reformulaciones de data/faq.json y preguntas que no están
+QUESTIONS = [
+    "cuanto tiempo debe fermentarse el cafe lavado",
+    "¿Qué humedad debe tener el pergamino seco?",
+    "diferencia entre tueste claro medio y oscuro",
+    "¿Cuánto tiempo tarda el secado del café al sol?",
+    "¿Qué variedad de café resiste mejor la roya?",
+    "¿Cómo preparo un cold brew en casa?",
+]
+
+
+def timeit(function, repeat: int) -> float:
+    """Mediana de `repeat` ejecuciones, en milisegundos"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def search_latency(sizes: list, dims: int, repeat: int, k: int) -> None:
+    from utils.faq import FAQIndex
+
+    rng = np.random.default_rng(0)
+    print(f"Búsqueda top-{k} ({dims} dimensiones, mediana de {repeat} consultas)")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            index = FAQIndex(os.path.join(directory, "faq_index.npy"))
+            matrix = rng.standard_normal((size, dims), dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            index.matrix = matrix
+            index.entries = [{"pregunta": f"P{i}", "respuesta": f"R{i}"} for i in range(size)]
+            index.model = "sintético"
+            index.save()
+            del matrix
+
+            opened = FAQIndex(index.path)
+            start = time.perf_counter()
+            opened.matrix = np.load(opened.path, mmap_mode="r")
+            mmap_ms = (time.perf_counter() - start) * 1000
+            opened.entries = index.entries
+
+            vector = rng.standard_normal(dims, dtype=np.float32)
+            vector /= np.linalg.norm(vector)
+            # Primera pasada: las páginas del archivo pasan a la caché del sistema
+            opened.search(vector, k)
+
+            def full_sort():
+                scores = opened.matrix @ vector
+                return np.argsort(scores)[::-1][:k]
+
+            top_ms = timeit(lambda: opened.search(vector, k), repeat)
+            sort_ms = timeit(full_sort, repeat)
+            expected = [entry["pregunta"] for _, entry in opened.search(vector, k)]
+            assert expected == [opened.entries[i]["pregunta"] for i in full_sort()]
+            size_mb = os.path.getsize(opened.path) / 1e6
+            print(f"  {size:>7} preguntas ({size_mb:.0f} MB): apertura con mmap {mmap_ms:.2f} ms, "
+                  f"argpartition {top_ms:.2f} ms, orden completo {sort_ms:.2f} ms "
+                  f"(x{sort_ms / top_ms:.1f})")
+
+
+async def end_to_end(latency: float) -> None:
+    from utils import faq
+    from utils.openai import client, generate_response
+
+    server = FakeOpenAIServer(latency=latency)
+    client.base_url = await server.start()
+    try:
+        entries = faq.load_sources()
+        start = time.perf_counter()
+        await faq.faq_index.build(entries)
+        faq.faq_index.save()
+        build_s = time.perf_counter() - start
+        print(f"De punta a punta (servidor falso, latencia del chat {latency:.1f} s)")
+        print(f"  Reconstrucción: {len(entries)} respuestas en {build_s * 1000:.0f} ms "
+              f"({server.embedding_requests} peticiones de embeddings)")
+
+        hits, hit_times = 0, []
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            answer = await faq.find_answer(question)
+            hit_times.append(time.perf_counter() - start)
+            score, entry = faq.faq_index.search(await faq.faq_index.query_vector(question), k=1)[0]
+            hits += answer is not None
+            marker = "✓" if answer is not None else "✗"
+            print(f"    {marker} {score:.3f}  {question!r} → {entry['pregunta']!r}")
+        print(f"  Aciertos con umbral {faq.FAQ_THRESHOLD}: {hits}/{len(QUESTIONS)}")
+
+        # Segunda vez: el embedding de la pregunta ya está en la caché
+        start = time.perf_counter()
+        for question in QUESTIONS:
+            await faq.find_answer(question)
+        cached_ms = (time.perf_counter() - start) / len(QUESTIONS) * 1000
+
+        chat_requests = server.requests
+        start = time.perf_counter()
+        await generate_response(QUESTIONS[0], use_cache=False)
+        chat_ms = (time.perf_counter() - start) * 1000
+        assert server.requests == chat_requests + 1
+        print(f"  Latencia: índice {np.median(hit_times) * 1000:.1f} ms (pregunta nueva), "
+              f"{cached_ms:.2f} ms (repetida); modelo de chat {chat_ms:.0f} ms")
+    finally:
+        await client.close()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del índice de preguntas frecuentes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_CACHE_ENABLED"] = "false"
+    os.environ["FAQ_ENABLED"] = "true"
+    os.environ["FAQ_INDEX_FILE"] = os.path.join(workdir, "faq_index.npy")
+    os.environ["FAQ_APPROVED_FILE"] = os.path.join(workdir, "faq_aprobadas.jsonl")
+    logging.disable(logging.CRITICAL)
+
+    search_latency(args.sizes, args.dims, args.repeat, args.k)
+    asyncio.run(end_to_end(args.latency))
@@ -0,0 +1,166 @@
+"""
+Benchmark: pools de conexiones HTTP con OpenAI y Telegram
+
+Envía ráfagas de peticiones a los servidores falsos de OpenAI y de la Bot
+API, separadas por un tiempo de inactividad, con tantas peticiones en
+vuelo como permite el bot (OPENAI_MAX_CONCURRENCY llamadas a OpenAI y
+CONCURRENT_UPDATES actualizaciones en paralelo). Cada conexión
+nueva tarda --connect-latency segundos en aceptarse (como un handshake
+TCP/TLS). Para cada configuración muestra la latencia p50/p95, la espera
+p95 por una conexión del pool, las conexiones abiertas y los errores.
+
+Configuraciones de OpenAI:
+- predeterminada del SDK: pool de 1000, 100 conexiones en keep-alive que
+  se cierran tras 5 s inactivas
+- pool pequeño: 4 conexiones, menos que las llamadas en vuelo
+- utils.http: pool de 2 × OPENAI_MAX_CONCURRENCY con keep-alive de
+  HTTP_KEEPALIVE_EXPIRY
+
+Configuraciones de Telegram:
+- predeterminada de python-telegram-bot: pool de 256, pero httpx solo
+  mantiene 20 conexiones en keep-alive, y durante 5 s
+- pool pequeño: 4 conexiones, con el plazo de espera de 1 s por defecto
+- utils.http: 2 × CONCURRENT_UPDATES conexiones en keep-alive
+
+Uso:
+    python -m benchmarks.bench_http --requests 64 --waves 3 --idle 6 --connect-latency 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def bursts(send, requests: int, concurrency: int, waves: int, idle: float) -> dict:
+    """Ráfagas de `requests` peticiones, `concurrency` a la vez, separadas por `idle` segundos"""
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await send(index)
+            except Exception:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    for wave in range(waves):
+        if wave:
+            await asyncio.sleep(idle)
+        await asyncio.gather(*(one(index) for index in range(requests)))
+    return {"latencies": latencies, "errors": errors}
+
+
+def report(label: str, result: dict, waits: list, connections: int) -> None:
+    latencies = result["latencies"]
+    print(f"  {label:38s} p50 {percentile(latencies, 0.5) * 1000:6.0f} ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:6.0f} ms  "
+          f"espera pool p95 {percentile(waits, 0.95) * 1000:6.1f} ms  "
+          f"conexiones {connections:4d}  errores {result['errors']}")
+
+
+async def bench_openai(args) -> None:
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    from config import OPENAI_MAX_CONCURRENCY
+    from utils.http import openai_http_client, pool_tracer
+
+    server = FakeOpenAIServer(latency=args.latency)
+    base_url = await server.start()
+    server.connect_latency = args.connect_latency
+    configs = {
+        "Predeterminada del SDK de openai": lambda hooks: DefaultAsyncHttpxClient(event_hooks=hooks),
+        "Pool pequeño (4 conexiones)": lambda hooks: httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=4), timeout=60, event_hooks=hooks
+        ),
+        "utils.http": lambda hooks: openai_http_client(event_hooks=hooks),
+    }
+    print(f"OpenAI: {args.waves} ráfagas de {args.requests} llamadas, {OPENAI_MAX_CONCURRENCY} a la vez, "
+          f"{args.idle:.0f} s inactivo entre ráfagas")
+    try:
+        for label, factory in configs.items():
+            waits = []
+            http_client = factory({"request": [pool_tracer(waits.append)]})
+            client = AsyncOpenAI(api_key="sk-fake", base_url=f"{base_url}/v1", max_retries=0,
+                                 http_client=http_client)
+            connections = server.connections
+
+            async def send(index: int) -> None:
+                await client.chat.completions.create(
+                    model="gpt-4-turbo", messages=[{"role": "user", "content": f"Pregunta {index}"}]
+                )
+
+            result = await bursts(send, args.requests, OPENAI_MAX_CONCURRENCY, args.waves, args.idle)
+            await client.close()
+            report(label, result, waits, server.connections - connections)
+    finally:
+        await server.stop()
+
+
+async def bench_telegram(args) -> None:
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+
+    from config import CONCURRENT_UPDATES
+    from utils.http import pool_tracer, telegram_request
+
+    server = FakeTelegramServer(latency=args.telegram_latency)
+    await server.start()
+    server.connect_latency = args.connect_latency
+    configs = {
+        "Predeterminada de python-telegram-bot": lambda hooks: HTTPXRequest(httpx_kwargs={"event_hooks": hooks}),
+        "Pool pequeño (4 conexiones)": lambda hooks: HTTPXRequest(
+            connection_pool_size=4, httpx_kwargs={"event_hooks": hooks}
+        ),
+        "utils.http": lambda hooks: telegram_request(event_hooks=hooks),
+    }
+    print(f"Telegram: {args.waves} ráfagas de {args.requests} mensajes, {CONCURRENT_UPDATES} a la vez, "
+          f"{args.idle:.0f} s inactivo entre ráfagas")
+    try:
+        for label, factory in configs.items():
+            waits = []
+            bot = Bot(FAKE_TOKEN, base_url=server.bot_url, request=factory({"request": [pool_tracer(waits.append)]}))
+            await bot.initialize()
+            waits.clear()
+            connections = server.connections
+
+            async def send(index: int) -> None:
+                await bot.send_message(chat_id=index + 1, text="☕ Respuesta de prueba")
+
+            result = await bursts(send, args.requests, CONCURRENT_UPDATES, args.waves, args.idle)
+            await bot.shutdown()
+            report(label, result, waits, server.connections - connections)
+    finally:
+        await server.stop()
+
+
+async def run(args) -> None:
+    await bench_openai(args)
+    await bench_telegram(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los pools de conexiones HTTP")
+    parser.add_argument("--requests", type=int, default=64, help="Peticiones por ráfaga")
+    parser.add_argument("--waves", type=int, default=3)
+    parser.add_argument("--idle", type=float, default=6.0, help="Segundos sin peticiones entre ráfagas")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="Segundos de cada conexión nueva")
+    parser.add_argument("--latency", type=float, default=0.2, help="Segundos de cada respuesta de OpenAI")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="Segundos de cada respuesta de Telegram")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    asyncio.run(run(args))
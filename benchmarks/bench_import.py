@@ -0,0 +1,186 @@
+"""
+Benchmark: importación masiva de historiales
+
+Genera un historial sintético de --rows filas de compras (CSV y, si
+openpyxl está instalado, XLSX) con un 1 % de filas inválidas y lo importa
+de dos formas:
+
+- fila a fila: como registrar cada compra con /compra, una escritura en el
+  CSV y una fila en la cola de Google Sheets (con su fsync en el diario)
+  por fila; se mide sobre --baseline-rows filas y se extrapola
+- utils.importer: lectura en streaming, validación por lotes en el pool de
+  procesos y una escritura en el CSV y en el diario por lote
+
+Google Sheets se sustituye por FakeSheetsService. Se informa de las filas
+por segundo, las llamadas a la API y la memoria máxima del proceso principal
+(tracemalloc) frente al tamaño del archivo; esa pasada se hace sin Sheets,
+porque el servicio falso guarda en memoria todas las filas recibidas (las
+pendientes de la cola real se limitan con IMPORT_SHEETS_MAX_PENDING).
+
+Uso:
+    python -m benchmarks.bench_import --rows 100000
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.fake_sheets import FakeSheetsService
+
+SUPPLIERS = [f"Finca {i}" for i in range(40)]
+TYPES = ["Cereza", "Pergamino", "Oro"]
+
+
+def history_rows(rows: int, seed: int = 7):
+    """Filas sintéticas con el formato de una hoja exportada en español"""
+    rng = random.Random(seed)
+    start = date(2015, 1, 1)
+    for i in range(rows):
+        day = start + timedelta(days=i * 3650 // max(rows, 1))
+        quantity = round(rng.uniform(20, 900), 1)
+        price = rng.randint(6000, 14000)
+        row = [day.strftime("%d/%m/%Y"), rng.choice(SUPPLIERS), rng.choice(TYPES),
+               str(quantity).replace(".", ","), str(price)]
+        if i % 100 == 99:
+            row[0] = "sin fecha"
+        yield row
+
+
+def write_csv(path: str, rows: int) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Fecha", "Proveedor", "Tipo café", "Kg", "Precio kg"])
+        writer.writerows(history_rows(rows))
+
+
+def write_xlsx(path: str, rows: int) -> bool:
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        return False
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("compras")
+    sheet.append(["Fecha", "Proveedor", "Tipo café", "Kg", "Precio kg"])
+    for row in history_rows(rows):
+        sheet.append(row)
+    workbook.save(path)
+    return True
+
+
+def make_queue(service: FakeSheetsService, journal: str):
+    from utils.sheets_queue import SheetsWriteQueue
+    return SheetsWriteQueue(lambda: service, "fake-spreadsheet", journal, batch_size=100, flush_interval=0.5)
+
+
+async def row_by_row(source: str, rows: int, directory: str, latency: float) -> float:
+    """Una escritura en el CSV y una fila en la cola de Sheets por fila"""
+    from utils.importer import normalize_column, read_rows, validate_chunk
+
+    service = FakeSheetsService(latency=latency)
+    queue = make_queue(service, os.path.join(directory, "fila_a_fila.jsonl"))
+    await queue.start()
+    target = ["fecha", "proveedor", "tipo_cafe", "cantidad", "precio", "total"]
+    ledger = os.path.join(directory, "compras_fila_a_fila.csv")
+
+    reader = read_rows(source)
+    header = [normalize_column(name) for name in next(reader)]
+    start = time.perf_counter()
+    for line, row in enumerate(reader, start=2):
+        if line - 1 > rows:
+            break
+        valid, _, _ = validate_chunk("compras", header, target, [row], line)
+        for values in valid:
+            with open(ledger, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(values)
+            queue.append("compras", values)
+        # Cada fila es un mensaje: se cede el bucle como entre dos actualizaciones
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    await queue.stop()
+    return elapsed
+
+
+async def bulk(source: str, directory: str, latency: float, chunk_rows: int, trace: bool = False) -> dict:
+    """utils.importer con Google Sheets falso; devuelve el estado y las llamadas a la API"""
+    from utils.importer import import_file
+
+    service = FakeSheetsService(latency=latency)
+    name = f"{os.path.basename(source)}_{'traza' if trace else 'tiempo'}"
+    queue = make_queue(service, os.path.join(directory, f"lotes_{name}.jsonl"))
+    await queue.start()
+    ledger = os.path.join(directory, f"compras_{name}.csv")
+    if trace:
+        tracemalloc.start()
+    state = await import_file(
+        source, "compras", file_path=ledger, sheets=None if trace else queue, chunk_rows=chunk_rows,
+        log_path=os.path.join(directory, "importaciones.jsonl"), force=True
+    )
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    if trace:
+        tracemalloc.stop()
+    start = time.perf_counter()
+    await queue.stop()
+    state["envio_sheets"] = time.perf_counter() - start
+    state["llamadas"] = service.calls
+    state["en_sheets"] = sum(len(values) for values in service.sheets.values())
+    state["memoria_max"] = peak
+    return state
+
+
+def report(label: str, state: dict, size: int) -> None:
+    print(f"  {label:18s} {state['filas_por_segundo']:9.0f} filas/s  ({state['leidas']} filas en {state['segundos']:.2f} s, "
+          f"{state['importadas']} importadas, {state['invalidas']} omitidas)")
+    if state["llamadas"]:
+        print(f"  {'':18s} Sheets: {state['en_sheets']} filas en {state['llamadas']} llamadas "
+              f"(envío final {state['envio_sheets']:.2f} s)")
+    if state["memoria_max"]:
+        print(f"  {'':18s} memoria máxima {state['memoria_max'] / 1e6:.1f} MB con un archivo de {size / 1e6:.1f} MB (sin Sheets)")
+
+
+async def run(args) -> None:
+    from utils.workers import worker_pool
+
+    # Arranca los procesos antes de medir (en el bot se crean con la primera tarea)
+    await worker_pool.run("importacion", sum, [1])
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "historial.csv")
+        print(f"Generando historial de {args.rows} filas...")
+        write_csv(source, args.rows)
+        size = os.path.getsize(source)
+
+        elapsed = await row_by_row(source, args.baseline_rows, directory, args.latency)
+        rate = args.baseline_rows / elapsed
+        print(f"Fila a fila ({args.baseline_rows} filas medidas)")
+        print(f"  {'':18s} {rate:9.0f} filas/s  ({args.rows} filas ≈ {args.rows / rate:.1f} s)")
+
+        print(f"Por lotes de {args.chunk} filas (utils.importer)")
+        report("CSV", await bulk(source, directory, args.latency, args.chunk), size)
+        report("CSV (memoria)", await bulk(source, directory, args.latency, args.chunk, trace=True), size)
+
+        xlsx = os.path.join(directory, "historial.xlsx")
+        if write_xlsx(xlsx, args.rows):
+            report("XLSX", await bulk(xlsx, directory, args.latency, args.chunk), os.path.getsize(xlsx))
+        else:
+            print("  XLSX: omitido (openpyxl no está instalado)")
+
+    worker_pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la importación masiva de historiales")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--baseline-rows", type=int, default=5000, help="Filas medidas fila a fila")
+    parser.add_argument("--chunk", type=int, default=5000, help="Filas por lote")
+    parser.add_argument("--latency", type=float, default=0.2, help="Latencia de cada llamada a Sheets (s)")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    asyncio.run(run(args))
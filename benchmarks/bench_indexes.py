@@ -0,0 +1,111 @@
+"""
+Benchmark: reportes con índices secundarios frente a recorrer el CSV completo
+
+Genera historiales sintéticos de ventas y procesos de varios años (con el
+mismo volumen diario) y mide los reportes de /reporte: ventas del último
+mes, ventas por cliente de la última semana e inventario por estado. Con
+los índices, la latencia depende del tamaño del resultado y no de los años
+de historial.
+
+Uso:
+    python -m benchmarks.bench_indexes --years 1 5 10 --rows-per-day 100
+"""
+
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from utils.ledger import parse_date, sync_from_csv
+
+STATES = ["Pendiente", "Procesado parcialmente", "Procesado completamente"]
+
+
+def write_history(directory: str, years: int, rows_per_day: int, today: date) -> tuple:
+    ventas_path = os.path.join(directory, "ventas.csv")
+    proceso_path = os.path.join(directory, "proceso.csv")
+    first_day = today - timedelta(days=years * 365)
+    with open(ventas_path, "w", newline="", encoding="utf-8") as ventas, \
+            open(proceso_path, "w", newline="", encoding="utf-8") as proceso:
+        ventas_writer = csv.writer(ventas)
+        proceso_writer = csv.writer(proceso)
+        ventas_writer.writerow(["fecha", "cliente", "tipo_cafe", "cantidad", "precio", "total"])
+        proceso_writer.writerow(["fecha", "origen", "destino", "cantidad", "estado"])
+        for day in range(years * 365 + 1):
+            iso = (first_day + timedelta(days=day)).isoformat()
+            for _ in range(rows_per_day):
+                quantity = round(random.uniform(5, 500), 1)
+                price = round(random.uniform(2, 12), 2)
+                ventas_writer.writerow([iso, f"Cliente {random.randint(1, 80)}", "oro",
+                                        quantity, price, round(quantity * price, 2)])
+            for _ in range(max(1, rows_per_day // 10)):
+                proceso_writer.writerow([iso, "cereza", "pergamino", round(random.uniform(50, 900), 1),
+                                         random.choice(STATES)])
+    return ventas_path, proceso_path
+
+
+def timed(function, repeat: int = 5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def csv_reports(ventas_path: str, proceso_path: str, month_start: date, week_start: date) -> tuple:
+    """Los mismos reportes recorriendo los CSV, como haría un manejador sin índices"""
+    month_total = 0.0
+    by_client = {}
+    with open(ventas_path, newline="", encoding="utf-8") as f:
+        for record in csv.DictReader(f):
+            day = parse_date(record["fecha"])
+            if day >= month_start:
+                month_total += float(record["total"])
+            if day >= week_start:
+                by_client[record["cliente"]] = by_client.get(record["cliente"], 0.0) + float(record["total"])
+    inventory = {}
+    with open(proceso_path, newline="", encoding="utf-8") as f:
+        for record in csv.DictReader(f):
+            inventory[record["estado"]] = inventory.get(record["estado"], 0.0) + float(record["cantidad"])
+    return month_total, by_client, inventory
+
+
+def main(years_list: list, rows_per_day: int) -> None:
+    today = date.today()
+    month_start, week_start = today - timedelta(days=30), today - timedelta(days=7)
+    print(f"{'años':>4} | {'filas':>9} | {'CSV completo':>12} | {'mes':>9} | {'clientes':>9} | {'inventario':>10}")
+    for years in years_list:
+        with tempfile.TemporaryDirectory() as directory:
+            ventas_path, proceso_path = write_history(directory, years, rows_per_day, today)
+            ventas = sync_from_csv(ventas_path)
+            proceso = sync_from_csv(proceso_path)
+
+            scan_time, (csv_month, csv_clients, csv_inventory) = timed(
+                lambda: csv_reports(ventas_path, proceso_path, month_start, week_start), repeat=1)
+            month_time, month_total = timed(lambda: ventas.sum_between("total", month_start, today))
+            clients_time, clients = timed(lambda: ventas.totals_by("cliente", week_start, today))
+            inventory_time, inventory = timed(lambda: proceso.totals_by("estado"))
+
+            assert abs(month_total - csv_month) < 1e-6 * max(1.0, csv_month)
+            assert all(abs(clients[name]["total"] - value) < 1e-6 * max(1.0, value)
+                       for name, value in csv_clients.items())
+            assert all(abs(inventory[state]["cantidad"] - value) < 1e-6 * max(1.0, value)
+                       for state, value in csv_inventory.items())
+
+            print(f"{years:>4} | {len(ventas):>9} | {scan_time * 1000:>9.0f} ms | "
+                  f"{month_time * 1000:>6.3f} ms | {clients_time * 1000:>6.2f} ms | {inventory_time * 1000:>7.3f} ms")
+            ventas.close()
+            proceso.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los índices de los registros columnares")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--rows-per-day", type=int, default=100)
+    args = parser.parse_args()
+    main(args.years, args.rows_per_day)
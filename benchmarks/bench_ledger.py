@@ -0,0 +1,78 @@
+"""
+Benchmark: registro columnar sobre mmap frente a leer el CSV completo
+
+Mide leer las últimas 50 filas y sumar una columna con ambos formatos.
+
+Uso:
+    python -m benchmarks.bench_ledger --rows 1000000
+"""
+
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from utils.ledger import sync_from_csv
+
+
+def write_csv(path: str, rows: int) -> None:
+    start = date.today() - timedelta(days=5 * 365)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["fecha", "cliente", "tipo_cafe", "cantidad", "precio", "total"])
+        for i in range(rows):
+            quantity = round(random.uniform(5, 500), 1)
+            price = round(random.uniform(2, 12), 2)
+            writer.writerow([
+                (start + timedelta(days=i * 5 * 365 // rows)).isoformat(),
+                f"Cliente {random.randint(1, 80)}", "oro", quantity, price, round(quantity * price, 2)
+            ])
+
+
+def timed(function, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(rows: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ventas.csv")
+        write_csv(path, rows)
+
+        def csv_tail():
+            with open(path, newline="", encoding="utf-8") as f:
+                return list(csv.DictReader(f))[-50:]
+
+        def csv_sum():
+            with open(path, newline="", encoding="utf-8") as f:
+                return sum(float(record["total"]) for record in csv.DictReader(f))
+
+        start = time.perf_counter()
+        ledger = sync_from_csv(path)
+        import_time = time.perf_counter() - start
+
+        csv_tail_time, _ = timed(csv_tail, repeat=1)
+        csv_sum_time, csv_total = timed(csv_sum, repeat=1)
+        tail_time, _ = timed(lambda: ledger.tail(50))
+        sum_time, ledger_total = timed(lambda: ledger.sum("total"))
+        ledger.close()
+
+    print(f"Filas: {rows}")
+    print(f"Importación inicial al formato columnar: {import_time:.2f} s (una sola vez)")
+    print(f"Últimas 50 filas   CSV: {csv_tail_time * 1000:10.1f} ms   columnar: {tail_time * 1000:8.3f} ms")
+    print(f"Suma de 'total'    CSV: {csv_sum_time * 1000:10.1f} ms   columnar: {sum_time * 1000:8.3f} ms")
+    print(f"Totales coinciden: {abs(csv_total - ledger_total) < 1e-6 * max(1.0, abs(csv_total))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del registro columnar")
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+    main(args.rows)
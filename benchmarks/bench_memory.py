@@ -0,0 +1,128 @@
+"""
+Benchmark: memoria de las consultas de IA con resumen progresivo
+
+1. Una conversación larga contra el servidor falso de OpenAI, en el que
+   leer el prompt cuesta tiempo (--prompt-tps). Se comparan tres formas de
+   enviar el contexto: sin historial, con el historial completo y con
+   utils.memory (últimos turnos literales y resumen de los anteriores). Se
+   muestran los tokens de entrada y la latencia en distintos turnos.
+2. Memoria del proceso con muchos chats: sin límite de conversaciones
+   frente al desalojo LRU de utils.memory.
+
+Uso:
+    python -m benchmarks.bench_memory --turns 40 --latency 0.2 --prompt-tps 20000 --chats 20000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+import tracemalloc
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+ANSWER = (
+    "Para ese lote conviene fermentar entre 18 y 24 horas a la sombra, revisar el pH cada seis horas "
+    "y lavar en cuanto el mucílago se desprenda; después seca en capas delgadas hasta el 11 % de "
+    "humedad, moviendo el grano cuatro veces al día. "
+) * 6
+SUMMARY = "El usuario procesa un lote lavado; se habló de fermentación de 18-24 h, pH y secado al 11 %."
+
+
+def responder(payload: dict) -> str:
+    system = payload["messages"][0]["content"] if payload.get("messages") else ""
+    return SUMMARY if "Resumes conversaciones" in system else ANSWER
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def conversation(label: str, server: FakeOpenAIServer, store, turns: int) -> None:
+    from utils.openai import stream_response
+
+    chat_id = 1
+    tokens, latencies = [], []
+    requests_before = server.requests
+    for turn in range(1, turns + 1):
+        question = f"Pregunta de seguimiento número {turn} sobre el mismo lote de café lavado"
+        history = store.history(chat_id) if store is not None else None
+        sent = sum(len(m["content"]) for m in history or []) + len(question)
+        start = time.perf_counter()
+        answer = "".join([chunk async for chunk in stream_response(
+            question, "Eres un experto en café.", use_cache=False, call_site="consulta", history=history
+        )])
+        latencies.append(time.perf_counter() - start)
+        tokens.append(sent // 4)
+        if store is not None:
+            store.record(chat_id, question, answer)
+            # Los resúmenes se hacen en segundo plano; en el bot el usuario tarda más en escribir
+            await store.wait_idle()
+
+    checkpoints = [t for t in (1, 5, 10, 20, 40, 80, turns) if t <= turns]
+    by_turn = ", ".join(f"t{t} {tokens[t - 1]}" for t in dict.fromkeys(checkpoints))
+    last = latencies[-10:]
+    print(f"  {label}")
+    print(f"    Tokens de entrada: {by_turn}")
+    print(f"    Latencia de los últimos 10 turnos: p50 {percentile(last, 0.5):.2f} s, máx {max(last):.2f} s; "
+          f"peticiones a OpenAI {server.requests - requests_before} para {turns} turnos")
+
+
+async def instant_summary(summary: str, turns: list) -> str:
+    return SUMMARY
+
+
+async def memory_footprint(label: str, store, chats: int, turns_per_chat: int) -> None:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for chat_id in range(chats):
+        for turn in range(turns_per_chat):
+            store.record(chat_id, f"Pregunta {turn} del chat {chat_id}", ANSWER)
+        await store.wait_idle()
+    current = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    stats = store.stats()
+    print(f"  {label}: {stats['conversations']} conversaciones, {stats['turns']} turnos, "
+          f"{current / 1e6:.1f} MB ({stats['evictions']} descartadas)")
+
+
+async def run(args) -> None:
+    server = FakeOpenAIServer(latency=args.latency, responder=responder, prompt_tokens_per_second=args.prompt_tps)
+    os.environ["OPENAI_BASE_URL"] = await server.start()
+    from utils.memory import ConversationStore
+    from utils.openai import client
+
+    try:
+        print(f"Conversación de {args.turns} turnos (latencia {args.latency:.1f} s + "
+              f"1 s por cada {args.prompt_tps:.0f} tokens de entrada)")
+        await conversation("Sin historial", server, None, args.turns)
+        await conversation("Historial completo", server,
+                           ConversationStore(keep_turns=10 ** 9, max_tokens=10 ** 9), args.turns)
+        await conversation("Memoria con resumen (utils.memory)", server, ConversationStore(), args.turns)
+    finally:
+        await client.close()
+        await server.stop()
+
+    print(f"Memoria del proceso con {args.chats} chats de {args.chat_turns} turnos")
+    await memory_footprint("Sin límite de conversaciones",
+                           ConversationStore(max_conversations=10 ** 9, summarizer=instant_summary),
+                           args.chats, args.chat_turns)
+    await memory_footprint("Desalojo LRU (utils.memory)", ConversationStore(summarizer=instant_summary),
+                           args.chats, args.chat_turns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la memoria de las consultas de IA")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--prompt-tps", type=float, default=20000.0)
+    parser.add_argument("--chats", type=int, default=20000)
+    parser.add_argument("--chat-turns", type=int, default=6)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_CACHE_ENABLED"] = "false"
+    logging.disable(logging.CRITICAL)
+    asyncio.run(run(args))
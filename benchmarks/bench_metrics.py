@@ -0,0 +1,155 @@
+"""
+Benchmark: coste de las métricas y contenido de /metrics
+
+1. Coste por operación de un histograma y un contador reales frente a la
+   métrica vacía que se usa con METRICS_ENABLED=false.
+2. Coste en el camino caliente: generate_response respondiendo desde la
+   caché (sin red) con las métricas activadas y desactivadas, cada caso en
+   un proceso aparte porque la configuración se lee al importar.
+3. Bot real (manejadores de /ia) contra los servidores falsos de Telegram
+   y OpenAI con las métricas activadas; se lee /metrics y se muestran las
+   series de manejadores, OpenAI y caché.
+
+Uso:
+    python -m benchmarks.bench_metrics --calls 200000 --chats 10
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import warnings
+
+from telegram.warnings import PTBUserWarning
+
+REPLY = "El tueste medio resalta el dulzor sin ocultar la acidez del grano."
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def per_call_ns(function, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def primitives(calls: int) -> None:
+    from utils.metrics import _NULL, Counter, Histogram
+
+    histogram = Histogram("bench_seconds", "prueba", ("call_site",))
+    counter = Counter("bench_total", "prueba", ("call_site",))
+    child = histogram.labels(call_site="consulta")
+
+    print("Coste por operación")
+    print(f"  Sin operación (bucle vacío):          {per_call_ns(lambda: None, calls):7.0f} ns")
+    print(f"  Histograma .labels().observe():       "
+          f"{per_call_ns(lambda: histogram.labels(call_site='consulta').observe(0.1), calls):7.0f} ns")
+    print(f"  Histograma (hijo ya resuelto):        {per_call_ns(lambda: child.observe(0.1), calls):7.0f} ns")
+    print(f"  Contador .labels().inc():             "
+          f"{per_call_ns(lambda: counter.labels(call_site='consulta').inc(), calls):7.0f} ns")
+    print(f"  Métrica desactivada .labels().observe(): "
+          f"{per_call_ns(lambda: _NULL.labels(call_site='consulta').observe(0.1), calls):4.0f} ns")
+
+
+async def cached_calls(calls: int) -> float:
+    """Llamadas por segundo a generate_response cuando la respuesta está en caché"""
+    from utils.openai import generate_response, response_cache, make_cache_key, OPENAI_MODEL
+
+    response_cache.set(make_cache_key(OPENAI_MODEL, None, "¿Qué es un café honey?", 0.7, False, 1000), REPLY)
+    start = time.perf_counter()
+    for _ in range(calls):
+        await generate_response("¿Qué es un café honey?", call_site="consulta")
+    return calls / (time.perf_counter() - start)
+
+
+def hot_path(calls: int) -> None:
+    print("generate_response con acierto de caché (proceso aparte por configuración)")
+    results = {}
+    for enabled in ("false", "true"):
+        env = dict(os.environ, METRICS_ENABLED=enabled, OPENAI_API_KEY="sk-fake", OPENAI_CACHE_ENABLED="true")
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_metrics", "--child", "--calls", str(calls)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        results[enabled] = float(output.strip().splitlines()[-1])
+    for enabled, rate in results.items():
+        print(f"  METRICS_ENABLED={enabled}: {rate:,.0f} llamadas/s ({1e6 / rate:.2f} µs/llamada)")
+    print(f"  Coste añadido: {(1e6 / results['true'] - 1e6 / results['false']):.2f} µs/llamada")
+
+
+async def scrape(chats: int) -> None:
+    import httpx
+
+    from benchmarks.fake_openai import FakeOpenAIServer
+    from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer, recorded_message
+
+    openai = FakeOpenAIServer(latency=0.2, reply=REPLY)
+    os.environ["OPENAI_BASE_URL"] = await openai.start()
+    telegram = FakeTelegramServer()
+    await telegram.start()
+
+    from telegram import Update
+    from telegram.ext import Application
+
+    from handlers.ia import register_ia_handlers
+    from utils import metrics
+    from utils.openai import client
+
+    application = Application.builder().token(FAKE_TOKEN).base_url(telegram.bot_url).concurrent_updates(16).build()
+    register_ia_handlers(application)
+    metrics.instrument_handlers(application)
+
+    async def session(chat_id: int) -> None:
+        for i, text in enumerate(("/ia", "¿Qué es un tueste medio?")):
+            update = Update.de_json(recorded_message(chat_id * 10 + i, chat_id, text), application.bot)
+            await application.process_update(update)
+
+    try:
+        async with application:
+            await application.start()
+            await metrics.start_metrics_server(application)
+            await asyncio.gather(*(session(5000 + i) for i in range(chats)))
+            async with httpx.AsyncClient() as http:
+                response = await http.get(f"http://{metrics.METRICS_HOST}:{metrics.METRICS_PORT}/metrics")
+            await metrics.stop_metrics_server(application)
+            await application.stop()
+    finally:
+        await client.close()
+        await telegram.stop()
+        await openai.stop()
+
+    print(f"/metrics tras {chats} conversaciones: HTTP {response.status_code}, "
+          f"{len(response.text.splitlines())} líneas")
+    for line in response.text.splitlines():
+        if line.startswith((
+            "bot_handler_seconds_count", "bot_handler_seconds_sum", "openai_request_seconds_count",
+            "openai_request_seconds_sum", "openai_first_token_seconds_sum", "openai_tokens_total",
+            "openai_cache_requests_total", "openai_cache_hit_ratio", "admission_requests_total"
+        )):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de las métricas")
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(asyncio.run(cached_calls(args.calls)))
+        sys.exit(0)
+
+    os.environ.update(METRICS_ENABLED="true", METRICS_PORT=str(free_port()), OPENAI_API_KEY="sk-fake",
+                      OPENAI_CACHE_ENABLED="false", STREAM_EDIT_INTERVAL="0.5")
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+    primitives(args.calls)
+    hot_path(args.calls // 4)
+    asyncio.run(scrape(args.chats))
@@ -0,0 +1,150 @@
+"""
+Benchmark: cola de salida de mensajes hacia Telegram
+
+Servidor falso de la Bot API con el control de flujo de Telegram (por chat
+privado, 1 mensaje por segundo con ráfagas de 3; en total, 30 por
+segundo; por encima responde 429 con retry_after). --chats chats reciben
+a la vez --messages textos cada uno (respuestas y avisos que coinciden bajo
+carga), de tres formas:
+
+- directo: bot.send_message sin limitador; los 429 son mensajes perdidos
+- limitador: utils.outbox.TelegramRateLimiter espera turno por chat y
+  global y reintenta tras RetryAfter
+- limitador + cola: además, utils.outbox.Outbox une los textos pendientes
+  de cada chat en un mensaje
+
+Se informa de los textos entregados por segundo, las llamadas a
+sendMessage y los 429. Al final se corta una lista de precios optimizados
+de --products productos en Markdown y se comprueba que ninguna parte deja
+una entidad abierta.
+
+Uso:
+    python -m benchmarks.bench_outbox --chats 20 --messages 10
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+import warnings
+
+from telegram.error import RetryAfter
+from telegram.warnings import PTBUserWarning
+
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer
+
+# Límites del control de flujo del servidor falso (y del limitador)
+CHAT_RATE = 1.0
+CHAT_BURST = 3.0
+GLOBAL_RATE = 30.0
+
+
+def build_application(telegram: FakeTelegramServer, rate_limiter=None):
+    from telegram.ext import Application
+
+    builder = Application.builder().token(FAKE_TOKEN).base_url(telegram.bot_url).connection_pool_size(256)
+    if rate_limiter is not None:
+        builder = builder.rate_limiter(rate_limiter)
+    return builder.build()
+
+
+async def burst(telegram: FakeTelegramServer, chats: int, messages: int, mode: str) -> dict:
+    """Envía messages textos a cada chat a la vez; devuelve entregados, llamadas, 429 y segundos"""
+    from utils.outbox import Outbox, TelegramRateLimiter
+
+    limiter = None
+    if mode != "directo":
+        limiter = TelegramRateLimiter(GLOBAL_RATE, CHAT_RATE, CHAT_BURST, group_rate=20 / 60, max_retries=5)
+    application = build_application(telegram, limiter)
+    outbox = Outbox()
+    async with application:
+        telegram.reset()
+        bot = application.bot
+
+        async def send(chat_id: int, number: int) -> None:
+            text = f"Aviso {number} para el chat {chat_id}: compra registrada, 120 kg de pergamino."
+            if mode == "limitador + cola":
+                await outbox.send(bot, chat_id, text)
+            else:
+                await bot.send_message(chat_id, text)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(send(1000 + chat, number) for chat in range(chats) for number in range(messages)),
+            return_exceptions=True
+        )
+        elapsed = time.perf_counter() - start
+    failed = [result for result in results if isinstance(result, BaseException)]
+    unexpected = [result for result in failed if not isinstance(result, RetryAfter)]
+    if unexpected:
+        raise unexpected[0]
+    return {
+        "entregados": len(results) - len(failed),
+        "llamadas": sum(1 for call in telegram.calls if call["method"] == "sendMessage"),
+        "errores_429": telegram.flood_errors,
+        "reintentos": limiter.retries if limiter else 0,
+        "segundos": elapsed,
+    }
+
+
+def price_list(products: int) -> str:
+    """Respuesta de handle_optimization_data para una lista de productos"""
+    response = "💰 *Precios optimizados recomendados:*\n\n"
+    for i in range(products):
+        response += f"*Café de origen {i} (pergamino, 500 g)*\n"
+        response += f"📈 Precio actual: ${18000 + i * 37}\n"
+        response += f"✅ Precio recomendado: ${19500 + i * 41}\n"
+        response += ("📝 Justificación: el precio de la competencia en la zona y el costo del "
+                     f"procesamiento permiten subirlo un _{5 + i % 7} %_ sin perder volumen.\n\n")
+    return response
+
+
+def split_report(products: int) -> None:
+    from utils.telegram import MAX_MESSAGE_LENGTH, _markdown_entities, split_message
+
+    text = price_list(products)
+    parts = split_message(text, markdown=True)
+    # Una entidad abierta llega hasta el final de su parte sin su delimitador de cierre
+    broken = sum(
+        1 for part in parts for start, end, marker in _markdown_entities(part)
+        if end == len(part) and not part.endswith(")" if marker == "[" else marker)
+    )
+    naive = [text[i:i + MAX_MESSAGE_LENGTH] for i in range(0, len(text), MAX_MESSAGE_LENGTH)]
+    naive_broken = sum(
+        1 for part in naive for start, end, marker in _markdown_entities(part)
+        if end == len(part) and not part.endswith(")" if marker == "[" else marker)
+    )
+    print(f"\nLista de precios de {products} productos ({len(text)} caracteres)")
+    print(f"  cortes cada {MAX_MESSAGE_LENGTH} caracteres: {len(naive)} mensajes, {naive_broken} con Markdown roto")
+    print(f"  split_message:              {len(parts)} mensajes, {broken} con Markdown roto "
+          f"(máx. {max(map(len, parts))} caracteres)")
+
+
+async def run(args) -> None:
+    telegram = FakeTelegramServer(chat_rate=CHAT_RATE, chat_burst=CHAT_BURST, global_rate=GLOBAL_RATE)
+    await telegram.start()
+    try:
+        total = args.chats * args.messages
+        print(f"{args.chats} chats × {args.messages} textos = {total} textos a la vez "
+              f"(límites: {CHAT_RATE:.0f}/s por chat con ráfagas de {CHAT_BURST:.0f}, {GLOBAL_RATE:.0f}/s en total)")
+        for mode in ("directo", "limitador", "limitador + cola"):
+            result = await burst(telegram, args.chats, args.messages, mode)
+            print(f"  {mode:17s} {result['entregados']:5d}/{total} entregados en {result['segundos']:5.1f} s "
+                  f"({result['entregados'] / result['segundos']:6.1f} textos/s), "
+                  f"{result['llamadas']} sendMessage, {result['errores_429']} respuestas 429, "
+                  f"{result['reintentos']} reintentos")
+    finally:
+        await telegram.stop()
+    split_report(args.products)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la cola de salida de mensajes hacia Telegram")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=10, help="Textos por chat")
+    parser.add_argument("--products", type=int, default=60, help="Productos de la lista de precios")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+    logging.disable(logging.CRITICAL)
+    asyncio.run(run(args))
@@ -0,0 +1,220 @@
+"""
+Benchmark: persistencia del estado del bot en SQLite
+
+1. Escrituras: coste por actualización agrupando las escrituras de cada
+   ciclo en una transacción (WAL) frente a confirmar cada una con fsync.
+2. Reinicio: un usuario abre /ia, el bot se reinicia y la pregunta
+   siguiente se responde igualmente (sin persistencia se pierde).
+3. Dos procesos: /ia lo atiende un proceso y la pregunta otro que
+   comparte el mismo archivo.
+4. Procesos concurrentes: varios procesos escriben a la vez en el mismo
+   archivo sin perder filas ni fallar por bloqueos.
+
+Uso:
+    python -m benchmarks.bench_persistence --updates 2000 --workers 4
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import warnings
+
+from telegram.warnings import PTBUserWarning
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer, recorded_message
+
+REPLY = "Un proceso honey conserva parte del mucílago durante el secado."
+CYCLE_UPDATES = 50
+
+
+def build_app(telegram: FakeTelegramServer, persistence):
+    from telegram.ext import Application
+
+    from handlers.ia import register_ia_handlers
+
+    builder = Application.builder().token(FAKE_TOKEN).base_url(telegram.bot_url)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
+    register_ia_handlers(application)
+    if persistence is not None:
+        persistence.sync_conversations(application)
+    return application
+
+
+async def send(application, update_id: int, chat_id: int, text: str) -> None:
+    from telegram import Update
+
+    await application.process_update(Update.de_json(recorded_message(update_id, chat_id, text), application.bot))
+
+
+def answered(telegram: FakeTelegramServer, chat_id: int) -> bool:
+    return any(REPLY in str(call["params"].get("text", "")) for call in telegram.calls_for(chat_id))
+
+
+async def write_cost(directory: str, updates: int) -> None:
+    from utils.persistence import SQLitePersistence, _dumps
+
+    # Una transacción con fsync por actualización
+    naive = sqlite3.connect(os.path.join(directory, "naive.sqlite3"), isolation_level=None)
+    naive.execute("PRAGMA synchronous=FULL")
+    naive.execute("CREATE TABLE state (kind TEXT, key TEXT, value BLOB, PRIMARY KEY (kind, key))")
+    start = time.perf_counter()
+    for i in range(updates):
+        naive.execute("BEGIN")
+        naive.execute("INSERT OR REPLACE INTO state VALUES ('user', ?, ?)",
+                      (str(i % 500), _dumps({"ia_mode": "consulta", "n": i})[1]))
+        naive.execute("INSERT OR REPLACE INTO state VALUES ('conversation:ia', ?, ?)", (f"[{i % 500}]", b"0"))
+        naive.execute("COMMIT")
+    naive_time = time.perf_counter() - start
+    naive.close()
+
+    # Escrituras agrupadas por ciclo de update_persistence
+    persistence = SQLitePersistence(os.path.join(directory, "coalesced.sqlite3"))
+    start = time.perf_counter()
+    for cycle in range(0, updates, CYCLE_UPDATES):
+        for i in range(cycle, min(updates, cycle + CYCLE_UPDATES)):
+            await persistence.update_user_data(i % 500, {"ia_mode": "consulta", "n": i})
+            await persistence.update_conversation("ia", (i % 500,), 0)
+        await persistence.flush()
+    coalesced_time = time.perf_counter() - start
+    commits = persistence.commits
+    persistence.close()
+
+    print("Escrituras")
+    print(f"  Una transacción con fsync por actualización: {naive_time / updates * 1000:.3f} ms/actualización")
+    print(f"  Agrupadas ({CYCLE_UPDATES} actualizaciones por ciclo, WAL): "
+          f"{coalesced_time / updates * 1000:.3f} ms/actualización, {commits} transacciones")
+
+
+async def restart(directory: str, telegram: FakeTelegramServer) -> None:
+    from utils.persistence import SQLitePersistence
+
+    results = {}
+    for label, persistent in (("sin persistencia", False), ("con persistencia", True)):
+        path = os.path.join(directory, f"restart-{label[:3]}.sqlite3")
+        chat_id = 3000 + len(results)
+        first = build_app(telegram, SQLitePersistence(path) if persistent else None)
+        async with first:
+            await first.start()
+            await send(first, 1, chat_id, "/ia")
+            await first.stop()
+
+        # Nuevo proceso del bot tras el reinicio
+        persistence = SQLitePersistence(path) if persistent else None
+        second = build_app(telegram, persistence)
+        async with second:
+            await second.start()
+            await send(second, 2, chat_id, "¿Qué es un proceso honey?")
+            await second.stop()
+        if persistence:
+            persistence.close()
+        results[label] = answered(telegram, chat_id)
+
+    print("Reinicio a mitad de conversación")
+    for label, ok in results.items():
+        print(f"  {label}: pregunta respondida tras el reinicio = {ok}")
+
+
+async def two_workers(directory: str, telegram: FakeTelegramServer) -> None:
+    from utils.persistence import SQLitePersistence
+
+    path = os.path.join(directory, "shared.sqlite3")
+    chat_id = 4000
+    persistence_a = SQLitePersistence(path, update_interval=0.2)
+    persistence_b = SQLitePersistence(path, update_interval=0.2)
+    worker_a = build_app(telegram, persistence_a)
+    worker_b = build_app(telegram, persistence_b)
+    async with worker_a, worker_b:
+        await worker_a.start()
+        await worker_b.start()
+
+        await send(worker_a, 1, chat_id, "/ia")
+        # Un ciclo de persistencia para que el estado llegue al archivo compartido
+        await asyncio.sleep(0.5)
+        await send(worker_b, 2, chat_id, "¿Qué es un proceso honey?")
+        first_answer = answered(telegram, chat_id)
+
+        # Y de vuelta: el proceso A ve que la conversación ya avanzó en B
+        await asyncio.sleep(0.5)
+        await send(worker_a, 3, chat_id, "/cancelar")
+        cancelled = any("cancelad" in str(call["params"].get("text", "")).lower()
+                        for call in telegram.calls_for(chat_id))
+
+        await worker_a.stop()
+        await worker_b.stop()
+    persistence_a.close()
+    persistence_b.close()
+    print("Dos procesos compartiendo el archivo")
+    print(f"  /ia en A y pregunta en B: respondida = {first_answer}")
+    print(f"  /cancelar en A tras avanzar en B: conversación encontrada = {cancelled}")
+
+
+def _stress_worker(path: str, worker: int, writes: int) -> int:
+    from utils.persistence import SQLitePersistence
+
+    async def run() -> int:
+        persistence = SQLitePersistence(path)
+        for i in range(writes):
+            await persistence.update_user_data(worker * 1000000 + i, {"ia_mode": "consulta", "worker": worker})
+            await persistence.update_conversation("ia", (worker, i), i % 3)
+            if i % CYCLE_UPDATES == CYCLE_UPDATES - 1:
+                await persistence.flush()
+        await persistence.flush()
+        commits = persistence.commits
+        persistence.close()
+        return commits
+
+    return asyncio.run(run())
+
+
+def concurrent_processes(directory: str, workers: int, writes: int) -> None:
+    path = os.path.join(directory, "concurrent.sqlite3")
+    start = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        commits = pool.starmap(_stress_worker, [(path, worker, writes) for worker in range(workers)])
+    elapsed = time.perf_counter() - start
+
+    db = sqlite3.connect(path)
+    users = db.execute("SELECT COUNT(*) FROM state WHERE kind = 'user'").fetchone()[0]
+    conversations = db.execute("SELECT COUNT(*) FROM state WHERE kind = 'conversation:ia'").fetchone()[0]
+    db.close()
+    print(f"{workers} procesos escribiendo a la vez")
+    print(f"  {workers * writes} actualizaciones en {elapsed:.2f} s ({sum(commits)} transacciones)")
+    print(f"  Filas guardadas: user_data {users}/{workers * writes}, "
+          f"conversaciones {conversations}/{workers * writes}")
+
+
+async def run(args) -> None:
+    openai = FakeOpenAIServer(latency=0.05, reply=REPLY)
+    os.environ["OPENAI_BASE_URL"] = await openai.start()
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_CACHE_ENABLED"] = "false"
+    telegram = FakeTelegramServer()
+    await telegram.start()
+    from utils.openai import client
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            await write_cost(directory, args.updates)
+            await restart(directory, telegram)
+            await two_workers(directory, telegram)
+            concurrent_processes(directory, args.workers, args.updates // args.workers)
+    finally:
+        await client.close()
+        await telegram.stop()
+        await openai.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la persistencia en SQLite")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+    asyncio.run(run(args))
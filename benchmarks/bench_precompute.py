@@ -0,0 +1,126 @@
+"""
+Benchmark: análisis de datos calculado en cada clic frente a precalculado
+
+Genera registros sintéticos (por defecto 100.000 compras y ventas) y simula
+una jornada de clics en "📊 Análisis de datos" mientras se registran ventas
+nuevas entre clic y clic. Compara dos formas de servir el análisis, con el
+servidor falso de OpenAI:
+
+- en cada clic: como antes, agregados, indicadores y una llamada al modelo
+  por clic (los datos cambiaron, así que la caché de respuestas no sirve).
+- precalculado: utils.precompute. El clic sirve el análisis guardado y la
+  tarea periódica (aquí, tras cada tanda de ventas) solo lo recalcula cuando
+  hay --threshold filas nuevas. Al final se pulsa "Actualizar".
+
+Muestra la latencia p50/p95 de los clics, las llamadas al modelo y cuántas
+filas llegaron a faltar en el análisis mostrado.
+
+Uso:
+    python -m benchmarks.bench_precompute --rows 100000 --clicks 30 --sales-per-click 3 --threshold 20
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def add_sales(path: str, count: int) -> None:
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        for _ in range(count):
+            writer.writerow([date.today().isoformat(), "Cliente 1", "oro", 10, 20, 200])
+
+
+def report(label: str, latencies: list, calls: int, stale: int) -> None:
+    print(f"  {label:14s} clic p50 {percentile(latencies, 0.5) * 1000:8.1f} ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:8.1f} ms  "
+          f"llamadas al modelo {calls:3d}  filas sin analizar (máx.) {stale}")
+
+
+async def run(args) -> None:
+    server = FakeOpenAIServer(latency=args.latency)
+    base_url = await server.start()
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    # Cada análisis debe llegar al modelo para contar las llamadas
+    os.environ["OPENAI_CACHE_ENABLED"] = "false"
+
+    from benchmarks.bench_reports import write_ledgers
+    from utils.aggregates import AggregationStore
+    from utils.ledger import GROUP_FIELDS
+    from utils.openai import analyze_coffee_data, close_client
+    from utils.precompute import AnalysisStore, analysis_data, changed_rows
+    from utils.reports import ReportEngine
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"Generando {args.rows} compras y ventas...")
+            files = write_ledgers(directory, args.rows)
+
+            def sources():
+                store = AggregationStore({name: {"file": path, "group_by": GROUP_FIELDS[name]}
+                                          for name, path in files.items()})
+                return store, ReportEngine(files)
+
+            print(f"{args.clicks} clics con {args.sales_per_click} ventas nuevas antes de cada uno, "
+                  f"modelo de {args.latency:.1f} s")
+
+            # En cada clic: agregados, indicadores y llamada al modelo
+            store, engine = sources()
+            await asyncio.to_thread(analysis_data, store, engine)
+            calls, latencies = server.requests, []
+            for _ in range(args.clicks):
+                add_sales(files["ventas"], args.sales_per_click)
+                start = time.perf_counter()
+                data = await asyncio.to_thread(analysis_data, store, engine)
+                await analyze_coffee_data(data, raise_errors=True)
+                latencies.append(time.perf_counter() - start)
+            report("En cada clic", latencies, server.requests - calls, 0)
+
+            # Precalculado: la tarea de arranque calcula el primero; los clics lo leen
+            store, engine = sources()
+            analysis = AnalysisStore(os.path.join(directory, "analisis.json"), store, engine)
+            calls, latencies, stale = server.requests, [], 0
+            await analysis.refresh(trigger="cambios")
+            for _ in range(args.clicks):
+                add_sales(files["ventas"], args.sales_per_click)
+                # Revisión periódica de cambios (changes_analysis_job)
+                await analysis.refresh(min_changes=args.threshold, trigger="cambios")
+                start = time.perf_counter()
+                result = analysis.latest()
+                rows = await asyncio.to_thread(store.row_counts)
+                latencies.append(time.perf_counter() - start)
+                stale = max(stale, changed_rows(result["filas"], rows))
+            report("Precalculado", latencies, server.requests - calls, stale)
+
+            start = time.perf_counter()
+            await analysis.refresh(force=True)
+            print(f"  Actualizar análisis (force): {(time.perf_counter() - start) * 1000:.0f} ms")
+    finally:
+        await close_client()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del análisis de datos precalculado")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--clicks", type=int, default=30)
+    parser.add_argument("--sales-per-click", type=int, default=3, help="Ventas registradas antes de cada clic")
+    parser.add_argument("--threshold", type=int, default=20, help="Filas nuevas que adelantan el análisis")
+    parser.add_argument("--latency", type=float, default=3.0, help="Segundos de cada respuesta de OpenAI")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    asyncio.run(run(args))
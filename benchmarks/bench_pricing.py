@@ -0,0 +1,101 @@
+"""
+Benchmark: optimización de precios en una sola llamada frente a bloques en paralelo
+
+El servidor falso genera una recomendación JSON por cada producto de la
+tabla del prompt, a una velocidad fija de tokens por segundo, y puede
+devolver JSON inválido con cierta probabilidad para simular fallos.
+
+Uso:
+    python -m benchmarks.bench_pricing --sizes 5 50 200 --failure-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def pricing_responder(failure_rate: float):
+    """Construye la respuesta JSON a partir de la tabla de productos del prompt"""
+
+    def respond(payload: dict) -> str:
+        prompt = payload["messages"][-1]["content"]
+        table = prompt.split("[productos]", 1)[1].strip().split("\n\n", 1)[0]
+        lines = [line.strip() for line in table.splitlines() if "|" in line]
+        header = lines[0].split("|")
+        rows = [dict(zip(header, line.split("|"))) for line in lines[1:]]
+
+        if random.random() < failure_rate:
+            return "Lo siento, aquí tienes las recomendaciones: {producto: ..."
+
+        return json.dumps({"recomendaciones": [
+            {
+                "producto": row["producto"],
+                "precio_actual": float(row.get("precio_actual") or 0),
+                "precio_recomendado": round(float(row.get("costo") or 1) * 1.35, 2),
+                "justificacion": "Margen ajustado al costo de producción y al precio de referencia del mercado local",
+            }
+            for row in rows
+        ]}, ensure_ascii=False)
+
+    return respond
+
+
+def synthetic_products(count: int) -> list:
+    return [
+        {
+            "producto": f"Café {i} {random.choice(['molido', 'en grano', 'tostado medio'])}",
+            "precio_actual": round(random.uniform(8, 30), 2),
+            "costo": round(random.uniform(4, 15), 2),
+            "margen": random.choice([25.0, 30.0, 40.0]),
+        }
+        for i in range(count)
+    ]
+
+
+async def run(sizes: list, latency: float, tokens_per_second: float, failure_rate: float) -> None:
+    server = FakeOpenAIServer(
+        latency=latency,
+        tokens_per_second=tokens_per_second,
+        responder=pricing_responder(failure_rate)
+    )
+    base_url = await server.start()
+
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_CACHE_ENABLED"] = "false"
+    from utils.openai import client, optimize_coffee_pricing
+
+    print(f"{'productos':>9} | {'una llamada':>18} | {'bloques paralelos':>18}")
+    try:
+        for size in sizes:
+            products = synthetic_products(size)
+            results = []
+            for chunk_size in (size, None):
+                start = time.perf_counter()
+                result = await optimize_coffee_pricing({"productos": products}, chunk_size=chunk_size)
+                elapsed = time.perf_counter() - start
+                if isinstance(result, dict):
+                    status = "falló"
+                else:
+                    priced = sum(1 for item in result if item["precio_recomendado"] is not None)
+                    status = f"{priced}/{size}"
+                results.append(f"{elapsed:6.2f} s ({status})")
+            print(f"{size:>9} | {results[0]:>18} | {results[1]:>18}")
+    finally:
+        await client.close()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la optimización de precios por bloques")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 200])
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=300)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.latency, args.tokens_per_second, args.failure_rate))
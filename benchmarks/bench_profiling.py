@@ -0,0 +1,195 @@
+"""
+Benchmark: perfilado del bucle de eventos y de las actualizaciones
+
+Bot real (Application de python-telegram-bot) contra el servidor falso de
+Telegram con manejadores de prueba:
+
+- /nada: no hace nada (coste de la capa de perfilado por actualización)
+- /rapido: responde de inmediato
+- /red: espera --latency segundos sin bloquear, como una llamada lenta a OpenAI
+- /bloqueo: duerme --block segundos con time.sleep, como una llamada síncrona
+  a OpenAI o a Sheets dentro de un manejador
+- /cpu: cálculo de Python puro de unos cientos de milisegundos
+
+1. Coste de la capa: --updates actualizaciones /nada sin y con perfilado.
+2. Detección: /red y /bloqueo mientras otros chats envían /rapido; se
+   muestra lo que responde /perf (el bloqueo aparece con su manejador y la
+   línea de time.sleep; /red es lenta pero no bloquea) y la pila de /perf bloqueos.
+3. Perfilador por muestreo: /cpu con el perfilador activo, su coste y las
+   funciones que más aparecen.
+
+Uso:
+    python -m benchmarks.bench_profiling --updates 2000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+import warnings
+
+from telegram.warnings import PTBUserWarning
+
+ADMIN_ID = 4242
+
+
+def busy_work(milliseconds: float) -> int:
+    """Cálculo de Python puro que retiene el GIL (p. ej. recorrer filas en un manejador)"""
+    deadline = time.perf_counter() + milliseconds / 1000
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(i * i for i in range(500))
+    return total
+
+
+def build_application(telegram, latency: float, block: float, cpu_ms: float):
+    from telegram.ext import Application, CommandHandler
+
+    from benchmarks.fake_telegram import FAKE_TOKEN
+    from handlers.perf import register_perf_handlers
+
+    async def nada(update, context) -> None:
+        return None
+
+    async def rapido(update, context) -> None:
+        await update.message.reply_text("ok")
+
+    async def red_lenta(update, context) -> None:
+        await asyncio.sleep(latency)
+        await update.message.reply_text("respuesta de la red")
+
+    async def bloqueo_sincrono(update, context) -> None:
+        time.sleep(block)
+        await update.message.reply_text("respuesta síncrona")
+
+    async def calculo(update, context) -> None:
+        busy_work(cpu_ms)
+        await update.message.reply_text("cálculo terminado")
+
+    application = Application.builder().token(FAKE_TOKEN).base_url(telegram.bot_url).concurrent_updates(32).build()
+    for command, callback in (("nada", nada), ("rapido", rapido), ("red", red_lenta),
+                              ("bloqueo", bloqueo_sincrono), ("cpu", calculo)):
+        application.add_handler(CommandHandler(command, callback))
+    register_perf_handlers(application)
+    return application
+
+
+async def process(application, update_id: int, chat_id: int, text: str) -> float:
+    from telegram import Update
+
+    from benchmarks.fake_telegram import recorded_message
+
+    start = time.perf_counter()
+    await application.process_update(Update.de_json(recorded_message(update_id, chat_id, text), application.bot))
+    return time.perf_counter() - start
+
+
+async def layer_cost(telegram, updates: int) -> None:
+    from utils.metrics import wrap_handlers
+    from utils.profiling import profiler
+
+    results = {}
+    for label, profiled in (("sin perfilado", False), ("con perfilado", True)):
+        application = build_application(telegram, 0, 0, 0)
+        if profiled:
+            wrap_handlers(application, profiler.wrap, "__profiling_wrapped__")
+        async with application:
+            start = time.perf_counter()
+            for i in range(updates):
+                await process(application, i, 100 + i % 10, "/nada")
+            results[label] = (time.perf_counter() - start) / updates
+    print(f"1. Coste de la capa ({updates} actualizaciones /nada)")
+    for label, seconds in results.items():
+        print(f"  {label:14s} {seconds * 1e6:7.1f} µs por actualización")
+    print(f"  Añadido: {(results['con perfilado'] - results['sin perfilado']) * 1e6:.1f} µs por actualización")
+    profiler.reset()
+
+
+async def detection(telegram, args) -> None:
+    from utils.metrics import wrap_handlers
+    from utils.profiling import profiler
+
+    application = build_application(telegram, args.latency, args.block, args.cpu_ms)
+    wrap_handlers(application, profiler.wrap, "__profiling_wrapped__")
+    async with application:
+        profiler.start()
+        profiler.reset()
+
+        async def other_chats() -> list:
+            latencies = []
+            for i in range(40):
+                latencies.append(await process(application, 1000 + i, 200 + i % 8, "/rapido"))
+                await asyncio.sleep(0.025)
+            return latencies
+
+        background = asyncio.create_task(other_chats())
+        await asyncio.sleep(0.1)
+        await asyncio.gather(process(application, 1, 300, "/red"), process(application, 2, 301, "/bloqueo"))
+        latencies = sorted(await background)
+
+        print(f"\n2. Detección: /red espera {args.latency * 1000:.0f} ms sin bloquear, "
+              f"/bloqueo duerme {args.block * 1000:.0f} ms con time.sleep")
+        lag = profiler.lag_stats()
+        print(f"  /rapido de otros chats: p50 {latencies[len(latencies) // 2] * 1000:.0f} ms; "
+              f"retraso del bucle máx. {lag['max'] * 1000:.0f} ms (lo que esperó cualquier otro chat)")
+        telegram.reset()
+        await process(application, 3, ADMIN_ID, "/perf")
+        print("  Respuesta de /perf:")
+        for line in telegram.calls_for(ADMIN_ID, "sendMessage")[-1]["params"]["text"].splitlines():
+            print(f"    {line}")
+        telegram.reset()
+        await process(application, 4, ADMIN_ID, "/perf bloqueos")
+        print("  Respuesta de /perf bloqueos (últimas líneas de la pila):")
+        for line in telegram.calls_for(ADMIN_ID, "sendMessage")[-1]["params"]["text"].splitlines()[-6:]:
+            print(f"    {line}")
+
+        # 3. Perfilador por muestreo
+        runs = 3
+        start = time.perf_counter()
+        for i in range(runs):
+            await process(application, 10 + i, 400, "/cpu")
+        plain = (time.perf_counter() - start) / runs
+        await process(application, 20, ADMIN_ID, "/perf perfil")
+        start = time.perf_counter()
+        for i in range(runs):
+            await process(application, 30 + i, 400, "/cpu")
+        sampled = (time.perf_counter() - start) / runs
+        samples_before = profiler.profile()["muestras"]
+        telegram.reset()
+        await process(application, 40, ADMIN_ID, "/perf perfil")
+        report = telegram.calls_for(ADMIN_ID, "sendMessage")[-1]["params"]["text"].splitlines()
+        print(f"\n3. Perfilador por muestreo (una muestra cada {profiler.sample_interval * 1000:.0f} ms)")
+        print(f"  /cpu sin perfilador {plain * 1000:.0f} ms, con perfilador {sampled * 1000:.0f} ms "
+              f"({(sampled / plain - 1):+.1%}), {samples_before} muestras")
+        print("  Respuesta de /perf perfil (primeras líneas):")
+        for line in report[:7]:
+            print(f"    {line}")
+        await profiler.stop()
+
+
+async def run(args) -> None:
+    from benchmarks.fake_telegram import FakeTelegramServer
+
+    telegram = FakeTelegramServer()
+    await telegram.start()
+    try:
+        await layer_cost(telegram, args.updates)
+        await detection(telegram, args)
+    finally:
+        await telegram.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del perfilado del bucle de eventos")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.5, help="Segundos de espera de /red")
+    parser.add_argument("--block", type=float, default=0.4, help="Segundos de time.sleep en /bloqueo")
+    parser.add_argument("--cpu-ms", type=float, default=300, help="Milisegundos de cálculo de /cpu")
+    args = parser.parse_args()
+
+    os.environ.update(PROFILING_ENABLED="true", ADMIN_IDS=str(ADMIN_ID), PROFILING_BLOCK_THRESHOLD="0.1")
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+    # El aviso de cada bloqueo (con su pila) se ve después en la respuesta de /perf bloqueos
+    logging.getLogger("utils.profiling").setLevel(logging.ERROR)
+    asyncio.run(run(args))
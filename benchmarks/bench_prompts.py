@@ -0,0 +1,55 @@
+"""
+Benchmark: tokens del prompt con JSON indentado frente al formato compacto
+
+Uso:
+    python -m benchmarks.bench_prompts --records 200 --budget 1500
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from utils.prompts import count_tokens, load_encoder, serialize_data, token_budget
+
+
+def synthetic_records(count: int) -> list:
+    start = date.today() - timedelta(days=count)
+    return [
+        {
+            "fecha": (start + timedelta(days=i)).isoformat(),
+            "proveedor": f"Proveedor {random.randint(1, 30)}",
+            "tipo_cafe": random.choice(["cereza", "pergamino", "oro"]),
+            "cantidad": round(random.uniform(10, 400), 1),
+            "precio": round(random.uniform(2, 9), 2),
+            "total": round(random.uniform(50, 3000), 2),
+        }
+        for i in range(count)
+    ]
+
+
+def main(records: int, budget: int) -> None:
+    exact = load_encoder()
+    data = {"compras": synthetic_records(records), "ventas": synthetic_records(records)}
+
+    indented = json.dumps(data, indent=2, ensure_ascii=False)
+    start = time.perf_counter()
+    compact = serialize_data(data, budget=10 ** 9)
+    fitted = serialize_data(data, budget=budget)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    print(f"Registros por tabla: {records} (tokens {'medidos con tiktoken' if exact else 'estimados'})")
+    print(f"JSON indentado:            {count_tokens(indented):7d} tokens")
+    print(f"Tablas compactas:          {count_tokens(compact):7d} tokens")
+    print(f"Ajustado a {budget} tokens:  {count_tokens(fitted):7d} tokens")
+    print(f"Presupuesto por defecto del modelo configurado: {token_budget()} tokens")
+    print(f"Tiempo de construcción: {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del constructor de prompts")
+    parser.add_argument("--records", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=1500)
+    args = parser.parse_args()
+    main(args.records, args.budget)
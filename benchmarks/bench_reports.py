@@ -0,0 +1,182 @@
+"""
+Benchmark: motor de reportes NumPy frente a bucles sobre listas de diccionarios
+
+Genera registros sintéticos de compras, procesos y ventas (por defecto
+1.000.000 de ventas y compras), los importa al formato columnar y calcula
+los mismos reportes de dos formas:
+
+1. Bucles de Python sobre listas de diccionarios leídas del CSV con
+   csv.DictReader (carga aparte): ventas por día, semana, mes y cliente, costo por kg por
+   proveedor, rendimientos cereza → pergamino → oro y ganancia por mes.
+2. utils.reports: primera carga de las columnas, reportes con las columnas
+   ya en caché y reportes tras anexar 1.000 ventas nuevas.
+
+Uso:
+    python -m benchmarks.bench_reports --rows 1000000
+"""
+
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from utils.ledger import parse_date, sync_from_csv
+from utils.reports import ReportEngine, coffee_state
+
+
+def write_ledgers(directory: str, rows: int) -> dict:
+    random.seed(7)
+    first_day = date.today() - timedelta(days=5 * 365)
+    days = [(first_day + timedelta(days=i * 5 * 365 // rows)).isoformat() for i in range(rows)]
+    files = {name: os.path.join(directory, f"{name}.csv") for name in ("compras", "proceso", "ventas", "gastos")}
+    with open(files["compras"], "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["fecha", "proveedor", "tipo_cafe", "cantidad", "precio", "total"])
+        for day in days:
+            quantity, price = round(random.uniform(20, 500), 1), round(random.uniform(1.5, 3), 2)
+            writer.writerow([day, f"Finca {random.randint(1, 60)}", "cereza", quantity, price,
+                             round(quantity * price, 2)])
+    with open(files["proceso"], "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["fecha", "origen", "destino", "cantidad", "merma", "estado"])
+        for day in days[::10]:
+            origin, target, kept = random.choice([("cereza", "pergamino", 0.2), ("pergamino", "oro", 0.8)])
+            quantity = round(random.uniform(100, 900), 1)
+            writer.writerow([day, origin, target, quantity, round(quantity * (1 - kept), 1),
+                             random.choice(["Pendiente", "Procesado parcialmente", "Procesado completamente"])])
+    with open(files["ventas"], "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["fecha", "cliente", "tipo_cafe", "cantidad", "precio", "total"])
+        for day in days:
+            quantity, price = round(random.uniform(5, 200), 1), round(random.uniform(14, 24), 2)
+            writer.writerow([day, f"Cliente {random.randint(1, 120)}", random.choice(["oro", "pergamino"]),
+                             quantity, price, round(quantity * price, 2)])
+    with open(files["gastos"], "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(["fecha", "categoria", "monto"])
+    return files
+
+
+def read_records(file_path: str) -> list:
+    with open(file_path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def _add(bucket: dict, key: str, amount: float, quantity: float) -> None:
+    entry = bucket.setdefault(key, {"registros": 0, "total": 0.0, "cantidad": 0.0})
+    entry["registros"] += 1
+    entry["total"] += amount
+    entry["cantidad"] += quantity
+
+
+def dict_reports(compras: list, proceso: list, ventas: list) -> dict:
+    """Los reportes con bucles de Python sobre listas de diccionarios"""
+    by_day, by_week, by_month, by_client = {}, {}, {}, {}
+    for record in ventas:
+        day = parse_date(record["fecha"])
+        iso_year, iso_week, _ = day.isocalendar()
+        amount, quantity = float(record["total"] or 0), float(record["cantidad"] or 0)
+        _add(by_day, day.isoformat(), amount, quantity)
+        _add(by_week, f"{iso_year}-S{iso_week:02d}", amount, quantity)
+        _add(by_month, f"{day.year}-{day.month:02d}", amount, quantity)
+        _add(by_client, record["cliente"].strip(), amount, quantity)
+
+    by_supplier = {}
+    for record in compras:
+        _add(by_supplier, record["proveedor"].strip(), float(record["total"] or 0), float(record["cantidad"] or 0))
+    cost_per_kg = {key: entry["total"] / entry["cantidad"] for key, entry in by_supplier.items()}
+
+    steps = {}
+    for record in proceso:
+        key = f"{coffee_state(record['origen'])}→{coffee_state(record['destino'])}"
+        entry = steps.setdefault(key, [0.0, 0.0])
+        entry[0] += float(record["cantidad"] or 0)
+        entry[1] += float(record["cantidad"] or 0) - float(record["merma"] or 0)
+    yields = {key: output / total for key, (total, output) in steps.items()}
+
+    purchased = sum(float(record["total"] or 0) for record in compras)
+    kilos = sum(float(record["cantidad"] or 0) for record in compras)
+    costs = {"cereza": purchased / kilos}
+    costs["pergamino"] = costs["cereza"] / yields["cereza→pergamino"]
+    costs["oro"] = costs["pergamino"] / yields["pergamino→oro"]
+    profit_by_month = {}
+    for record in ventas:
+        day = parse_date(record["fecha"])
+        revenue = float(record["total"] or 0)
+        cost = float(record["cantidad"] or 0) * costs[coffee_state(record["tipo_cafe"])]
+        entry = profit_by_month.setdefault(f"{day.year}-{day.month:02d}", {"ingresos": 0.0, "costo": 0.0})
+        entry["ingresos"] += revenue
+        entry["costo"] += cost
+    return {"dia": by_day, "semana": by_week, "mes": by_month, "cliente": by_client,
+            "costo_kg": cost_per_kg, "rendimientos": yields, "ganancia": profit_by_month}
+
+
+def engine_reports(engine: ReportEngine) -> dict:
+    return {
+        "dia": engine.totals("ventas", "dia"),
+        "semana": engine.totals("ventas", "semana"),
+        "mes": engine.totals("ventas", "mes"),
+        "cliente": engine.totals("ventas", "cliente"),
+        "costo_kg": engine.cost_per_kg("proveedor"),
+        "rendimientos": engine.yields(),
+        "ganancia": engine.profit("mes"),
+    }
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main(rows: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Generando {rows} compras y ventas y {rows // 10} procesos...")
+        files = write_ledgers(directory, rows)
+        import_time, _ = timed(lambda: [sync_from_csv(path).close() for path in files.values()])
+        print(f"  Importación al formato columnar: {import_time:.1f} s (una sola vez)")
+
+        load_time, (compras, proceso, ventas) = timed(
+            lambda: tuple(read_records(files[name]) for name in ("compras", "proceso", "ventas"))
+        )
+        loop_time, expected = timed(lambda: dict_reports(compras, proceso, ventas))
+        del compras, proceso, ventas
+        print("Bucles sobre listas de diccionarios")
+        print(f"  Lectura del CSV: {load_time:.2f} s; reportes: {loop_time:.2f} s")
+
+        engine = ReportEngine(files)
+        cold_time, result = timed(lambda: engine_reports(engine))
+        warm_time, result = timed(lambda: engine_reports(engine))
+        with open(files["ventas"], "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            for _ in range(1000):
+                writer.writerow([date.today().isoformat(), "Cliente 1", "oro", 10, 20, 200])
+        append_time, _ = timed(lambda: engine_reports(engine))
+        print("Motor NumPy (utils.reports)")
+        print(f"  Primera carga y reportes: {cold_time:.2f} s; con columnas en caché: {warm_time * 1000:.0f} ms; "
+              f"tras anexar 1.000 ventas: {append_time * 1000:.0f} ms")
+        print(f"  Aceleración de los reportes: x{loop_time / warm_time:.0f} "
+              f"(x{(load_time + loop_time) / cold_time:.1f} contando la carga)")
+
+        # Los dos caminos deben dar los mismos números
+        for key in ("dia", "semana", "mes", "cliente"):
+            assert expected[key].keys() == result[key].keys(), key
+            for group, entry in expected[key].items():
+                assert abs(entry["total"] - result[key][group]["total"]) < 0.01 * max(1.0, entry["total"]) / 100
+        for group, value in expected["costo_kg"].items():
+            assert abs(value - result["costo_kg"][group]) < 0.01
+        for step, value in expected["rendimientos"].items():
+            assert abs(value - result["rendimientos"][step]["rendimiento"]) < 0.0001
+        for month, entry in expected["ganancia"].items():
+            assert abs(entry["ingresos"] - entry["costo"] - result["ganancia"][month]["ganancia"]) < \
+                max(1.0, entry["ingresos"]) * 0.001
+        print("  Resultados idénticos a los de los bucles ✓")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del motor de reportes NumPy")
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+    main(args.rows)
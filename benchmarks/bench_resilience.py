@@ -0,0 +1,123 @@
+"""
+Benchmark: reintentos, peticiones de cobertura y modelo de respaldo
+
+Llama a generate_response contra el servidor falso de OpenAI con fallos
+inyectados y compara políticas de utils.resilience:
+
+1. Errores transitorios: una parte de las peticiones responde 429 (con
+   Retry-After) o 5xx. Sin reintentos el usuario recibe el error; con
+   reintentos con jitter casi todas terminan bien.
+2. Cola lenta: unas pocas peticiones tardan muchísimo. Con un plazo por
+   intento o con una petición de cobertura, el p99 queda acotado.
+3. Modelo principal caído: sin cortacircuitos cada llamada agota sus
+   reintentos y falla; con él, tras unos fallos todas van al modelo de
+   respaldo.
+
+Uso:
+    python -m benchmarks.bench_resilience --calls 200 --concurrency 8 --latency 0.3
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+PRIMARY = "gpt-4-turbo"
+FALLBACK = "gpt-4o-mini"
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def measure(label: str, server: FakeOpenAIServer, policy, calls: int, concurrency: int) -> None:
+    import utils.openai
+    from utils.openai import generate_response
+
+    utils.openai.resilience = policy
+    server.requests_by_model.clear()
+    requests_before = server.requests
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(i: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            reply = await generate_response(f"Pregunta {i} {time.perf_counter()}", use_cache=False)
+            latencies.append(time.perf_counter() - start)
+            if reply.startswith("Lo siento"):
+                failures += 1
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    by_model = ", ".join(f"{model} {count}" for model, count in sorted(server.requests_by_model.items()))
+    print(f"  {label}")
+    print(f"    Correctas {calls - failures}/{calls}; latencia p50 {percentile(latencies, 0.5):.2f} s, "
+          f"p95 {percentile(latencies, 0.95):.2f} s, p99 {percentile(latencies, 0.99):.2f} s, "
+          f"máx {max(latencies):.2f} s")
+    print(f"    Peticiones a OpenAI: {server.requests - requests_before} ({by_model})")
+
+
+async def run(args) -> None:
+    from utils.resilience import CircuitBreaker, ResiliencePolicy
+
+    server = FakeOpenAIServer(latency=args.latency, seed=1)
+    os.environ["OPENAI_BASE_URL"] = await server.start()
+    from utils.openai import client
+
+    try:
+        print(f"Errores transitorios ({args.error_rate:.0%} de 429 con Retry-After 0.5 s, 500 y 503)")
+        server.error_rate, server.retry_after = args.error_rate, 0.5
+        await measure("Sin reintentos", server, ResiliencePolicy(max_retries=0), args.calls, args.concurrency)
+        await measure("Reintentos con jitter (3)", server, ResiliencePolicy(max_retries=3, base_delay=0.2),
+                      args.calls, args.concurrency)
+        server.error_rate = 0.0
+
+        print(f"Cola lenta ({args.slow_rate:.0%} de las peticiones tarda {args.slow_latency:.0f} s más)")
+        server.slow_rate, server.slow_latency = args.slow_rate, args.slow_latency
+        await measure("Sin plazo por intento", server, ResiliencePolicy(attempt_timeout=60, total_timeout=120),
+                      args.calls, args.concurrency)
+        await measure("Plazo de 2 s por intento y reintento", server,
+                      ResiliencePolicy(attempt_timeout=2, total_timeout=10, max_retries=2, base_delay=0.05),
+                      args.calls, args.concurrency)
+        await measure(f"Petición de cobertura a los {args.latency * 3:.1f} s", server,
+                      ResiliencePolicy(attempt_timeout=30, hedge_after=args.latency * 3),
+                      args.calls, args.concurrency)
+        server.slow_rate = 0.0
+
+        print(f"Modelo principal ({PRIMARY}) caído; respaldo {FALLBACK} con la mitad de latencia")
+        server.down_models = {PRIMARY}
+        server.model_latency = {FALLBACK: args.latency / 2}
+        await measure("Reintentos sin cortacircuitos", server,
+                      ResiliencePolicy(max_retries=2, base_delay=0.2), args.calls, args.concurrency)
+        breaker = CircuitBreaker(failure_threshold=5, cooldown=30)
+        await measure("Cortacircuitos con modelo de respaldo", server,
+                      ResiliencePolicy(max_retries=2, base_delay=0.2, breaker=breaker),
+                      args.calls, args.concurrency)
+        print(f"    Cortacircuitos abierto: {breaker.is_open} (se abrió {breaker.times_opened} vez)")
+    finally:
+        await client.close()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la resiliencia de las llamadas a OpenAI")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-latency", type=float, default=10.0)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_MODEL"] = PRIMARY
+    os.environ["OPENAI_FALLBACK_MODEL"] = FALLBACK
+    os.environ["OPENAI_CACHE_ENABLED"] = "false"
+    # Los avisos de cada reintento no aportan nada al resultado
+    logging.disable(logging.CRITICAL)
+    asyncio.run(run(args))
@@ -0,0 +1,101 @@
+"""
+Benchmark: cola de escritura diferida hacia Google Sheets
+
+1. Ráfaga: registra muchas filas y compara el tiempo de confirmación al
+   usuario y el número de llamadas a la API con una llamada por fila.
+2. Cuota: el servicio falso responde 429 varias veces y la cola reintenta.
+3. Caída: se registran filas, se "mata" la cola sin enviarlas y una nueva
+   instancia las recupera del diario y las envía en orden y sin duplicados.
+
+Uso:
+    python -m benchmarks.bench_sheets_queue --rows 500
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fake_sheets import FakeSheetsService
+from utils.sheets_queue import SheetsWriteQueue
+
+
+def make_queue(service: FakeSheetsService, journal: str) -> SheetsWriteQueue:
+    return SheetsWriteQueue(lambda: service, "fake-spreadsheet", journal, batch_size=100, flush_interval=0.5)
+
+
+async def burst(rows: int, latency: float, directory: str) -> None:
+    service = FakeSheetsService(latency=latency)
+    queue = make_queue(service, os.path.join(directory, "burst.jsonl"))
+    await queue.start()
+
+    start = time.perf_counter()
+    for i in range(rows):
+        queue.append("ventas" if i % 2 else "compras", [i, "2024-05-01", "Cliente", 10, 25.0])
+    ack_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await queue.stop()
+    drain_time = time.perf_counter() - start
+
+    stored = sum(len(values) for values in service.sheets.values())
+    print("Ráfaga")
+    print(f"  Confirmación de {rows} filas: {ack_time * 1000:.1f} ms ({ack_time / rows * 1000:.3f} ms por fila)")
+    print(f"  Envío a Sheets: {service.calls} llamadas en {drain_time:.2f} s (filas guardadas: {stored})")
+    print(f"  Una llamada por fila habría tardado ~{rows * latency:.1f} s")
+
+
+async def quota(directory: str) -> None:
+    service = FakeSheetsService(latency=0.01, quota_errors=2)
+    queue = make_queue(service, os.path.join(directory, "quota.jsonl"))
+    await queue.start()
+    for i in range(10):
+        queue.append("gastos", [i, "transporte", 50])
+    await queue.stop()
+    print("Cuota")
+    print(f"  Llamadas rechazadas con 429: {service.failed_calls}, filas guardadas: {len(service.sheets.get('gastos', []))}")
+
+
+async def crash_recovery(directory: str) -> None:
+    journal = os.path.join(directory, "crash.jsonl")
+    service = FakeSheetsService(latency=0.01)
+
+    # Primera instancia: envía 5 filas y luego "se cae" con 7 filas sin enviar
+    first = make_queue(service, journal)
+    for i in range(5):
+        first.append("compras", [i])
+    await first.flush()
+    for i in range(5, 12):
+        first.append("compras" if i % 3 else "ventas", [i])
+    first._journal.close()
+
+    # Segunda instancia: recupera lo pendiente del diario
+    second = make_queue(service, journal)
+    recovered = second.pending
+    await second.start()
+    await second.stop()
+
+    compras = [row[0] for row in service.sheets["compras"]]
+    ventas = [row[0] for row in service.sheets.get("ventas", [])]
+    in_order = compras == sorted(compras) and ventas == sorted(ventas)
+    no_duplicates = len(compras + ventas) == len(set(compras + ventas)) == 12
+    print("Caída y recuperación")
+    print(f"  Filas recuperadas del diario: {recovered}")
+    print(f"  compras={compras} ventas={ventas}")
+    print(f"  Orden conservado: {in_order}, sin duplicados ni pérdidas: {no_duplicates}")
+
+
+async def run(rows: int, latency: float) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        await burst(rows, latency, directory)
+        await quota(directory)
+        await crash_recovery(directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la cola de escritura de Google Sheets")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.latency))
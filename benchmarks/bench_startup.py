@@ -0,0 +1,127 @@
+"""
+Benchmark: arranque en frío del bot hasta la primera respuesta
+
+Lanza el bot en un proceso nuevo, con long polling contra el servidor falso
+de la Bot API, y mide el tiempo desde que arranca el proceso hasta que
+responde al primer /start (tiempo hasta la primera actualización). Compara
+dos arranques:
+
+- previo: como lo hacía bot.py antes de la carga diferida. Se importan al
+  arrancar el SDK de openai (con su cliente), NumPy (índice de preguntas
+  frecuentes y reportes) y el cliente de Google, y se inicializa Google
+  Sheets antes de empezar a recibir actualizaciones.
+- diferido: el arranque actual. El cliente de OpenAI, NumPy y el cliente de
+  Google se cargan en el primer uso, y Sheets se inicializa en segundo plano.
+
+Sin red no se puede llamar a la API de Google Sheets: su inicialización se
+representa con una llamada bloqueante de --sheets-latency segundos.
+
+Uso:
+    python -m benchmarks.bench_startup --runs 5 --sheets-latency 1.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer, recorded_message
+
+MODES = ("previo", "diferido")
+
+
+def child(mode: str, bot_url: str, sheets_latency: float) -> None:
+    """Arranque del bot en el proceso hijo (los manejadores de /start, /ayuda e /ia)"""
+    start = time.perf_counter()
+    from telegram.ext import Application, CommandHandler
+
+    from handlers.ia import register_ia_handlers
+    from handlers.start import help_command, start_command
+
+    if mode == "previo":
+        import googleapiclient.discovery  # noqa: F401
+        import utils.faq  # noqa: F401
+        import utils.reports  # noqa: F401
+        from utils.openai import get_client
+        get_client()
+    print(json.dumps({"imports": time.perf_counter() - start}), flush=True)
+    if mode == "previo":
+        # initialize_sheets() antes de empezar el polling
+        time.sleep(sheets_latency)
+
+    tasks = set()
+
+    async def post_init(application: Application) -> None:
+        if mode == "diferido":
+            task = asyncio.create_task(asyncio.to_thread(time.sleep, sheets_latency))
+            tasks.add(task)
+
+    application = (
+        Application.builder()
+        .token(FAKE_TOKEN)
+        .base_url(bot_url)
+        .post_init(post_init)
+        .build()
+    )
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("ayuda", help_command))
+    register_ia_handlers(application)
+    application.run_polling()
+
+
+async def cold_start(mode: str, sheets_latency: float) -> dict:
+    server = FakeTelegramServer()
+    await server.start()
+    server.updates.append(recorded_message(1, 1, "/start"))
+    env = {**os.environ, "OPENAI_API_KEY": "sk-fake", "METRICS_ENABLED": "false"}
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "benchmarks.bench_startup", "--child", mode, "--bot-url", server.bot_url,
+        "--sheets-latency", str(sheets_latency),
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL, env=env
+    )
+    try:
+        await server.wait_until(lambda: bool(server.calls_for(1, "sendMessage")), timeout=60)
+        first_update = server.calls_for(1, "sendMessage")[0]["time"] - started
+        # config.py puede escribir avisos antes de la línea con los tiempos
+        line = b""
+        while not line.startswith(b"{"):
+            line = await process.stdout.readline()
+        imports = json.loads(line)["imports"]
+    finally:
+        process.terminate()
+        await process.wait()
+        await server.stop()
+    return {"first_update": first_update, "imports": imports}
+
+
+async def run(args) -> None:
+    results = {mode: [] for mode in MODES}
+    # Se alternan los modos para que la caché de disco favorezca a ambos por igual
+    for _ in range(args.runs):
+        for mode in MODES:
+            results[mode].append(await cold_start(mode, args.sheets_latency))
+
+    print(f"Arranque en frío ({args.runs} ejecuciones, inicialización de Sheets de {args.sheets_latency:.1f} s)")
+    for mode in MODES:
+        first_update = statistics.median(result["first_update"] for result in results[mode])
+        imports = statistics.median(result["imports"] for result in results[mode])
+        print(f"  {mode:9s} importaciones {imports * 1000:6.0f} ms   "
+              f"primera respuesta {first_update * 1000:6.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del arranque en frío del bot")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--sheets-latency", type=float, default=1.0)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--bot-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.bot_url, args.sheets_latency)
+    else:
+        asyncio.run(run(args))
@@ -0,0 +1,71 @@
+"""
+Benchmark: tiempo hasta el primer contenido con y sin streaming
+
+Compara cuánto tarda el usuario en ver texto cuando se espera la respuesta
+completa (generate_response) frente a la edición progresiva del mensaje
+provisional (stream_response + stream_to_message).
+
+Uso:
+    python -m benchmarks.bench_streaming --latency 0.4 --tokens-per-second 40
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+LONG_REPLY = " ".join(
+    ["La fermentación controlada del café mejora la dulzura y la acidez del grano."] * 20
+)
+
+
+class RecordingMessage:
+    """Mensaje de Telegram falso que registra cuándo se edita"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.edits = []
+
+    async def edit_text(self, text, parse_mode=None, reply_markup=None):
+        self.edits.append(time.perf_counter() - self.started)
+
+    async def reply_text(self, text, parse_mode=None):
+        pass
+
+
+async def run(latency: float, tokens_per_second: float) -> None:
+    server = FakeOpenAIServer(latency=latency, reply=LONG_REPLY, tokens_per_second=tokens_per_second)
+    base_url = await server.start()
+
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    from config import STREAM_EDIT_INTERVAL
+    from utils.openai import client, generate_response, stream_response
+    from utils.telegram import stream_to_message
+
+    try:
+        start = time.perf_counter()
+        await generate_response("Explica la fermentación del café", use_cache=False)
+        blocking = time.perf_counter() - start
+
+        message = RecordingMessage()
+        await stream_to_message(message, stream_response("Explica la fermentación del café", use_cache=False), title="☕ Respuesta:")
+        streamed_total = time.perf_counter() - message.started
+    finally:
+        await client.close()
+        await server.stop()
+
+    print(f"Sin streaming, primer contenido visible: {blocking:.2f} s")
+    print(f"Con streaming, primer contenido visible: {message.edits[0]:.2f} s")
+    print(f"Con streaming, respuesta completa:       {streamed_total:.2f} s")
+    print(f"Ediciones realizadas: {len(message.edits)} (intervalo mínimo {STREAM_EDIT_INTERVAL:.1f} s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de respuestas en streaming")
+    parser.add_argument("--latency", type=float, default=0.4)
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    args = parser.parse_args()
+    asyncio.run(run(args.latency, args.tokens_per_second))
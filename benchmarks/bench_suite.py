@@ -0,0 +1,342 @@
+"""
+Suite de benchmarks sin red del asistente de IA
+
+Construye la aplicación real (manejadores de /start, /ayuda e /ia) contra
+los servidores falsos de la Bot API de Telegram y de OpenAI, y le entrega
+actualizaciones sintéticas por su update_queue, como haría el long polling.
+Cada usuario simulado repite conversaciones completas de una mezcla de
+escenarios:
+
+- consulta: /ia, botón "Consulta IA" y una pregunta (respuesta en streaming)
+- analisis: /ia y botón "Análisis de datos"
+- recomendacion: /ia, botón "Recomendación" y unas preferencias
+- precios: /ia, botón "Optimización de precios" y una lista de productos
+
+Informa del rendimiento (conversaciones y actualizaciones por segundo), de
+la latencia p50/p95/p99 desde el último mensaje del usuario hasta la
+respuesta final de cada escenario, y de la memoria que ocupa cada
+conversación abierta. Con --output se guardan los resultados en JSON y con
+--compare se comparan con los de otra versión.
+
+Uso:
+    python -m benchmarks.bench_suite --users 20 --rounds 5 --latency 0.5 --tokens-per-second 60
+    python -m benchmarks.bench_suite --output resultados/v1.json
+    python -m benchmarks.bench_suite --compare resultados/v1.json
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+from telegram.warnings import PTBUserWarning
+
+from benchmarks.bench_pricing import pricing_responder, synthetic_products
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer, recorded_callback, recorded_message
+
+REPLY = ("Para un espresso equilibrado conviene un tueste medio, una molienda fina y una extracción "
+         "de 25 a 30 segundos; ajusta la dosis según el cuerpo que busques.")
+
+# Escenario: (botón, mensaje del usuario o None, método y texto de la respuesta final)
+SCENARIOS = {
+    "consulta": ("ia_consulta", "¿Cómo preparo un espresso equilibrado?", "editMessageText", "¿Deseas hacer otra consulta?"),
+    "analisis": ("ia_analisis", None, "editMessageText", REPLY),
+    "recomendacion": ("ia_recomendacion", "Me gusta la acidez baja, notas a chocolate y prensa francesa",
+                      "sendMessage", "Recomendaciones personalizadas"),
+    "precios": ("ia_precios", None, "sendMessage", "Precios optimizados"),
+}
+
+# Proporción de cada escenario en la mezcla por defecto
+DEFAULT_MIX = {"consulta": 0.6, "analisis": 0.15, "recomendacion": 0.15, "precios": 0.1}
+
+# Respuestas que indican que la conversación terminó con un error
+ERROR_MARKERS = ("Lo siento", "⏳")
+
+_update_ids = itertools.count(1)
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def openai_responder(payload: dict) -> str:
+    """Respuesta JSON para los bloques de precios y texto para todo lo demás"""
+    if payload.get("response_format", {}).get("type") == "json_object":
+        return pricing_responder(0.0)(payload)
+    return REPLY
+
+
+def pricing_message(products: int) -> str:
+    return "\n".join(
+        f"Producto: {p['producto']}\nPrecio actual: {p['precio_actual']}\n"
+        f"Costo: {p['costo']}\nMargen deseado: {p['margen']}%"
+        for p in synthetic_products(products)
+    )
+
+
+def build_application(telegram: FakeTelegramServer, concurrent_updates: int):
+    from telegram.ext import Application, CommandHandler
+
+    from handlers.ia import register_ia_handlers
+    from handlers.start import help_command, start_command
+
+    application = (
+        Application.builder()
+        .token(FAKE_TOKEN)
+        .base_url(telegram.bot_url)
+        .concurrent_updates(concurrent_updates)
+        .build()
+    )
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("ayuda", help_command))
+    register_ia_handlers(application)
+    return application
+
+
+class Driver:
+    """Entrega actualizaciones a la aplicación y espera las respuestas en la Bot API falsa"""
+
+    def __init__(self, application, telegram: FakeTelegramServer, timeout: float):
+        self.application = application
+        self.telegram = telegram
+        self.timeout = timeout
+        self.updates = 0
+
+    async def send(self, update: dict) -> float:
+        from telegram import Update
+
+        self.updates += 1
+        sent = time.perf_counter()
+        await self.application.update_queue.put(Update.de_json(update, self.application.bot))
+        return sent
+
+    async def reply(self, chat_id: int, since: float, method: str, marker: str = "") -> dict:
+        """Primera llamada a la Bot API para el chat posterior a `since` con el texto indicado"""
+        found = []
+
+        def match() -> bool:
+            for call in reversed(self.telegram.calls_for(chat_id)):
+                if call["time"] < since:
+                    return False
+                text = str(call["params"].get("text", ""))
+                if call["method"] == method and marker in text or any(m in text for m in ERROR_MARKERS):
+                    found.append(call)
+                    return True
+            return False
+
+        await self.telegram.wait_until(match, timeout=self.timeout)
+        return found[0]
+
+    async def open_menu(self, chat_id: int) -> int:
+        """Envía /ia y devuelve el mensaje con los botones"""
+        since = await self.send(recorded_message(next(_update_ids), chat_id, "/ia"))
+        call = await self.reply(chat_id, since, "sendMessage", "Asistente de IA")
+        return call["result"]["message_id"]
+
+    async def conversation(self, chat_id: int, scenario: str, products: int) -> tuple:
+        """
+        Una conversación completa
+
+        Returns:
+            (latencia desde el último mensaje del usuario hasta la respuesta final, terminó bien)
+        """
+        button, message, method, marker = SCENARIOS[scenario]
+        if scenario == "precios":
+            message = pricing_message(products)
+        menu = await self.open_menu(chat_id)
+        since = await self.send(recorded_callback(next(_update_ids), chat_id, button, menu))
+        if message is not None:
+            await self.reply(chat_id, since, "editMessageText")
+            since = await self.send(recorded_message(next(_update_ids), chat_id, message))
+        call = await self.reply(chat_id, since, method, marker)
+        ok = not any(m in str(call["params"].get("text", "")) for m in ERROR_MARKERS)
+        if scenario == "consulta":
+            # Cierra la conversación para que la siguiente empiece desde /ia
+            await self.send(recorded_message(next(_update_ids), chat_id, "/cancelar"))
+            await self.reply(chat_id, since, "sendMessage", "Operación cancelada")
+        return call["time"] - since, ok
+
+
+async def load(driver: Driver, users: int, rounds: int, mix: dict, products: int) -> dict:
+    names, weights = list(mix), list(mix.values())
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+
+    async def user(chat_id: int) -> None:
+        rng = random.Random(chat_id)
+        for _ in range(rounds):
+            scenario = rng.choices(names, weights)[0]
+            latency, ok = await driver.conversation(chat_id, scenario, products)
+            latencies[scenario].append(latency)
+            if not ok:
+                errors[scenario] += 1
+
+    updates_before = driver.updates
+    start = time.perf_counter()
+    await asyncio.gather(*(user(10000 + i) for i in range(users)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "conversaciones": users * rounds,
+        "segundos": round(elapsed, 3),
+        "conversaciones_por_segundo": round(users * rounds / elapsed, 2),
+        "actualizaciones_por_segundo": round((driver.updates - updates_before) / elapsed, 2),
+        "escenarios": {
+            name: {
+                "n": len(values),
+                "errores": errors[name],
+                "p50": round(percentile(values, 0.50), 4),
+                "p95": round(percentile(values, 0.95), 4),
+                "p99": round(percentile(values, 0.99), 4),
+                "max": round(max(values, default=0.0), 4),
+            }
+            for name, values in latencies.items() if values
+        },
+    }
+
+
+async def memory_per_conversation(driver: Driver, conversations: int) -> float:
+    """Bytes que retiene cada conversación abierta (esperando la pregunta del usuario)"""
+
+    async def open_conversation(chat_id: int) -> None:
+        menu = await driver.open_menu(chat_id)
+        since = await driver.send(recorded_callback(next(_update_ids), chat_id, "ia_consulta", menu))
+        await driver.reply(chat_id, since, "editMessageText")
+
+    # Calentamiento: conexiones, cachés internas y objetos que se crean una sola vez
+    await asyncio.gather(*(open_conversation(90000 + i) for i in range(10)))
+    driver.telegram.reset()
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    await asyncio.gather(*(open_conversation(100000 + i) for i in range(conversations)))
+    # Las llamadas registradas por el servidor falso no son memoria del bot
+    driver.telegram.reset()
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return retained / conversations
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocida"
+
+
+def report(results: dict, previous: dict = None) -> None:
+    def delta(current: float, key_path: list) -> str:
+        if previous is None:
+            return ""
+        value = previous
+        for key in key_path:
+            value = value.get(key, {}) if isinstance(value, dict) else {}
+        if not isinstance(value, (int, float)) or not value:
+            return ""
+        return f" ({(current - value) / value * 100:+.1f}%)"
+
+    carga = results["carga"]
+    print(f"Versión {results['revision']} - {results['fecha']}")
+    print(f"  {carga['conversaciones']} conversaciones en {carga['segundos']:.2f} s: "
+          f"{carga['conversaciones_por_segundo']:.2f} conv/s{delta(carga['conversaciones_por_segundo'], ['carga', 'conversaciones_por_segundo'])}, "
+          f"{carga['actualizaciones_por_segundo']:.2f} actualizaciones/s")
+    print(f"  {'escenario':<14}{'n':>5}{'errores':>9}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'máx s':>9}")
+    for name, stats in carga["escenarios"].items():
+        print(f"  {name:<14}{stats['n']:>5}{stats['errores']:>9}{stats['p50']:>9.3f}"
+              f"{stats['p95']:>9.3f}{stats['p99']:>9.3f}{stats['max']:>9.3f}"
+              f"{delta(stats['p95'], ['carga', 'escenarios', name, 'p95'])}")
+    memory = results["memoria_por_conversacion_kb"]
+    print(f"  Memoria por conversación abierta: {memory:.1f} KiB{delta(memory, ['memoria_por_conversacion_kb'])}")
+
+
+async def run(args) -> dict:
+    openai = FakeOpenAIServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                              responder=openai_responder)
+    os.environ["OPENAI_BASE_URL"] = await openai.start()
+    telegram = FakeTelegramServer(latency=args.telegram_latency)
+    await telegram.start()
+    from utils.openai import client
+
+    mix = DEFAULT_MIX if not args.scenarios else {name: 1.0 for name in args.scenarios}
+    application = build_application(telegram, args.concurrent_updates)
+    try:
+        async with application:
+            await application.start()
+            driver = Driver(application, telegram, timeout=args.timeout)
+            carga = await load(driver, args.users, args.rounds, mix, args.products)
+            telegram.reset()
+            memory = await memory_per_conversation(driver, args.memory_conversations)
+            await application.stop()
+    finally:
+        await client.close()
+        await telegram.stop()
+        await openai.stop()
+
+    return {
+        "revision": git_revision(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parametros": {
+            "usuarios": args.users, "rondas": args.rounds, "latencia_openai": args.latency,
+            "tokens_por_segundo": args.tokens_per_second, "latencia_telegram": args.telegram_latency,
+            "concurrent_updates": args.concurrent_updates, "productos": args.products, "mezcla": mix,
+        },
+        "carga": carga,
+        "memoria_por_conversacion_kb": round(memory / 1024, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suite de benchmarks sin red del asistente de IA")
+    parser.add_argument("--users", type=int, default=20, help="Usuarios simultáneos")
+    parser.add_argument("--rounds", type=int, default=5, help="Conversaciones por usuario")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="Solo estos escenarios, a partes iguales")
+    parser.add_argument("--latency", type=float, default=0.5, help="Segundos hasta el primer token de OpenAI")
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--telegram-latency", type=float, default=0.01)
+    parser.add_argument("--concurrent-updates", type=int, default=16)
+    parser.add_argument("--products", type=int, default=12, help="Productos en el escenario de precios")
+    parser.add_argument("--memory-conversations", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=120, help="Espera máxima por respuesta")
+    parser.add_argument("--output", help="Guarda los resultados en este archivo JSON")
+    parser.add_argument("--compare", help="Resultados JSON de otra versión con los que comparar")
+    args = parser.parse_args()
+
+    # Mide el código del bot, no los límites de uso, la caché ni las preguntas frecuentes
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ["OPENAI_CACHE_ENABLED"] = "false"
+    os.environ["ADMISSION_ENABLED"] = "false"
+    os.environ["FAQ_ENABLED"] = "false"
+    os.environ.setdefault("STREAM_EDIT_INTERVAL", "0.5")
+    # El análisis precalculado empieza vacío y no sustituye al de data/
+    os.environ["PRECOMPUTE_FILE"] = os.path.join(tempfile.mkdtemp(), "analisis.json")
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+
+    results = asyncio.run(run(args))
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    report(results, previous)
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Resultados guardados en {args.output}")
@@ -0,0 +1,190 @@
+"""
+Benchmark: modo webhook con actualizaciones procesadas en paralelo
+
+Levanta el bot real (manejadores de /start e /ia) en modo webhook con
+uvicorn, contra un servidor falso de la Bot API de Telegram y otro de
+OpenAI, y le envía por POST actualizaciones grabadas: cada chat abre /ia y
+hace una pregunta. Compara CONCURRENT_UPDATES=1 con procesamiento en
+paralelo, y comprueba que al detener el servidor se terminan las
+respuestas de OpenAI que estaban en curso.
+
+Uso:
+    python -m benchmarks.bench_webhook --chats 20 --latency 1.0
+    python -m benchmarks.bench_webhook --replay updates.json   # lista de Update JSON grabados
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import warnings
+
+import httpx
+from telegram.warnings import PTBUserWarning
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer, recorded_message
+
+REPLY = "El café lavado se fermenta y se lava antes de secarse, lo que da una taza más limpia y ácida."
+SECRET = "secreto-de-prueba"
+
+
+async def start_bot(telegram: FakeTelegramServer, concurrent_updates: int, drain_timeout: float = 30.0):
+    """Construye la aplicación real y la sirve con uvicorn en un puerto libre"""
+    import uvicorn
+    from telegram.ext import Application, CommandHandler
+
+    from handlers.ia import register_ia_handlers
+    from handlers.start import help_command, start_command
+    from utils.webhook import TelegramWebhookApp
+
+    application = (
+        Application.builder()
+        .token(FAKE_TOKEN)
+        .base_url(telegram.bot_url)
+        .concurrent_updates(concurrent_updates)
+        .build()
+    )
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("ayuda", help_command))
+    register_ia_handlers(application)
+
+    app = TelegramWebhookApp(application, "/telegram", webhook_url="https://bot.example.com",
+                             secret_token=SECRET, drain_timeout=drain_timeout)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, lifespan="on", log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+def answered(telegram: FakeTelegramServer, chat_id: int) -> bool:
+    return any(REPLY in str(call["params"].get("text", "")) for call in telegram.calls_for(chat_id, "editMessageText"))
+
+
+async def post(client: httpx.AsyncClient, url: str, update: dict, secret: str = SECRET) -> tuple:
+    start = time.perf_counter()
+    response = await client.post(f"{url}/telegram", json=update,
+                                 headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+    return response.status_code, time.perf_counter() - start
+
+
+async def chat_session(client: httpx.AsyncClient, url: str, telegram: FakeTelegramServer,
+                       chat_id: int, acks: list) -> float:
+    """Un usuario abre /ia y hace una pregunta; devuelve el tiempo hasta la respuesta final"""
+    start = time.perf_counter()
+    status, ack = await post(client, url, recorded_message(chat_id * 10, chat_id, "/ia"))
+    acks.append(ack)
+    await telegram.wait_until(lambda: telegram.calls_for(chat_id, "sendMessage"), timeout=120)
+    status, ack = await post(client, url, recorded_message(chat_id * 10 + 1, chat_id, "¿Qué es un café lavado?"))
+    acks.append(ack)
+    await telegram.wait_until(lambda: answered(telegram, chat_id), timeout=300)
+    return time.perf_counter() - start
+
+
+async def load(chats: int, concurrent_updates: int) -> None:
+    telegram = FakeTelegramServer(latency=0.02)
+    await telegram.start()
+    server, task, url = await start_bot(telegram, concurrent_updates)
+    acks = []
+    async with httpx.AsyncClient() as client:
+        health = (await client.get(f"{url}/health")).json()
+        forbidden, _ = await post(client, url, recorded_message(1, 1, "/start"), secret="otro")
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(
+            chat_session(client, url, telegram, 1000 + i, acks) for i in range(chats)
+        ))
+        elapsed = time.perf_counter() - start
+    server.should_exit = True
+    await task
+    await telegram.stop()
+
+    latencies.sort()
+    acks.sort()
+    print(f"CONCURRENT_UPDATES={concurrent_updates}")
+    print(f"  /health: {health['status']}, POST con token secreto incorrecto: {forbidden}")
+    print(f"  {chats} chats respondidos en {elapsed:.2f} s; "
+          f"respuesta p50 {latencies[len(latencies) // 2]:.2f} s, máx {latencies[-1]:.2f} s")
+    print(f"  Confirmación del POST a Telegram: p50 {acks[len(acks) // 2] * 1000:.1f} ms, "
+          f"máx {acks[-1] * 1000:.1f} ms")
+
+
+async def graceful_shutdown(chats: int, openai: FakeOpenAIServer) -> None:
+    """Se detiene el servidor con respuestas de OpenAI en curso y se comprueba que todas terminan"""
+    telegram = FakeTelegramServer()
+    await telegram.start()
+    server, task, url = await start_bot(telegram, concurrent_updates=chats)
+    chat_ids = [2000 + i for i in range(chats)]
+    async with httpx.AsyncClient() as client:
+        await asyncio.gather(*(post(client, url, recorded_message(i * 10, i, "/ia")) for i in chat_ids))
+        await telegram.wait_until(lambda: all(telegram.calls_for(i, "sendMessage") for i in chat_ids))
+        await asyncio.gather(*(
+            post(client, url, recorded_message(i * 10 + 1, i, "¿Qué es un café lavado?")) for i in chat_ids
+        ))
+        await telegram.wait_until(lambda: all(len(telegram.calls_for(i, "sendMessage")) >= 2 for i in chat_ids))
+
+    in_flight = openai._in_flight
+    start = time.perf_counter()
+    server.should_exit = True
+    await task
+    drained = time.perf_counter() - start
+    completed = sum(1 for i in chat_ids if answered(telegram, i))
+    await telegram.stop()
+    print("Detención ordenada")
+    print(f"  Llamadas a OpenAI en curso al detener: {in_flight}; "
+          f"respuestas completadas: {completed}/{chats} en {drained:.2f} s")
+
+
+async def replay(path: str, concurrent_updates: int) -> None:
+    """Envía una lista de Update JSON grabados y muestra las llamadas resultantes a la Bot API"""
+    with open(path, encoding="utf-8") as f:
+        updates = json.load(f)
+    telegram = FakeTelegramServer()
+    await telegram.start()
+    server, task, url = await start_bot(telegram, concurrent_updates)
+    async with httpx.AsyncClient() as client:
+        for update in updates:
+            status, ack = await post(client, url, update)
+            print(f"update {update.get('update_id')}: HTTP {status} en {ack * 1000:.1f} ms")
+    server.should_exit = True
+    await task
+    await telegram.stop()
+    for call in telegram.calls:
+        if call["method"] not in ("getMe", "setWebhook"):
+            print(f"  {call['method']}: {str(call['params'].get('text', ''))[:60]!r}")
+
+
+async def run(args) -> None:
+    openai = FakeOpenAIServer(latency=args.latency, reply=REPLY, tokens_per_second=args.tokens_per_second)
+    os.environ["OPENAI_BASE_URL"] = await openai.start()
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_CACHE_ENABLED"] = "false"
+    os.environ["STREAM_EDIT_INTERVAL"] = "0.5"
+    from utils.openai import client
+
+    try:
+        if args.replay:
+            # Las actualizaciones grabadas dependen del orden (estado de las conversaciones)
+            await replay(args.replay, 1)
+        else:
+            await load(args.chats, 1)
+            await load(args.chats, args.concurrent_updates)
+            await graceful_shutdown(min(args.chats, 10), openai)
+    finally:
+        await client.close()
+        await openai.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del modo webhook")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--concurrent-updates", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    parser.add_argument("--replay", help="Archivo JSON con una lista de actualizaciones grabadas")
+    args = parser.parse_args()
+    # Aviso de ConversationHandler sobre per_message, irrelevante para el benchmark
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+    asyncio.run(run(args))
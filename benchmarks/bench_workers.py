@@ -0,0 +1,151 @@
+"""
+Benchmark: retraso del bucle de eventos durante el trabajo de CPU
+
+Mide cuánto se retrasa el bucle de eventos (lo que esperaría la respuesta
+a cualquier otro chat) mientras se hace trabajo pesado, ejecutado en el
+propio bucle, en el pool de hilos o en el pool de procesos de
+utils.workers:
+
+- reportes: primera carga y todos los reportes de utils.reports sobre
+  registros sintéticos de --rows filas (siempre en hilos en el bot)
+- precios: análisis de una lista de --products productos con el formato de
+  "Optimización de precios"
+
+Una tarea vigía duerme --interval segundos una y otra vez y anota cuánto
+tarda de más en despertar. Al final se cancela un trabajo dividido en
+bloques, como hace /cancelar, y se mide cuánto tarda en detenerse.
+
+Uso:
+    python -m benchmarks.bench_workers --rows 300000 --products 100000
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+from benchmarks.bench_reports import engine_reports, write_ledgers
+from benchmarks.bench_suite import pricing_message
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def measure_lag(work, interval: float) -> tuple:
+    """Ejecuta `work` mientras una tarea vigía mide el retraso del bucle"""
+    lags, done = [], asyncio.Event()
+
+    async def watchdog() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - start - interval)
+
+    watcher = asyncio.create_task(watchdog())
+    await asyncio.sleep(interval * 2)
+    start = time.perf_counter()
+    try:
+        await work()
+    finally:
+        elapsed = time.perf_counter() - start
+        done.set()
+        await watcher
+    return elapsed, lags
+
+
+def report(label: str, elapsed: float, lags: list) -> None:
+    print(f"  {label:10s} trabajo {elapsed * 1000:7.0f} ms   retraso del bucle p50 {percentile(lags, 0.5) * 1000:6.1f} ms  "
+          f"p95 {percentile(lags, 0.95) * 1000:6.1f} ms  máx. {max(lags) * 1000:7.1f} ms")
+
+
+def pricing_chunks(products: int, chunks: int) -> list:
+    size = max(1, products // chunks)
+    return [pricing_message(size) for _ in range(chunks)]
+
+
+async def run(args) -> None:
+    from utils.ledger import sync_from_csv
+    from utils.openai import parse_pricing_text
+    from utils.reports import ReportEngine
+    from utils.workers import TaskCancelled, WorkerPool
+
+    pool = WorkerPool(threads=args.threads, processes=args.processes, process_tasks=["precios_procesos"])
+    # Arranca los procesos antes de medir (en el bot se crean con la primera tarea)
+    await pool.run("precios_procesos", sum, [1])
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Generando registros de {args.rows} filas...")
+        files = write_ledgers(directory, args.rows)
+        for path in files.values():
+            sync_from_csv(path).close()
+
+        print(f"Reportes completos sobre {args.rows} filas (retraso con vigía cada {args.interval * 1000:.0f} ms)")
+
+        async def reports_inline() -> None:
+            engine_reports(ReportEngine(files))
+
+        async def reports_threads() -> None:
+            await pool.run("reportes", engine_reports, ReportEngine(files))
+
+        for label, work in (("en bucle", reports_inline), ("hilos", reports_threads)):
+            report(label, *await measure_lag(work, args.interval))
+
+    text = pricing_message(args.products)
+    print(f"Lista de precios de {args.products} productos ({len(text) / 1e6:.1f} MB)")
+
+    async def pricing_inline() -> None:
+        parse_pricing_text(text)
+
+    async def pricing_threads() -> None:
+        await pool.run("precios", parse_pricing_text, text)
+
+    async def pricing_processes() -> None:
+        await pool.run("precios_procesos", parse_pricing_text, text)
+
+    for label, work in (("en bucle", pricing_inline), ("hilos", pricing_threads), ("procesos", pricing_processes)):
+        report(label, *await measure_lag(work, args.interval))
+
+    # Cancelación: un trabajo en bloques se detiene tras los bloques ya empezados
+    chunks = pricing_chunks(args.products, 40)
+    finished = 0
+
+    def parse_chunk(chunk: str) -> int:
+        nonlocal finished
+        products = len(parse_pricing_text(chunk))
+        finished += 1
+        return products
+
+    async def job() -> None:
+        async with pool.cancellable(1, "precios"):
+            await pool.map("precios", parse_chunk, chunks)
+
+    task = asyncio.create_task(job())
+    await asyncio.sleep(args.cancel_after)
+    cancelled_at = time.perf_counter()
+    pool.cancel(1)
+    try:
+        await task
+        print("  El trabajo terminó antes de cancelarse")
+    except TaskCancelled:
+        stop = time.perf_counter() - cancelled_at
+        await asyncio.sleep(0.5)
+        print(f"Cancelación tras {args.cancel_after * 1000:.0f} ms: respuesta en {stop * 1000:.1f} ms, "
+              f"{finished} de {len(chunks)} bloques llegaron a ejecutarse")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del retraso del bucle con los ejecutores de CPU")
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--interval", type=float, default=0.01, help="Segundos entre despertares de la vigía")
+    parser.add_argument("--cancel-after", type=float, default=0.2, help="Segundos hasta /cancelar")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    asyncio.run(run(args))
@@ -0,0 +1,92 @@
+"""
+Servidor HTTP/1.1 mínimo sobre asyncio para los servidores falsos de los benchmarks
+
+No requiere dependencias externas: lee peticiones con Content-Length,
+mantiene las conexiones abiertas (keep-alive) y delega cada petición en
+_dispatch, que implementan las subclases.
+"""
+
+import asyncio
+import json
+from typing import Dict, Optional, Set, Tuple
+
+
+class FakeHTTPServer:
+    """Base de los servidores falsos: arranque, parada y lectura de peticiones"""
+
+    def __init__(self):
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self.base_url = ""
+        # Conexiones aceptadas y retardo de cada conexión nueva (imita el handshake TCP/TLS)
+        self.connections = 0
+        self.connect_latency = 0.0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Inicia el servidor y devuelve su URL (http://host:puerto)"""
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        """Detiene el servidor"""
+        if self._server:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, value = line.decode("latin-1").split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+        body = b""
+        length = int(headers.get("content-length", 0))
+        if length:
+            body = await reader.readexactly(length)
+        return method, path, headers, body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        self.connections += 1
+        try:
+            if self.connect_latency:
+                await asyncio.sleep(self.connect_latency)
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                await self._dispatch(method, path, headers, body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes,
+                        writer: asyncio.StreamWriter) -> None:
+        raise NotImplementedError
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, data: dict,
+                         headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(data).encode("utf-8")
+        extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"{extra}"
+            "Connection: keep-alive\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
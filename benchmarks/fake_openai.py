@@ -0,0 +1,261 @@
+"""
+Servidor local que imita la API de chat completions de OpenAI
+
+Sirve para las pruebas de carga y benchmarks sin red: responde con una
+latencia configurable (tiempo hasta el primer token) y, opcionalmente, a
+una velocidad fija de tokens por segundo. Soporta respuestas en streaming
+(Server-Sent Events) y no requiere ninguna dependencia externa.
+
+También inyecta fallos para probar los reintentos y el modelo de respaldo:
+errores 429/5xx con cierta probabilidad (con Retry-After opcional),
+respuestas muy lentas de vez en cuando, modelos caídos por completo y
+latencias distintas por modelo.
+
+/v1/embeddings devuelve vectores deterministas (bolsa de palabras con
+hashing): preguntas con las mismas palabras dan vectores parecidos, lo
+justo para probar el índice de preguntas frecuentes.
+
+Uso independiente:
+    python -m benchmarks.fake_openai --port 8089 --latency 1.0 --tokens-per-second 30
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+from benchmarks.fake_http import FakeHTTPServer
+
+
+class FakeOpenAIServer(FakeHTTPServer):
+    """Servidor HTTP/1.1 mínimo compatible con /v1/chat/completions y /v1/embeddings"""
+
+    def __init__(self, latency: float = 0.5, reply: str = "Respuesta de prueba sobre café.",
+                 tokens_per_second: Optional[float] = None,
+                 responder: Optional[Callable[[dict], str]] = None,
+                 error_rate: float = 0.0, error_statuses: Iterable[int] = (429, 500, 503),
+                 retry_after: Optional[float] = None, slow_rate: float = 0.0, slow_latency: float = 10.0,
+                 down_models: Iterable[str] = (), model_latency: Optional[Dict[str, float]] = None,
+                 seed: Optional[int] = None, embedding_dimensions: int = 256,
+                 prompt_tokens_per_second: Optional[float] = None):
+        """
+        Args:
+            latency: Segundos hasta el primer token
+            reply: Texto de la respuesta
+            tokens_per_second: Velocidad de generación (None = todo de golpe)
+            responder: Función opcional que construye la respuesta a partir de la petición
+            error_rate: Proporción de peticiones que fallan con uno de error_statuses
+            error_statuses: Códigos HTTP de los fallos inyectados
+            retry_after: Segundos de la cabecera Retry-After en los 429 (None = sin cabecera)
+            slow_rate: Proporción de peticiones que tardan slow_latency más
+            slow_latency: Segundos extra de las peticiones lentas
+            down_models: Modelos que siempre responden 503
+            model_latency: Latencia propia de algunos modelos (p. ej. el de respaldo)
+            seed: Semilla para que los fallos sean reproducibles
+            embedding_dimensions: Dimensiones de los vectores de /v1/embeddings
+            prompt_tokens_per_second: Velocidad de lectura del prompt: los prompts largos
+                tardan más en dar el primer token (None = sin coste)
+        """
+        super().__init__()
+        self.latency = latency
+        self.reply = reply
+        self.tokens_per_second = tokens_per_second
+        self.responder = responder
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.down_models = set(down_models)
+        self.model_latency = model_latency or {}
+        self._random = random.Random(seed)
+        self.embedding_dimensions = embedding_dimensions
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.embedding_requests = 0
+        self.embedded_texts = 0
+        self.requests = 0
+        self.requests_by_model: Counter = Counter()
+        self.errors = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Inicia el servidor y devuelve la URL base para el cliente de OpenAI"""
+        self.base_url = await super().start(host, port) + "/v1"
+        return self.base_url
+
+    async def _dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes,
+                        writer: asyncio.StreamWriter) -> None:
+        if method == "POST" and path.endswith("/chat/completions"):
+            payload = json.loads(body or b"{}")
+            model = payload.get("model", "fake-model")
+            self.requests += 1
+            self.requests_by_model[model] += 1
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            try:
+                latency = self._latency_for(model)
+                if self.prompt_tokens_per_second:
+                    latency += self._usage(payload, "")["prompt_tokens"] / self.prompt_tokens_per_second
+                status = self._injected_error(model)
+                if status is not None:
+                    self.errors += 1
+                    # Los errores llegan rápido, como los de una API saturada
+                    await asyncio.sleep(min(latency, 0.05))
+                    headers = {}
+                    if status == 429 and self.retry_after is not None:
+                        headers["Retry-After"] = f"{self.retry_after:g}"
+                    await self._send_json(writer, status, {"error": {
+                        "message": f"Fallo inyectado ({status})", "type": "server_error", "code": None
+                    }}, headers)
+                    return
+                reply = self._reply_for(payload)
+                if payload.get("stream"):
+                    await self._send_stream(writer, payload, reply, latency)
+                else:
+                    await asyncio.sleep(latency + self._generation_time(self._tokens(reply)))
+                    await self._send_json(writer, 200, self._completion(payload, reply))
+            finally:
+                self._in_flight -= 1
+        elif method == "POST" and path.endswith("/embeddings"):
+            payload = json.loads(body or b"{}")
+            texts = payload.get("input", [])
+            if isinstance(texts, str):
+                texts = [texts]
+            self.embedding_requests += 1
+            self.embedded_texts += len(texts)
+            # Los embeddings son mucho más rápidos que una respuesta de chat
+            await asyncio.sleep(min(self.latency, 0.05))
+            await self._send_json(writer, 200, {
+                "object": "list",
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": self._embedding(text)}
+                    for i, text in enumerate(texts)
+                ],
+                "model": payload.get("model", "fake-embedding"),
+                "usage": {"prompt_tokens": sum(len(t) // 4 for t in texts),
+                          "total_tokens": sum(len(t) // 4 for t in texts)},
+            })
+        else:
+            await self._send_json(writer, 404, {"error": {"message": f"Ruta no soportada: {path}"}})
+
+    def _embedding(self, text: str) -> List[float]:
+        # Palabras sin tildes ni signos; cada una suma 1 en una dimensión elegida por hash
+        text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode()
+        vector = [0.0] * self.embedding_dimensions
+        for word in re.findall(r"[a-z0-9]+", text):
+            digest = hashlib.md5(word.encode()).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.embedding_dimensions] += 1.0
+        return vector
+
+    def _latency_for(self, model: str) -> float:
+        latency = self.model_latency.get(model, self.latency)
+        if self.slow_rate and self._random.random() < self.slow_rate:
+            latency += self.slow_latency
+        return latency
+
+    def _injected_error(self, model: str) -> Optional[int]:
+        if model in self.down_models:
+            return 503
+        if self.error_rate and self._random.random() < self.error_rate:
+            return self._random.choice(self.error_statuses)
+        return None
+
+    def _reply_for(self, payload: dict) -> str:
+        return self.responder(payload) if self.responder else self.reply
+
+    def _tokens(self, reply: str) -> List[str]:
+        # Aproximación: cada palabra (con su espacio) cuenta como un token
+        words = reply.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _generation_time(self, tokens: List[str]) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return len(tokens) / self.tokens_per_second
+
+    async def _send_stream(self, writer: asyncio.StreamWriter, payload: dict, reply: str,
+                           latency: float) -> None:
+        # Las cabeceras llegan con el primer token, como en la API real
+        await asyncio.sleep(latency)
+        writer.write(
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/event-stream\r\n"
+            "Transfer-Encoding: chunked\r\n"
+            "Connection: keep-alive\r\n\r\n".encode("latin-1")
+        )
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for i, token in enumerate(self._tokens(reply)):
+            if i and delay:
+                await asyncio.sleep(delay)
+            chunk = {
+                "id": f"chatcmpl-fake-{self.requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake-model"),
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            await self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n")
+        if payload.get("stream_options", {}).get("include_usage"):
+            usage_chunk = {
+                "id": f"chatcmpl-fake-{self.requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake-model"),
+                "choices": [],
+                "usage": self._usage(payload, reply),
+            }
+            await self._write_chunk(writer, f"data: {json.dumps(usage_chunk)}\n\n")
+        await self._write_chunk(writer, "data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _write_chunk(self, writer: asyncio.StreamWriter, data: str) -> None:
+        raw = data.encode("utf-8")
+        writer.write(f"{len(raw):x}\r\n".encode("latin-1") + raw + b"\r\n")
+        await writer.drain()
+
+    def _completion(self, payload: dict, reply: str) -> dict:
+        return {
+            "id": f"chatcmpl-fake-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": self._usage(payload, reply),
+        }
+
+    def _usage(self, payload: dict, reply: str) -> dict:
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in payload.get("messages", []))
+        completion_tokens = len(self._tokens(reply))
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+
+async def _serve_forever(port: int, latency: float, tokens_per_second: Optional[float]) -> None:
+    server = FakeOpenAIServer(latency=latency, tokens_per_second=tokens_per_second)
+    base_url = await server.start(port=port)
+    print(f"Servidor falso de OpenAI escuchando en {base_url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor falso de OpenAI para benchmarks")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    args = parser.parse_args()
+    asyncio.run(_serve_forever(args.port, args.latency, args.tokens_per_second))
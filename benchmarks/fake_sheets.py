@@ -0,0 +1,69 @@
+"""
+Servicio falso de Google Sheets para benchmarks sin red
+
+Imita la cadena spreadsheets().values().append(...).execute() del cliente
+de googleapiclient, con latencia configurable y errores de cuota (429) o
+de servidor (5xx) inyectables.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List
+
+from googleapiclient.errors import HttpError
+from httplib2 import Response
+
+
+class _Request:
+    def __init__(self, service: "FakeSheetsService", kwargs: Dict[str, Any]):
+        self._service = service
+        self._kwargs = kwargs
+
+    def execute(self) -> Dict[str, Any]:
+        return self._service._execute(self._kwargs)
+
+
+class _Values:
+    def __init__(self, service: "FakeSheetsService"):
+        self._service = service
+
+    def append(self, **kwargs) -> _Request:
+        return _Request(self._service, kwargs)
+
+
+class _Spreadsheets:
+    def __init__(self, service: "FakeSheetsService"):
+        self._service = service
+
+    def values(self) -> _Values:
+        return _Values(self._service)
+
+
+class FakeSheetsService:
+    """Hojas en memoria que cuentan las llamadas a la API"""
+
+    def __init__(self, latency: float = 0.2, quota_errors: int = 0, error_status: int = 429):
+        self.latency = latency
+        # Número de llamadas que fallarán (con error_status) antes de aceptar datos
+        self.quota_errors = quota_errors
+        self.error_status = error_status
+        self.calls = 0
+        self.failed_calls = 0
+        self.sheets: Dict[str, List[List[Any]]] = {}
+        self._lock = threading.Lock()
+
+    def spreadsheets(self) -> _Spreadsheets:
+        return _Spreadsheets(self)
+
+    def _execute(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.quota_errors > 0:
+                self.quota_errors -= 1
+                self.failed_calls += 1
+                raise HttpError(Response({"status": self.error_status}), b'{"error": {"message": "Quota exceeded"}}')
+            sheet = kwargs["range"].split("!", 1)[0]
+            rows = kwargs["body"]["values"]
+            self.sheets.setdefault(sheet, []).extend(rows)
+            return {"updates": {"updatedRows": len(rows)}}
@@ -0,0 +1,202 @@
+"""
+Servidor local que imita la Bot API de Telegram
+
+Responde a los métodos que usa el bot (getMe, sendMessage,
+editMessageText, answerCallbackQuery, setWebhook...) con objetos mínimos
+pero válidos, con una latencia configurable, y registra cada llamada para
+que los benchmarks puedan comprobar qué se envió y cuándo. Opcionalmente
+imita el control de flujo de Telegram: las llamadas a un chat que superan
+los límites por chat o globales reciben un error 429 con retry_after.
+
+Se usa construyendo la aplicación con
+Application.builder().token(FAKE_TOKEN).base_url(server.bot_url)...
+"""
+
+import asyncio
+import json
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from benchmarks.fake_http import FakeHTTPServer
+
+FAKE_TOKEN = "123456:FAKE-TOKEN-PARA-BENCHMARKS"
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Café Bot", "username": "cafe_fake_bot"}
+
+
+def _parse_params(headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+    """Parámetros de la petición; los valores complejos llegan serializados en JSON"""
+    if not body:
+        return {}
+    if headers.get("content-type", "").startswith("application/json"):
+        return json.loads(body)
+    params = {}
+    for name, value in parse_qsl(body.decode("utf-8"), keep_blank_values=True):
+        try:
+            params[name] = json.loads(value)
+        except ValueError:
+            params[name] = value
+    return params
+
+
+class FakeTelegramServer(FakeHTTPServer):
+    """Bot API en memoria que registra las llamadas"""
+
+    def __init__(self, latency: float = 0.0, chat_rate: float = 0.0, chat_burst: float = 3.0,
+                 global_rate: float = 0.0):
+        """
+        Args:
+            latency: Segundos de espera de cada respuesta
+            chat_rate: Llamadas por segundo a un mismo chat antes de responder 429 (0 = sin límite)
+            chat_burst: Llamadas seguidas permitidas a un mismo chat
+            global_rate: Llamadas por segundo entre todos los chats antes de responder 429 (0 = sin límite)
+        """
+        super().__init__()
+        self.latency = latency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_rate = global_rate
+        # Cubos de fichas del control de flujo: (fichas, última reposición)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self.flood_errors = 0
+        self.calls: List[Dict[str, Any]] = []
+        # Las mismas llamadas agrupadas por chat, para no recorrer todas en cada espera
+        self._by_chat: Dict[str, List[Dict[str, Any]]] = {}
+        self._next_message_id = 1000
+        self._changed: Optional[asyncio.Condition] = None
+        # Actualizaciones que se entregan por getUpdates (long polling)
+        self.updates: List[Dict[str, Any]] = []
+
+    @property
+    def bot_url(self) -> str:
+        """URL base para ApplicationBuilder.base_url"""
+        return f"{self.base_url}/bot"
+
+    def calls_for(self, chat_id: int, method: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Llamadas dirigidas a un chat (opcionalmente, solo las de un método)"""
+        return [
+            call for call in self._by_chat.get(str(chat_id), ())
+            if method is None or call["method"] == method
+        ]
+
+    def reset(self) -> None:
+        """Olvida las llamadas registradas y el control de flujo"""
+        self.calls.clear()
+        self._by_chat.clear()
+        self._buckets.clear()
+        self.flood_errors = 0
+
+    def _retry_after(self, chat_id: str) -> int:
+        """Segundos que debe esperar una llamada al chat (0 si está dentro de los límites)"""
+        now = time.monotonic()
+        limits = []
+        if self.chat_rate:
+            limits.append((chat_id, self.chat_rate, self.chat_burst))
+        if self.global_rate:
+            limits.append(("*", self.global_rate, self.global_rate))
+        refilled = {}
+        wait = 0.0
+        for key, rate, capacity in limits:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            refilled[key] = tokens
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / rate)
+        if wait:
+            return max(1, math.ceil(wait))
+        for key, tokens in refilled.items():
+            self._buckets[key] = (tokens - 1, now)
+        return 0
+
+    async def wait_until(self, predicate: Callable[[], bool], timeout: float = 30.0) -> None:
+        """Espera a que se cumpla una condición sobre las llamadas registradas"""
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        async with self._changed:
+            await asyncio.wait_for(self._changed.wait_for(predicate), timeout)
+
+    async def _dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes,
+                        writer: asyncio.StreamWriter) -> None:
+        if not path.startswith("/bot"):
+            await self._send_json(writer, 404, {"ok": False, "error_code": 404, "description": "Not Found"})
+            return
+        api_method = path.rstrip("/").rsplit("/", 1)[-1]
+        params = _parse_params(headers, body)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if "chat_id" in params and (self.chat_rate or self.global_rate):
+            retry_after = self._retry_after(str(params["chat_id"]))
+            if retry_after:
+                self.flood_errors += 1
+                await self._send_json(writer, 429, {
+                    "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                })
+                return
+
+        result = self._result(api_method, params)
+        call = {"method": api_method, "params": params, "result": result, "time": time.perf_counter()}
+        self.calls.append(call)
+        self._by_chat.setdefault(str(params.get("chat_id")), []).append(call)
+        await self._send_json(writer, 200, {"ok": True, "result": result})
+
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _result(self, api_method: str, params: Dict[str, Any]) -> Any:
+        if api_method == "getMe":
+            return BOT_USER
+        if api_method == "getUpdates":
+            offset = int(params.get("offset") or 0)
+            return [update for update in self.updates if update["update_id"] >= offset]
+        if api_method in ("sendMessage", "editMessageText"):
+            if api_method == "sendMessage" or "message_id" not in params:
+                self._next_message_id += 1
+            return {
+                "message_id": params.get("message_id", self._next_message_id),
+                "date": int(time.time()),
+                "chat": {"id": params.get("chat_id", 0), "type": "private"},
+                "from": BOT_USER,
+                "text": str(params.get("text", "")),
+            }
+        return True
+
+
+def recorded_message(update_id: int, chat_id: int, text: str) -> Dict[str, Any]:
+    """Update de Telegram con un mensaje de texto, tal como llega al webhook"""
+    user = {"id": chat_id, "is_bot": False, "first_name": f"Usuario {chat_id}", "language_code": "es"}
+    message = {
+        "message_id": update_id,
+        "from": user,
+        "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+        "date": int(time.time()),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def recorded_callback(update_id: int, chat_id: int, data: str, message_id: int) -> Dict[str, Any]:
+    """Update de Telegram con la pulsación de un botón en línea de un mensaje del bot"""
+    user = {"id": chat_id, "is_bot": False, "first_name": f"Usuario {chat_id}", "language_code": "es"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "from": BOT_USER,
+                "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+                "date": int(time.time()),
+                "text": "Selecciona una opción",
+            },
+        },
+    }
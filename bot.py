@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 from telegram.ext import Application, CommandHandler
 
@@ -14,8 +15,22 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("telegram").setLevel(logging.WARNING)
 
 # Importar configuración
-from config import TOKEN, sheets_configured, openai_configured
-from utils.sheets import initialize_sheets
+from config import (
+    TOKEN, sheets_configured, openai_configured, BOT_MODE, CONCURRENT_UPDATES, SHUTDOWN_TIMEOUT,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, PORT,
+    PERSISTENCE_ENABLED, PERSISTENCE_FILE, PERSISTENCE_INTERVAL
+)
+from utils.sheets_queue import start_write_queue, stop_write_queue
+from utils.persistence import SQLitePersistence
+from utils.http import telegram_request, telegram_updates_request
+from utils.metrics import instrument_handlers, start_metrics_server, stop_metrics_server
+# El cliente de OpenAI se crea con la primera consulta de IA, no al importar
+from utils.openai import close_client
+from utils.precompute import schedule_precompute
+from utils.prompts import load_encoder
+from utils.workers import shutdown_workers
+from utils.profiling import install_profiling, start_profiling, stop_profiling
+from utils.outbox import telegram_rate_limiter
 
 # Importar handlers
 from handlers.start import start_command, help_command
@@ -25,21 +40,58 @@ from handlers.gastos import register_gastos_handlers
 from handlers.ventas import register_ventas_handlers
 from handlers.reportes import register_reportes_handlers
 from handlers.ia import register_ia_handlers  # Nuevo handler para IA
+from handlers.importar import register_import_handlers
+from handlers.perf import register_perf_handlers
+
+# Tareas de arranque en segundo plano (se guarda la referencia para que no se recolecten)
+_startup_tasks = set()
+
+async def initialize_sheets_in_background() -> None:
+    """Inicializa Google Sheets sin retrasar la primera respuesta del bot"""
+    logger.info("Inicializando Google Sheets...")
+    try:
+        # Import local: el cliente de Google (discovery) tarda en cargarse
+        from utils.sheets import initialize_sheets
+        await asyncio.to_thread(initialize_sheets)
+        logger.info("Google Sheets inicializado correctamente")
+    except Exception as e:
+        logger.error(f"Error al inicializar Google Sheets: {e}")
+        logger.warning("El bot continuará funcionando, pero los datos no se guardarán en Google Sheets")
+
+async def load_encoder_in_background() -> None:
+    """Carga el tokenizador de tiktoken (puede descargar sus tablas) sin bloquear el bucle"""
+    if await asyncio.to_thread(load_encoder):
+        logger.info("Tokenizador de tiktoken cargado")
+
+def _start_background(coroutine) -> None:
+    task = asyncio.create_task(coroutine)
+    _startup_tasks.add(task)
+    task.add_done_callback(_startup_tasks.discard)
+
+async def post_init(application: Application) -> None:
+    """Inicia la cola de Google Sheets, el servidor de métricas, el perfilado, la inicialización de Sheets y el tokenizador"""
+    await start_write_queue(application)
+    await start_metrics_server(application)
+    await start_profiling(application)
+    if sheets_configured:
+        _start_background(initialize_sheets_in_background())
+    if openai_configured:
+        _start_background(load_encoder_in_background())
+
+async def post_shutdown(application: Application) -> None:
+    """Envía lo pendiente a Google Sheets y cierra el servidor de métricas, el perfilado, el cliente de OpenAI y los ejecutores"""
+    await stop_write_queue(application)
+    await stop_metrics_server(application)
+    await stop_profiling(application)
+    await close_client()
+    await shutdown_workers(application)
 
 def main():
     """Iniciar el bot"""
     logger.info("Iniciando bot de Telegram para Gestión de Café con IA")
     
-    # Verificar la configuración de Google Sheets
-    if sheets_configured:
-        logger.info("Inicializando Google Sheets...")
-        try:
-            initialize_sheets()
-            logger.info("Google Sheets inicializado correctamente")
-        except Exception as e:
-            logger.error(f"Error al inicializar Google Sheets: {e}")
-            logger.warning("El bot continuará funcionando, pero los datos no se guardarán en Google Sheets")
-    else:
+    # Verificar la configuración de Google Sheets; se inicializa en segundo plano (ver post_init)
+    if not sheets_configured:
         logger.warning("Google Sheets no está configurado. Los datos no se guardarán correctamente.")
         logger.info("Asegúrate de configurar SPREADSHEET_ID y GOOGLE_CREDENTIALS en las variables de entorno")
     
@@ -72,7 +124,27 @@ def main():
             logger.warning(f"Variable de entorno {var} NO está configurada")
     
     # Crear la aplicación
-    application = Application.builder().token(TOKEN).build()
+    # La cola de Google Sheets se inicia con la aplicación y envía lo pendiente al detenerse
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        # Pool, keep-alive y plazos explícitos con la Bot API (ver utils.http)
+        .request(telegram_request())
+        .get_updates_request(telegram_updates_request())
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    # Límites de envío de la Bot API por chat y globales, con reintentos tras RetryAfter (ver utils.outbox)
+    rate_limiter = telegram_rate_limiter()
+    if rate_limiter is not None:
+        builder = builder.rate_limiter(rate_limiter)
+    # Las conversaciones en curso sobreviven a los reinicios y se comparten entre procesos
+    persistence = None
+    if PERSISTENCE_ENABLED:
+        persistence = SQLitePersistence(PERSISTENCE_FILE, update_interval=PERSISTENCE_INTERVAL)
+        builder = builder.persistence(persistence)
+    application = builder.build()
     
     # Registrar comandos básicos
     application.add_handler(CommandHandler("start", start_command))
@@ -86,10 +158,33 @@ def main():
     register_ventas_handlers(application)
     register_reportes_handlers(application)
     register_ia_handlers(application)  # Registrar handlers de IA
+    register_import_handlers(application)
+    register_perf_handlers(application)  # /perf, solo con PROFILING_ENABLED=true
+    # Análisis de datos precalculado: diario y cuando cambian los registros (JobQueue)
+    schedule_precompute(application)
+    if persistence:
+        persistence.sync_conversations(application)
+    # Latencia de cada manejador (no hace nada si METRICS_ENABLED=false)
+    instrument_handlers(application)
+    # Capa de perfilado alrededor de todos los manejadores (no hace nada si PROFILING_ENABLED=false)
+    install_profiling(application)
     
     # Iniciar el bot
-    logger.info("Bot iniciado. Esperando comandos...")
-    application.run_polling()
+    if BOT_MODE == "webhook":
+        from utils.webhook import run_webhook
+        logger.info(f"Bot iniciado en modo webhook. Escuchando en {WEBHOOK_HOST}:{PORT}{WEBHOOK_PATH}")
+        run_webhook(
+            application,
+            host=WEBHOOK_HOST,
+            port=PORT,
+            path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            drain_timeout=SHUTDOWN_TIMEOUT
+        )
+    else:
+        logger.info("Bot iniciado. Esperando comandos...")
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
@@ -7,20 +7,152 @@ load_dotenv()
 # Obtener el token del bot desde las variables de entorno
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+# Usuarios de Telegram (IDs numéricos separados por comas) con acceso a los comandos de administración (/perf)
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
+
 # Configuración de archivos de datos (se mantiene para compatibilidad)
 DATA_DIR = "data"
 COMPRAS_FILE = os.path.join(DATA_DIR, "compras.csv")
 PROCESO_FILE = os.path.join(DATA_DIR, "proceso.csv")
 GASTOS_FILE = os.path.join(DATA_DIR, "gastos.csv")
 VENTAS_FILE = os.path.join(DATA_DIR, "ventas.csv")
+OPENAI_CACHE_FILE = os.path.join(DATA_DIR, "openai_cache.sqlite3")
+FAQ_FILE = os.path.join(DATA_DIR, "faq.json")  # Preguntas frecuentes revisadas
+FAQ_APPROVED_FILE = os.getenv("FAQ_APPROVED_FILE", os.path.join(DATA_DIR, "faq_aprobadas.jsonl"))  # Respuestas aprobadas después
+FAQ_INDEX_FILE = os.getenv("FAQ_INDEX_FILE", os.path.join(DATA_DIR, "faq_index.npy"))  # Embeddings (los textos van en faq_index.json)
+PERSISTENCE_FILE = os.getenv("PERSISTENCE_FILE", os.path.join(DATA_DIR, "bot_state.sqlite3"))
+
+# Persistencia de conversaciones y user_data (compartible entre varios procesos del bot; desactivada por defecto)
+PERSISTENCE_ENABLED = os.getenv("PERSISTENCE_ENABLED", "false").lower() == "true"
+PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", "1.0"))  # Segundos entre escrituras agrupadas
+
+# Modo de ejecución: "polling" (predeterminado) o "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Actualizaciones procesadas en paralelo, en polling y en webhook. Con 1 se procesan en orden, pero /cancelar
+# no llega hasta que termina el análisis o la importación que debía detener
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "16"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))  # Segundos de espera por las respuestas en curso al detenerse
+
+# Configuración del modo webhook
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # URL pública base, p. ej. https://mi-bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # Se comprueba en la cabecera X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8080"))
+
+# Intervalo mínimo (segundos) entre ediciones de un mensaje en streaming, para respetar los límites de Telegram
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+# Envío de mensajes a Telegram: límites de la Bot API por chat y globales, y reintentos tras RetryAfter
+TELEGRAM_RATE_LIMIT_ENABLED = os.getenv("TELEGRAM_RATE_LIMIT_ENABLED", "true").lower() == "true"
+TELEGRAM_GLOBAL_PER_SECOND = float(os.getenv("TELEGRAM_GLOBAL_PER_SECOND", "30"))  # Mensajes por segundo entre todos los chats
+TELEGRAM_CHAT_PER_SECOND = float(os.getenv("TELEGRAM_CHAT_PER_SECOND", "1"))  # Mensajes por segundo a un chat privado
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))  # Mensajes seguidos a un mismo chat
+TELEGRAM_GROUP_PER_MINUTE = float(os.getenv("TELEGRAM_GROUP_PER_MINUTE", "20"))  # Mensajes por minuto a un grupo o canal
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))  # Reintentos de un envío tras un RetryAfter
 
 # Configuración de Google Sheets
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 GOOGLE_CREDENTIALS = os.getenv("GOOGLE_CREDENTIALS")
+SHEETS_JOURNAL_FILE = os.path.join(DATA_DIR, "sheets_journal.jsonl")  # Diario local de filas pendientes
+SHEETS_BATCH_SIZE = int(os.getenv("SHEETS_BATCH_SIZE", "100"))  # Filas que disparan un envío inmediato
+SHEETS_FLUSH_INTERVAL = float(os.getenv("SHEETS_FLUSH_INTERVAL", "2.0"))  # Segundos entre envíos a Sheets
 
 # Configuración de OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4-turbo")  # Valor predeterminado si no se especifica
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Opcional, p. ej. para apuntar a un servidor local de pruebas
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))  # Llamadas simultáneas a OpenAI
+OPENAI_PROMPT_BUDGET = int(os.getenv("OPENAI_PROMPT_BUDGET", "0"))  # Tokens de datos por prompt (0 = según el modelo)
+OPENAI_PRICING_CHUNK_SIZE = int(os.getenv("OPENAI_PRICING_CHUNK_SIZE", "10"))  # Productos por llamada de precios
+OPENAI_PRICING_ATTEMPTS = int(os.getenv("OPENAI_PRICING_ATTEMPTS", "3"))  # Intentos por bloque de productos
+
+# Resiliencia de las llamadas a OpenAI
+OPENAI_FALLBACK_MODEL = os.getenv("OPENAI_FALLBACK_MODEL", "gpt-4o-mini")  # Modelo de respaldo ("" = ninguno)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))  # Segundos máximos de cada intento (hasta el primer token)
+OPENAI_TOTAL_TIMEOUT = float(os.getenv("OPENAI_TOTAL_TIMEOUT", "60"))  # Segundos máximos con todos los reintentos
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))  # Reintentos ante 429, 5xx y tiempos agotados
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "8"))
+OPENAI_HEDGE_AFTER = float(os.getenv("OPENAI_HEDGE_AFTER", "0"))  # Segundos antes de una petición de cobertura (0 = nunca)
+OPENAI_BREAKER_THRESHOLD = int(os.getenv("OPENAI_BREAKER_THRESHOLD", "5"))  # Fallos seguidos que abren el circuito
+OPENAI_BREAKER_COOLDOWN = float(os.getenv("OPENAI_BREAKER_COOLDOWN", "30"))  # Segundos hasta probar de nuevo el principal
+
+# Control de admisión de las consultas de IA
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_CHAT_PER_MINUTE = float(os.getenv("ADMISSION_CHAT_PER_MINUTE", "6"))  # Consultas por minuto por chat
+ADMISSION_CHAT_BURST = float(os.getenv("ADMISSION_CHAT_BURST", "3"))  # Consultas seguidas por chat
+ADMISSION_GLOBAL_PER_SECOND = float(os.getenv("ADMISSION_GLOBAL_PER_SECOND", "2"))  # Consultas por segundo en total
+ADMISSION_GLOBAL_BURST = float(os.getenv("ADMISSION_GLOBAL_BURST", "8"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "50"))  # Consultas que pueden esperar turno
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "30"))  # Segundos máximos de espera en la cola
+
+# Índice semántico de preguntas frecuentes
+FAQ_ENABLED = os.getenv("FAQ_ENABLED", "true").lower() == "true"
+FAQ_THRESHOLD = float(os.getenv("FAQ_THRESHOLD", "0.85"))  # Similitud coseno mínima para responder desde el índice
+FAQ_BATCH_SIZE = int(os.getenv("FAQ_BATCH_SIZE", "100"))  # Textos por llamada a la API de embeddings
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Memoria de las consultas de IA (historial por chat con resumen de los turnos antiguos)
+MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "true").lower() == "true"
+MEMORY_TURNS = int(os.getenv("MEMORY_TURNS", "4"))  # Turnos recientes que se envían literalmente
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "1500"))  # Tokens máximos de historial por consulta
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))  # Tokens máximos del resumen
+MEMORY_MAX_CONVERSATIONS = int(os.getenv("MEMORY_MAX_CONVERSATIONS", "1000"))  # Conversaciones en memoria
+MEMORY_IDLE_TTL = float(os.getenv("MEMORY_IDLE_TTL", "3600"))  # Segundos sin uso tras los que se olvida una conversación
+
+# Caché de respuestas de OpenAI
+OPENAI_CACHE_ENABLED = os.getenv("OPENAI_CACHE_ENABLED", "true").lower() == "true"
+OPENAI_CACHE_TTL = float(os.getenv("OPENAI_CACHE_TTL", "86400"))  # Segundos que una respuesta sigue siendo válida
+OPENAI_CACHE_MAX_ENTRIES = int(os.getenv("OPENAI_CACHE_MAX_ENTRIES", "1000"))
+OPENAI_CACHE_SQLITE = os.getenv("OPENAI_CACHE_SQLITE", "false").lower() == "true"  # Guardar también en disco
+
+# Conexiones HTTP con OpenAI, Telegram y Google Sheets
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"  # Solo si está instalado httpx[http2]
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))  # Segundos que sigue abierta una conexión inactiva
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "0"))  # Conexiones con OpenAI (0 = 2 × OPENAI_MAX_CONCURRENCY)
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_POOL_TIMEOUT = float(os.getenv("OPENAI_POOL_TIMEOUT", "10"))  # Segundos de espera por una conexión libre
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "0"))  # Conexiones con la Bot API (0 = 2 × CONCURRENT_UPDATES)
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", "10"))
+TELEGRAM_POOL_TIMEOUT = float(os.getenv("TELEGRAM_POOL_TIMEOUT", "5"))  # Segundos de espera por una conexión libre
+SHEETS_HTTP_TIMEOUT = float(os.getenv("SHEETS_HTTP_TIMEOUT", "30"))  # Segundos máximos de cada llamada a Google Sheets
+
+# Análisis de datos precalculado en segundo plano (JobQueue de python-telegram-bot)
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "true").lower() == "true"
+PRECOMPUTE_TIME = os.getenv("PRECOMPUTE_TIME", "06:00")  # Hora diaria del análisis (HH:MM, UTC)
+PRECOMPUTE_CHECK_INTERVAL = float(os.getenv("PRECOMPUTE_CHECK_INTERVAL", "600"))  # Segundos entre revisiones de cambios
+PRECOMPUTE_CHANGE_THRESHOLD = int(os.getenv("PRECOMPUTE_CHANGE_THRESHOLD", "20"))  # Filas nuevas que adelantan el análisis
+PRECOMPUTE_FILE = os.getenv("PRECOMPUTE_FILE", os.path.join(DATA_DIR, "analisis.json"))
+
+# Ejecutores del trabajo de CPU (listas de productos, JSON de OpenAI y reportes)
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "4"))
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "2"))  # 0 = todo en hilos
+# Tipos de tarea que van al pool de procesos ("json", "importacion"); los reportes siempre van en hilos.
+# Solo compensa para trabajo largo: cada tarea paga la serialización y el primer uso, el arranque del proceso
+WORKER_PROCESS_TASKS = [
+    task.strip() for task in os.getenv("WORKER_PROCESS_TASKS", "importacion").split(",") if task.strip()
+]
+
+# Importación masiva de registros históricos (/importar y python importar.py)
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))  # Filas que se validan y escriben por lote
+IMPORT_PROGRESS_INTERVAL = float(os.getenv("IMPORT_PROGRESS_INTERVAL", "3"))  # Segundos entre avisos de progreso
+IMPORT_MAX_FILE_MB = float(os.getenv("IMPORT_MAX_FILE_MB", "20"))  # La Bot API no descarga archivos de más de 20 MB
+IMPORT_SHEETS_MAX_PENDING = int(os.getenv("IMPORT_SHEETS_MAX_PENDING", "20000"))  # Filas para Sheets en memoria antes de esperar al envío
+IMPORT_LOG_FILE = os.getenv("IMPORT_LOG_FILE", os.path.join(DATA_DIR, "importaciones.jsonl"))  # Archivos ya importados
+
+# Perfilado del bucle de eventos y de las actualizaciones (consulta con /perf)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_LAG_INTERVAL = float(os.getenv("PROFILING_LAG_INTERVAL", "0.1"))  # Segundos entre mediciones del retraso del bucle
+PROFILING_BLOCK_THRESHOLD = float(os.getenv("PROFILING_BLOCK_THRESHOLD", "0.25"))  # Bloqueo del bucle que se registra con su pila
+PROFILING_SLOWEST = int(os.getenv("PROFILING_SLOWEST", "20"))  # Actualizaciones más lentas que se conservan
+PROFILING_SAMPLE_INTERVAL = float(os.getenv("PROFILING_SAMPLE_INTERVAL", "0.005"))  # Segundos entre muestras del perfilador
+
+# Métricas en formato Prometheus (servidor HTTP local en /metrics)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # Solo accesible desde la propia máquina por defecto
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
 
 # Asegurar que el directorio de datos existe (se mantiene para compatibilidad)
 os.makedirs(DATA_DIR, exist_ok=True)
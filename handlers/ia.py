@@ -2,8 +2,11 @@
 Manejadores para comandos relacionados con IA y OpenAI
 """
 
+import asyncio
 import logging
 import json
+import math
+from datetime import datetime, timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ContextTypes, 
@@ -15,17 +18,28 @@ from telegram.ext import (
 )
 
 from utils.openai import (
-    generate_response, 
-    analyze_coffee_data, 
+    stream_response, 
     generate_coffee_recommendation,
-    optimize_coffee_pricing
+    optimize_coffee_pricing,
+    parse_pricing_text
 )
-from utils.db import get_all_records
-from config import COMPRAS_FILE, PROCESO_FILE, VENTAS_FILE, GASTOS_FILE, openai_configured
+from utils.telegram import stream_to_message
+from utils.outbox import reply
+from utils.memory import chat_history, remember, forget
+from utils.admission import AdmissionRejected, admit, busy_message
+from utils.precompute import analysis_store, changed_rows
+from utils.workers import TaskCancelled, worker_pool
+from config import openai_configured, OPENAI_PRICING_CHUNK_SIZE, PRECOMPUTE_ENABLED
 
 # Estados para la conversación
 AWAIT_QUESTION, AWAIT_PREFERENCES, AWAIT_OPTIMIZATION_DATA = range(3)
 
+# Botón que recalcula el análisis de datos sin usar el guardado
+ANALYSIS_REFRESH = "ia_analisis_actualizar"
+
+# Pregunta de seguimiento, en el mismo mensaje que la respuesta
+ANOTHER_QUESTION = "¿Deseas hacer otra consulta?"
+
 # Configuración de logging
 logger = logging.getLogger(__name__)
 
@@ -38,6 +52,9 @@ async def ia_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         )
         return ConversationHandler.END
     
+    # Cada /ia empieza una conversación nueva; "Nueva consulta" continúa la actual
+    forget(update.effective_chat.id)
+    
     keyboard = [
         [InlineKeyboardButton("💬 Consulta IA", callback_data="ia_consulta")],
         [InlineKeyboardButton("📊 Análisis de datos", callback_data="ia_analisis")],
@@ -65,6 +82,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     choice = query.data
     
     if choice == "ia_cancelar":
+        forget(update.effective_chat.id)
         await query.edit_message_text("Operación cancelada.")
         return ConversationHandler.END
     
@@ -78,41 +96,8 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         context.user_data["ia_mode"] = "consulta"
         return AWAIT_QUESTION
     
-    elif choice == "ia_analisis":
-        await query.edit_message_text(
-            "📊 *Análisis de datos*\n\n"
-            "Estoy analizando tus datos de café...",
-            parse_mode="Markdown"
-        )
-        
-        # Recopilar datos para análisis
-        try:
-            compras = get_all_records(COMPRAS_FILE)
-            procesos = get_all_records(PROCESO_FILE)
-            ventas = get_all_records(VENTAS_FILE)
-            gastos = get_all_records(GASTOS_FILE)
-            
-            data = {
-                "compras": compras[-50:] if len(compras) > 50 else compras,  # Últimas 50 compras
-                "procesos": procesos[-50:] if len(procesos) > 50 else procesos,
-                "ventas": ventas[-50:] if len(ventas) > 50 else ventas,
-                "gastos": gastos[-50:] if len(gastos) > 50 else gastos
-            }
-            
-            # Generar análisis
-            analysis = analyze_coffee_data(data)
-            
-            await query.edit_message_text(
-                f"📊 *Análisis de datos*\n\n{analysis}",
-                parse_mode="Markdown"
-            )
-            
-        except Exception as e:
-            logger.error(f"Error al analizar datos: {e}")
-            await query.edit_message_text(
-                f"Lo siento, ocurrió un error al analizar los datos: {str(e)}"
-            )
-        
+    elif choice in ("ia_analisis", ANALYSIS_REFRESH):
+        await show_analysis(update, force=choice == ANALYSIS_REFRESH)
         return ConversationHandler.END
     
     elif choice == "ia_recomendacion":
@@ -148,11 +133,92 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     return ConversationHandler.END
 
+async def show_analysis(update: Update, force: bool = False) -> None:
+    """
+    Muestra el análisis de datos en el mensaje del botón pulsado
+
+    El análisis precalculado (ver utils.precompute) se sirve al instante;
+    solo se llama al modelo si aún no hay ninguno, si el precálculo está
+    desactivado o si se pulsó "Actualizar" (force).
+
+    Args:
+        update: Actualización con el callback del botón
+        force: Si es True, se recalcula el análisis sin usar el guardado
+    """
+    query = update.callback_query
+    result = analysis_store.latest() if PRECOMPUTE_ENABLED and not force else None
+    
+    if result is None:
+        try:
+            await admit(update.effective_chat.id)
+        except AdmissionRejected as e:
+            await query.edit_message_text(busy_message(e))
+            return
+        
+        await query.edit_message_text(
+            "📊 *Análisis de datos*\n\n"
+            "Estoy analizando tus datos de café...",
+            parse_mode="Markdown"
+        )
+        try:
+            async with worker_pool.cancellable(update.effective_chat.id, "analisis"):
+                result = await analysis_store.refresh(force=force or not PRECOMPUTE_ENABLED)
+        except TaskCancelled:
+            return
+        except Exception as e:
+            logger.error(f"Error al analizar datos: {e}")
+            await query.edit_message_text(
+                f"Lo siento, ocurrió un error al analizar los datos: {str(e)}"
+            )
+            return
+    
+    # Filas registradas desde que se calculó (solo se leen las nuevas)
+    rows = await asyncio.to_thread(analysis_store.store.row_counts)
+    pending = changed_rows(result["filas"], rows)
+    calculated = datetime.fromtimestamp(result["calculado"], timezone.utc).strftime("%Y-%m-%d %H:%M")
+    stamp = f"Calculado el {calculated} UTC con {sum(result['filas'].values())} registros"
+    if pending:
+        stamp += f" ({pending} cambios desde entonces)"
+    
+    keyboard = [[InlineKeyboardButton("🔄 Actualizar análisis", callback_data=ANALYSIS_REFRESH)]]
+    await query.edit_message_text(
+        f"📊 *Análisis de datos*\n\n{result['analisis']}\n\n_{stamp}_",
+        parse_mode="Markdown",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def refresh_analysis_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Botón "Actualizar análisis" pulsado fuera de la conversación de /ia"""
+    await update.callback_query.answer()
+    await show_analysis(update, force=True)
+
 async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Maneja una pregunta del usuario para la IA"""
     user_question = update.message.text
+    chat_id = update.effective_chat.id
     
-    await update.message.reply_text("🤔 Procesando tu consulta...")
+    # Preguntas frecuentes ya respondidas: no hace falta llamar al modelo de chat
+    # (import local: NumPy y el índice se cargan con la primera pregunta)
+    from utils.faq import find_answer
+    faq_answer = await find_answer(user_question)
+    if faq_answer is not None:
+        await reply(
+            update.message,
+            f"☕ Respuesta:\n\n{faq_answer['respuesta']}\n\n{ANOTHER_QUESTION}",
+            reply_markup=_another_question_keyboard()
+        )
+        remember(chat_id, user_question, faq_answer["respuesta"])
+        return AWAIT_QUESTION
+    
+    # Se sigue esperando una pregunta: el usuario puede reenviarla cuando se indique
+    try:
+        await admit(chat_id)
+    except AdmissionRejected as e:
+        await reply(update.message, busy_message(e))
+        return AWAIT_QUESTION
+    
+    # Se edita con la respuesta: va directamente, sin unirse a otros textos de la cola de salida
+    placeholder = await update.message.reply_text("🤔 Procesando tu consulta...")
     
     # Sistema de prompts específicos para café
     system_prompt = """
@@ -163,36 +229,47 @@ async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """
     
     try:
-        response = generate_response(user_question, system_prompt)
-        
-        await update.message.reply_text(
-            f"☕ *Respuesta:*\n\n{response}",
-            parse_mode="Markdown"
+        # La respuesta se muestra a medida que llega en lugar de esperar a que termine
+        # Las preguntas de seguimiento llevan el resumen y los últimos turnos de la conversación
+        answer = await stream_to_message(
+            placeholder,
+            stream_response(user_question, system_prompt, call_site="consulta", history=chat_history(chat_id)),
+            title="☕ Respuesta:",
+            footer=f"\n\n{ANOTHER_QUESTION}",
+            reply_markup=_another_question_keyboard()
         )
+        # Solo se llega aquí si la respuesta terminó: una interrumpida no entra en la memoria
+        if answer.strip():
+            remember(chat_id, user_question, answer)
     except Exception as e:
         logger.error(f"Error al generar respuesta: {e}")
-        await update.message.reply_text(
-            f"Lo siento, ocurrió un error al procesar tu consulta: {str(e)}"
+        await reply(
+            update.message,
+            f"Lo siento, ocurrió un error al procesar tu consulta: {str(e)}\n\n{ANOTHER_QUESTION}",
+            reply_markup=_another_question_keyboard()
         )
     
-    # Preguntar si quiere hacer otra consulta
+    return AWAIT_QUESTION
+
+def _another_question_keyboard() -> InlineKeyboardMarkup:
+    """Botones para hacer otra consulta o terminar"""
     keyboard = [
         [InlineKeyboardButton("Nueva consulta", callback_data="ia_consulta")],
         [InlineKeyboardButton("Terminar", callback_data="ia_cancelar")]
     ]
-    
-    await update.message.reply_text(
-        "¿Deseas hacer otra consulta?",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
-    
-    return AWAIT_QUESTION
+    return InlineKeyboardMarkup(keyboard)
 
 async def handle_preferences(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Maneja las preferencias del usuario para recomendaciones de café"""
     preferences_text = update.message.text
     
-    await update.message.reply_text("☕ Analizando tus preferencias...")
+    try:
+        await admit(update.effective_chat.id)
+    except AdmissionRejected as e:
+        await reply(update.message, busy_message(e))
+        return AWAIT_PREFERENCES
+    
+    await reply(update.message, "☕ Analizando tus preferencias...")
     
     # Convertir texto a formato de diccionario
     preferences = {
@@ -201,15 +278,17 @@ async def handle_preferences(update: Update, context: ContextTypes.DEFAULT_TYPE)
     }
     
     try:
-        recommendations = generate_coffee_recommendation(preferences)
+        recommendations = await generate_coffee_recommendation(preferences)
         
-        await update.message.reply_text(
+        await reply(
+            update.message,
             f"☕ *Recomendaciones personalizadas:*\n\n{recommendations}",
             parse_mode="Markdown"
         )
     except Exception as e:
         logger.error(f"Error al generar recomendaciones: {e}")
-        await update.message.reply_text(
+        await reply(
+            update.message,
             f"Lo siento, ocurrió un error al generar recomendaciones: {str(e)}"
         )
     
@@ -219,75 +298,56 @@ async def handle_optimization_data(update: Update, context: ContextTypes.DEFAULT
     """Maneja los datos de optimización de precios"""
     pricing_data_text = update.message.text
     
-    await update.message.reply_text("💰 Analizando datos de precios...")
+    await reply(update.message, "💰 Analizando datos de precios...")
     
     # Intentar estructurar los datos del texto
     try:
-        # Conversión básica (podría mejorarse con regex para una estructura más precisa)
-        lines = pricing_data_text.split('\n')
-        products = []
-        current_product = {}
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            if line.startswith("Producto:"):
-                if current_product and "producto" in current_product:
-                    products.append(current_product)
-                current_product = {}
-                current_product["producto"] = line.replace("Producto:", "").strip()
-            elif line.startswith("Precio actual:"):
-                try:
-                    current_product["precio_actual"] = float(line.replace("Precio actual:", "").strip())
-                except ValueError:
-                    pass
-            elif line.startswith("Costo:"):
-                try:
-                    current_product["costo"] = float(line.replace("Costo:", "").strip())
-                except ValueError:
-                    pass
-            elif line.startswith("Margen deseado:"):
-                try:
-                    current_product["margen"] = float(line.replace("Margen deseado:", "").replace("%", "").strip())
-                except ValueError:
-                    pass
+        # /cancelar detiene el análisis y las llamadas a OpenAI en curso
+        async with worker_pool.cancellable(update.effective_chat.id, "precios"):
+            # Un mensaje de Telegram tiene como mucho 4096 caracteres: se analiza en microsegundos,
+            # menos de lo que costaría enviarlo a un hilo o a un proceso
+            products = parse_pricing_text(pricing_data_text)
         
-        # Añadir el último producto
-        if current_product and "producto" in current_product:
-            products.append(current_product)
+            # Cada bloque de productos es una llamada a OpenAI
+            try:
+                await admit(update.effective_chat.id, cost=math.ceil(len(products) / OPENAI_PRICING_CHUNK_SIZE))
+            except AdmissionRejected as e:
+                await reply(update.message, busy_message(e))
+                return AWAIT_OPTIMIZATION_DATA
         
-        # Si no hay productos, lanzar excepción
-        if not products:
-            raise ValueError("No se pudieron extraer datos de productos del texto proporcionado")
-            
-        # Obtener recomendaciones de precios
-        pricing_data = {"productos": products}
-        optimization_result = optimize_coffee_pricing(pricing_data)
+            # Obtener recomendaciones de precios
+            pricing_data = {"productos": products}
+            optimization_result = await optimize_coffee_pricing(pricing_data)
         
-        # Formatear respuesta
-        response = "💰 *Precios optimizados recomendados:*\n\n"
+            # Formatear respuesta
+            response = "💰 *Precios optimizados recomendados:*\n\n"
         
-        if "error" in optimization_result:
-            raise ValueError(optimization_result["error"])
+            if isinstance(optimization_result, dict) and "error" in optimization_result:
+                raise ValueError(optimization_result["error"])
             
-        # Verificar si es una lista o un objeto
-        items = optimization_result
-        if not isinstance(optimization_result, list):
-            items = [optimization_result]
+            # Verificar si es una lista o un objeto
+            items = optimization_result
+            if not isinstance(optimization_result, list):
+                items = [optimization_result]
             
-        for item in items:
-            response += f"*{item.get('producto', 'Producto')}*\n"
-            response += f"📈 Precio actual: ${item.get('precio_actual', 'N/A')}\n"
-            response += f"✅ Precio recomendado: ${item.get('precio_recomendado', 'N/A')}\n"
-            response += f"📝 Justificación: {item.get('justificacion', 'No disponible')}\n\n"
+            for item in items:
+                response += f"*{item.get('producto', 'Producto')}*\n"
+                current_price = item.get('precio_actual')
+                recommended_price = item.get('precio_recomendado')
+                response += f"📈 Precio actual: ${current_price if current_price is not None else 'N/A'}\n"
+                response += f"✅ Precio recomendado: ${recommended_price if recommended_price is not None else 'N/A'}\n"
+                response += f"📝 Justificación: {item.get('justificacion', 'No disponible')}\n\n"
         
-        await update.message.reply_text(response, parse_mode="Markdown")
+            # Con muchos productos supera los 4096 caracteres: la cola de salida lo corta por productos
+            await reply(update.message, response, parse_mode="Markdown")
         
+    except TaskCancelled:
+        # cancel() ya respondió al usuario
+        pass
     except Exception as e:
         logger.error(f"Error en la optimización de precios: {e}")
-        await update.message.reply_text(
+        await reply(
+            update.message,
             f"Lo siento, ocurrió un error al procesar los datos de precios: {str(e)}\n\n"
             "Por favor, asegúrate de seguir el formato especificado."
         )
@@ -295,7 +355,9 @@ async def handle_optimization_data(update: Update, context: ContextTypes.DEFAULT
     return ConversationHandler.END
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Cancela la conversación"""
+    """Cancela la conversación y el trabajo en curso del chat"""
+    worker_pool.cancel(update.effective_chat.id)
+    forget(update.effective_chat.id)
     await update.message.reply_text("Operación cancelada.")
     return ConversationHandler.END
 
@@ -321,7 +383,12 @@ def register_ia_handlers(application):
                 MessageHandler(filters.TEXT & ~filters.COMMAND, handle_optimization_data)
             ],
         },
-        fallbacks=[CommandHandler("cancelar", cancel)]
+        fallbacks=[CommandHandler("cancelar", cancel)],
+        # Con persistencia, la conversación sobrevive a los reinicios del bot
+        name="ia_conversation",
+        persistent=application.persistence is not None
     )
     
     application.add_handler(conv_handler)
+    # El botón de actualizar sigue en el mensaje cuando la conversación ya terminó
+    application.add_handler(CallbackQueryHandler(refresh_analysis_callback, pattern=f"^{ANALYSIS_REFRESH}$"))
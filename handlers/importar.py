@@ -0,0 +1,168 @@
+"""
+Manejadores para la importación masiva de compras y ventas históricas
+"""
+
+import logging
+import os
+import tempfile
+import time
+from telegram import Update
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import (
+    ContextTypes,
+    CommandHandler,
+    MessageHandler,
+    filters,
+    ConversationHandler
+)
+
+from utils.importer import IMPORT_LEDGERS, ImportFileError, import_file
+from utils import sheets_queue
+from utils.workers import TaskCancelled, worker_pool
+from config import ADMIN_IDS, IMPORT_MAX_FILE_MB, IMPORT_PROGRESS_INTERVAL
+
+# Estados para la conversación
+AWAIT_FILE = 0
+
+# Extensiones de archivo admitidas
+IMPORT_EXTENSIONS = (".csv", ".xlsx")
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+def _summary(state: dict) -> str:
+    """Resumen de una importación para el chat"""
+    text = (
+        f"📥 Importación de {state['registro']}\n\n"
+        f"Filas leídas: {state['leidas']}\n"
+        f"✅ Importadas: {state['importadas']}\n"
+        f"⚠️ Omitidas por errores: {state['invalidas']}\n"
+        f"⏱️ {state['segundos']:.1f} s ({state['filas_por_segundo']:.0f} filas/s)"
+    )
+    if state["errores"]:
+        lines = "\n".join(f"• Línea {line}: {reason}" for line, reason in state["errores"][:10])
+        text += f"\n\nPrimeros errores:\n{lines}"
+    return text
+
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Manejador para el comando /importar - Pide el registro y el archivo (solo administradores)"""
+    user = update.effective_user
+    if user is None or user.id not in ADMIN_IDS:
+        logger.warning(f"Acceso denegado a /importar para el usuario {getattr(user, 'id', None)}")
+        await update.message.reply_text("Este comando es solo para administradores.")
+        return ConversationHandler.END
+
+    ledger = context.args[0].lower() if context.args else ""
+    if ledger not in IMPORT_LEDGERS:
+        await update.message.reply_text(
+            "📥 *Importar registros históricos*\n\n"
+            "Usa /importar compras o /importar ventas y después envía el archivo CSV o XLSX.\n\n"
+            "Columnas de compras: fecha, proveedor, tipo\\_cafe, cantidad, precio, total\n"
+            "Columnas de ventas: fecha, cliente, tipo\\_cafe, cantidad, precio, total\n"
+            "(tipo\\_cafe y total son opcionales; el total se calcula si falta)",
+            parse_mode="Markdown"
+        )
+        return ConversationHandler.END
+
+    context.user_data["import_ledger"] = ledger
+    await update.message.reply_text(
+        f"Envía el archivo CSV o XLSX con las {ledger} históricas (máximo {IMPORT_MAX_FILE_MB:g} MB) "
+        "o /cancelar para salir."
+    )
+    return AWAIT_FILE
+
+async def handle_import_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Descarga el archivo enviado y lo importa mostrando el progreso"""
+    document = update.message.document
+    ledger = context.user_data.get("import_ledger")
+    name = document.file_name or ""
+    extension = os.path.splitext(name)[1].lower()
+
+    if ledger not in IMPORT_LEDGERS:
+        await update.message.reply_text("Usa /importar compras o /importar ventas para empezar.")
+        return ConversationHandler.END
+    if extension not in IMPORT_EXTENSIONS:
+        await update.message.reply_text("⚠️ El archivo debe ser CSV o XLSX. Envía otro o /cancelar.")
+        return AWAIT_FILE
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_MB * 1024 * 1024:
+        await update.message.reply_text(
+            f"⚠️ El archivo supera los {IMPORT_MAX_FILE_MB:g} MB. Divídelo en partes o usa "
+            "python importar.py en el servidor."
+        )
+        return AWAIT_FILE
+
+    status = await update.message.reply_text(f"📥 Descargando {name}...")
+    last_update = time.monotonic()
+
+    async def progress(state: dict) -> None:
+        nonlocal last_update
+        # Editar el mensaje en cada bloque agotaría el límite de la Bot API
+        if time.monotonic() - last_update < IMPORT_PROGRESS_INTERVAL:
+            return
+        last_update = time.monotonic()
+        try:
+            await status.edit_text(
+                f"📥 Importando {ledger}: {state['leidas']} filas leídas, "
+                f"{state['importadas']} importadas, {state['invalidas']} con errores "
+                f"({state['filas_por_segundo']:.0f} filas/s)"
+            )
+        except (BadRequest, RetryAfter) as e:
+            logger.debug(f"No se pudo actualizar el progreso de la importación: {e}")
+
+    fd, path = tempfile.mkstemp(suffix=extension)
+    os.close(fd)
+    try:
+        # /cancelar detiene la importación tras el bloque en curso
+        async with worker_pool.cancellable(update.effective_chat.id, "importacion"):
+            telegram_file = await document.get_file()
+            await telegram_file.download_to_drive(path)
+            state = await import_file(
+                path, ledger, progress=progress, sheets=sheets_queue.write_queue, source_name=name
+            )
+        await status.edit_text(_summary(state))
+    except TaskCancelled:
+        # cancel() ya respondió al usuario; lo escrito hasta el bloque anterior se conserva
+        logger.info(f"Importación de {ledger} cancelada en el chat {update.effective_chat.id}")
+    except ImportFileError as e:
+        await status.edit_text(f"⚠️ No se pudo importar el archivo: {e}")
+    except Exception as e:
+        logger.error(f"Error en la importación de {ledger}: {e}")
+        await update.message.reply_text(
+            f"Lo siento, ocurrió un error al importar el archivo: {str(e)}"
+        )
+    finally:
+        os.remove(path)
+        context.user_data.pop("import_ledger", None)
+
+    return ConversationHandler.END
+
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Cancela la conversación y la importación en curso del chat"""
+    if worker_pool.cancel(update.effective_chat.id):
+        await update.message.reply_text(
+            "Importación cancelada. Las filas ya importadas se conservan; "
+            "importa en otro archivo solo las que faltan."
+        )
+    else:
+        await update.message.reply_text("Operación cancelada.")
+    context.user_data.pop("import_ledger", None)
+    return ConversationHandler.END
+
+def register_import_handlers(application):
+    """Registra los manejadores de la importación masiva"""
+    if not ADMIN_IDS:
+        logger.warning("Sin ADMIN_IDS nadie podrá usar /importar")
+    conv_handler = ConversationHandler(
+        entry_points=[CommandHandler("importar", import_command)],
+        states={
+            AWAIT_FILE: [
+                MessageHandler(filters.Document.ALL, handle_import_file)
+            ],
+        },
+        fallbacks=[CommandHandler("cancelar", cancel)],
+        # Con persistencia, la conversación sobrevive a los reinicios del bot
+        name="importar_conversation",
+        persistent=application.persistence is not None
+    )
+
+    application.add_handler(conv_handler)
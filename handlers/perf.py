@@ -0,0 +1,127 @@
+"""
+Manejador del comando /perf (solo administradores): perfilado del bot en ejecución
+"""
+
+import logging
+from datetime import datetime
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+
+from utils.outbox import reply
+from utils.profiling import profiler
+from config import ADMIN_IDS, PROFILING_ENABLED
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+PERF_HELP = (
+    "/perf - Retraso del bucle, bloqueos y actualizaciones más lentas\n"
+    "/perf bloqueos - Pilas de los últimos bloqueos del bucle\n"
+    "/perf perfil - Activa o desactiva el perfilador por muestreo (al desactivarlo muestra el resultado)\n"
+    "/perf reiniciar - Borra las mediciones acumuladas"
+)
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f} ms"
+
+def _clock(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%H:%M:%S")
+
+def summary_text() -> str:
+    """Resumen: retraso del bucle, bloqueos recientes, manejadores y actualizaciones más lentas"""
+    lag = profiler.lag_stats()
+    blocks = profiler.blocks()
+    lines = [
+        f"⏱️ Perfilado desde las {_clock(profiler.since)}",
+        "",
+        f"Retraso del bucle ({lag['mediciones']} mediciones): p50 {_ms(lag['p50'])}, p95 {_ms(lag['p95'])}, "
+        f"p99 {_ms(lag['p99'])}, máx. {_ms(lag['max'])}",
+        f"Bloqueos de más de {_ms(profiler.block_threshold)}: {len(blocks)}"
+        + (" (el perfilador por muestreo está activo)" if profiler.sampling else ""),
+    ]
+    for block in blocks[:5]:
+        where = block.stack.strip().splitlines()[-2].strip() if block.stack.strip() else ""
+        lines.append(f"  {_clock(block.at)} {_ms(block.seconds)} en {block.handler} · {where}")
+
+    handlers = profiler.handler_stats()
+    if handlers:
+        lines += ["", "Por manejador (actualizaciones, media, máx., bloqueo más largo):"]
+        for name, count, mean, worst, blocked in handlers[:10]:
+            lines.append(f"  {name}: {count}, {_ms(mean)}, {_ms(worst)}, {_ms(blocked)}")
+
+    slowest = profiler.slowest_updates()
+    if slowest:
+        lines += ["", "Actualizaciones más lentas:"]
+        for timing in slowest[:10]:
+            blocked = f", bloqueó {_ms(timing.blocked)}" if timing.blocked else ""
+            lines.append(
+                f"  {_ms(timing.seconds)} {timing.handler} ({timing.kind}, chat {timing.chat_id}) "
+                f"a las {_clock(timing.at)}{blocked}"
+            )
+    return "\n".join(lines)
+
+def blocks_text() -> str:
+    """Las pilas de los últimos bloqueos del bucle"""
+    blocks = profiler.blocks()
+    if not blocks:
+        return f"No hubo bloqueos del bucle de más de {_ms(profiler.block_threshold)}."
+    parts = []
+    for block in blocks[:3]:
+        parts.append(f"🧱 {_clock(block.at)} · {_ms(block.seconds)} en {block.handler}\n{block.stack.strip()}")
+    return "\n\n".join(parts)
+
+def profile_text() -> str:
+    """Funciones con más muestras del perfilador por muestreo"""
+    profile = profiler.profile()
+    samples = profile["muestras"]
+    if not samples:
+        return "El perfilador no tomó ninguna muestra."
+    busy = samples - profile["inactivo"]
+    lines = [
+        f"🔬 {samples} muestras en {profile['segundos']:.0f} s; bucle ocupado en el {busy / samples:.0%}",
+        "",
+        "Funciones en ejecución (muestras propias):",
+    ]
+    lines += [f"  {count / samples:5.1%} {name}" for name, count in profile["propias"]]
+    lines += ["", "Incluidas sus llamadas (acumuladas):"]
+    lines += [f"  {count / samples:5.1%} {name}" for name, count in profile["acumuladas"]]
+    return "\n".join(lines)
+
+async def perf_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Manejador para el comando /perf - Informes del perfilado (solo administradores)"""
+    user = update.effective_user
+    if user is None or user.id not in ADMIN_IDS:
+        logger.warning(f"Acceso denegado a /perf para el usuario {getattr(user, 'id', None)}")
+        await update.message.reply_text("Este comando es solo para administradores.")
+        return
+
+    option = context.args[0].lower() if context.args else ""
+    if option == "":
+        text = summary_text()
+    elif option == "bloqueos":
+        text = blocks_text()
+    elif option == "perfil":
+        if profiler.sampling:
+            profiler.stop_sampling()
+            text = profile_text()
+        else:
+            profiler.start_sampling()
+            text = (
+                f"🔬 Perfilador por muestreo activado (una muestra cada {_ms(profiler.sample_interval)}). "
+                "Repite /perf perfil para detenerlo y ver el resultado."
+            )
+    elif option == "reiniciar":
+        profiler.reset()
+        text = "Mediciones borradas."
+    else:
+        text = PERF_HELP
+    # Los informes largos (pilas de los bloqueos, perfil) se envían en varios mensajes
+    await reply(update.message, text)
+
+def register_perf_handlers(application):
+    """Registra /perf si el perfilado está activado"""
+    if not PROFILING_ENABLED:
+        return
+    if not ADMIN_IDS:
+        logger.warning("PROFILING_ENABLED=true sin ADMIN_IDS: nadie podrá usar /perf")
+    application.add_handler(CommandHandler("perf", perf_command))
@@ -22,6 +22,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "*/venta* - Registrar una venta\n"
         "*/reporte* - Ver reportes y estadísticas\n"
         "*/ia* - Usar asistente inteligente con OpenAI\n"
+        "*/importar* - Importar compras o ventas históricas (CSV o XLSX)\n"
         "*/ayuda* - Ver esta ayuda\n\n"
         "Para más información, consulta la documentación completa.",
         parse_mode="Markdown"
@@ -0,0 +1,82 @@
+"""
+Importación masiva de compras o ventas históricas desde la línea de comandos
+
+Para archivos que superan el límite de descarga de la Bot API (20 MB) o para
+cargar el historial antes de poner el bot en marcha. Hace lo mismo que
+/importar (ver utils.importer); las filas para Google Sheets pasan por un
+diario propio y se envían antes de terminar. Puede ejecutarse con el bot en
+marcha: cada bloque se anexa al CSV con el mismo bloqueo de archivo que
+usan los procesos del bot.
+
+Uso:
+    python importar.py compras historial_compras.xlsx
+    python importar.py ventas ventas_2023.csv --validar
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from config import (
+    SPREADSHEET_ID, SHEETS_JOURNAL_FILE, SHEETS_BATCH_SIZE, SHEETS_FLUSH_INTERVAL, sheets_configured
+)
+from utils.importer import IMPORT_LEDGERS, ImportFileError, import_file
+from utils.sheets_queue import SheetsWriteQueue, build_sheets_service
+from utils.workers import worker_pool
+
+# Configuración de logging (solo avisos: el progreso se muestra en la misma línea)
+logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+async def progress(state: dict) -> None:
+    print(
+        f"\r{state['leidas']} filas leídas, {state['importadas']} importadas, "
+        f"{state['invalidas']} con errores ({state['filas_por_segundo']:.0f} filas/s)",
+        end="", flush=True
+    )
+
+async def run(args) -> int:
+    queue = None
+    if sheets_configured and not args.sin_sheets and not args.validar:
+        # Diario aparte del de bot.py: los dos procesos pueden estar en marcha a la vez
+        queue = SheetsWriteQueue(
+            build_sheets_service, SPREADSHEET_ID, SHEETS_JOURNAL_FILE + ".importar",
+            batch_size=SHEETS_BATCH_SIZE, flush_interval=SHEETS_FLUSH_INTERVAL
+        )
+        await queue.start()
+
+    try:
+        state = await import_file(
+            args.archivo, args.registro, progress=progress,
+            sheets=queue,
+            dry_run=args.validar, force=args.forzar
+        )
+    except ImportFileError as e:
+        print(f"No se pudo importar el archivo: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if queue is not None:
+            print(f"\nEnviando {queue.pending} filas pendientes a Google Sheets...")
+            await queue.stop()
+        worker_pool.shutdown()
+
+    print()
+    valid = state["leidas"] - state["invalidas"]
+    action = "válidas (no se escribió nada)" if args.validar else "importadas"
+    print(f"{state['leidas']} filas leídas, {valid} {action}, {state['invalidas']} omitidas por errores "
+          f"en {state['segundos']:.1f} s ({state['filas_por_segundo']:.0f} filas/s)")
+    for line, reason in state["errores"]:
+        print(f"  Línea {line}: {reason}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa compras o ventas históricas desde un CSV o XLSX")
+    parser.add_argument("registro", choices=list(IMPORT_LEDGERS))
+    parser.add_argument("archivo", help="Archivo .csv o .xlsx con encabezado")
+    parser.add_argument("--validar", action="store_true", help="Solo valida el archivo, sin escribir nada")
+    parser.add_argument("--forzar", action="store_true", help="Importa aunque el archivo ya se haya importado")
+    parser.add_argument("--sin-sheets", action="store_true", help="No envía las filas a Google Sheets")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args)))
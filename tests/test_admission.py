@@ -0,0 +1,127 @@
+"""
+Control de admisión de las consultas de IA: límites por chat, turnos entre chats y cola acotada
+"""
+
+import asyncio
+
+import pytest
+
+import utils.admission
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.metrics import Counter
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    """Contador real en lugar del vacío (las métricas están desactivadas en las pruebas)"""
+    counter = Counter("admission_requests_total", "Consultas de IA admitidas y rechazadas", ("result",))
+    monkeypatch.setattr(utils.admission, "REQUESTS", counter)
+    return lambda result: counter.labels(result=result).value
+
+
+def controller(**kwargs):
+    options = {"chat_rate": 0.01, "chat_burst": 10, "global_rate": 100, "global_burst": 10,
+               "max_queue": 50, "max_wait": 5.0}
+    return AdmissionController(**{**options, **kwargs})
+
+
+def test_a_chat_over_its_burst_is_rejected(requests):
+    admission = controller(chat_burst=2)
+
+    async def run():
+        await admission.acquire(1)
+        await admission.acquire(1)
+        with pytest.raises(AdmissionRejected) as error:
+            await admission.acquire(1)
+        # Otro chat no se ve afectado
+        await admission.acquire(2)
+        return error.value
+
+    error = asyncio.run(run())
+
+    assert error.reason == "límite del chat"
+    assert 0 < error.retry_after <= 1 / 0.01
+    assert (admission.admitted, admission.rejected_chat) == (3, 1)
+    assert (requests("admitidas"), requests("rechazadas_chat")) == (3, 1)
+
+
+def test_queued_requests_take_turns_between_chats(requests):
+    # Una ficha global cada 10 ms: la primera consulta pasa y el resto espera en cola
+    admission = controller(global_rate=100, global_burst=1)
+    order = []
+
+    async def query(chat_id, number):
+        await admission.acquire(chat_id)
+        order.append((chat_id, number))
+
+    async def run():
+        tasks = [asyncio.create_task(query("A", number)) for number in range(1, 5)]
+        tasks += [asyncio.create_task(query("B", number)) for number in range(1, 3)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert order == [("A", 1), ("A", 2), ("B", 1), ("A", 3), ("B", 2), ("A", 4)]
+    assert admission.queued == 5 and admission.max_depth == 5 and admission.depth == 0
+    assert requests("admitidas") == 6
+
+
+def test_a_full_queue_rejects_and_refunds_the_chat_token(requests):
+    admission = controller(global_rate=0.1, global_burst=1, max_queue=1)
+
+    async def run():
+        await admission.acquire(1)
+        waiting = asyncio.create_task(admission.acquire(2))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as error:
+            await admission.acquire(3)
+        tokens = admission._chats[3].tokens
+        waiting.cancel()
+        return error.value, tokens
+
+    error, tokens = asyncio.run(run())
+
+    assert error.reason == "cola llena"
+    assert error.retry_after > 0
+    assert tokens == pytest.approx(10, abs=0.01)
+    assert (admission.rejected_queue, requests("rechazadas_cola_llena")) == (1, 1)
+
+
+def test_a_timed_out_request_leaves_the_queue_and_gets_its_token_back(requests):
+    admission = controller(global_rate=0.1, global_burst=1, max_wait=0.05)
+
+    async def run():
+        await admission.acquire(1)
+        with pytest.raises(AdmissionRejected) as error:
+            await admission.acquire(1)
+        return error.value
+
+    error = asyncio.run(run())
+
+    assert error.reason == "espera agotada"
+    assert admission.depth == 0
+    assert admission._chats[1].tokens == pytest.approx(9, abs=0.01)
+    assert (admission.rejected_timeout, requests("rechazadas_espera"), requests("admitidas")) == (1, 1, 1)
+
+
+def test_a_cancelled_request_leaves_the_queue_and_gets_its_token_back():
+    admission = controller(global_rate=20, global_burst=1)
+
+    async def run():
+        await admission.acquire(1)
+        waiting = asyncio.create_task(admission.acquire(2))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        chat_tokens = admission._chats[2].tokens
+        # La consulta cancelada salió de la cola: la siguiente no espera detrás de ella
+        await asyncio.sleep(0.1)
+        await admission.acquire(3)
+        return chat_tokens
+
+    chat_tokens = asyncio.run(run())
+
+    assert chat_tokens == pytest.approx(10, abs=0.01)
+    assert admission.depth == 0
+    assert admission.queued == 1 and admission.admitted == 2
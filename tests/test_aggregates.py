@@ -0,0 +1,99 @@
+"""
+Agregados incrementales sobre el registro columnar, el mismo que usan los reportes
+"""
+
+import csv
+
+from utils.aggregates import LEDGERS, AggregationStore, LedgerAggregate
+from utils.ledger import GROUP_FIELDS, ledger_name, open_ledger, read_csv_records
+from utils.reports import REPORT_FILES, ReportEngine
+
+
+def test_read_csv_records_stops_at_the_last_complete_record(tmp_path):
+    path = tmp_path / "ventas.csv"
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["fecha", "cliente", "total"])
+        writer.writerow(["2024-01-01", "Tienda\nCentro", "10"])
+        f.write('2024-01-02,"Tienda')
+
+    records, offset = read_csv_records(str(path))
+
+    assert records == [["fecha", "cliente", "total"], ["2024-01-01", "Tienda\nCentro", "10"]]
+    with open(path, "rb") as f:
+        assert f.read()[offset:] == b'2024-01-02,"Tienda'
+
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        f.write(' Norte",5\r\n')
+    assert read_csv_records(str(path), offset) == ([["2024-01-02", "Tienda Norte", "5"]], path.stat().st_size)
+
+
+def test_aggregate_counts_records_not_lines(tmp_path):
+    path = tmp_path / "ventas.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["fecha", "cliente", "cantidad", "total"])
+        writer.writerow(["2024-01-01", "Tienda\x0bCentro", "2", "10"])
+        writer.writerow(["2024-01-02", "Tienda\r\nNorte", "3", "15"])
+    aggregate = LedgerAggregate("ventas", str(path), ("cliente",))
+
+    assert aggregate.refresh()
+    assert aggregate.count == 2
+    assert aggregate.total == 25
+    assert set(aggregate.by_group) == {"Tienda\x0bCentro", "Tienda\r\nNorte"}
+
+
+def write_csv(path, header, rows, mode="w"):
+    with open(path, mode, newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if mode == "w":
+            writer.writerow(header)
+        writer.writerows(rows)
+
+
+def test_aggregates_and_reports_share_names_and_group_fields():
+    assert list(LEDGERS) == list(REPORT_FILES) == list(GROUP_FIELDS)
+    for name, spec in LEDGERS.items():
+        assert spec["file"] == REPORT_FILES[name]
+        assert ledger_name(spec["file"]) == name
+        assert spec["group_by"] == GROUP_FIELDS[name]
+
+
+def test_aggregates_and_reports_read_the_same_columnar_ledger(tmp_path):
+    path = str(tmp_path / "proceso.csv")
+    header = ["fecha", "origen", "destino", "cantidad", "merma"]
+    write_csv(path, header, [
+        ["2024-01-01", "cereza", "pergamino", "100", "80"],
+        ["2024-01-02", "pergamino", "oro", "20", ""],
+    ])
+    store = AggregationStore({"proceso": {"file": path, "group_by": GROUP_FIELDS["proceso"]}})
+    engine = ReportEngine({"proceso": path})
+
+    assert store.row_counts() == {"proceso": 2}
+    ledger = open_ledger(path)
+    # Los agregados agrupan por una columna que el registro columnar indexa
+    assert store.ledgers["proceso"].fields["group"] == "destino"
+    assert "destino" in ledger.indexes["keys"]
+
+    write_csv(path, header, [["2024-01-03", "cereza", "Pergamino\nseco", "50", "40"]], mode="a")
+    summary = store.snapshot()["proceso"]
+    totals = engine.totals("proceso", "destino")
+
+    assert ledger.rows == engine.frame("proceso").rows == summary["registros"] == 3
+    assert {key: entry["cantidad"] for key, entry in summary["por_destino"].items()} == \
+        {key: entry["cantidad"] for key, entry in totals.items()} == {"pergamino": 100, "oro": 20, "Pergamino\nseco": 50}
+    assert summary["ultimos"][-1]["destino"] == "Pergamino\nseco"
+
+
+def test_empty_numbers_do_not_poison_the_totals(tmp_path):
+    path = str(tmp_path / "ventas.csv")
+    write_csv(path, ["fecha", "cliente", "cantidad", "precio", "total"], [
+        ["2024-01-01", "Tienda", "2.5", "4", ""],
+        ["2024-01-02", "Tienda", "1.5", "4", "7.5"],
+    ])
+    aggregate = LedgerAggregate("ventas", path, GROUP_FIELDS["ventas"])
+
+    assert aggregate.refresh()
+    # Sin total, el importe es precio × cantidad
+    assert aggregate.total == 17.5
+    assert aggregate.quantity == 4
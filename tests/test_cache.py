@@ -0,0 +1,99 @@
+"""
+Caché de respuestas en disco: escrituras agrupadas fuera del bucle de eventos
+"""
+
+import asyncio
+import sqlite3
+import threading
+
+import utils.cache as cache
+from utils.cache import COMMIT_DELAY, ResponseCache
+
+
+def rows_on_disk(path):
+    with sqlite3.connect(path) as db:
+        return dict(db.execute("SELECT key, value FROM responses").fetchall())
+
+
+def test_writes_are_committed_together_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    responses = ResponseCache(sqlite_path=path)
+    threads = []
+    commit = responses._commit
+
+    def tracked_commit():
+        threads.append(threading.get_ident())
+        commit()
+
+    responses._commit = tracked_commit
+
+    async def run():
+        for number in range(5):
+            responses.set(f"clave {number}", f"respuesta {number}")
+        # set no espera al disco
+        before = rows_on_disk(path)
+        await asyncio.sleep(COMMIT_DELAY * 4)
+        return threading.get_ident(), before
+
+    loop_thread, before = asyncio.run(run())
+
+    assert before == {}
+    assert rows_on_disk(path) == {f"clave {number}": f"respuesta {number}" for number in range(5)}
+    assert responses.commits == 1
+    assert threads and loop_thread not in threads
+    responses.close()
+
+
+def test_pending_responses_are_served_before_they_reach_the_disk(tmp_path):
+    responses = ResponseCache(max_entries=1, sqlite_path=str(tmp_path / "cache.sqlite3"))
+
+    async def run():
+        responses.set("primera", "respuesta 1")
+        # La segunda saca a la primera del nivel en memoria antes de guardarse
+        responses.set("segunda", "respuesta 2")
+        return responses.get("primera")
+
+    assert asyncio.run(run()) == "respuesta 1"
+    assert responses.disk_hits == 1
+    responses.close()
+
+
+def test_flush_saves_pending_responses_for_the_next_process(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    responses = ResponseCache(sqlite_path=path)
+
+    async def run():
+        responses.set("pregunta", "respuesta")
+        await responses.flush()
+
+    asyncio.run(run())
+    responses.close()
+
+    restarted = ResponseCache(sqlite_path=path)
+    assert restarted.get("pregunta") == "respuesta"
+    assert restarted.disk_hits == 1
+    restarted.close()
+
+
+def test_outside_the_event_loop_writes_are_saved_at_once(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    responses = ResponseCache(sqlite_path=path)
+
+    responses.set("pregunta", "respuesta")
+
+    assert rows_on_disk(path) == {"pregunta": "respuesta"}
+    responses.close()
+
+
+def test_expired_responses_are_purged_from_the_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "PURGE_EVERY", 2)
+    path = str(tmp_path / "cache.sqlite3")
+    responses = ResponseCache(ttl=60, sqlite_path=path)
+    with sqlite3.connect(path) as db:
+        db.execute("INSERT INTO responses (key, created, value) VALUES ('antigua', 0, 'caducada')")
+
+    responses.set("nueva 1", "respuesta 1")
+    responses.set("nueva 2", "respuesta 2")
+
+    assert sorted(rows_on_disk(path)) == ["nueva 1", "nueva 2"]
+    responses.close()
@@ -0,0 +1,101 @@
+"""
+Conversaciones de /ia con actualizaciones en paralelo (CONCURRENT_UPDATES), como en polling y en webhook
+"""
+
+import asyncio
+import warnings
+
+from telegram import Update
+from telegram.ext import Application
+from telegram.warnings import PTBUserWarning
+
+import handlers.ia as ia
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer, recorded_callback, recorded_message
+from config import CONCURRENT_UPDATES
+
+PRICING_TEXT = "Producto: Café oro\nPrecio actual: 12\nCosto: 8\nMargen deseado: 40%"
+
+SLOW_CHAT, FAST_CHAT = 6001, 6002
+
+
+def texts(telegram, chat_id):
+    return [call["params"].get("text", "") for call in telegram.calls_for(chat_id, "sendMessage")]
+
+
+def test_conversations_run_in_parallel_and_cancelar_ends_the_one_in_progress(monkeypatch):
+    started = asyncio.Event()
+    optimized = []
+
+    async def optimize(data):
+        chat = data["productos"][0]["producto"]
+        optimized.append(chat)
+        if chat == "lento":
+            started.set()
+            # Solo termina si se cancela
+            await asyncio.Event().wait()
+        return [{"producto": chat, "precio_actual": 12, "precio_recomendado": 13, "justificacion": "margen"}]
+
+    async def admit(chat_id, cost=1):
+        return None
+
+    monkeypatch.setattr(ia, "openai_configured", True)
+    monkeypatch.setattr(ia, "optimize_coffee_pricing", optimize)
+    monkeypatch.setattr(ia, "admit", admit)
+
+    async def scenario():
+        telegram = FakeTelegramServer()
+        await telegram.start()
+        application = (
+            Application.builder().token(FAKE_TOKEN).base_url(telegram.bot_url).concurrent_updates(CONCURRENT_UPDATES).build()
+        )
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", PTBUserWarning)
+            ia.register_ia_handlers(application)
+        update_id = 0
+
+        async def send(update):
+            await application.update_queue.put(Update.de_json(update, application.bot))
+
+        async def step(chat_id, builder, *args, expected):
+            nonlocal update_id
+            update_id += 1
+            calls = len(telegram.calls_for(chat_id))
+            await send(builder(update_id, chat_id, *args))
+            await telegram.wait_until(lambda: len(telegram.calls_for(chat_id)) >= calls + expected, timeout=5)
+
+        async def conversation():
+            nonlocal update_id
+            for chat_id in (SLOW_CHAT, FAST_CHAT):
+                await step(chat_id, recorded_message, "/ia", expected=1)
+                await step(chat_id, recorded_callback, "ia_precios", 1, expected=1)
+            await step(SLOW_CHAT, recorded_message, PRICING_TEXT.replace("Café oro", "lento"), expected=1)
+            await asyncio.wait_for(started.wait(), 5)
+
+            # El chat lento sigue analizando mientras el otro completa su conversación
+            await step(FAST_CHAT, recorded_message, PRICING_TEXT.replace("Café oro", "rápido"), expected=2)
+            # /cancelar llega al chat lento aunque su manejador no ha terminado
+            await step(SLOW_CHAT, recorded_message, "/cancelar", expected=1)
+            # La conversación terminó: un texto suelto ya no se toma como lista de precios
+            update_id += 1
+            await send(recorded_message(update_id, SLOW_CHAT, PRICING_TEXT))
+            await asyncio.sleep(0.3)
+
+        try:
+            async with application:
+                await application.start()
+                try:
+                    await conversation()
+                finally:
+                    await application.stop()
+        finally:
+            await telegram.stop()
+        return texts(telegram, SLOW_CHAT), texts(telegram, FAST_CHAT)
+
+    assert CONCURRENT_UPDATES > 1
+    slow, fast = asyncio.run(scenario())
+
+    assert optimized == ["lento", "rápido"]
+    assert fast[-1].startswith("💰 *Precios optimizados recomendados:*") and "rápido" in fast[-1]
+    assert slow[-1] == "Operación cancelada."
+    assert sum(text == "💰 Analizando datos de precios..." for text in slow) == 1
+    assert not any("Precios optimizados" in text for text in slow)
@@ -0,0 +1,107 @@
+"""
+Índice de preguntas frecuentes: búsqueda top-k, umbral y recarga tras rebuild o aprobar
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+import utils.faq as faq
+from utils.faq import FAQIndex
+
+# Embeddings de prueba: cuántas veces aparece cada palabra
+VOCABULARY = ("fermentación", "horas", "secado", "días", "tueste", "temperatura", "precio")
+
+ENTRIES = [
+    {"pregunta": "¿Cuántas horas dura la fermentación?", "respuesta": "Entre 12 y 36 horas."},
+    {"pregunta": "¿Cuántos días dura el secado?", "respuesta": "De 10 a 20 días al sol."},
+    {"pregunta": "¿A qué temperatura termina el tueste?", "respuesta": "Hacia 210 °C."},
+]
+
+
+async def fake_embed(texts, batch_size=100):
+    vectors = np.array([[text.lower().count(word) for word in VOCABULARY] for text in texts], dtype=np.float32)
+    return faq._normalize(vectors)
+
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(faq, "embed_texts", fake_embed)
+    monkeypatch.setattr(faq, "FAQ_ENABLED", True)
+    monkeypatch.setattr(faq, "FAQ_APPROVED_FILE", str(tmp_path / "faq_aprobadas.jsonl"))
+    monkeypatch.setattr(faq, "faq_index", FAQIndex(str(tmp_path / "faq_index.npy")))
+    monkeypatch.setattr(faq, "_loaded_version", None)
+    return str(tmp_path / "faq_index.npy")
+
+
+async def build_and_save(path, entries=ENTRIES):
+    """Como python -m utils.faq rebuild"""
+    index = FAQIndex(path)
+    await index.build(entries)
+    index.save()
+    return index
+
+
+def built_index(path, entries=ENTRIES):
+    return asyncio.run(build_and_save(path, entries))
+
+
+def test_search_returns_the_top_k_in_order(index_path):
+    index = built_index(index_path)
+    vector = asyncio.run(index.query_vector("fermentación: ¿horas o días?"))
+
+    results = index.search(vector, k=2)
+
+    assert [entry["respuesta"] for _, entry in results] == ["Entre 12 y 36 horas.", "De 10 a 20 días al sol."]
+    assert results[0][0] > results[1][0] > 0
+    assert len(index.search(vector, k=10)) == len(ENTRIES)
+
+
+def test_lookup_misses_below_the_threshold(index_path):
+    index = built_index(index_path)
+
+    async def run():
+        hit = await index.lookup("¿cuántas horas de fermentación?", threshold=0.9)
+        partial = await index.lookup("¿horas de secado?", threshold=0.9)
+        unrelated = await index.lookup("¿precio del café?", threshold=0.1)
+        return hit, partial, unrelated
+
+    hit, partial, unrelated = asyncio.run(run())
+
+    assert hit["respuesta"] == "Entre 12 y 36 horas." and hit["similitud"] == pytest.approx(1.0)
+    assert partial is None
+    assert unrelated is None
+
+
+def test_find_answer_reloads_the_index_after_a_rebuild_in_another_process(index_path):
+    built_index(index_path, ENTRIES[:1])
+
+    async def run():
+        before = await faq.find_answer("¿cuántos días de secado?")
+        # python -m utils.faq rebuild en otro proceso
+        await build_and_save(index_path)
+        after = await faq.find_answer("¿cuántos días de secado?")
+        return before, after
+
+    before, after = asyncio.run(run())
+
+    assert before is None
+    assert after["respuesta"] == "De 10 a 20 días al sol."
+    assert len(faq.faq_index) == len(ENTRIES)
+
+
+def test_find_answer_sees_an_approved_answer(index_path):
+    built_index(index_path)
+
+    async def run():
+        before = await faq.find_answer("¿precio del café?")
+        await faq.approve_answer("¿Cuál es el precio del café?", "Depende del lote.")
+        after = await faq.find_answer("¿precio del café?")
+        return before, after
+
+    before, after = asyncio.run(run())
+
+    assert before is None
+    assert after["respuesta"] == "Depende del lote." and after["fuente"] == "aprobada"
+    assert FAQIndex(index_path).load() and len(faq.faq_index) == len(ENTRIES) + 1
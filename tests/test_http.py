@@ -0,0 +1,145 @@
+"""
+Conexiones HTTP: tamaño de los pools de cada servicio, HTTP/2 opcional y medida de la espera por el pool
+"""
+
+import asyncio
+
+import pytest
+from google.auth.credentials import AnonymousCredentials
+
+import utils.http as http
+import utils.openai as openai_utils
+from benchmarks.fake_telegram import FakeTelegramServer
+from utils.metrics import Counter, Histogram
+
+
+def pool_of(client):
+    """Pool de httpcore de un cliente httpx"""
+    return client._transport._pool
+
+
+def test_openai_client_pool_size(monkeypatch):
+    monkeypatch.setattr(http, "OPENAI_MAX_CONCURRENCY", 3)
+
+    explicit = pool_of(http.openai_http_client(pool_size=5))
+    default = pool_of(http.openai_http_client(pool_size=0))
+
+    assert (explicit._max_connections, explicit._max_keepalive_connections) == (5, 5)
+    assert explicit._keepalive_expiry == http.HTTP_KEEPALIVE_EXPIRY
+    # Dos conexiones por llamada concurrente, por las peticiones de cobertura
+    assert default._max_connections == 6
+
+
+def test_openai_sdk_uses_the_shared_client(monkeypatch):
+    monkeypatch.setattr(openai_utils, "_client", None)
+    monkeypatch.setattr(openai_utils, "OPENAI_API_KEY", "sk-prueba")
+    monkeypatch.setattr(http, "OPENAI_MAX_CONCURRENCY", 4)
+
+    client = openai_utils.get_client()
+    try:
+        assert pool_of(client._client)._max_connections == 8
+        assert client.max_retries == 0
+    finally:
+        asyncio.run(openai_utils.close_client())
+
+
+def test_telegram_requests_pool_sizes(monkeypatch):
+    monkeypatch.setattr(http, "CONCURRENT_UPDATES", 5)
+
+    explicit = pool_of(http.telegram_request(pool_size=7)._client)
+    default = pool_of(http.telegram_request(pool_size=0)._client)
+    updates = pool_of(http.telegram_updates_request()._client)
+
+    assert (explicit._max_connections, explicit._max_keepalive_connections) == (7, 7)
+    assert default._max_connections == 10
+    # getUpdates: una sola conexión de long polling
+    assert updates._max_connections == 1
+
+
+def test_sheets_transport_has_an_explicit_timeout(monkeypatch):
+    monkeypatch.setattr(http, "SHEETS_HTTP_TIMEOUT", 12.5)
+
+    transport = http.sheets_http(AnonymousCredentials())
+
+    assert transport.http.timeout == 12.5
+
+
+def test_http2_falls_back_to_http1_without_h2(monkeypatch):
+    monkeypatch.setattr(http, "HTTP2_ENABLED", True)
+    monkeypatch.setattr(http.importlib.util, "find_spec", lambda name: None)
+
+    assert not http.http2_available()
+    # Los clientes se crean igualmente (httpx exige h2 con http2=True)
+    assert not pool_of(http.openai_http_client(pool_size=2))._http2
+    assert http.telegram_request(pool_size=2)._http_version == "1.1"
+
+
+def test_http2_is_used_when_available_and_enabled(monkeypatch):
+    monkeypatch.setattr(http.importlib.util, "find_spec", lambda name: object())
+
+    monkeypatch.setattr(http, "HTTP2_ENABLED", True)
+    assert http.http2_available()
+    monkeypatch.setattr(http, "HTTP2_ENABLED", False)
+    assert not http.http2_available()
+
+
+def test_pool_tracer_measures_the_wait_for_a_connection():
+    waits, connections = [], []
+    hook = http.pool_tracer(waits.append, lambda: connections.append(1))
+
+    async def scenario():
+        telegram = FakeTelegramServer(latency=0.2)
+        await telegram.start()
+        try:
+            limits = http.httpx.Limits(max_connections=1, max_keepalive_connections=1)
+            async with http.httpx.AsyncClient(limits=limits, event_hooks={"request": [hook]}) as client:
+                url = f"{telegram.bot_url}/getMe"
+                # Con una sola conexión, la segunda petición espera a que termine la primera
+                await asyncio.gather(client.get(url), client.get(url))
+                await client.get(url)
+        finally:
+            await telegram.stop()
+
+    asyncio.run(scenario())
+
+    assert len(waits) == 3
+    first, second, third = waits
+    assert first < 0.1 and third < 0.1
+    assert second >= 0.15
+    # La conexión se reutiliza: solo se abre una
+    assert connections == [1]
+
+
+def test_metric_hooks_are_installed_only_with_metrics(monkeypatch):
+    monkeypatch.setattr(http, "METRICS_ENABLED", False)
+    assert http._event_hooks("openai") == {}
+
+    monkeypatch.setattr(http, "METRICS_ENABLED", True)
+    monkeypatch.setattr(http, "POOL_WAIT_SECONDS", Histogram("http_pool_wait_seconds", "Espera", ("backend",)))
+    monkeypatch.setattr(http, "CONNECTIONS", Counter("http_connections_opened_total", "Conexiones", ("backend",)))
+    hooks = http._event_hooks("telegram")
+
+    assert len(hooks["request"]) == 1
+
+
+@pytest.mark.parametrize("backend", ["openai", "telegram"])
+def test_pool_wait_metrics_are_labelled_by_backend(monkeypatch, backend):
+    monkeypatch.setattr(http, "METRICS_ENABLED", True)
+    seconds = Histogram("http_pool_wait_seconds", "Espera", ("backend",))
+    connections = Counter("http_connections_opened_total", "Conexiones", ("backend",))
+    monkeypatch.setattr(http, "POOL_WAIT_SECONDS", seconds)
+    monkeypatch.setattr(http, "CONNECTIONS", connections)
+
+    async def scenario():
+        telegram = FakeTelegramServer()
+        await telegram.start()
+        try:
+            async with http.httpx.AsyncClient(event_hooks=http._event_hooks(backend)) as client:
+                await client.get(f"{telegram.bot_url}/getMe")
+        finally:
+            await telegram.stop()
+
+    asyncio.run(scenario())
+
+    assert seconds.labels(backend=backend).count == 1
+    assert connections.labels(backend=backend).value == 1
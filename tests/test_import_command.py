@@ -0,0 +1,38 @@
+"""
+Acceso a /importar: solo los administradores de ADMIN_IDS
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from telegram.ext import ConversationHandler
+
+import handlers.importar as importar
+
+
+def command_update(user_id: int):
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=SimpleNamespace(reply_text=reply_text))
+    context = SimpleNamespace(args=["compras"], user_data={})
+    return update, context, replies
+
+
+def test_non_admin_cannot_start_an_import(monkeypatch):
+    monkeypatch.setattr(importar, "ADMIN_IDS", {1})
+    update, context, replies = command_update(2)
+
+    assert asyncio.run(importar.import_command(update, context)) == ConversationHandler.END
+    assert "import_ledger" not in context.user_data
+    assert replies == ["Este comando es solo para administradores."]
+
+
+def test_admin_is_asked_for_the_file(monkeypatch):
+    monkeypatch.setattr(importar, "ADMIN_IDS", {1})
+    update, context, replies = command_update(1)
+
+    assert asyncio.run(importar.import_command(update, context)) == importar.AWAIT_FILE
+    assert context.user_data["import_ledger"] == "compras"
@@ -0,0 +1,56 @@
+"""
+Importación masiva junto a otro proceso que escribe el mismo registro
+"""
+
+import asyncio
+import csv
+import multiprocessing
+
+from utils.importer import IMPORT_LEDGERS, import_file
+from utils.ledger import ledger_lock
+from utils.workers import worker_pool
+
+COLUMNS = list(IMPORT_LEDGERS["compras"]["columns"])
+
+
+def write_while_locked(csv_path: str, locked, seconds: float) -> None:
+    """Como el bot: toma el bloqueo del registro, espera y anexa una compra con encabezado"""
+    import time
+
+    with ledger_lock(csv_path):
+        locked.set()
+        time.sleep(seconds)
+        with open(csv_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerow(["2024-01-01", "Finca del bot", "Pergamino", "10", "2.0", "20.0"])
+
+
+def test_import_waits_for_the_ledger_lock(tmp_path):
+    source = tmp_path / "historial.csv"
+    with open(source, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["fecha", "proveedor", "cantidad", "precio"])
+        writer.writerows([[f"2023-05-{day:02d}", "Finca vieja", "5", "1.5"] for day in range(1, 11)])
+    ledger_csv = tmp_path / "compras.csv"
+
+    context = multiprocessing.get_context("spawn")
+    locked = context.Event()
+    writer = context.Process(target=write_while_locked, args=(str(ledger_csv), locked, 0.5))
+    writer.start()
+    try:
+        assert locked.wait(30)
+        state = asyncio.run(import_file(
+            str(source), "compras", file_path=str(ledger_csv), log_path=str(tmp_path / "importaciones.jsonl")
+        ))
+    finally:
+        writer.join(30)
+        worker_pool.shutdown()
+
+    with open(ledger_csv, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    # Un solo encabezado: la importación esperó al otro proceso y vio el CSV ya empezado
+    assert state["importadas"] == 10
+    assert rows[0] == COLUMNS
+    assert rows[1][1] == "Finca del bot"
+    assert [row[1] for row in rows[2:]] == ["Finca vieja"] * 10
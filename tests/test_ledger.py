@@ -0,0 +1,287 @@
+"""
+Registro columnar usado por varios procesos sobre el mismo data/
+"""
+
+import csv
+import json
+import multiprocessing
+from datetime import date
+
+from utils.ledger import ColumnarLedger, _matches, ledger_lock, open_ledger, query_records, sync_from_csv
+
+HEADER = ["fecha", "proveedor", "cantidad", "precio"]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows([HEADER] + rows)
+
+
+def append_rows(csv_path: str, tag: str, count: int) -> None:
+    """Como un proceso del bot: anexa al CSV con el bloqueo y lee el registro columnar"""
+    for i in range(count):
+        with ledger_lock(csv_path):
+            with open(csv_path, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow([f"2024-02-{1 + i % 28:02d}", tag, str(i + 1), "2.5"])
+        assert open_ledger(csv_path) is not None
+
+
+def test_two_instances_reload_rows_written_by_the_other(tmp_path):
+    csv_path = tmp_path / "compras.csv"
+    write_csv(csv_path, [["2024-01-01", "Finca A", "10", "1.0"]])
+    first = sync_from_csv(str(csv_path))
+    # Otra instancia del mismo registro: sus filas y desplazamientos en memoria quedan atrasados
+    second = ColumnarLedger(first.path)
+
+    first.append_many([{"fecha": "2024-01-02", "proveedor": "Finca B", "cantidad": 5, "precio": 2.0}])
+    second.append_many([{"fecha": "2024-01-03", "proveedor": "Finca C", "cantidad": 7, "precio": 3.0}])
+
+    assert len(second) == 3
+    assert [record["proveedor"] for record in second.get_all_records()] == ["Finca A", "Finca B", "Finca C"]
+    assert second.sum("cantidad") == 22
+    assert set(second.totals_by("proveedor")) == {"Finca A", "Finca B", "Finca C"}
+    first.close()
+    second.close()
+
+    reopened = ColumnarLedger(first.path)
+    assert [record["proveedor"] for record in reopened.get_all_records()] == ["Finca A", "Finca B", "Finca C"]
+    reopened.close()
+
+
+def test_sync_does_not_import_the_same_tail_twice(tmp_path):
+    csv_path = tmp_path / "compras.csv"
+    write_csv(csv_path, [["2024-01-01", "Finca A", "10", "1.0"]])
+    first = sync_from_csv(str(csv_path))
+    second = ColumnarLedger(first.path)
+
+    with open(csv_path, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(["2024-01-02", "Finca B", "5", "2.0"])
+    sync_from_csv(str(csv_path), first)
+    with open(csv_path, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(["2024-01-03", "Finca C", "7", "3.0"])
+    # La segunda instancia aún tiene en memoria la posición del CSV anterior a Finca B
+    sync_from_csv(str(csv_path), second)
+
+    assert [record["proveedor"] for record in second.get_all_records()] == ["Finca A", "Finca B", "Finca C"]
+    first.close()
+    second.close()
+    reopened = ColumnarLedger(first.path)
+    assert [record["proveedor"] for record in reopened.get_all_records()] == ["Finca A", "Finca B", "Finca C"]
+    assert reopened.sum("cantidad") == 22
+    reopened.close()
+
+
+def test_concurrent_processes_keep_csv_and_ledger_in_step(tmp_path):
+    csv_path = str(tmp_path / "compras.csv")
+    write_csv(csv_path, [["2024-01-01", "inicial", "1", "1.0"]])
+    sync_from_csv(csv_path).close()
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=append_rows, args=(csv_path, tag, 60)) for tag in ("A", "B", "C")]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    assert [process.exitcode for process in processes] == [0, 0, 0]
+
+    ledger = sync_from_csv(csv_path)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        csv_rows = list(csv.DictReader(f))
+    assert len(ledger) == len(csv_rows) == 181
+    assert {key: values["registros"] for key, values in ledger.totals_by("proveedor").items()} == {
+        "inicial": 1, "A": 60, "B": 60, "C": 60
+    }
+    assert ledger.sum("cantidad") == 1 + 3 * sum(range(1, 61))
+
+
+def test_sync_keeps_fields_with_line_breaks_and_waits_for_partial_records(tmp_path):
+    csv_path = tmp_path / "compras.csv"
+    write_csv(csv_path, [["2024-01-01", "Finca\nAlta", "10", "1.0"], ["2024-01-02", "Finca\x0bB\x1cC D", "5", "2.0"]])
+    with open(csv_path, "a", newline="", encoding="utf-8") as f:
+        # Registro a medio escribir: comillas abiertas con un salto de línea
+        f.write('2024-01-03,"Finca\r\nCortada')
+    ledger = sync_from_csv(str(csv_path))
+
+    assert [record["proveedor"] for record in ledger.get_all_records()] == ["Finca\nAlta", "Finca\x0bB\x1cC D"]
+
+    with open(csv_path, "a", newline="", encoding="utf-8") as f:
+        f.write(' al fin",7,3.0\r\n')
+    sync_from_csv(str(csv_path), ledger)
+
+    assert [record["proveedor"] for record in ledger.get_all_records()][-1] == "Finca\r\nCortada al fin"
+    assert ledger.sum("cantidad") == 22
+    ledger.close()
+
+
+def append_csv(path, rows):
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+
+
+def column_types(ledger):
+    return {spec["name"]: spec["type"] for spec in ledger.meta["columns"]}
+
+
+def test_decimals_in_an_int_column_widen_it_to_float(tmp_path):
+    csv_path = tmp_path / "compras.csv"
+    write_csv(csv_path, [["2024-01-01", "Finca A", "100", "5"]])
+    ledger = sync_from_csv(str(csv_path))
+    other = ColumnarLedger(ledger.path)
+    assert column_types(ledger)["cantidad"] == column_types(ledger)["precio"] == "int"
+
+    # Punto decimal y coma decimal (exportación en español)
+    append_csv(csv_path, [["2024-01-02", "Finca A", "12.5", "4.75"], ["2024-01-03", "Finca B", "1,5", "2"]])
+    sync_from_csv(str(csv_path), ledger)
+
+    assert column_types(ledger)["cantidad"] == column_types(ledger)["precio"] == "float"
+    assert ledger.column("cantidad") == [100.0, 12.5, 1.5]
+    assert ledger.column("precio") == [5.0, 4.75, 2.0]
+    assert ledger.sum("cantidad") == 114
+    assert ledger.totals_by("proveedor")["Finca A"]["cantidad"] == 112.5
+    # Los archivos de la columna int ya no se usan
+    assert not (tmp_path / "compras.ledger" / "cantidad.bin").exists()
+
+    # Otra instancia abierta antes de ampliar la columna la ve al releer
+    other.reload()
+    assert other.column("cantidad") == [100.0, 12.5, 1.5]
+    ledger.close()
+    other.close()
+    reopened = ColumnarLedger(ledger.path)
+    assert reopened.get_records(1, 2) == [
+        {"fecha": "2024-01-02", "proveedor": "Finca A", "cantidad": 12.5, "precio": 4.75}
+    ]
+    reopened.close()
+
+
+def test_text_in_a_numeric_column_widens_it_to_str(tmp_path):
+    csv_path = tmp_path / "compras.csv"
+    write_csv(csv_path, [["2024-01-01", "Finca A", "100", "5.5"]])
+    ledger = sync_from_csv(str(csv_path))
+
+    append_csv(csv_path, [["2024-01-02", "Finca B", "pendiente", "4"], ["sin fecha", "Finca C", "3", "2"]])
+    sync_from_csv(str(csv_path), ledger)
+
+    types = column_types(ledger)
+    assert types["cantidad"] == types["fecha"] == "str"
+    assert types["precio"] == "float"
+    assert ledger.column("cantidad") == ["100", "pendiente", "3"]
+    assert ledger.column("fecha") == ["2024-01-01", "2024-01-02", "sin fecha"]
+    # Sin columna de fecha no hay índice de fechas
+    assert ledger.indexes["date"] is None
+    assert ledger.totals_by("proveedor")["Finca B"] == {"registros": 1, "precio": 4.0}
+    ledger.close()
+
+
+def test_widening_is_confirmed_with_the_rows_that_caused_it(tmp_path):
+    csv_path = tmp_path / "compras.csv"
+    write_csv(csv_path, [["2024-01-01", "Finca A", "100", "5"]])
+    ledger = sync_from_csv(str(csv_path))
+
+    with ledger.file_lock:
+        ledger.append_many([{"fecha": "2024-01-02", "proveedor": "Finca B", "cantidad": "7,25", "precio": 1}],
+                           commit=False)
+        # Sin confirmar, otro proceso sigue viendo el esquema y las filas anteriores
+        with open(tmp_path / "compras.ledger" / "schema.json", encoding="utf-8") as f:
+            schema = json.load(f)
+        assert schema["rows"] == 1
+        assert {spec["name"]: spec["type"] for spec in schema["columns"]}["cantidad"] == "int"
+        ledger.append_many([], source=ledger.meta["source"])
+    ledger.close()
+
+    reopened = ColumnarLedger(ledger.path)
+    assert reopened.column("cantidad") == [100.0, 7.25]
+    reopened.close()
+
+
+# Compras sin orden cronológico, con fechas repetidas
+UNSORTED = [
+    ["2024-03-05", "Finca A", "10", "2.0"],
+    ["2024-03-01", "Finca B", "4", "2.5"],
+    ["2024-03-10", "Finca A", "6", "3.0"],
+    ["2024-03-01", "Finca C", "8", "2.0"],
+    ["2024-03-07", "Finca B", "2", "1.5"],
+]
+
+RANGES = [
+    (None, None), ("2024-03-01", "2024-03-05"), ("2024-03-05", "2024-03-05"), ("2024-03-02", "2024-03-06"),
+    ("2024-03-02", "2024-03-04"), (None, "2024-03-01"), ("2024-03-07", None), ("2024-03-11", None),
+    (date(2024, 3, 1), date(2024, 3, 7)),
+]
+
+
+def scan_rows(records, desde, hasta):
+    """Filas del rango recorriendo todos los registros, en orden de fecha y después de llegada"""
+    desde, hasta = (str(value) if value is not None else None for value in (desde, hasta))
+    rows = [row for row, record in enumerate(records)
+            if (desde is None or record["fecha"] >= desde) and (hasta is None or record["fecha"] <= hasta)]
+    return sorted(rows, key=lambda row: records[row]["fecha"])
+
+
+def test_date_index_matches_a_full_scan_with_inclusive_bounds(tmp_path):
+    csv_path = tmp_path / "compras.csv"
+    write_csv(csv_path, UNSORTED)
+    ledger = sync_from_csv(str(csv_path))
+    records = ledger.get_all_records()
+
+    assert ledger.indexes == {"date": "fecha", "keys": ["proveedor"]}
+    assert ledger.rows_between("2024-03-05", "2024-03-05") == [0]
+    assert ledger.rows_between("2024-03-02", "2024-03-04") == []
+    assert ledger.rows_between("2024-03-01", "2024-03-01") == [1, 3]
+    for desde, hasta in RANGES:
+        rows = scan_rows(records, desde, hasta)
+        assert ledger.rows_between(desde, hasta) == rows, (desde, hasta)
+        assert ledger.sum_between("cantidad", desde, hasta) == sum(records[row]["cantidad"] for row in rows)
+    ledger.close()
+
+
+def test_date_index_is_updated_after_an_append(tmp_path):
+    csv_path = tmp_path / "compras.csv"
+    write_csv(csv_path, UNSORTED)
+    ledger = sync_from_csv(str(csv_path))
+
+    ledger.append_many([
+        {"fecha": "2024-03-03", "proveedor": "Finca C", "cantidad": 3, "precio": 2.0},
+        {"fecha": "2024-03-12", "proveedor": "Finca A", "cantidad": 5, "precio": 2.0},
+    ])
+    records = ledger.get_all_records()
+
+    assert ledger.rows_between("2024-03-02", "2024-03-04") == [5]
+    assert ledger.rows_between("2024-03-11", None) == [6]
+    for desde, hasta in RANGES:
+        rows = scan_rows(records, desde, hasta)
+        assert ledger.rows_between(desde, hasta) == rows, (desde, hasta)
+        assert ledger.sum_between("cantidad", desde, hasta) == sum(records[row]["cantidad"] for row in rows)
+    assert ledger.rows_where("proveedor", "Finca C") == [3, 5]
+    ledger.close()
+
+    # La copia guardada de los índices también incluye las filas nuevas
+    reopened = ColumnarLedger(ledger.path)
+    assert reopened.rows_between() == scan_rows(records, None, None)
+    reopened.close()
+
+
+def test_query_records_matches_a_full_scan_of_the_csv(tmp_path):
+    csv_path = tmp_path / "compras.csv"
+    write_csv(csv_path, UNSORTED)
+
+    def scan(desde, hasta, **filtros):
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            records = list(csv.DictReader(f))
+        start, end = (date.fromisoformat(str(value)).toordinal() if value else None for value in (desde, hasta))
+        return sorted((record["fecha"], record["proveedor"], float(record["cantidad"]))
+                      for record in records if _matches(record, start, end, filtros))
+
+    def indexed(desde, hasta, **filtros):
+        return sorted((record["fecha"], record["proveedor"], float(record["cantidad"]))
+                      for record in query_records(str(csv_path), desde, hasta, **filtros))
+
+    # Sin importar: se recorre el CSV
+    assert indexed("2024-03-01", "2024-03-05") == scan("2024-03-01", "2024-03-05")
+    sync_from_csv(str(csv_path)).close()
+    with ledger_lock(str(csv_path)):
+        with open(csv_path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(["2024-03-02", "Finca A", "9", "2.0"])
+
+    for desde, hasta in RANGES:
+        for filtros in ({}, {"proveedor": "Finca A"}, {"proveedor": "Finca B"}, {"proveedor": "Nadie"}):
+            assert indexed(desde, hasta, **filtros) == scan(desde, hasta, **filtros), (desde, hasta, filtros)
@@ -0,0 +1,126 @@
+"""
+Memoria de las consultas de IA: turnos recientes, resumen de los antiguos y desalojo de conversaciones
+"""
+
+import asyncio
+import time
+
+from utils.memory import ConversationStore
+
+
+class Summarizer:
+    """Resume contando los turnos recibidos; falla las primeras `failures` veces"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    async def __call__(self, summary, turns):
+        self.calls.append((summary, [turn.question for turn in turns]))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("OpenAI no responde")
+        return f"{summary} {'+'.join(turn.question for turn in turns)}".strip()
+
+
+def store(summarizer, **kwargs):
+    options = {"keep_turns": 2, "max_tokens": 10000, "summary_tokens": 300, "max_conversations": 100,
+               "idle_ttl": 3600}
+    return ConversationStore(summarizer=summarizer, **{**options, **kwargs})
+
+
+def questions(history):
+    return [message["content"] for message in history if message["role"] == "user"]
+
+
+def summary(history):
+    return next((message["content"] for message in history if message["role"] == "system"), None)
+
+
+def record_turns(memory, chat_id, numbers):
+    async def run():
+        for number in numbers:
+            memory.record(chat_id, f"p{number}", f"respuesta {number}")
+            await memory.wait_idle()
+
+    asyncio.run(run())
+
+
+def test_old_turns_are_compacted_into_the_summary():
+    summarizer = Summarizer()
+    memory = store(summarizer)
+
+    record_turns(memory, 1, range(1, 5))
+    history = memory.history(1)
+    assert summary(history) == "Resumen de la conversación anterior:\np1+p2"
+    assert questions(history) == ["p3", "p4"]
+
+    record_turns(memory, 1, range(5, 7))
+
+    # Cada resumen parte del anterior y recibe solo los turnos que dejan de enviarse literalmente
+    assert summarizer.calls == [("", ["p1", "p2"]), ("p1+p2", ["p3", "p4"])]
+    history = memory.history(1)
+    assert summary(history) == "Resumen de la conversación anterior:\np1+p2 p3+p4"
+    assert questions(history) == ["p5", "p6"]
+    assert memory.stats()["turns"] == 2
+
+
+def test_history_keeps_the_most_recent_turns_within_max_tokens():
+    memory = store(Summarizer(), keep_turns=10)
+    record_turns(memory, 1, range(1, 6))
+    turns = memory._conversations[1].turns
+
+    memory.max_tokens = turns[-1].tokens + turns[-2].tokens
+
+    assert questions(memory.history(1)) == ["p4", "p5"]
+
+
+def test_a_failed_summary_keeps_the_turns_until_one_succeeds():
+    summarizer = Summarizer(failures=1)
+    memory = store(summarizer)
+
+    record_turns(memory, 1, range(1, 5))
+    history = memory.history(1)
+    assert summary(history) is None
+    assert questions(history) == ["p1", "p2", "p3", "p4"]
+
+    record_turns(memory, 1, [5])
+
+    assert summarizer.calls == [("", ["p1", "p2"]), ("", ["p1", "p2", "p3"])]
+    history = memory.history(1)
+    assert summary(history) == "Resumen de la conversación anterior:\np1+p2+p3"
+    assert questions(history) == ["p4", "p5"]
+
+
+def test_turns_stay_bounded_while_summaries_keep_failing():
+    memory = store(Summarizer(failures=100))
+
+    record_turns(memory, 1, range(1, 11))
+
+    assert questions(memory.history(1)) == [f"p{number}" for number in range(5, 11)]
+
+
+def test_least_recently_used_conversations_are_evicted():
+    memory = store(Summarizer(), max_conversations=2)
+
+    record_turns(memory, 1, [1])
+    record_turns(memory, 2, [1])
+    record_turns(memory, 1, [2])
+    record_turns(memory, 3, [1])
+
+    assert memory.history(2) == []
+    assert questions(memory.history(1)) == ["p1", "p2"]
+    assert questions(memory.history(3)) == ["p1"]
+    assert memory.evictions == 1
+
+
+def test_idle_conversations_are_forgotten():
+    memory = store(Summarizer(), idle_ttl=0.05)
+    record_turns(memory, 1, [1])
+    record_turns(memory, 2, [1])
+    time.sleep(0.1)
+
+    assert memory.history(1) == []
+    # La siguiente conversación nueva desaloja también las inactivas que nadie ha consultado
+    record_turns(memory, 3, [1])
+    assert len(memory) == 1 and memory.evictions == 2
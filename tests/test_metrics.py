@@ -0,0 +1,126 @@
+"""
+Métricas: formato de exposición de Prometheus e instrumentación de los manejadores
+"""
+
+import asyncio
+import warnings
+
+import pytest
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters
+from telegram.warnings import PTBUserWarning
+
+import utils.metrics as metrics
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer, recorded_message
+from utils.metrics import Counter, Gauge, Histogram, Registry
+
+ASKING = 0
+
+
+def test_render_counter_labelled_gauge_and_histogram():
+    registry = Registry()
+    requests = registry.register(Counter("pruebas_total", 'Consultas "de prueba"\ncon salto'))
+    pending = registry.register(Gauge("pendientes", "Filas pendientes", ("registro",)))
+    seconds = registry.register(Histogram("duracion_seconds", "Duración", ("metodo",), buckets=(1.0, 0.3)))
+
+    requests.inc()
+    requests.inc(2)
+    pending.labels(registro="compras").set(4)
+    pending.labels(registro='Finca "El Roble"\\norte\nsur').set_function(lambda: 2.5)
+    for value in (0.25, 0.5, 1.0, 4.0):
+        seconds.labels(metodo="get").observe(value)
+
+    assert registry.render().splitlines() == [
+        '# HELP pruebas_total Consultas "de prueba"\\ncon salto',
+        "# TYPE pruebas_total counter",
+        "pruebas_total 3.0",
+        "# HELP pendientes Filas pendientes",
+        "# TYPE pendientes gauge",
+        'pendientes{registro="compras"} 4',
+        'pendientes{registro="Finca \\"El Roble\\"\\\\norte\\nsur"} 2.5',
+        "# HELP duracion_seconds Duración",
+        "# TYPE duracion_seconds histogram",
+        # Cubos acumulados; el límite es inclusivo (1.0 cae en le="1.0")
+        'duracion_seconds_bucket{metodo="get",le="0.3"} 1',
+        'duracion_seconds_bucket{metodo="get",le="1.0"} 3',
+        'duracion_seconds_bucket{metodo="get",le="+Inf"} 4',
+        'duracion_seconds_sum{metodo="get"} 5.75',
+        'duracion_seconds_count{metodo="get"} 4',
+    ]
+
+
+def test_registering_a_metric_twice_reuses_the_first():
+    registry = Registry()
+    first = registry.register(Counter("pruebas_total", "Consultas"))
+
+    assert registry.register(Counter("pruebas_total", "Consultas")) is first
+
+
+@pytest.fixture
+def handler_metrics(monkeypatch):
+    """Métricas reales de los manejadores (están desactivadas en las pruebas)"""
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    values = {
+        "HANDLER_SECONDS": Histogram("bot_handler_seconds", "Duración", ("handler",)),
+        "HANDLER_ERRORS": Counter("bot_handler_errors_total", "Excepciones", ("handler",)),
+        "HANDLER_IN_FLIGHT": Gauge("bot_handler_in_flight", "En curso", ("handler",)),
+        "UPDATES_IN_FLIGHT": Gauge("bot_updates_in_flight", "Actualizaciones"),
+    }
+    for name, metric in values.items():
+        monkeypatch.setattr(metrics, name, metric)
+    return values
+
+
+async def start(update, context):
+    return ASKING
+
+
+async def answer(update, context):
+    raise ValueError("respuesta no válida")
+
+
+async def cancel(update, context):
+    return ConversationHandler.END
+
+
+async def help_command(update, context):
+    return None
+
+
+def test_instrument_handlers_wraps_conversation_children(handler_metrics):
+    async def scenario():
+        telegram = FakeTelegramServer()
+        await telegram.start()
+        application = Application.builder().token(FAKE_TOKEN).base_url(telegram.bot_url).build()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", PTBUserWarning)
+            application.add_handler(ConversationHandler(
+                entry_points=[CommandHandler("ia", start)],
+                states={ASKING: [MessageHandler(filters.TEXT & ~filters.COMMAND, answer)]},
+                fallbacks=[CommandHandler("cancelar", cancel)],
+            ))
+        application.add_handler(CommandHandler("ayuda", help_command))
+        metrics.instrument_handlers(application)
+        # Una segunda llamada no vuelve a envolver los callbacks
+        rewrapped = metrics.wrap_handlers(application, metrics._instrument, "__metrics_wrapped__")
+        try:
+            async with application:
+                for update_id, text in enumerate(["/ia", "lavado", "/cancelar", "/ayuda"], start=1):
+                    update = Update.de_json(recorded_message(update_id, 7000, text), application.bot)
+                    try:
+                        await application.process_update(update)
+                    except ValueError:
+                        pass
+        finally:
+            await telegram.stop()
+        return rewrapped
+
+    assert asyncio.run(scenario()) == 0
+
+    seconds, errors, in_flight = (handler_metrics[name] for name in
+                                  ("HANDLER_SECONDS", "HANDLER_ERRORS", "HANDLER_IN_FLIGHT"))
+    for name in ("start", "answer", "cancel", "help_command"):
+        assert seconds.labels(handler=name).count == 1, name
+        assert in_flight.labels(handler=name).get() == 0
+    assert errors.labels(handler="answer").value == 1
+    assert errors.labels(handler="start").value == 0
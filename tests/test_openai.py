@@ -0,0 +1,89 @@
+"""
+Caché de respuestas de utils.openai con un cliente de OpenAI falso
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import utils.openai as openai_utils
+from utils.cache import ResponseCache
+
+VALID = '{"recomendaciones": [{"producto": "Pergamino", "precio_actual": 10, "precio_recomendado": 12, "justificacion": "margen"}]}'
+INVALID = '{"recomendaciones": []}'
+PRODUCTS = [{"producto": "Pergamino", "precio_actual": 10, "costo": 8}]
+
+
+def completion(content: str):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """Sustituye la llamada a OpenAI por respuestas de una lista; devuelve los kwargs recibidos"""
+    replies = []
+    calls = []
+
+    async def create_completion(**kwargs):
+        calls.append(kwargs)
+        return completion(replies.pop(0)), openai_utils.OPENAI_MODEL
+
+    monkeypatch.setattr(openai_utils, "_create_completion", create_completion)
+    monkeypatch.setattr(openai_utils, "OPENAI_CACHE_ENABLED", True)
+    monkeypatch.setattr(openai_utils, "response_cache", ResponseCache())
+    return SimpleNamespace(replies=replies, calls=calls)
+
+
+def test_invalid_pricing_reply_is_not_cached(fake_openai, monkeypatch):
+    monkeypatch.setattr(openai_utils, "OPENAI_PRICING_ATTEMPTS", 2)
+    fake_openai.replies.extend([INVALID, VALID])
+
+    result = asyncio.run(openai_utils._price_chunk(PRODUCTS, "sistema"))
+
+    assert result[0]["precio_recomendado"] == 12
+    assert openai_utils.response_cache.stats()["entries"] == 0
+
+    # La siguiente consulta no recibe la respuesta inválida de la caché
+    fake_openai.replies.append(VALID)
+    assert asyncio.run(openai_utils._price_chunk(PRODUCTS, "sistema"))[0]["precio_recomendado"] == 12
+    assert len(fake_openai.calls) == 3
+
+
+def test_valid_pricing_reply_is_served_from_cache(fake_openai):
+    fake_openai.replies.append(VALID)
+
+    first = asyncio.run(openai_utils._price_chunk(PRODUCTS, "sistema"))
+    second = asyncio.run(openai_utils._price_chunk(PRODUCTS, "sistema"))
+
+    assert first == second
+    assert len(fake_openai.calls) == 1
+
+
+def test_invalid_cached_entry_is_fetched_again(fake_openai):
+    async def validate(response):
+        return openai_utils.parse_pricing_response(response, PRODUCTS)
+
+    key = openai_utils.make_cache_key(openai_utils.OPENAI_MODEL, "sistema", "pregunta", 0.2, True, 1000)
+    openai_utils.response_cache.set(key, INVALID)
+    fake_openai.replies.append(VALID)
+
+    result = asyncio.run(openai_utils.generate_response(
+        "pregunta", "sistema", temperature=0.2, json_mode=True, validate=validate
+    ))
+
+    assert result[0]["precio_recomendado"] == 12
+    assert openai_utils.response_cache.get(key) == VALID
+
+
+def test_cache_key_depends_on_json_mode_and_max_tokens(fake_openai):
+    fake_openai.replies.extend(["texto", '{"texto": 1}', "texto corto"])
+
+    plain = asyncio.run(openai_utils.generate_response("pregunta", "sistema"))
+    json_reply = asyncio.run(openai_utils.generate_response("pregunta", "sistema", json_mode=True))
+    short = asyncio.run(openai_utils.generate_response("pregunta", "sistema", max_tokens=50))
+
+    assert (plain, json_reply, short) == ("texto", '{"texto": 1}', "texto corto")
+    assert asyncio.run(openai_utils.generate_response("pregunta", "sistema", json_mode=True)) == '{"texto": 1}'
+    assert len(fake_openai.calls) == 3
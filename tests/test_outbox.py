@@ -0,0 +1,226 @@
+"""
+Cola de salida y limitador de la Bot API: cortes sin romper el Markdown, unión de textos y ediciones en streaming
+"""
+
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from telegram.error import RetryAfter
+from telegram.ext import Application
+
+import utils.telegram
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer
+from utils.outbox import JOIN_SEPARATOR, Outbox, TelegramRateLimiter
+from utils.telegram import PREVIEW_RATE_LIMIT_ARGS, PRE, split_message, stream_to_message
+
+
+def test_split_message_respects_the_limit():
+    text = "\n\n".join(f"Párrafo {number}: " + "café de especialidad " * 12 for number in range(40))
+
+    parts = split_message(text, limit=300)
+
+    assert len(parts) > 1
+    assert all(len(part) <= 300 for part in parts)
+    assert " ".join(" ".join(parts).split()) == " ".join(text.split())
+
+
+def test_split_message_reopens_a_code_block():
+    code = "\n".join(f"precio_{number} = {number * 1.5}" for number in range(60))
+    text = f"Cálculo:\n{PRE}python\n{code}\n{PRE}\nFin"
+
+    parts = split_message(text, limit=400, markdown=True)
+
+    assert len(parts) > 2
+    assert all(len(part) <= 400 for part in parts)
+    for part in parts[:-1]:
+        assert part.count(PRE) % 2 == 0 and part.rstrip().endswith(PRE)
+    for part in parts[1:]:
+        assert part.startswith(f"{PRE}python\n")
+    lines = [line for part in parts for line in part.split("\n") if line.startswith("precio_")]
+    assert lines == code.split("\n")
+
+
+def test_split_message_does_not_split_a_link():
+    link = "[ficha de cata del lote 42](https://example.com/cafe/lotes/42/ficha-de-cata)"
+    text = "Resumen " * 20 + link + " y más notas" * 10
+
+    parts = split_message(text, limit=200, markdown=True)
+
+    assert all(len(part) <= 200 for part in parts)
+    assert sum(link in part for part in parts) == 1
+
+
+class RecordingBot:
+    """Bot que guarda los mensajes enviados; cada envío tarda `delay` segundos"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None, reply_markup=None):
+        await asyncio.sleep(self.delay)
+        self.sent.append((chat_id, text, parse_mode, reply_markup))
+        return len(self.sent)
+
+
+def test_outbox_merges_pending_texts_with_the_same_parse_mode():
+    async def scenario():
+        outbox, bot = Outbox(), RecordingBot(delay=0.01)
+        first = asyncio.create_task(outbox.send(bot, 1, "primero"))
+        await asyncio.sleep(0)
+        results = await asyncio.gather(
+            first, outbox.send(bot, 1, "segundo"), outbox.send(bot, 1, "tercero"),
+            outbox.send(bot, 1, "*cuarto*", parse_mode="Markdown")
+        )
+        return outbox, bot, results
+
+    outbox, bot, results = asyncio.run(scenario())
+
+    assert bot.sent == [
+        (1, "primero", None, None),
+        (1, JOIN_SEPARATOR.join(["segundo", "tercero"]), None, None),
+        (1, "*cuarto*", "Markdown", None),
+    ]
+    assert results == [1, 2, 2, 3]
+    assert outbox.coalesced == 1
+
+
+def test_outbox_reply_markup_closes_the_batch():
+    async def scenario():
+        outbox, bot = Outbox(), RecordingBot(delay=0.01)
+        first = asyncio.create_task(outbox.send(bot, 1, "primero"))
+        await asyncio.sleep(0)
+        await asyncio.gather(
+            first, outbox.send(bot, 1, "segundo"), outbox.send(bot, 1, "elige", reply_markup="teclado"),
+            outbox.send(bot, 1, "después")
+        )
+        return bot
+
+    bot = asyncio.run(scenario())
+
+    assert bot.sent == [
+        (1, "primero", None, None),
+        (1, JOIN_SEPARATOR.join(["segundo", "elige"]), None, "teclado"),
+        (1, "después", None, None),
+    ]
+
+
+def test_outbox_skips_cancelled_texts():
+    async def scenario():
+        outbox, bot = Outbox(), RecordingBot(delay=0.01)
+        first = asyncio.create_task(outbox.send(bot, 1, "primero"))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(outbox.send(bot, 1, "cancelado"))
+        kept = asyncio.create_task(outbox.send(bot, 1, "segundo"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(first, kept)
+        return bot
+
+    bot = asyncio.run(scenario())
+
+    assert [text for _, text, _, _ in bot.sent] == ["primero", "segundo"]
+
+
+def limiter(**kwargs):
+    return TelegramRateLimiter(**{"global_rate": 30, "chat_rate": 1, "chat_burst": 3, "group_rate": 1, **kwargs})
+
+
+def call_limiter(limiter, callback, rate_limit_args=None):
+    return limiter.process_request(callback, (), {}, "editMessageText", {"chat_id": 5}, rate_limit_args)
+
+
+def test_preview_calls_do_not_wait_and_keep_a_token():
+    async def scenario():
+        rate_limiter, calls = limiter(), []
+
+        async def callback():
+            calls.append(time.monotonic())
+            return True
+
+        start = time.monotonic()
+        results = []
+        for _ in range(4):
+            try:
+                results.append(await call_limiter(rate_limiter, callback, PREVIEW_RATE_LIMIT_ARGS))
+            except RetryAfter as e:
+                results.append(utils.telegram.retry_after_seconds(e))
+        # La edición final no se omite y encuentra ficha sin esperar
+        await call_limiter(rate_limiter, callback)
+        return results, time.monotonic() - start, len(calls)
+
+    results, elapsed, calls = asyncio.run(scenario())
+
+    assert results[:2] == [True, True]
+    assert all(0 < wait <= 1 for wait in results[2:])
+    assert calls == 3
+    assert elapsed < 0.5
+
+
+def test_preview_calls_are_not_retried_after_retry_after():
+    async def scenario():
+        rate_limiter, calls = limiter(), []
+
+        async def callback():
+            calls.append(1)
+            raise RetryAfter(timedelta(seconds=30))
+
+        with pytest.raises(RetryAfter):
+            await call_limiter(rate_limiter, callback, PREVIEW_RATE_LIMIT_ARGS)
+        # El chat queda en pausa: la siguiente edición provisional ni llega a Telegram
+        with pytest.raises(RetryAfter) as error:
+            await call_limiter(rate_limiter, callback, PREVIEW_RATE_LIMIT_ARGS)
+        return len(calls), utils.telegram.retry_after_seconds(error.value)
+
+    calls, wait = asyncio.run(scenario())
+
+    assert calls == 1
+    assert 29 < wait <= 30
+
+
+def test_other_calls_wait_and_retry_after_retry_after():
+    async def scenario():
+        rate_limiter, calls = limiter(), []
+
+        async def callback():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RetryAfter(timedelta(seconds=0.05))
+            return True
+
+        return await call_limiter(rate_limiter, callback), len(calls), rate_limiter.retries
+
+    assert asyncio.run(scenario()) == (True, 2, 1)
+
+
+def test_stream_previews_are_skipped_instead_of_waiting(monkeypatch):
+    monkeypatch.setattr(utils.telegram, "STREAM_EDIT_INTERVAL", 0.0)
+
+    async def chunks():
+        for number in range(20):
+            yield f"fragmento {number} "
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        telegram = FakeTelegramServer()
+        await telegram.start()
+        application = Application.builder().token(FAKE_TOKEN).base_url(telegram.bot_url).rate_limiter(limiter()).build()
+        try:
+            async with application:
+                message = await application.bot.send_message(5, "Procesando...")
+                start = time.monotonic()
+                text = await stream_to_message(message, chunks(), title="Respuesta")
+                elapsed = time.monotonic() - start
+                return text, elapsed, telegram.calls_for(5, "editMessageText")
+        finally:
+            await telegram.stop()
+
+    text, elapsed, edits = asyncio.run(scenario())
+
+    # Con 3 fichas: el envío, una edición provisional (queda una de reserva) y la final
+    assert elapsed < 0.8
+    assert len(edits) == 2
+    assert edits[-1]["params"]["text"].startswith("*Respuesta*") and "fragmento 19" in edits[-1]["params"]["text"]
+    assert text.startswith("fragmento 0")
@@ -0,0 +1,192 @@
+"""
+Persistencia en SQLite: reinicios, varios procesos y atributos internos de python-telegram-bot
+"""
+
+import asyncio
+import multiprocessing
+import sqlite3
+import warnings
+
+import pytest
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters
+from telegram.warnings import PTBUserWarning
+
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer, recorded_message
+from utils.persistence import SQLitePersistence
+
+ASKING = 0
+
+
+async def start(update, context):
+    context.user_data["pregunta"] = update.message.text
+    return ASKING
+
+
+async def answer(update, context):
+    context.chat_data.setdefault("respuestas", []).append(update.message.text)
+    return ASKING
+
+
+async def cancel(update, context):
+    context.chat_data["cancelada"] = True
+    return ConversationHandler.END
+
+
+def build_app(telegram, persistence):
+    """Aplicación con una conversación persistente, como la de /ia"""
+    application = Application.builder().token(FAKE_TOKEN).base_url(telegram.bot_url).persistence(persistence).build()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", PTBUserWarning)
+        application.add_handler(ConversationHandler(
+            entry_points=[CommandHandler("ia", start)],
+            states={ASKING: [MessageHandler(filters.TEXT & ~filters.COMMAND, answer)]},
+            fallbacks=[CommandHandler("cancelar", cancel)],
+            name="ia_conversation",
+            persistent=True
+        ))
+    persistence.sync_conversations(application)
+    return application
+
+
+async def send(application, update_id, chat_id, text):
+    await application.process_update(Update.de_json(recorded_message(update_id, chat_id, text), application.bot))
+
+
+def with_telegram(scenario):
+    """Ejecuta scenario(telegram) con una Bot API falsa en el mismo bucle de eventos"""
+
+    async def run():
+        telegram = FakeTelegramServer()
+        await telegram.start()
+        try:
+            return await scenario(telegram)
+        finally:
+            await telegram.stop()
+
+    return asyncio.run(run())
+
+
+def test_conversation_survives_a_restart(tmp_path):
+    path = str(tmp_path / "bot_state.sqlite3")
+
+    async def scenario(telegram):
+        persistence = SQLitePersistence(path)
+        application = build_app(telegram, persistence)
+        async with application:
+            await send(application, 1, 3000, "/ia")
+        persistence.close()
+
+        # Nuevo proceso del bot tras el reinicio
+        persistence = SQLitePersistence(path)
+        application = build_app(telegram, persistence)
+        async with application:
+            await send(application, 2, 3000, "¿Qué es un proceso honey?")
+            result = (application.chat_data[3000], application.user_data[3000])
+        persistence.close()
+        return result
+
+    chat_data, user_data = with_telegram(scenario)
+
+    assert chat_data["respuestas"] == ["¿Qué es un proceso honey?"]
+    assert user_data["pregunta"] == "/ia"
+
+
+def test_two_processes_share_the_conversation(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+
+    async def scenario(telegram):
+        persistence_a = SQLitePersistence(path, update_interval=0.1)
+        persistence_b = SQLitePersistence(path, update_interval=0.1)
+        worker_a = build_app(telegram, persistence_a)
+        worker_b = build_app(telegram, persistence_b)
+        async with worker_a, worker_b:
+            await worker_a.start()
+            await worker_b.start()
+
+            await send(worker_a, 1, 4000, "/ia")
+            # Un ciclo de persistencia para que el estado llegue al archivo compartido
+            await asyncio.sleep(0.4)
+            await send(worker_b, 2, 4000, "¿Qué es un proceso honey?")
+            answered_in_b = worker_b.chat_data[4000].get("respuestas")
+
+            # Y de vuelta: A ve que la conversación sigue abierta y la termina
+            await asyncio.sleep(0.4)
+            await send(worker_a, 3, 4000, "/cancelar")
+            cancelled_in_a = worker_a.chat_data[4000].get("cancelada")
+            await asyncio.sleep(0.4)
+            await send(worker_b, 4, 4000, "otra pregunta")
+            answers_after_cancel = worker_b.chat_data[4000].get("respuestas")
+
+            await worker_a.stop()
+            await worker_b.stop()
+        persistence_a.close()
+        persistence_b.close()
+        return answered_in_b, cancelled_in_a, answers_after_cancel
+
+    answered_in_b, cancelled_in_a, answers_after_cancel = with_telegram(scenario)
+
+    assert answered_in_b == ["¿Qué es un proceso honey?"]
+    assert cancelled_in_a is True
+    # B relee el estado antes de la actualización: la conversación terminada en A no responde
+    assert answers_after_cancel == ["¿Qué es un proceso honey?"]
+
+
+def write_states(path: str, worker: int, writes: int) -> int:
+    """Como un proceso del bot: escribe estado en ciclos de persistencia"""
+
+    async def run() -> int:
+        persistence = SQLitePersistence(path)
+        for i in range(writes):
+            await persistence.update_user_data(worker * 1000000 + i, {"ia_mode": "consulta", "worker": worker})
+            await persistence.update_conversation("ia", (worker, i), i % 3)
+            if i % 25 == 24:
+                await persistence.flush()
+        await persistence.flush()
+        persistence.close()
+        return persistence.commits
+
+    return asyncio.run(run())
+
+
+def test_concurrent_processes_do_not_lose_rows(tmp_path):
+    path = str(tmp_path / "concurrent.sqlite3")
+    with multiprocessing.get_context("spawn").Pool(3) as pool:
+        commits = pool.starmap(write_states, [(path, worker, 100) for worker in range(3)])
+
+    db = sqlite3.connect(path)
+    users = db.execute("SELECT COUNT(*) FROM state WHERE kind = 'user'").fetchone()[0]
+    conversations = db.execute("SELECT COUNT(*) FROM state WHERE kind = 'conversation:ia'").fetchone()[0]
+    db.close()
+    assert all(commits)
+    assert users == conversations == 300
+
+
+def test_ptb_internals_used_by_sync_conversations(tmp_path):
+    """
+    sync_conversations usa atributos privados de ConversationHandler: si una
+    versión de python-telegram-bot los cambia, esta prueba falla antes que el bot
+    """
+
+    async def scenario(telegram):
+        persistence = SQLitePersistence(str(tmp_path / "bot_state.sqlite3"))
+        application = build_app(telegram, persistence)
+        async with application:
+            handler = application.handlers[0][0]
+            update = Update.de_json(recorded_message(1, 5000, "/ia"), application.bot)
+
+            assert handler._get_key(update) == (5000, 5000)
+            # Actualización sin chat ni usuario: _refresh_conversation la omite por este RuntimeError
+            with pytest.raises(RuntimeError):
+                handler._get_key(Update(update_id=2))
+
+            conversations = handler._conversations
+            conversations.update_no_track({(5000, 5000): ASKING})
+            assert conversations.data == {(5000, 5000): ASKING}
+            # update_no_track no marca la clave como escrita: no se vuelve a guardar
+            assert not conversations.pop_accessed_write_items()
+            conversations.data.pop((5000, 5000))
+            assert (5000, 5000) not in conversations
+        persistence.close()
+
+    with_telegram(scenario)
@@ -0,0 +1,107 @@
+"""
+Análisis de datos precalculado: umbral de cambios, archivo guardado tras un reinicio y recálculo forzado
+"""
+
+import asyncio
+
+import pytest
+
+import utils.precompute as precompute
+from utils.precompute import AnalysisStore
+
+
+class FakeStore:
+    """Agregados con un número de filas por registro que la prueba va cambiando"""
+
+    def __init__(self, **rows):
+        self.rows = dict(rows)
+
+    def row_counts(self):
+        return dict(self.rows)
+
+    def snapshot(self):
+        return {name: {"registros": count} for name, count in self.rows.items()}
+
+
+class FakeEngine:
+    def indicators(self):
+        return {}
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Modelo falso que numera sus análisis y registra si se permitió la caché"""
+    calls = []
+
+    async def analyze(data, use_cache=True, raise_errors=False):
+        calls.append({"datos": data, "use_cache": use_cache})
+        return f"análisis {len(calls)}"
+
+    monkeypatch.setattr(precompute, "analyze_coffee_data", analyze)
+    return calls
+
+
+def test_refresh_waits_for_min_changes(tmp_path, model):
+    store = FakeStore(compras=10, ventas=5)
+    analysis = AnalysisStore(str(tmp_path / "analisis.json"), store, FakeEngine())
+
+    async def run():
+        first = await analysis.refresh(min_changes=5)
+        store.rows["ventas"] = 8
+        unchanged = await analysis.refresh(min_changes=5)
+        store.rows["compras"] = 12
+        recalculated = await analysis.refresh(min_changes=5)
+        return first, unchanged, recalculated
+
+    first, unchanged, recalculated = asyncio.run(run())
+
+    assert first["analisis"] == "análisis 1" and first["version"] == "compras=10,ventas=5"
+    assert unchanged is first
+    assert recalculated["analisis"] == "análisis 2" and recalculated["version"] == "compras=12,ventas=8"
+    assert model[-1]["datos"] == {"compras": {"registros": 12}, "ventas": {"registros": 8}}
+
+
+def test_saved_analysis_is_served_after_a_restart(tmp_path, model):
+    path = str(tmp_path / "analisis.json")
+    store = FakeStore(compras=10)
+    saved = asyncio.run(AnalysisStore(path, store, FakeEngine()).refresh())
+
+    # Nuevo proceso del bot: sin nada en memoria
+    restarted = AnalysisStore(path, store, FakeEngine())
+    latest = restarted.latest()
+    refreshed = asyncio.run(restarted.refresh(min_changes=1))
+
+    assert latest["analisis"] == saved["analisis"] == "análisis 1"
+    assert latest["filas"] == {"compras": 10}
+    assert refreshed["analisis"] == "análisis 1"
+    assert len(model) == 1
+
+
+def test_force_recalculates_without_changes_or_cache(tmp_path, model):
+    analysis = AnalysisStore(str(tmp_path / "analisis.json"), FakeStore(compras=10), FakeEngine())
+
+    async def run():
+        await analysis.refresh()
+        return await analysis.refresh(force=True)
+
+    forced = asyncio.run(run())
+
+    assert forced["analisis"] == "análisis 2"
+    assert [call["use_cache"] for call in model] == [True, False]
+    assert AnalysisStore(analysis.path).latest()["analisis"] == "análisis 2"
+
+
+def test_a_failed_refresh_keeps_the_saved_analysis(tmp_path, model, monkeypatch):
+    path = str(tmp_path / "analisis.json")
+    store = FakeStore(compras=10)
+    asyncio.run(AnalysisStore(path, store, FakeEngine()).refresh())
+
+    async def failing(data, use_cache=True, raise_errors=False):
+        raise ConnectionError("OpenAI no responde")
+
+    monkeypatch.setattr(precompute, "analyze_coffee_data", failing)
+    store.rows["compras"] = 50
+    with pytest.raises(ConnectionError):
+        asyncio.run(AnalysisStore(path, store, FakeEngine()).refresh(force=True))
+
+    assert AnalysisStore(path).latest()["analisis"] == "análisis 1"
@@ -0,0 +1,138 @@
+"""
+Perfilado del bucle: bloqueos por encima del umbral, actualizaciones más lentas, muestreo e informes de /perf
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import handlers.perf as perf
+from utils.profiling import BlockSample, LoopProfiler
+from utils.telegram import MAX_MESSAGE_LENGTH
+
+
+def chat_update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), callback_query=None,
+                           effective_message=SimpleNamespace(text="/ia", document=None))
+
+
+async def blocking_handler(update, context):
+    # E/S síncrona dentro de un manejador: retiene el bucle
+    time.sleep(0.3)
+
+
+async def waiting_handler(update, context):
+    await asyncio.sleep(0.3)
+
+
+def test_a_blocking_handler_is_detected_above_the_threshold():
+    profiler = LoopProfiler(lag_interval=0.01, block_threshold=0.1, slowest=10, sample_interval=0.005)
+    blocking, waiting = profiler.wrap(blocking_handler), profiler.wrap(waiting_handler)
+
+    async def run():
+        profiler.start()
+        try:
+            await asyncio.sleep(0.05)
+            await waiting(chat_update(1), None)
+            await blocking(chat_update(2), None)
+            await asyncio.sleep(0.05)
+        finally:
+            await profiler.stop()
+
+    asyncio.run(run())
+
+    blocks = profiler.blocks()
+    assert len(blocks) == 1
+    assert blocks[0].handler == "blocking_handler"
+    assert 0.1 <= blocks[0].seconds < 0.5
+    assert "time.sleep(0.3)" in blocks[0].stack
+    # La espera sin bloquear es igual de lenta, pero no retuvo el bucle
+    timings = {timing.handler: timing for timing in profiler.slowest_updates()}
+    assert timings["blocking_handler"].blocked >= 0.1 and timings["blocking_handler"].chat_id == 2
+    assert timings["waiting_handler"].blocked == 0.0 and timings["waiting_handler"].seconds >= 0.3
+
+
+def test_slowest_updates_keeps_the_slowest_in_order():
+    profiler = LoopProfiler(slowest=3)
+
+    for number, seconds in enumerate([0.2, 1.5, 0.1, 0.9, 3.0, 0.4], start=1):
+        profiler.record(f"manejador_{number}", chat_update(number), seconds)
+    profiler.record("manejador_1", chat_update(1), 0.6)
+
+    slowest = profiler.slowest_updates()
+    assert [timing.seconds for timing in slowest] == [3.0, 1.5, 0.9]
+    assert [timing.chat_id for timing in slowest] == [5, 2, 4]
+    assert slowest[0].kind == "/ia"
+    stats = {name: (count, mean, worst) for name, count, mean, worst, _ in profiler.handler_stats()}
+    assert stats["manejador_1"] == (2, pytest.approx(0.4), 0.6)
+    assert profiler.handler_stats()[0][0] == "manejador_5"
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampling_starts_and_stops_with_the_loop():
+    profiler = LoopProfiler(lag_interval=0.01, block_threshold=5.0, sample_interval=0.005)
+    # Sin bucle que medir no hay nada que muestrear
+    profiler.start_sampling()
+    assert not profiler.sampling
+
+    async def run():
+        profiler.start()
+        try:
+            profiler.start_sampling()
+            assert profiler.sampling
+            busy_loop(0.2)
+            await asyncio.sleep(0.1)
+            profiler.stop_sampling()
+            samples = profiler.profile()["muestras"]
+            await asyncio.sleep(0.05)
+            return samples
+        finally:
+            await profiler.stop()
+
+    samples = asyncio.run(run())
+
+    profile = profiler.profile()
+    assert not profiler.sampling
+    # Al detenerlo no se toman más muestras, pero se conservan para el informe
+    assert profile["muestras"] == samples > 10
+    assert 0 < profile["inactivo"] < samples
+    assert any(name.endswith(" busy_loop") for name, _ in profile["propias"])
+    assert any(name.endswith(" run") for name, _ in profile["acumuladas"])
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None, reply_markup=None):
+        self.sent.append(text)
+        return SimpleNamespace(chat_id=chat_id, text=text)
+
+
+def test_long_reports_are_sent_in_several_messages(monkeypatch):
+    profiler = LoopProfiler()
+    stack = "".join(f'  File "handlers/lento.py", line {line}, in calcular_precios\n    precios = cargar()\n'
+                    for line in range(40))
+    for number in range(3):
+        profiler._blocks.append(BlockSample(1.0 + number, "lento", time.time(), stack))
+    monkeypatch.setattr(perf, "profiler", profiler)
+    monkeypatch.setattr(perf, "ADMIN_IDS", {7})
+    bot = RecordingBot()
+    message = SimpleNamespace(chat_id=7, get_bot=lambda: bot)
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=7), message=message)
+
+    asyncio.run(perf.perf_command(update, SimpleNamespace(args=["bloqueos"])))
+
+    report = perf.blocks_text()
+    assert len(report) > MAX_MESSAGE_LENGTH
+    assert len(bot.sent) > 1
+    assert all(len(text) <= MAX_MESSAGE_LENGTH for text in bot.sent)
+    # Nada se recorta: todas las pilas llegan completas
+    assert "".join(bot.sent).count("calcular_precios") == report.count("calcular_precios")
@@ -0,0 +1,61 @@
+"""
+Conteo de tokens: tiktoken se carga aparte y, mientras tanto, los tokens se estiman
+"""
+
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import utils.prompts as prompts
+from utils.prompts import count_tokens, load_encoder
+
+
+class FakeEncoding:
+    def encode(self, text):
+        return text.split()
+
+
+@pytest.fixture
+def tiktoken(monkeypatch):
+    """tiktoken falso que registra los modelos cuyo codificador se pide"""
+    requested = []
+
+    def encoding_for_model(model):
+        requested.append(model)
+        if model == "desconocido":
+            raise KeyError(model)
+        return FakeEncoding()
+
+    module = SimpleNamespace(encoding_for_model=encoding_for_model, get_encoding=lambda name: FakeEncoding())
+    monkeypatch.setitem(sys.modules, "tiktoken", module)
+    monkeypatch.setattr(prompts, "_encoders", {})
+    return requested
+
+
+def test_count_tokens_estimates_until_the_encoder_is_loaded(tiktoken):
+    text = "el lavado retira el mucílago"
+
+    # count_tokens nunca carga tiktoken: la descarga de sus tablas bloquearía el bucle de eventos
+    assert count_tokens(text, "gpt-4o") == 7
+    assert tiktoken == []
+
+    assert load_encoder("gpt-4o")
+    assert count_tokens(text, "gpt-4o") == 5
+    assert tiktoken == ["gpt-4o"]
+
+
+def test_unknown_models_use_the_generic_encoding(tiktoken):
+    assert load_encoder("desconocido")
+    assert count_tokens("uno dos tres", "desconocido") == 3
+
+
+def test_tokens_are_estimated_when_tiktoken_cannot_load(monkeypatch):
+    def encoding_for_model(model):
+        raise ConnectionError("sin red para descargar las tablas")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", SimpleNamespace(encoding_for_model=encoding_for_model))
+    monkeypatch.setattr(prompts, "_encoders", {})
+
+    assert not load_encoder("gpt-4o")
+    assert count_tokens("x" * 40, "gpt-4o") == 10
@@ -0,0 +1,86 @@
+"""
+Reportes vectorizados sobre un registro pequeño calculado a mano
+"""
+
+import csv
+
+import numpy as np
+import pytest
+
+from utils.reports import ReportEngine
+
+# Cereza a 1,5 $/kg: 750 $ por 500 kg (la compra "mixto" cuenta como cereza)
+COMPRAS = [
+    ["fecha", "proveedor", "tipo_cafe", "cantidad", "precio"],
+    ["2024-01-05", "Finca A", "Cereza", "100", "2.0"],
+    ["2024-01-20", "Finca B", "cereza madura", "300", "1.0"],
+    ["2024-02-10", "Finca A", "mixto", "100", "2.5"],
+]
+
+# cereza→pergamino: 215 kg de 500 (0,43); pergamino→oro: 80 kg de 100 (0,8)
+PROCESO = [
+    ["fecha", "origen", "destino", "estado", "cantidad", "merma"],
+    ["2024-01-10", "Cereza", "Pergamino seco", "pergamino", "200", "120"],
+    ["2024-01-12", "cereza", "pergamino", "pergamino", "300", "165"],
+    ["2024-01-20", "Pergamino", "Oro", "oro", "100", "20"],
+    # Sin estados reconocibles: no es un paso del rendimiento
+    ["2024-01-21", "Lavado", "Secado", "pergamino", "50", "5"],
+]
+
+VENTAS = [
+    ["fecha", "cliente", "tipo_cafe", "cantidad", "total"],
+    ["2024-01-15", "Café Sol", "oro", "10", "80"],
+    ["2024-01-25", "Café Luna", "Pergamino", "20", "100"],
+    # Sin estado: se valora al costo de la cereza
+    ["2024-02-05", "Café Sol", "", "4", "10"],
+]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    files = {}
+    for name, rows in (("compras", COMPRAS), ("proceso", PROCESO), ("ventas", VENTAS)):
+        files[name] = str(tmp_path / f"{name}.csv")
+        with open(files[name], "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows)
+    return ReportEngine(files)
+
+
+def test_yields_by_step_and_chained(engine):
+    yields = engine.yields()
+
+    assert yields == {
+        "cereza→pergamino": {"registros": 2, "entrada": 500.0, "salida": 215.0, "rendimiento": 0.43},
+        "pergamino→oro": {"registros": 1, "entrada": 100.0, "salida": 80.0, "rendimiento": 0.8},
+        "cereza→oro": {"rendimiento": 0.344, "encadenado": True},
+    }
+    # Con el rango solo entra el segundo paso de cereza y no hay pergamino→oro que encadenar
+    assert engine.yields(desde="2024-01-11", hasta="2024-01-19") == {
+        "cereza→pergamino": {"registros": 1, "entrada": 300.0, "salida": 135.0, "rendimiento": 0.45},
+    }
+
+
+def test_cost_by_state_follows_the_yields(engine):
+    # pergamino = 1,5 / 0,43; oro = pergamino / 0,8
+    assert engine.cost_by_state() == {"cereza": 1.5, "pergamino": 3.49, "oro": 4.36}
+
+
+def test_sale_profits_value_each_sale_at_its_state_cost(engine):
+    revenue, cost = engine.sale_profits()
+
+    np.testing.assert_allclose(revenue, [80, 100, 10])
+    np.testing.assert_allclose(cost, [10 * 4.36, 20 * 3.49, 4 * 1.5])
+
+
+def test_profit_by_month_and_by_client(engine):
+    assert engine.profit("mes") == {
+        "2024-01": {"registros": 2, "ingresos": 180.0, "costo": 113.4, "ganancia": 66.6, "margen": 37.0},
+        "2024-02": {"registros": 1, "ingresos": 10.0, "costo": 6.0, "ganancia": 4.0, "margen": 40.0},
+    }
+    assert engine.profit("cliente") == {
+        "Café Sol": {"registros": 2, "ingresos": 90.0, "costo": 49.6, "ganancia": 40.4, "margen": 44.9},
+        "Café Luna": {"registros": 1, "ingresos": 100.0, "costo": 69.8, "ganancia": 30.2, "margen": 30.2},
+    }
+    assert engine.profit("mes", desde="2024-02-01") == {
+        "2024-02": {"registros": 1, "ingresos": 10.0, "costo": 6.0, "ganancia": 4.0, "margen": 40.0},
+    }
@@ -0,0 +1,231 @@
+"""
+Política de llamadas a OpenAI: reintentos, peticiones de cobertura y cortacircuitos
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIStatusError
+
+import utils.resilience as resilience
+from utils.resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy
+
+
+def status_error(status: int, retry_after: str = "") -> APIStatusError:
+    headers = {"retry-after": retry_after} if retry_after else {}
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return APIStatusError(f"Error {status}", response=httpx.Response(status, headers=headers, request=request), body=None)
+
+
+class FakeModel:
+    """Petición a OpenAI que responde con la lista de resultados o errores indicada"""
+
+    def __init__(self, *outcomes, delay: float = 0.0):
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, model: str, timeout: float):
+        self.calls.append(model)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj manual para el cortacircuitos (el bucle de eventos sigue con el real)"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=lambda: now.value, time=time.time))
+    return now
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Esperas entre reintentos, sin dormir de verdad"""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    return delays
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=30)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.is_open
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert breaker.times_opened == 1
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_allows_a_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    breaker.record_failure()
+
+    clock.value += 29
+    assert not breaker.allow()
+    clock.value += 1
+    assert breaker.allow()
+    # Mientras la prueba está en curso, el resto sigue yendo al respaldo
+    assert not breaker.allow()
+
+    # La prueba falla: otro enfriamiento completo
+    breaker.record_failure()
+    clock.value += 29
+    assert not breaker.allow()
+    clock.value += 1
+    assert breaker.allow()
+
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_allows_another_probe_if_the_first_never_reports(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+    breaker.record_failure()
+    clock.value += 10
+    assert breaker.allow()
+    clock.value += 5
+    assert not breaker.allow()
+    clock.value += 5
+    assert breaker.allow()
+
+
+def test_transient_errors_are_retried_with_backoff(sleeps):
+    model = FakeModel(status_error(503), status_error(429), "respuesta")
+    policy = ResiliencePolicy(max_retries=2, base_delay=0.5, max_delay=8)
+
+    result = asyncio.run(policy.call(model, "principal"))
+
+    assert result == ("respuesta", "principal")
+    assert model.calls == ["principal"] * 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 0.5 and 0 <= sleeps[1] <= 1.0
+
+
+def test_retry_after_header_is_respected(sleeps):
+    model = FakeModel(status_error(429, retry_after="3"), "respuesta")
+    policy = ResiliencePolicy(max_retries=1, base_delay=0.1)
+
+    assert asyncio.run(policy.call(model, "principal"))[0] == "respuesta"
+    assert sleeps == [3.0]
+
+
+def test_non_retryable_errors_are_raised_at_once(sleeps):
+    model = FakeModel(status_error(400), "respuesta")
+    policy = ResiliencePolicy(max_retries=3)
+
+    with pytest.raises(APIStatusError):
+        asyncio.run(policy.call(model, "principal"))
+    assert model.calls == ["principal"]
+    assert sleeps == []
+
+
+def test_last_error_is_raised_when_retries_run_out(sleeps):
+    model = FakeModel(status_error(502))
+    policy = ResiliencePolicy(max_retries=2, base_delay=0.01)
+
+    with pytest.raises(APIStatusError) as error:
+        asyncio.run(policy.call(model, "principal"))
+    assert error.value.status_code == 502
+    assert len(model.calls) == 3
+
+
+def test_each_attempt_has_its_own_timeout():
+    model = FakeModel("lenta", delay=1.0)
+    policy = ResiliencePolicy(attempt_timeout=0.05, total_timeout=0.5, max_retries=1, base_delay=0.01)
+
+    start = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(policy.call(model, "principal"))
+    assert len(model.calls) == 2
+    assert time.perf_counter() - start < 0.5
+
+
+def test_hedged_request_wins_when_the_first_is_slow():
+    calls = []
+    finished = []
+
+    async def request(model, timeout):
+        number = len(calls)
+        calls.append(model)
+        # La primera petición se queda colgada; la de cobertura responde enseguida
+        await asyncio.sleep(1.0 if number == 0 else 0.01)
+        finished.append(number)
+        return f"respuesta {number}"
+
+    policy = ResiliencePolicy(attempt_timeout=2, hedge_after=0.05)
+    start = time.perf_counter()
+
+    assert asyncio.run(policy.call(request, "principal")) == ("respuesta 1", "principal")
+    assert len(calls) == 2
+    # La original se cancela en cuanto gana la de cobertura
+    assert finished == [1]
+    assert time.perf_counter() - start < 0.5
+
+
+def test_no_hedge_when_the_first_answers_in_time():
+    model = FakeModel("rápida", delay=0.01)
+    policy = ResiliencePolicy(attempt_timeout=2, hedge_after=0.2)
+
+    assert asyncio.run(policy.call(model, "principal")) == ("rápida", "principal")
+    assert model.calls == ["principal"]
+
+
+def test_open_breaker_sends_calls_to_the_fallback_model(clock, sleeps):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    model = FakeModel(status_error(500), "respaldo")
+    policy = ResiliencePolicy(max_retries=1, base_delay=0.01, breaker=breaker)
+
+    assert asyncio.run(policy.call(model, "principal", "barato")) == ("respaldo", "barato")
+    assert model.calls == ["principal", "barato"]
+    assert breaker.is_open
+
+    # Abierto: ni siquiera se intenta el principal
+    model = FakeModel("respaldo")
+    assert asyncio.run(policy.call(model, "principal", "barato")) == ("respaldo", "barato")
+    assert model.calls == ["barato"]
+
+    # Tras el enfriamiento, la llamada de prueba al principal lo cierra
+    clock.value += 30
+    model = FakeModel("principal de nuevo")
+    assert asyncio.run(policy.call(model, "principal", "barato")) == ("principal de nuevo", "principal")
+    assert not breaker.is_open
+
+
+def test_open_breaker_without_fallback_raises(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    breaker.record_failure()
+    model = FakeModel("respuesta")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(ResiliencePolicy(breaker=breaker).call(model, "principal"))
+    assert model.calls == []
+
+
+def test_long_retry_after_switches_to_the_fallback_at_once(sleeps):
+    model = FakeModel(status_error(429, retry_after="120"), "respaldo")
+    policy = ResiliencePolicy(total_timeout=10, max_retries=2)
+
+    assert asyncio.run(policy.call(model, "principal", "barato")) == ("respaldo", "barato")
+    assert sleeps == [0.0]
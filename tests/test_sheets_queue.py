@@ -0,0 +1,116 @@
+"""
+Cola de escritura diferida de Google Sheets: diario, punto de control y reintentos
+"""
+
+import asyncio
+
+import pytest
+
+import utils.sheets_queue as sheets_queue
+from benchmarks.fake_sheets import FakeSheetsService
+from utils.sheets_queue import SheetsWriteQueue
+
+
+def make_queue(service, journal, **kwargs):
+    return SheetsWriteQueue(lambda: service, "fake-spreadsheet", str(journal), flush_interval=0.05, **kwargs)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Esperas de los reintentos, sin dormir de verdad"""
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(sheets_queue.asyncio, "sleep", sleep)
+    monkeypatch.setattr(sheets_queue.random, "uniform", lambda low, high: 1.0)
+    return delays
+
+
+def test_rows_are_replayed_in_order_after_a_crash(tmp_path):
+    journal = tmp_path / "sheets.jsonl"
+    service = FakeSheetsService(latency=0)
+
+    first = make_queue(service, journal)
+    for i in range(3):
+        first.append("compras", [i])
+    asyncio.run(first.flush())
+    for i in range(3, 8):
+        first.append("ventas" if i % 2 else "compras", [i])
+    # Caída: el proceso muere sin enviar lo pendiente, a mitad de escribir una línea del diario
+    first._journal.write('{"seq": 9, "sheet": "compras", "ro')
+    first._journal.close()
+
+    second = make_queue(service, journal)
+    assert second.pending == 5
+    asyncio.run(second.stop())
+
+    assert service.sheets["compras"] == [[0], [1], [2], [4], [6]]
+    assert service.sheets["ventas"] == [[3], [5], [7]]
+
+
+def test_checkpoint_prevents_resending_committed_rows(tmp_path):
+    journal = tmp_path / "sheets.jsonl"
+    service = FakeSheetsService(latency=0)
+
+    first = make_queue(service, journal)
+    first.append_many("compras", [[1], [2]])
+    asyncio.run(first.flush())
+    first._journal.close()
+
+    # Reinicio: el diario aún contiene las filas, pero el punto de control ya las confirma
+    second = make_queue(service, journal)
+    assert second.pending == 0
+    second.append("compras", [3])
+    asyncio.run(second.stop())
+
+    third = make_queue(service, journal)
+    assert third.pending == 0
+    asyncio.run(third.stop())
+
+    assert service.sheets["compras"] == [[1], [2], [3]]
+    assert service.calls == 2
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_transient_errors_are_retried_with_exponential_backoff(tmp_path, sleeps, status):
+    service = FakeSheetsService(latency=0, quota_errors=3, error_status=status)
+    queue = make_queue(service, tmp_path / "sheets.jsonl", max_backoff=3)
+    queue.append("gastos", ["transporte", 50])
+
+    asyncio.run(queue.stop())
+
+    assert sleeps == [1, 2, 3]
+    assert service.calls == 4
+    assert service.sheets["gastos"] == [["transporte", 50]]
+    assert queue.pending == 0
+
+
+def test_rows_stay_in_the_journal_when_retries_run_out(tmp_path, sleeps):
+    journal = tmp_path / "sheets.jsonl"
+    service = FakeSheetsService(latency=0, quota_errors=2, error_status=502)
+    queue = make_queue(service, journal, max_attempts=2)
+    queue.append("gastos", ["luz", 30])
+
+    asyncio.run(queue.stop())
+
+    assert sleeps == [1]
+    assert queue.pending == 1
+    assert "gastos" not in service.sheets
+    # El siguiente arranque la recupera y la envía
+    restarted = make_queue(service, journal)
+    asyncio.run(restarted.stop())
+    assert service.sheets["gastos"] == [["luz", 30]]
+
+
+def test_client_errors_are_not_retried(tmp_path, sleeps):
+    service = FakeSheetsService(latency=0, quota_errors=1, error_status=400)
+    queue = make_queue(service, tmp_path / "sheets.jsonl")
+    queue.append("gastos", ["agua", 10])
+
+    asyncio.run(queue.stop())
+
+    assert sleeps == []
+    assert service.calls == 1
+    assert queue.pending == 1
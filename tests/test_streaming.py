@@ -0,0 +1,101 @@
+"""
+Respuestas en streaming que fallan a mitad: el error no llega como texto ni a la memoria
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import handlers.ia as ia
+import utils.faq
+import utils.openai as openai_utils
+from utils.telegram import INTERRUPTED, stream_to_message
+
+
+class FakeMessage:
+    """Mensaje de Telegram que guarda sus ediciones"""
+
+    def __init__(self):
+        self.edits = []
+
+    def get_bot(self):
+        return None
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+async def failing_chunks():
+    yield "El lavado "
+    yield "retira el mucílago"
+    raise ConnectionError("conexión cortada")
+
+
+def delta_chunk(text):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+def test_stream_response_raises_instead_of_yielding_the_error(monkeypatch):
+    class Stream:
+        async def __aiter__(self):
+            yield delta_chunk("Primera parte")
+            raise ConnectionError("conexión cortada")
+
+    async def create_completion(**kwargs):
+        return Stream(), openai_utils.OPENAI_MODEL
+
+    monkeypatch.setattr(openai_utils, "_create_completion", create_completion)
+    received = []
+
+    async def consume():
+        async for delta in openai_utils.stream_response("pregunta", use_cache=False):
+            received.append(delta)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(consume())
+    assert received == ["Primera parte"]
+
+
+def test_stream_to_message_marks_the_answer_as_interrupted():
+    message = FakeMessage()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(stream_to_message(message, failing_chunks(), title="☕ Respuesta:", footer="\n\npie"))
+
+    assert message.edits[-1] == f"☕ Respuesta:\n\nEl lavado retira el mucílago\n\n{INTERRUPTED}"
+    assert "pie" not in message.edits[-1]
+
+
+def test_interrupted_answer_is_not_remembered(monkeypatch):
+    remembered = []
+    replies = []
+    placeholder = FakeMessage()
+
+    async def no_faq(question):
+        return None
+
+    async def admit(chat_id):
+        return None
+
+    async def reply(message, text, **kwargs):
+        replies.append(text)
+
+    async def reply_text(text, **kwargs):
+        return placeholder
+
+    monkeypatch.setattr(utils.faq, "find_answer", no_faq)
+    monkeypatch.setattr(ia, "admit", admit)
+    monkeypatch.setattr(ia, "reply", reply)
+    monkeypatch.setattr(ia, "chat_history", lambda chat_id: [])
+    monkeypatch.setattr(ia, "stream_response", lambda *args, **kwargs: failing_chunks())
+    monkeypatch.setattr(ia, "remember", lambda *args: remembered.append(args))
+    update = SimpleNamespace(
+        message=SimpleNamespace(text="¿Qué es el lavado?", reply_text=reply_text),
+        effective_chat=SimpleNamespace(id=7)
+    )
+
+    assert asyncio.run(ia.handle_question(update, SimpleNamespace())) == ia.AWAIT_QUESTION
+    assert remembered == []
+    assert placeholder.edits[-1].endswith(INTERRUPTED)
+    assert len(replies) == 1 and "conexión cortada" in replies[0]
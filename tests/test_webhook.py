@@ -0,0 +1,118 @@
+"""
+Modo webhook: comprobación del token secreto y espera a las actualizaciones en curso al detenerse
+"""
+
+import asyncio
+import json
+import time
+
+from telegram.ext import Application, MessageHandler, filters
+
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramServer, recorded_message
+from utils.webhook import TelegramWebhookApp
+
+SECRET = "secreto-de-prueba"
+
+
+async def request(app, method, path, body=b"", secret=None):
+    """Petición ASGI al servidor del webhook; devuelve (estado, JSON de la respuesta)"""
+    headers = [(b"content-type", b"application/json")]
+    if secret is not None:
+        headers.append((b"x-telegram-bot-api-secret-token", secret.encode()))
+    scope = {"type": "http", "method": method, "path": path, "headers": headers}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+def update_body(update_id, text="hola"):
+    return json.dumps(recorded_message(update_id, 6000, text)).encode()
+
+
+def run_webhook(scenario, handler_seconds=0.0, drain_timeout=5.0):
+    """Ejecuta scenario(app, handled) con una aplicación cuyo manejador tarda handler_seconds"""
+
+    async def run():
+        telegram = FakeTelegramServer()
+        await telegram.start()
+        handled = []
+
+        async def handle(update, context):
+            await asyncio.sleep(handler_seconds)
+            handled.append(update.update_id)
+
+        application = (
+            Application.builder().token(FAKE_TOKEN).base_url(telegram.bot_url).concurrent_updates(8).build()
+        )
+        application.add_handler(MessageHandler(filters.TEXT, handle))
+        app = TelegramWebhookApp(application, "/telegram", secret_token=SECRET, drain_timeout=drain_timeout)
+        await app.startup()
+        try:
+            return await scenario(app, handled)
+        finally:
+            if application.running:
+                await app.shutdown()
+            await telegram.stop()
+
+    return asyncio.run(run())
+
+
+def test_updates_without_the_secret_token_are_rejected():
+    async def scenario(app, handled):
+        missing = await request(app, "POST", "/telegram", update_body(1))
+        wrong = await request(app, "POST", "/telegram", update_body(2), secret="otro")
+        valid = await request(app, "POST", "/telegram", update_body(3), secret=SECRET)
+        await app.shutdown()
+        return missing, wrong, valid, handled, app.received
+
+    missing, wrong, valid, handled, received = run_webhook(scenario)
+
+    assert missing[0] == wrong[0] == 403
+    assert valid == (200, {"ok": True})
+    assert handled == [3]
+    assert received == 1
+
+
+def test_shutdown_waits_for_updates_in_progress():
+    async def scenario(app, handled):
+        for update_id in range(1, 4):
+            assert (await request(app, "POST", "/telegram", update_body(update_id), secret=SECRET))[0] == 200
+        # Las actualizaciones están en curso (cada una tarda 0.3 s) cuando llega SIGTERM
+        await asyncio.sleep(0.05)
+        shutdown = asyncio.ensure_future(app.shutdown())
+        await asyncio.sleep(0.05)
+        health = await request(app, "GET", "/health")
+        late = await request(app, "POST", "/telegram", update_body(4), secret=SECRET)
+        handled_before = list(handled)
+        await shutdown
+        return handled_before, sorted(handled), health, late
+
+    handled_before, handled_after, health, late = run_webhook(scenario, handler_seconds=0.3)
+
+    assert handled_before == []
+    assert handled_after == [1, 2, 3]
+    assert health[0] == 503 and health[1]["status"] == "draining"
+    # Durante la parada no se aceptan más: Telegram las reintenta en otra instancia
+    assert late[0] == 503
+
+
+def test_shutdown_gives_up_after_the_drain_timeout():
+    async def scenario(app, handled):
+        await request(app, "POST", "/telegram", update_body(1), secret=SECRET)
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        await app.shutdown()
+        return time.perf_counter() - start, handled
+
+    elapsed, handled = run_webhook(scenario, handler_seconds=5.0, drain_timeout=0.2)
+
+    assert elapsed < 2.0
+    assert handled == []
@@ -0,0 +1,136 @@
+"""
+Pools de hilos y procesos por tipo de tarea y cancelación con /cancelar
+"""
+
+import asyncio
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import handlers.ia as ia
+from config import WORKER_PROCESS_TASKS
+from utils.workers import TaskCancelled, WorkerPool
+
+PRICING_TEXT = "Producto: Café oro\nPrecio actual: 12\nCosto: 8\nMargen deseado: 40%"
+
+
+def test_each_task_type_goes_to_its_pool():
+    pool = WorkerPool(threads=2, processes=1, process_tasks=["importacion"])
+
+    assert pool.pool_for("importacion") == "procesos"
+    assert pool.pool_for("json") == pool.pool_for("reportes") == "hilos"
+    # Sin procesos, todo va en hilos
+    assert WorkerPool(processes=0, process_tasks=["importacion"]).pool_for("importacion") == "hilos"
+
+
+def test_short_tasks_are_not_sent_to_processes_by_default():
+    assert "precios" not in WORKER_PROCESS_TASKS
+
+
+def test_tasks_run_outside_the_event_loop():
+    pool = WorkerPool(threads=1, processes=1, process_tasks=["importacion"])
+
+    async def run():
+        return await pool.run("importacion", os.getpid), await pool.run("json", threading.get_ident)
+
+    try:
+        process_id, thread_id = asyncio.run(run())
+    finally:
+        pool.shutdown()
+    assert process_id != os.getpid()
+    assert thread_id != threading.get_ident()
+
+
+def test_cancel_stops_the_scope_and_drops_queued_work():
+    pool = WorkerPool(threads=1, processes=0)
+    release = threading.Event()
+    ran = []
+
+    def blocking():
+        release.wait(5)
+        ran.append("primera")
+
+    def queued():
+        ran.append("en cola")
+
+    async def run():
+        async def work():
+            async with pool.cancellable(1, "precios"):
+                await pool.map("precios", lambda function: function(), [blocking, queued])
+
+        async def other_chat():
+            async with pool.cancellable(2):
+                await asyncio.sleep(0.2)
+                return "sigue"
+
+        task, other = asyncio.create_task(work()), asyncio.create_task(other_chat())
+        await asyncio.sleep(0.05)
+        assert pool.cancel(1) == 1
+        with pytest.raises(TaskCancelled):
+            await task
+        release.set()
+        return await other
+
+    try:
+        assert asyncio.run(run()) == "sigue"
+    finally:
+        pool.shutdown()
+    # La tarea en cola no llegó a empezar; la que estaba en curso termina pero su resultado se descarta
+    assert "en cola" not in ran
+    assert pool.cancel(1) == 0
+
+
+def test_other_cancellations_are_not_reported_as_user_cancellations():
+    pool = WorkerPool(threads=1, processes=0)
+
+    async def run():
+        async def work():
+            async with pool.cancellable(1):
+                await asyncio.sleep(5)
+
+        task = asyncio.create_task(work())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+
+def test_cancelar_stops_the_pricing_handler_in_progress(monkeypatch):
+    started, finished, replies = asyncio.Event(), [], []
+
+    async def optimize(data):
+        started.set()
+        await asyncio.sleep(5)
+        finished.append(data)
+
+    async def admit(chat_id, cost=1):
+        return None
+
+    async def reply(message, text, **kwargs):
+        replies.append(text)
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    monkeypatch.setattr(ia, "optimize_coffee_pricing", optimize)
+    monkeypatch.setattr(ia, "admit", admit)
+    monkeypatch.setattr(ia, "reply", reply)
+    chat = SimpleNamespace(id=8)
+    pricing = SimpleNamespace(
+        message=SimpleNamespace(text=PRICING_TEXT, reply_text=reply_text), effective_chat=chat
+    )
+    cancel = SimpleNamespace(message=SimpleNamespace(text="/cancelar", reply_text=reply_text), effective_chat=chat)
+
+    async def run():
+        handler = asyncio.create_task(ia.handle_optimization_data(pricing, SimpleNamespace()))
+        await asyncio.wait_for(started.wait(), 1)
+        assert await ia.cancel(cancel, SimpleNamespace()) == ia.ConversationHandler.END
+        return await asyncio.wait_for(handler, 1)
+
+    assert asyncio.run(run()) == ia.ConversationHandler.END
+    assert finished == []
+    assert replies == ["💰 Analizando datos de precios...", "Operación cancelada."]
@@ -0,0 +1,270 @@
+"""
+Control de admisión de las consultas de IA
+
+Se sitúa entre los manejadores de handlers/ia.py y utils/openai.py para
+que un solo usuario no acapare OpenAI (ni el gasto) mientras los demás
+esperan:
+
+- Cada chat tiene un cubo de fichas (token bucket): puede hacer una ráfaga
+  corta de consultas y después, como mucho, ADMISSION_CHAT_PER_MINUTE por
+  minuto. Si se le acaban, se le responde al momento cuándo puede volver.
+- Un cubo global limita las consultas por segundo hacia OpenAI. Cuando no
+  hay fichas, la consulta espera en una cola acotada que se atiende por
+  turnos entre chats (round-robin), de modo que un chat con muchas
+  consultas en cola no retrasa a los demás.
+- Si la cola está llena, o la espera supera ADMISSION_MAX_WAIT, se
+  responde "ocupado, inténtalo en N s".
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, Optional, Tuple
+
+from config import (
+    ADMISSION_ENABLED, ADMISSION_CHAT_PER_MINUTE, ADMISSION_CHAT_BURST,
+    ADMISSION_GLOBAL_PER_SECOND, ADMISSION_GLOBAL_BURST, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT
+)
+from utils import metrics
+
+# Cada cuántas admisiones se eliminan los cubos de chats inactivos
+PRUNE_EVERY = 1000
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+REQUESTS = metrics.counter(
+    "admission_requests_total", "Consultas de IA admitidas y rechazadas", ("result",)
+)
+
+class AdmissionRejected(Exception):
+    """La consulta no se admite; retry_after indica en cuántos segundos reintentar"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"{reason} (reintentar en {retry_after:.0f} s)")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Cubo de fichas: `capacity` fichas que se reponen a `rate` por segundo"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, cost: float = 1.0, now: Optional[float] = None) -> bool:
+        """Gasta `cost` fichas si las hay"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def refund(self, cost: float = 1.0) -> None:
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+    def wait_time(self, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """Segundos hasta que haya `cost` fichas"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+class AdmissionController:
+    """Cubos por chat y global, con cola de espera acotada y turnos entre chats"""
+
+    def __init__(self, chat_rate: float, chat_burst: float, global_rate: float, global_burst: float,
+                 max_queue: int = 50, max_wait: float = 30.0):
+        """
+        Args:
+            chat_rate: Consultas por segundo que se reponen a cada chat
+            chat_burst: Consultas seguidas que puede hacer un chat
+            global_rate: Consultas por segundo hacia OpenAI entre todos los chats
+            global_burst: Consultas seguidas permitidas globalmente
+            max_queue: Consultas que pueden esperar turno a la vez
+            max_wait: Segundos máximos de espera en la cola
+        """
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: Dict[Hashable, TokenBucket] = {}
+        # Cola por chat; el orden del diccionario es el turno
+        self._queues: "OrderedDict[Hashable, Deque[Tuple[asyncio.Future, float]]]" = OrderedDict()
+        self._depth = 0
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._admissions = 0
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_chat = 0
+        self.rejected_queue = 0
+        self.rejected_timeout = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Consultas esperando turno"""
+        return self._depth
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores para métricas y registros"""
+        return {
+            "admitidas": self.admitted,
+            "en_cola": self._depth,
+            "max_cola": self.max_depth,
+            "encoladas": self.queued,
+            "rechazadas_chat": self.rejected_chat,
+            "rechazadas_cola_llena": self.rejected_queue,
+            "rechazadas_espera": self.rejected_timeout,
+            "espera_media": round(self.total_wait / self.queued, 3) if self.queued else 0.0,
+        }
+
+    async def acquire(self, chat_id: Hashable, cost: float = 1.0) -> None:
+        """
+        Espera turno para una consulta de un chat
+
+        Args:
+            chat_id: Chat que hace la consulta
+            cost: Fichas que cuesta (p. ej. varias llamadas a OpenAI en una consulta)
+
+        Raises:
+            AdmissionRejected: Si el chat superó su límite, la cola está llena o
+                la espera supera max_wait
+        """
+        now = time.monotonic()
+        self._admissions += 1
+        if self._admissions % PRUNE_EVERY == 0:
+            self._prune(now)
+
+        chat_cost = min(cost, self.chat_burst)
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        if not bucket.consume(chat_cost, now):
+            self.rejected_chat += 1
+            REQUESTS.labels(result="rechazadas_chat").inc()
+            logger.info(f"Consulta del chat {chat_id} rechazada: superó su límite de consultas")
+            raise AdmissionRejected("límite del chat", bucket.wait_time(chat_cost, now))
+
+        global_cost = min(cost, self._global.capacity)
+        if not self._queues and self._global.consume(global_cost, now):
+            self.admitted += 1
+            REQUESTS.labels(result="admitidas").inc()
+            return
+
+        if self._depth >= self.max_queue:
+            bucket.refund(chat_cost)
+            self.rejected_queue += 1
+            REQUESTS.labels(result="rechazadas_cola_llena").inc()
+            logger.warning(f"Consulta del chat {chat_id} rechazada: cola de espera llena ({self._depth})")
+            retry_after = self._global.wait_time(global_cost, now) + self._depth / self._global.rate
+            raise AdmissionRejected("cola llena", retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, global_cost)
+        self._queues.setdefault(chat_id, deque()).append(entry)
+        self._depth += 1
+        self.queued += 1
+        self.max_depth = max(self.max_depth, self._depth)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            # Si se le dio turno justo al vencer la espera, se admite igualmente
+            if not future.done():
+                self._abandon(chat_id, entry, bucket, chat_cost)
+                self.rejected_timeout += 1
+                REQUESTS.labels(result="rechazadas_espera").inc()
+                raise AdmissionRejected(
+                    "espera agotada", self._global.wait_time(global_cost) + self._depth / self._global.rate
+                )
+        except asyncio.CancelledError:
+            if not future.done():
+                self._abandon(chat_id, entry, bucket, chat_cost)
+            raise
+        self.total_wait += time.monotonic() - now
+        self.admitted += 1
+        REQUESTS.labels(result="admitidas").inc()
+
+    def _abandon(self, chat_id: Hashable, entry: Tuple[asyncio.Future, float],
+                 bucket: TokenBucket, chat_cost: float) -> None:
+        """Saca de la cola una consulta que dejó de esperar y devuelve la ficha del chat"""
+        entry[0].cancel()
+        bucket.refund(chat_cost)
+        queue = self._queues.get(chat_id)
+        if queue and entry in queue:
+            queue.remove(entry)
+            self._depth -= 1
+            if not queue:
+                del self._queues[chat_id]
+
+    async def _dispatch(self) -> None:
+        """Da turno a las consultas en cola, un chat cada vez, según haya fichas globales"""
+        while self._queues:
+            chat_id, queue = next(iter(self._queues.items()))
+            future, cost = queue[0]
+            wait = self._global.wait_time(cost)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            if not self._global.consume(cost):
+                continue
+            queue.popleft()
+            self._depth -= 1
+            # El chat pasa al final del turno aunque le queden consultas
+            del self._queues[chat_id]
+            if queue:
+                self._queues[chat_id] = queue
+            if future.done():
+                # Abandonó la espera: se devuelve la ficha
+                self._global.refund(cost)
+            else:
+                future.set_result(None)
+
+    def _prune(self, now: float) -> None:
+        """Elimina los cubos llenos de chats sin consultas en cola"""
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items()
+                        if chat_id not in self._queues and bucket.is_full(now)]:
+            del self._chats[chat_id]
+
+def busy_message(error: AdmissionRejected) -> str:
+    """Respuesta al usuario cuando su consulta no se admite"""
+    seconds = max(1, math.ceil(error.retry_after))
+    if error.reason == "límite del chat":
+        return f"⏳ Estás enviando consultas muy seguido. Inténtalo de nuevo en {seconds} s."
+    return f"⏳ El asistente está ocupado en este momento. Inténtalo de nuevo en {seconds} s."
+
+# Controlador compartido por los manejadores de IA (None si está desactivado)
+admission: Optional[AdmissionController] = AdmissionController(
+    chat_rate=ADMISSION_CHAT_PER_MINUTE / 60,
+    chat_burst=ADMISSION_CHAT_BURST,
+    global_rate=ADMISSION_GLOBAL_PER_SECOND,
+    global_burst=ADMISSION_GLOBAL_BURST,
+    max_queue=ADMISSION_QUEUE_SIZE,
+    max_wait=ADMISSION_MAX_WAIT
+) if ADMISSION_ENABLED else None
+
+if admission is not None:
+    metrics.gauge("admission_queue_depth", "Consultas de IA esperando turno").set_function(lambda: admission.depth)
+
+async def admit(chat_id: Hashable, cost: float = 1.0) -> None:
+    """Espera turno en el controlador compartido (no hace nada si está desactivado)"""
+    if admission is not None:
+        await admission.acquire(chat_id, cost)
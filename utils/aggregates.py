@@ -0,0 +1,265 @@
+"""
+Agregados incrementales de los registros de compras, procesos, ventas y gastos
+
+En lugar de releer cada registro completo en cada análisis, el almacén
+recuerda hasta qué fila del registro columnar (utils.ledger, que importa
+solo los registros nuevos de cada CSV) ha procesado y solo suma las filas
+nuevas. Mantiene en memoria totales, sumas por proveedor/cliente/estado,
+cubetas diarias, semanales y mensuales, y las últimas N filas.
+"""
+
+import logging
+import math
+import os
+import threading
+from collections import deque
+from itertools import repeat
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from utils.ledger import (
+    AMOUNT_FIELDS, DATE_FIELDS, GROUP_FIELDS, LEDGER_FILES, PRICE_FIELDS, QUANTITY_FIELDS,
+    ColumnarLedger, load_ledger, parse_date
+)
+from utils import metrics
+
+# Filas recientes que se conservan por registro
+RECENT_ROWS = 50
+
+# Filas del registro columnar que se leen de una vez al actualizar
+REFRESH_BATCH_ROWS = 10000
+
+# Cuántas cubetas de cada periodo se incluyen en el resumen
+SUMMARY_DAYS = 14
+SUMMARY_WEEKS = 8
+SUMMARY_MONTHS = 12
+SUMMARY_GROUPS = 10
+SUMMARY_RECENT_ROWS = 10
+
+# Mismos nombres, archivos y columnas de agrupación que los índices de utils.ledger
+LEDGERS = {
+    name: {"file": path, "group_by": GROUP_FIELDS[name]}
+    for name, path in LEDGER_FILES.items()
+}
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SECONDS = metrics.histogram(
+    "aggregates_snapshot_seconds", "Duración de la instantánea de agregados de los registros"
+)
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace("$", "").replace(",", "")
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def _first_field(header: Sequence[str], candidates: Sequence[str]) -> Optional[str]:
+    for name in candidates:
+        if name in header:
+            return name
+    return None
+
+def _add(bucket: Dict[str, Dict[str, float]], key: str, amount: float, quantity: float) -> None:
+    entry = bucket.get(key)
+    if entry is None:
+        entry = bucket[key] = {"registros": 0, "total": 0.0, "cantidad": 0.0}
+    entry["registros"] += 1
+    entry["total"] += amount
+    entry["cantidad"] += quantity
+
+def _top(bucket: Dict[str, Dict[str, float]], limit: int) -> Dict[str, Dict[str, float]]:
+    items = sorted(bucket.items(), key=lambda item: item[1]["total"], reverse=True)[:limit]
+    return {key: _rounded(value) for key, value in items}
+
+def _latest(bucket: Dict[str, Dict[str, float]], limit: int) -> Dict[str, Dict[str, float]]:
+    return {key: _rounded(bucket[key]) for key in sorted(bucket)[-limit:]}
+
+def _rounded(entry: Dict[str, float]) -> Dict[str, float]:
+    return {key: round(value, 2) for key, value in entry.items()}
+
+class LedgerAggregate:
+    """Agregados de un único registro, actualizados leyendo solo las filas nuevas"""
+
+    def __init__(self, name: str, path: str, group_by: Sequence[str], recent_rows: int = RECENT_ROWS):
+        self.name = name
+        self.path = path
+        self.group_by_candidates = group_by
+        self.recent_rows = recent_rows
+        self._reset()
+
+    def _reset(self) -> None:
+        self.rows = 0
+        self.signature: Tuple[int, float] = (0, 0.0)
+        self.header: List[str] = []
+        self.fields: Dict[str, Optional[str]] = {}
+        self.count = 0
+        self.total = 0.0
+        self.quantity = 0.0
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=self.recent_rows)
+        self.by_group: Dict[str, Dict[str, float]] = {}
+        self.by_day: Dict[str, Dict[str, float]] = {}
+        self.by_week: Dict[str, Dict[str, float]] = {}
+        self.by_month: Dict[str, Dict[str, float]] = {}
+
+    def refresh(self) -> bool:
+        """
+        Procesa las filas añadidas desde la última lectura
+
+        Returns:
+            True si el registro cambió desde la última vez
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self.count:
+                self._reset()
+                return True
+            return False
+
+        # Si el CSV no cambió, tampoco su registro columnar: ni siquiera se abre
+        signature = (stat.st_size, stat.st_mtime)
+        if signature == self.signature:
+            return False
+        self.signature = signature
+
+        try:
+            ledger = load_ledger(self.path)
+        except ValueError as e:
+            # El CSV se reescribió más corto que lo ya importado (ver utils.ledger)
+            logger.error(f"No se pudieron actualizar los agregados de {self.path}: {e}")
+            return False
+        if ledger is None:
+            return False
+
+        stop = ledger.rows
+        header = [spec["name"] for spec in ledger.meta["columns"]]
+        if stop < self.rows or header != self.header:
+            # El registro se volvió a importar desde cero: hay que empezar de nuevo
+            if self.header:
+                logger.info(f"El registro {self.path} se reimportó, recalculando agregados")
+            self._reset()
+            self.signature = signature
+            self.header = header
+            self.fields = {
+                "date": _first_field(header, DATE_FIELDS),
+                "amount": _first_field(header, AMOUNT_FIELDS),
+                "quantity": _first_field(header, QUANTITY_FIELDS),
+                "price": _first_field(header, PRICE_FIELDS),
+                "group": _first_field(header, self.group_by_candidates),
+            }
+
+        for start in range(self.rows, stop, REFRESH_BATCH_ROWS):
+            self._consume(ledger, start, min(start + REFRESH_BATCH_ROWS, stop))
+        if stop > self.rows:
+            self.recent.extend(ledger.get_records(max(self.rows, stop - self.recent_rows), stop))
+            self.rows = stop
+        return True
+
+    def _consume(self, ledger: ColumnarLedger, start: int, stop: int) -> None:
+        """Suma las filas [start, stop) leyendo solo las columnas que se usan"""
+
+        def values(key: str):
+            field = self.fields[key]
+            return ledger.column(field, start, stop) if field else repeat(None, stop - start)
+
+        for day, amount, quantity, price, group in zip(
+            values("date"), values("amount"), values("quantity"), values("price"), values("group")
+        ):
+            self._add_row(day, amount, quantity, price, group)
+
+    def _add_row(self, day: Any, amount: Any, quantity: Any, price: Any, group: Any) -> None:
+        quantity = _to_float(quantity)
+        amount = _to_float(amount)
+        if amount is None and quantity is not None:
+            price = _to_float(price)
+            amount = price * quantity if price is not None else None
+        amount = amount or 0.0
+        quantity = quantity or 0.0
+
+        self.count += 1
+        self.total += amount
+        self.quantity += quantity
+
+        if self.fields["group"]:
+            label = str(group).strip() if group is not None else ""
+            _add(self.by_group, label or "(sin dato)", amount, quantity)
+
+        day = parse_date(day)
+        if day:
+            iso_year, iso_week, _ = day.isocalendar()
+            _add(self.by_day, day.isoformat(), amount, quantity)
+            _add(self.by_week, f"{iso_year}-S{iso_week:02d}", amount, quantity)
+            _add(self.by_month, f"{day.year}-{day.month:02d}", amount, quantity)
+
+    def summary(self) -> Dict[str, Any]:
+        """Resumen compacto para el análisis de IA"""
+        summary: Dict[str, Any] = {
+            "registros": self.count,
+            "total": round(self.total, 2),
+            "cantidad": round(self.quantity, 2),
+        }
+        if self.by_group:
+            summary[f"por_{self.fields['group']}"] = _top(self.by_group, SUMMARY_GROUPS)
+        if self.by_month:
+            summary["por_mes"] = _latest(self.by_month, SUMMARY_MONTHS)
+            summary["por_semana"] = _latest(self.by_week, SUMMARY_WEEKS)
+            summary["por_dia"] = _latest(self.by_day, SUMMARY_DAYS)
+        summary["ultimos"] = list(self.recent)[-SUMMARY_RECENT_ROWS:]
+        return summary
+
+class AggregationStore:
+    """Conjunto de agregados de todos los registros con una instantánea memorizada"""
+
+    def __init__(self, ledgers: Optional[Dict[str, Dict[str, Any]]] = None):
+        ledgers = ledgers or LEDGERS
+        self.ledgers = {
+            name: LedgerAggregate(name, spec["file"], spec["group_by"])
+            for name, spec in ledgers.items()
+        }
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict[str, Any]] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Devuelve los agregados actuales de todos los registros
+
+        Si ningún archivo cambió, se devuelve la instantánea anterior sin
+        recalcular nada; si cambiaron, solo se leen las filas nuevas.
+
+        Returns:
+            Diccionario con el resumen de cada registro
+        """
+        with self._lock, SNAPSHOT_SECONDS.time():
+            changed = False
+            for ledger in self.ledgers.values():
+                changed = ledger.refresh() or changed
+            if changed or self._snapshot is None:
+                self._snapshot = {name: ledger.summary() for name, ledger in self.ledgers.items()}
+            return self._snapshot
+
+    def row_counts(self) -> Dict[str, int]:
+        """Filas de cada registro (solo se leen las añadidas desde la última vez)"""
+        with self._lock:
+            for ledger in self.ledgers.values():
+                if ledger.refresh():
+                    self._snapshot = None
+            return {name: ledger.count for name, ledger in self.ledgers.items()}
+
+    def recent_rows(self, name: str) -> List[Dict[str, Any]]:
+        """Últimas filas de un registro (como máximo RECENT_ROWS)"""
+        with self._lock:
+            ledger = self.ledgers[name]
+            if ledger.refresh():
+                self._snapshot = None
+            return list(ledger.recent)
+
+# Almacén compartido por los manejadores
+ledger_store = AggregationStore()
@@ -0,0 +1,238 @@
+"""
+Caché de respuestas de OpenAI con expiración (TTL) y desalojo LRU
+
+Las respuestas se guardan en memoria y, opcionalmente, en una base SQLite
+dentro de DATA_DIR para que sobrevivan a los reinicios del bot. Las
+escrituras en disco se acumulan y se confirman juntas en un hilo aparte,
+como en utils/persistence.py: guardar una respuesta no espera al disco.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Segundos que se espera tras la primera escritura para guardar las demás en la misma transacción
+COMMIT_DELAY = 0.05
+
+# Respuestas escritas entre purgas de las entradas expiradas del disco
+PURGE_EVERY = 100
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Signos que no cambian el sentido de una pregunta ("¿Qué es...?" == "que es...")
+_EDGE_PUNCTUATION = "¿?¡!.,;: \t\n"
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normaliza un prompt para que preguntas casi idénticas compartan entrada en la caché
+
+    Args:
+        prompt: Texto original
+
+    Returns:
+        Texto en minúsculas, con espacios colapsados y sin signos en los extremos
+    """
+    text = unicodedata.normalize("NFKC", prompt).casefold()
+    text = _WHITESPACE.sub(" ", text)
+    return text.strip(_EDGE_PUNCTUATION)
+
+def make_cache_key(model: str, system_prompt: Optional[str], prompt: str, temperature: float,
+                   json_mode: bool, max_tokens: int) -> str:
+    """Genera la clave de caché para una llamada a OpenAI (con los parámetros que cambian la respuesta)"""
+    payload = json.dumps(
+        [model, normalize_prompt(system_prompt or ""), normalize_prompt(prompt), round(temperature, 2),
+         json_mode, max_tokens],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Caché LRU en memoria con TTL y un segundo nivel opcional en SQLite"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 86400, sqlite_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.commits = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        # Respuestas aún no guardadas en disco
+        self._pending: Dict[str, Tuple[float, str]] = {}
+        self._write_lock = threading.Lock()
+        self._commit_task: Optional[asyncio.Task] = None
+        self._unpurged = 0
+
+        if sqlite_path:
+            try:
+                # Las escrituras se confirman en un hilo aparte (ver _commit); en modo WAL
+                # las lecturas del bucle de eventos no esperan a las escrituras
+                self._db = sqlite3.connect(sqlite_path, timeout=30, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses "
+                    "(key TEXT PRIMARY KEY, created REAL NOT NULL, value TEXT NOT NULL)"
+                )
+                self._reader = sqlite3.connect(sqlite_path, timeout=30, check_same_thread=False)
+            except sqlite3.Error as e:
+                logger.error(f"No se pudo abrir la caché en disco {sqlite_path}: {e}")
+                self._db = None
+                self._reader = None
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Busca una respuesta en la caché
+
+        Args:
+            key: Clave generada con make_cache_key
+
+        Returns:
+            La respuesta guardada o None si no existe o ha expirado
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            value = self._get_from_disk(key, now)
+            if value is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """Guarda una respuesta en la caché (en disco, en la siguiente transacción; ver _commit)"""
+        now = time.time()
+        with self._lock:
+            self._store_in_memory(key, now, value)
+            if self._db is None:
+                return
+            self._pending[key] = (now, value)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Fuera del bucle de eventos (scripts): se guarda en el acto
+            self._commit()
+            return
+        if self._commit_task is None or self._commit_task.done():
+            self._commit_task = loop.create_task(self._commit_soon())
+
+    def stats(self) -> Dict[str, float]:
+        """Devuelve los contadores de aciertos y fallos de la caché"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "entries": len(self._entries),
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        """Vacía la caché en memoria y en disco"""
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+        if self._db is not None:
+            with self._write_lock:
+                self._db.execute("DELETE FROM responses")
+
+    async def flush(self) -> None:
+        """Guarda en disco las respuestas pendientes (se llama al cerrar el cliente de OpenAI)"""
+        if self._db is None:
+            return
+        if self._commit_task is not None and not self._commit_task.done():
+            self._commit_task.cancel()
+        await asyncio.to_thread(self._commit)
+
+    def close(self) -> None:
+        """Guarda lo pendiente y cierra la base en disco"""
+        if self._db is None:
+            return
+        self._commit()
+        with self._write_lock:
+            self._db.close()
+            self._db = None
+        self._reader.close()
+        self._reader = None
+
+    async def _commit_soon(self) -> None:
+        # Las respuestas que lleguen mientras tanto van en la misma transacción
+        await asyncio.sleep(COMMIT_DELAY)
+        while self._pending:
+            await asyncio.to_thread(self._commit)
+
+    def _commit(self) -> None:
+        """Guarda en disco todas las respuestas pendientes en una transacción"""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending or self._db is None:
+                return
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO responses (key, created, value) VALUES (?, ?, ?)",
+                    [(key, created, value) for key, (created, value) in pending.items()]
+                )
+                self._unpurged += len(pending)
+                # Purgar entradas expiradas de vez en cuando para que el archivo no crezca sin límite
+                if self._unpurged >= PURGE_EVERY:
+                    self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+                    self._unpurged = 0
+                self._db.execute("COMMIT")
+                self.commits += 1
+            except sqlite3.Error as e:
+                # Es una caché: las respuestas siguen en memoria y se pierden solo del disco
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                logger.error(f"Error al guardar en la caché en disco: {e}")
+
+    def _store_in_memory(self, key: str, created: float, value: str) -> None:
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_from_disk(self, key: str, now: float) -> Optional[str]:
+        if self._db is None:
+            return None
+        # Una respuesta pendiente de guardar pudo salir ya del nivel en memoria
+        row = self._pending.get(key)
+        if row is None:
+            try:
+                row = self._reader.execute(
+                    "SELECT created, value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Error al leer la caché en disco: {e}")
+                return None
+        if row is None or now - row[0] >= self.ttl:
+            return None
+        # Promover al nivel en memoria para las siguientes consultas
+        self._store_in_memory(key, row[0], row[1])
+        return row[1]
@@ -0,0 +1,307 @@
+"""
+Índice semántico de preguntas frecuentes
+
+Antes de enviar una consulta libre a OpenAI, se busca en un índice local de
+respuestas revisadas (data/faq.json) y de respuestas aprobadas después
+(data/faq_aprobadas.jsonl). Si la pregunta se parece lo suficiente a una
+ya respondida (similitud coseno >= FAQ_THRESHOLD), se devuelve la respuesta
+guardada sin llamar al modelo de chat.
+
+- Los embeddings se calculan con la API de embeddings de OpenAI, en lotes.
+- Se guardan normalizados en una matriz NumPy (float32) en disco, que se
+  abre con mmap; la búsqueda top-k es un producto matriz-vector.
+- Los embeddings de las preguntas de los usuarios se cachean en memoria.
+
+Reconstruir el índice tras editar data/faq.json:
+    python -m utils.faq rebuild
+Aprobar una respuesta y añadirla al índice:
+    python -m utils.faq aprobar "¿Cuánto dura la fermentación?" "Entre 12 y 36 horas..."
+Probar una búsqueda:
+    python -m utils.faq buscar "¿cuántas horas se fermenta el café?"
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import (
+    FAQ_ENABLED, FAQ_FILE, FAQ_APPROVED_FILE, FAQ_INDEX_FILE, FAQ_THRESHOLD,
+    FAQ_BATCH_SIZE, OPENAI_EMBEDDING_MODEL
+)
+from utils import metrics
+from utils.cache import normalize_prompt
+
+# Embeddings de preguntas de usuarios que se conservan en memoria
+QUERY_CACHE_SIZE = 1000
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+LOOKUPS = metrics.counter("faq_lookups_total", "Búsquedas en el índice de preguntas frecuentes", ("result",))
+SEARCH_SECONDS = metrics.histogram(
+    "faq_search_seconds", "Duración de la búsqueda top-k en la matriz de embeddings",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5)
+)
+
+async def embed_texts(texts: Sequence[str], batch_size: int = FAQ_BATCH_SIZE) -> np.ndarray:
+    """
+    Calcula los embeddings de varios textos, en lotes
+
+    Args:
+        texts: Textos a convertir
+        batch_size: Textos por llamada a la API
+
+    Returns:
+        Matriz (len(texts), dimensiones) en float32 con las filas normalizadas
+    """
+    # Import local: utils.openai crea la caché de respuestas al importarse
+    from utils.openai import get_client
+
+    client = get_client()
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = list(texts[start:start + batch_size])
+        response = await client.embeddings.create(model=OPENAI_EMBEDDING_MODEL, input=batch)
+        vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+    if not vectors:
+        return np.zeros((0, 0), dtype=np.float32)
+    return _normalize(np.asarray(vectors, dtype=np.float32))
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class FAQIndex:
+    """Preguntas con su respuesta y una matriz de embeddings normalizados"""
+
+    def __init__(self, path: str = FAQ_INDEX_FILE):
+        """
+        Args:
+            path: Archivo .npy con la matriz; los textos van en el mismo nombre con .json
+        """
+        self.path = path
+        self.meta_path = os.path.splitext(path)[0] + ".json"
+        self.entries: List[Dict[str, Any]] = []
+        self.model: Optional[str] = None
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._queries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def load(self) -> bool:
+        """Abre el índice guardado; devuelve False si no existe o es de otro modelo de embeddings"""
+        if not (os.path.exists(self.path) and os.path.exists(self.meta_path)):
+            return False
+        with open(self.meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != OPENAI_EMBEDDING_MODEL:
+            logger.warning(
+                f"El índice de preguntas frecuentes se creó con {meta.get('model')} y el modelo actual es "
+                f"{OPENAI_EMBEDDING_MODEL}; reconstrúyelo con python -m utils.faq rebuild"
+            )
+            return False
+        # Solo lectura y bajo demanda: no se copia la matriz en memoria al arrancar
+        matrix = np.load(self.path, mmap_mode="r")
+        if len(matrix) != len(meta["entries"]):
+            # Se leyó entre las dos sustituciones de save(): la siguiente consulta lo vuelve a intentar
+            logger.warning(f"El índice {self.path} no coincide con sus textos; se mantiene el anterior")
+            return False
+        with self._lock:
+            self.matrix = matrix
+            self.entries = meta["entries"]
+            self.model = meta["model"]
+        return True
+
+    def save(self) -> None:
+        """Guarda la matriz y los textos de forma atómica"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_matrix = self.path + ".tmp.npy"
+        np.save(tmp_matrix, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        tmp_meta = self.meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_matrix, self.path)
+        os.replace(tmp_meta, self.meta_path)
+
+    async def build(self, entries: Sequence[Dict[str, Any]]) -> None:
+        """Calcula los embeddings de todas las preguntas y sustituye el índice"""
+        matrix = await embed_texts([entry["pregunta"] for entry in entries])
+        with self._lock:
+            self.entries = [dict(entry) for entry in entries]
+            self.matrix = matrix
+            self.model = OPENAI_EMBEDDING_MODEL
+
+    async def add(self, entries: Sequence[Dict[str, Any]]) -> None:
+        """Añade preguntas al índice (p. ej. respuestas recién aprobadas)"""
+        matrix = await embed_texts([entry["pregunta"] for entry in entries])
+        with self._lock:
+            self.matrix = matrix if not len(self.entries) else np.vstack([self.matrix, matrix])
+            self.entries = self.entries + [dict(entry) for entry in entries]
+            self.model = OPENAI_EMBEDDING_MODEL
+
+    def search(self, vector: np.ndarray, k: int = 3) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Las k preguntas más parecidas a un embedding normalizado
+
+        Returns:
+            Lista de (similitud coseno, entrada), de mayor a menor similitud
+        """
+        with self._lock:
+            matrix, entries = self.matrix, self.entries
+        if not entries:
+            return []
+        with SEARCH_SECONDS.time():
+            scores = matrix @ vector
+            k = min(k, len(entries))
+            # argpartition evita ordenar todas las similitudes
+            top = np.argpartition(scores, -k)[-k:]
+            top = top[np.argsort(scores[top])[::-1]]
+        return [(float(scores[i]), entries[i]) for i in top]
+
+    async def query_vector(self, question: str) -> np.ndarray:
+        """Embedding de una pregunta de usuario, con caché LRU"""
+        key = normalize_prompt(question)
+        vector = self._queries.get(key)
+        if vector is not None:
+            self._queries.move_to_end(key)
+            return vector
+        vector = (await embed_texts([question]))[0]
+        self._queries[key] = vector
+        if len(self._queries) > QUERY_CACHE_SIZE:
+            self._queries.popitem(last=False)
+        return vector
+
+    async def lookup(self, question: str, threshold: float = FAQ_THRESHOLD) -> Optional[Dict[str, Any]]:
+        """
+        Respuesta guardada para una pregunta, si hay una suficientemente parecida
+
+        Args:
+            question: Pregunta del usuario
+            threshold: Similitud coseno mínima para usar la respuesta guardada
+
+        Returns:
+            La entrada con "pregunta", "respuesta" y "similitud", o None
+        """
+        if not self.entries:
+            return None
+        results = self.search(await self.query_vector(question), k=1)
+        if not results or results[0][0] < threshold:
+            LOOKUPS.labels(result="miss").inc()
+            return None
+        score, entry = results[0]
+        LOOKUPS.labels(result="hit").inc()
+        logger.info(f"Pregunta respondida desde el índice de preguntas frecuentes (similitud {score:.3f})")
+        return {**entry, "similitud": score}
+
+def load_sources(faq_file: str = FAQ_FILE, approved_file: str = FAQ_APPROVED_FILE) -> List[Dict[str, Any]]:
+    """Preguntas revisadas (JSON) y aprobadas (una línea JSON por respuesta)"""
+    entries = []
+    if os.path.exists(faq_file):
+        with open(faq_file, encoding="utf-8") as f:
+            entries.extend({**entry, "fuente": "revisada"} for entry in json.load(f))
+    if os.path.exists(approved_file):
+        with open(approved_file, encoding="utf-8") as f:
+            entries.extend({**json.loads(line), "fuente": "aprobada"} for line in f if line.strip())
+    return entries
+
+# Índice compartido por los manejadores; se abre la primera vez que se usa
+faq_index = FAQIndex()
+# Versión en disco del índice cargado: se vuelve a abrir si rebuild o aprobar lo sustituyen
+_loaded_version: Optional[Tuple[Tuple[int, int], ...]] = None
+
+def _index_version() -> Optional[Tuple[Tuple[int, int], ...]]:
+    """Inodo y fecha de modificación de la matriz y de los textos (None si no existen)"""
+    try:
+        stats = [os.stat(faq_index.path), os.stat(faq_index.meta_path)]
+    except OSError:
+        return None
+    return tuple((stat.st_ino, stat.st_mtime_ns) for stat in stats)
+
+async def find_answer(question: str) -> Optional[Dict[str, Any]]:
+    """
+    Busca una respuesta guardada para la pregunta (None si no hay o el índice está desactivado)
+
+    El índice se abre con la primera consulta y de nuevo cuando cambia en
+    disco (python -m utils.faq rebuild o aprobar, desde este u otro proceso).
+    Los fallos al calcular el embedding no interrumpen la consulta: se sigue
+    con la respuesta del modelo.
+    """
+    global _loaded_version
+    if not FAQ_ENABLED:
+        return None
+    version = _index_version()
+    if version is not None and version != _loaded_version:
+        _loaded_version = version
+        if await asyncio.to_thread(faq_index.load):
+            logger.info(f"Índice de preguntas frecuentes cargado: {len(faq_index)} respuestas")
+    try:
+        return await faq_index.lookup(question)
+    except Exception as e:
+        logger.warning(f"No se pudo consultar el índice de preguntas frecuentes: {e}")
+        return None
+
+async def approve_answer(question: str, answer: str) -> None:
+    """
+    Guarda una respuesta aprobada y la añade al índice
+
+    Args:
+        question: Pregunta tal como la haría un usuario
+        answer: Respuesta revisada
+    """
+    entry = {"pregunta": question, "respuesta": answer}
+    directory = os.path.dirname(FAQ_APPROVED_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(FAQ_APPROVED_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    if not faq_index.load():
+        await faq_index.build(load_sources())
+    else:
+        await faq_index.add([{**entry, "fuente": "aprobada"}])
+    faq_index.save()
+
+async def _main(args: argparse.Namespace) -> None:
+    from utils.openai import close_client
+
+    try:
+        if args.command == "rebuild":
+            entries = load_sources()
+            await faq_index.build(entries)
+            faq_index.save()
+            print(f"Índice reconstruido: {len(entries)} respuestas en {faq_index.path}")
+        elif args.command == "aprobar":
+            await approve_answer(args.pregunta, args.respuesta)
+            print(f"Respuesta añadida; el índice tiene {len(faq_index)} respuestas")
+        elif args.command == "buscar":
+            if not faq_index.load():
+                print("No hay índice; créalo con python -m utils.faq rebuild")
+                return
+            for score, entry in faq_index.search(await faq_index.query_vector(args.pregunta), k=args.k):
+                marker = "✓" if score >= FAQ_THRESHOLD else " "
+                print(f"{marker} {score:.3f}  {entry['pregunta']}")
+    finally:
+        await close_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Índice de preguntas frecuentes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Recalcula los embeddings de todas las respuestas")
+    approve_parser = subparsers.add_parser("aprobar", help="Añade una respuesta aprobada")
+    approve_parser.add_argument("pregunta")
+    approve_parser.add_argument("respuesta")
+    search_parser = subparsers.add_parser("buscar", help="Muestra las preguntas más parecidas")
+    search_parser.add_argument("pregunta")
+    search_parser.add_argument("-k", type=int, default=5)
+    asyncio.run(_main(parser.parse_args()))
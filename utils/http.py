@@ -0,0 +1,185 @@
+"""
+Conexiones HTTP compartidas con OpenAI, Telegram y Google Sheets
+
+Cada servicio usa un único cliente con un pool de tamaño explícito,
+proporcional a la concurrencia del bot (httpcore recorre todas las
+conexiones del pool al asignar cada petición, así que un pool sobrado
+cuesta CPU en las ráfagas), keep-alive largo (las conexiones inactivas no se cierran a los pocos
+segundos, así que no se repiten los handshakes TLS entre ráfagas), HTTP/2
+cuando está instalado el paquete h2 y plazos propios:
+
+- OpenAI: openai_http_client() se pasa como http_client a AsyncOpenAI.
+- Telegram: telegram_request() y telegram_updates_request() se pasan a
+  Application.builder().request(...) y .get_updates_request(...).
+- Google Sheets: sheets_http() es el transporte autorizado de
+  googleapiclient (httplib2 reutiliza la conexión mientras siga abierta).
+
+Con las métricas activadas se mide, por servicio, cuánto espera cada
+petición a que el pool le asigne una conexión y cuántas conexiones nuevas
+se abren.
+"""
+
+import importlib.util
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from config import (
+    HTTP2_ENABLED, HTTP_KEEPALIVE_EXPIRY, OPENAI_POOL_SIZE, OPENAI_MAX_CONCURRENCY, OPENAI_CONNECT_TIMEOUT,
+    CONCURRENT_UPDATES,
+    OPENAI_POOL_TIMEOUT, OPENAI_TIMEOUT, TELEGRAM_POOL_SIZE, TELEGRAM_POOL_TIMEOUT, TELEGRAM_CONNECT_TIMEOUT,
+    TELEGRAM_READ_TIMEOUT, SHEETS_HTTP_TIMEOUT, METRICS_ENABLED
+)
+from utils import metrics
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+POOL_WAIT_SECONDS = metrics.histogram(
+    "http_pool_wait_seconds", "Espera de cada petición hasta obtener una conexión del pool", ("backend",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+CONNECTIONS = metrics.counter(
+    "http_connections_opened_total", "Conexiones nuevas (con su handshake TCP/TLS) por servicio", ("backend",)
+)
+
+def http2_available() -> bool:
+    """Indica si se puede usar HTTP/2 (HTTP2_ENABLED y el paquete h2 instalado)"""
+    if not HTTP2_ENABLED:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.info("HTTP/2 no disponible (instala httpx[http2]); se usa HTTP/1.1")
+        return False
+    return True
+
+def pool_tracer(observe: Callable[[float], None],
+                on_connect: Optional[Callable[[], None]] = None) -> Callable[[httpx.Request], Awaitable[None]]:
+    """
+    Hook de petición de httpx que mide la espera por una conexión del pool
+
+    La espera termina cuando la petición empieza a abrir una conexión nueva
+    o a enviar sus cabeceras por una ya abierta (eventos de traza de httpcore).
+
+    Args:
+        observe: Recibe los segundos de espera de cada petición
+        on_connect: Se llama cada vez que se abre una conexión nueva
+
+    Returns:
+        Función para event_hooks={"request": [...]}
+    """
+    async def on_request(request: httpx.Request) -> None:
+        started = time.perf_counter()
+        waiting = True
+
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            nonlocal waiting
+            if event == "connection.connect_tcp.started" and on_connect is not None:
+                on_connect()
+            if waiting and (event == "connection.connect_tcp.started"
+                            or event.endswith("send_request_headers.started")):
+                waiting = False
+                observe(time.perf_counter() - started)
+
+        request.extensions["trace"] = trace
+
+    return on_request
+
+def _event_hooks(backend: str) -> Dict[str, list]:
+    """Hooks de métricas de un servicio (ninguno si las métricas están desactivadas)"""
+    if not METRICS_ENABLED:
+        return {}
+    return {"request": [pool_tracer(POOL_WAIT_SECONDS.labels(backend=backend).observe,
+                                    CONNECTIONS.labels(backend=backend).inc)]}
+
+def openai_http_client(pool_size: int = OPENAI_POOL_SIZE,
+                       event_hooks: Optional[Dict[str, list]] = None) -> httpx.AsyncClient:
+    """
+    Cliente httpx para AsyncOpenAI
+
+    Args:
+        pool_size: Conexiones simultáneas (0 = dos por llamada concurrente, por las peticiones de cobertura)
+        event_hooks: Hooks de httpx (por defecto, los de las métricas)
+
+    Returns:
+        Cliente con pool, keep-alive y plazos de OpenAI
+    """
+    pool_size = pool_size or 2 * OPENAI_MAX_CONCURRENCY
+    return httpx.AsyncClient(
+        http2=http2_available(),
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        # Cada intento lleva además su propio plazo (OPENAI_TIMEOUT, ver utils.resilience)
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT, pool=OPENAI_POOL_TIMEOUT),
+        event_hooks=_event_hooks("openai") if event_hooks is None else event_hooks,
+        follow_redirects=True
+    )
+
+def telegram_request(pool_size: int = TELEGRAM_POOL_SIZE, event_hooks: Optional[Dict[str, list]] = None) -> Any:
+    """
+    Petición HTTPX de python-telegram-bot para los métodos de la Bot API
+
+    Args:
+        pool_size: Conexiones simultáneas con la Bot API (0 = dos por actualización en paralelo)
+        event_hooks: Hooks de httpx (por defecto, los de las métricas)
+
+    Returns:
+        HTTPXRequest para Application.builder().request(...)
+    """
+    from telegram.request import HTTPXRequest
+
+    pool_size = pool_size or 2 * CONCURRENT_UPDATES
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        read_timeout=TELEGRAM_READ_TIMEOUT,
+        write_timeout=TELEGRAM_READ_TIMEOUT,
+        connect_timeout=TELEGRAM_CONNECT_TIMEOUT,
+        pool_timeout=TELEGRAM_POOL_TIMEOUT,
+        http_version="2" if http2_available() else "1.1",
+        httpx_kwargs={
+            "limits": httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            "event_hooks": _event_hooks("telegram") if event_hooks is None else event_hooks,
+        }
+    )
+
+def telegram_updates_request() -> Any:
+    """
+    Petición HTTPX para getUpdates (long polling): una sola conexión que se mantiene abierta
+
+    Returns:
+        HTTPXRequest para Application.builder().get_updates_request(...)
+    """
+    from telegram.request import HTTPXRequest
+
+    return HTTPXRequest(
+        connection_pool_size=1,
+        connect_timeout=TELEGRAM_CONNECT_TIMEOUT,
+        pool_timeout=TELEGRAM_POOL_TIMEOUT,
+        httpx_kwargs={
+            "limits": httpx.Limits(max_connections=1, max_keepalive_connections=1,
+                                   keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+        }
+    )
+
+def sheets_http(credentials: Any) -> Any:
+    """
+    Transporte autorizado de googleapiclient con plazo explícito
+
+    Args:
+        credentials: Credenciales de la cuenta de servicio
+
+    Returns:
+        AuthorizedHttp para build(..., http=...)
+    """
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+
+    return AuthorizedHttp(credentials, http=httplib2.Http(timeout=SHEETS_HTTP_TIMEOUT))
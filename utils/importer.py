@@ -0,0 +1,388 @@
+"""
+Importación masiva de compras y ventas históricas desde CSV o XLSX
+
+Para dar de alta una finca con años de historial sin repetir cada
+operación en las conversaciones de /compra y /venta. El archivo se lee en
+streaming, por bloques de IMPORT_CHUNK_ROWS filas, así que la memoria no
+depende de su tamaño:
+
+1. Cada bloque se valida en el pool de "importacion" (utils.workers): fecha,
+   números y columnas obligatorias; el total se calcula si falta. Las filas
+   inválidas se omiten y se informan con su número de línea.
+2. Las filas válidas se anexan al CSV del registro con una sola escritura
+   (y un fsync) por bloque, con el bloqueo del registro tomado (ver
+   utils.ledger.ledger_lock) para no mezclarse con las escrituras del bot;
+   los registros columnares y los agregados las leen de forma incremental.
+3. Si Google Sheets está configurado, el bloque entra en la cola de
+   escritura diferida (utils.sheets_queue) con una sola escritura en el
+   diario. Con más de IMPORT_SHEETS_MAX_PENDING filas sin enviar, la
+   importación espera a la cola antes de leer el siguiente bloque.
+
+Cada archivo importado se anota en IMPORT_LOG_FILE con su huella SHA-256,
+y volver a importarlo se rechaza para no duplicar el historial.
+
+Desde Telegram: /importar compras (o ventas) y enviar el archivo. Desde la
+línea de comandos, junto a bot.py:
+    python importar.py compras historial_compras.xlsx
+"""
+
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+import unicodedata
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import COMPRAS_FILE, VENTAS_FILE, IMPORT_CHUNK_ROWS, IMPORT_LOG_FILE, IMPORT_SHEETS_MAX_PENDING
+from utils import metrics
+from utils.ledger import ledger_lock, parse_date, parse_number
+from utils.sheets_queue import SheetsWriteQueue
+from utils.workers import worker_pool
+
+# Registros que se pueden importar: archivo, hoja de Google Sheets y columnas
+IMPORT_LEDGERS = {
+    "compras": {
+        "file": COMPRAS_FILE,
+        "sheet": "compras",
+        "columns": ("fecha", "proveedor", "tipo_cafe", "cantidad", "precio", "total"),
+        "required": ("fecha", "proveedor", "cantidad", "precio"),
+    },
+    "ventas": {
+        "file": VENTAS_FILE,
+        "sheet": "ventas",
+        "columns": ("fecha", "cliente", "tipo_cafe", "cantidad", "precio", "total"),
+        "required": ("fecha", "cliente", "cantidad", "precio"),
+    },
+}
+
+# Otros nombres habituales de las columnas en las hojas de cálculo
+COLUMN_ALIASES = {
+    "kg": "cantidad", "kilos": "cantidad", "peso": "cantidad",
+    "precio_kg": "precio", "precio_por_kg": "precio", "precio_unitario": "precio",
+    "valor_total": "total", "importe": "total", "monto": "total",
+    "tipo": "tipo_cafe", "tipo_de_cafe": "tipo_cafe", "estado": "tipo_cafe",
+    "finca": "proveedor", "comprador": "cliente",
+}
+
+NUMERIC_COLUMNS = ("cantidad", "precio", "total")
+
+# Errores de validación que se muestran (el resto solo se cuenta)
+MAX_REPORTED_ERRORS = 20
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+IMPORTED_ROWS = metrics.counter("import_rows_total", "Filas importadas por registro y resultado", ("ledger", "result"))
+
+class ImportFileError(ValueError):
+    """El archivo no se puede importar (formato, columnas o ya importado)"""
+
+def normalize_column(name: Any) -> str:
+    """Nombre de columna sin tildes, en minúsculas y con guiones bajos (p. ej. "Tipo café" → "tipo_cafe")"""
+    text = unicodedata.normalize("NFKD", str(name or "")).encode("ascii", "ignore").decode()
+    text = "_".join(text.strip().lower().replace("-", " ").split())
+    return COLUMN_ALIASES.get(text, text)
+
+def _read_csv(path: str) -> Iterator[Sequence[Any]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        # Las hojas exportadas en español suelen usar ";" como separador
+        sample = f.readline()
+        f.seek(0)
+        delimiter = ";" if sample.count(";") > sample.count(",") else ","
+        yield from csv.reader(f, delimiter=delimiter)
+
+def _read_xlsx(path: str) -> Iterator[Sequence[Any]]:
+    try:
+        # Import local: openpyxl solo hace falta para importar hojas de Excel
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError("Para importar archivos XLSX instala openpyxl (pip install openpyxl)") from None
+    # read_only: las filas se leen en streaming sin cargar el libro completo
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def read_rows(path: str) -> Iterator[Sequence[Any]]:
+    """
+    Lee en streaming las filas de un CSV o de la primera hoja de un XLSX
+
+    Args:
+        path: Archivo .csv o .xlsx
+
+    Returns:
+        Iterador de filas (la primera es el encabezado)
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return _read_csv(path)
+    if extension in (".xlsx", ".xlsm"):
+        return _read_xlsx(path)
+    raise ImportFileError(f"Formato no admitido: {extension or 'sin extensión'} (usa CSV o XLSX)")
+
+def read_chunks(path: str, chunk_rows: int = IMPORT_CHUNK_ROWS) -> Iterator[Tuple[int, List[Sequence[Any]]]]:
+    """
+    Agrupa las filas de datos en bloques
+
+    Args:
+        path: Archivo .csv o .xlsx
+        chunk_rows: Filas por bloque
+
+    Returns:
+        Iterador de (línea de la primera fila, filas); antes, (0, [encabezado])
+    """
+    rows = read_rows(path)
+    header = next(rows, None)
+    if header is None:
+        raise ImportFileError("El archivo está vacío")
+    yield 0, [header]
+    chunk: List[Sequence[Any]] = []
+    line = 2
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield line, chunk
+            line += len(chunk)
+            chunk = []
+    if chunk:
+        yield line, chunk
+
+def _format_number(number: float) -> str:
+    if number.is_integer():
+        return str(int(number))
+    return f"{number:.6f}".rstrip("0").rstrip(".")
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def validate_chunk(ledger: str, header: Sequence[str], target: Sequence[str], rows: List[Sequence[Any]],
+                   first_line: int) -> Tuple[List[List[str]], List[Tuple[int, str]], int]:
+    """
+    Valida un bloque de filas y las ordena según las columnas del registro
+
+    Se ejecuta en el pool de "importacion" (un proceso aparte por defecto).
+
+    Args:
+        ledger: "compras" o "ventas"
+        header: Columnas del archivo, ya normalizadas
+        target: Columnas del CSV del registro
+        rows: Filas del bloque
+        first_line: Línea del archivo de la primera fila
+
+    Returns:
+        (filas válidas, [(línea, motivo)] de las primeras inválidas, total de inválidas)
+    """
+    required = IMPORT_LEDGERS[ledger]["required"]
+    positions = {name: i for i, name in enumerate(header) if name}
+    valid: List[List[str]] = []
+    errors: List[Tuple[int, str]] = []
+    invalid = 0
+
+    for offset, row in enumerate(rows):
+        values = {name: _text(row[i]) if i < len(row) else "" for name, i in positions.items()}
+        if not any(values.values()):
+            continue
+        try:
+            missing = [name for name in required if not values.get(name)]
+            if missing:
+                raise ValueError(f"faltan {', '.join(missing)}")
+            day = parse_date(values["fecha"])
+            if day is None:
+                raise ValueError(f"fecha no válida: {values['fecha']}")
+            values["fecha"] = day.isoformat()
+            for name in NUMERIC_COLUMNS:
+                if values.get(name):
+                    number = parse_number(values[name])
+                    if number is None or number < 0:
+                        raise ValueError(f"{name} no válido: {values[name]}")
+                    values[name] = _format_number(number)
+            if float(values["cantidad"]) <= 0:
+                raise ValueError("la cantidad debe ser mayor que cero")
+            if not values.get("total"):
+                values["total"] = _format_number(round(float(values["cantidad"]) * float(values["precio"]), 2))
+        except ValueError as e:
+            invalid += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append((first_line + offset, str(e)))
+            continue
+        valid.append([values.get(name, "") for name in target])
+
+    return valid, errors, invalid
+
+def file_digest(path: str) -> str:
+    """Huella SHA-256 del archivo (para no importarlo dos veces)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def find_import(digest: str, log_path: str = IMPORT_LOG_FILE) -> Optional[Dict[str, Any]]:
+    """Importación anterior del mismo archivo, o None"""
+    if not os.path.exists(log_path):
+        return None
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("sha256") == digest:
+                return entry
+    return None
+
+def _target_columns(file_path: str, ledger: str) -> List[str]:
+    """Columnas del CSV del registro (las de su encabezado si ya existe)"""
+    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+        with open(file_path, newline="", encoding="utf-8-sig") as f:
+            header = next(csv.reader(f), None)
+        if header:
+            return [normalize_column(column) for column in header]
+    return list(IMPORT_LEDGERS[ledger]["columns"])
+
+def _append_csv(file_path: str, header: List[str], rows: List[List[str]]) -> None:
+    """
+    Anexa las filas al CSV con una sola escritura y un fsync
+
+    Toma el bloqueo del registro (ver utils.ledger.ledger_lock), el mismo que
+    el bot y otras importaciones, y escribe el encabezado solo si el CSV sigue
+    vacío con el bloqueo tomado.
+    """
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    with ledger_lock(file_path), open(file_path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if f.tell() == 0:
+            writer.writerow(header)
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+
+async def _store_chunk(file_path: str, header: List[str], rows: List[List[str]], sheet: str,
+                       sheets: Optional[SheetsWriteQueue], state: Dict[str, Any]) -> None:
+    """
+    Escribe un bloque en el CSV (desde un hilo) y lo encola para Google Sheets
+
+    Un bloque empezado se termina aunque llegue /cancelar, para que el CSV,
+    Google Sheets y el recuento de filas importadas coincidan.
+    """
+    write = asyncio.ensure_future(asyncio.to_thread(_append_csv, file_path, header, rows))
+    cancelled = False
+    try:
+        await asyncio.shield(write)
+    except asyncio.CancelledError:
+        cancelled = True
+        await write
+    if sheets is not None:
+        sheets.append_many(sheet, rows)
+    state["importadas"] += len(rows)
+    IMPORTED_ROWS.labels(ledger=state["registro"], result="ok").inc(len(rows))
+    if cancelled:
+        raise asyncio.CancelledError
+
+def _log_import(log_path: str, entry: Dict[str, Any]) -> None:
+    """Anota un archivo importado en el registro de importaciones"""
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+async def import_file(path: str, ledger: str, file_path: Optional[str] = None,
+                      progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+                      sheets: Optional[SheetsWriteQueue] = None,
+                      chunk_rows: int = IMPORT_CHUNK_ROWS, dry_run: bool = False, force: bool = False,
+                      log_path: str = IMPORT_LOG_FILE, source_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Importa un archivo CSV o XLSX a un registro
+
+    Args:
+        path: Archivo a importar
+        ledger: "compras" o "ventas"
+        file_path: CSV del registro (por defecto, el de config)
+        progress: Se llama tras cada bloque con el estado de la importación
+        sheets: Cola de escritura de Google Sheets (None = no se envían)
+        chunk_rows: Filas por bloque
+        dry_run: Si es True, solo se valida (no se escribe nada)
+        force: Si es True, se importa aunque el archivo ya se haya importado
+        log_path: Registro de archivos importados
+        source_name: Nombre original del archivo (para el registro de importaciones)
+
+    Returns:
+        Estado final: filas leídas, importadas, inválidas, errores, segundos y filas por segundo
+
+    Raises:
+        ImportFileError: Si el archivo no se puede importar
+    """
+    if ledger not in IMPORT_LEDGERS:
+        raise ImportFileError(f"Registro desconocido: {ledger} (usa {' o '.join(IMPORT_LEDGERS)})")
+    spec = IMPORT_LEDGERS[ledger]
+    file_path = file_path or spec["file"]
+
+    digest = await asyncio.to_thread(file_digest, path)
+    previous = None if force or dry_run else await asyncio.to_thread(find_import, digest, log_path)
+    if previous:
+        partial = "" if previous.get("completa", True) else ", importación cancelada a medias"
+        raise ImportFileError(
+            f"Este archivo ya se importó en {previous['registro']} el {previous['fecha']} "
+            f"({previous['importadas']} filas{partial})"
+        )
+
+    state: Dict[str, Any] = {
+        "registro": ledger, "leidas": 0, "importadas": 0, "invalidas": 0, "errores": [],
+        "segundos": 0.0, "filas_por_segundo": 0.0, "simulacion": dry_run,
+    }
+    start = time.perf_counter()
+    chunks = read_chunks(path, chunk_rows)
+    # El archivo se lee en un hilo, un bloque cada vez
+    _, (raw_header,) = await asyncio.to_thread(next, chunks)
+    header = [normalize_column(name) for name in raw_header]
+    missing = [name for name in spec["required"] if name not in header]
+    if missing:
+        raise ImportFileError(f"Faltan columnas en el archivo: {', '.join(missing)}")
+    target = await asyncio.to_thread(_target_columns, file_path, ledger)
+
+    finished = False
+    try:
+        while True:
+            item = await asyncio.to_thread(next, chunks, None)
+            if item is None:
+                break
+            first_line, rows = item
+            valid, errors, invalid = await worker_pool.run(
+                "importacion", validate_chunk, ledger, header, target, rows, first_line
+            )
+            state["leidas"] += len(rows)
+            state["invalidas"] += invalid
+            state["errores"].extend(errors[:MAX_REPORTED_ERRORS - len(state["errores"])])
+            IMPORTED_ROWS.labels(ledger=ledger, result="invalida").inc(invalid)
+            if valid and not dry_run:
+                await _store_chunk(file_path, target, valid, spec["sheet"], sheets, state)
+                if sheets is not None and not await sheets.wait_pending(IMPORT_SHEETS_MAX_PENDING):
+                    logger.warning("Google Sheets no acepta filas; la importación sigue y las filas quedan en el diario")
+            state["segundos"] = time.perf_counter() - start
+            state["filas_por_segundo"] = state["leidas"] / state["segundos"] if state["segundos"] else 0.0
+            if progress is not None:
+                await progress(state)
+        finished = True
+    finally:
+        # También se anota una importación cancelada: sus filas ya están en el registro
+        if not dry_run and state["importadas"]:
+            _log_import(log_path, {
+                "sha256": digest, "archivo": source_name or os.path.basename(path), "registro": ledger,
+                "importadas": state["importadas"], "completa": finished,
+                "fecha": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            })
+
+    logger.info(
+        f"Importación de {ledger}: {state['importadas']} filas importadas, {state['invalidas']} inválidas "
+        f"en {state['segundos']:.1f} s"
+    )
+    return state
@@ -0,0 +1,1277 @@
+"""
+Almacenamiento columnar de solo anexado para los registros de café
+
+Cada registro CSV (p. ej. data/compras.csv) puede tener a su lado un
+directorio columnar (data/compras.ledger) con un archivo binario por
+columna y tipos fijos:
+
+- float: valores float64 (8 bytes por fila) más un archivo de sumas
+  acumuladas para sumar cualquier rango en O(1)
+- int: valores int64, también con sumas acumuladas
+- date: ordinal del día en int64
+- str: desplazamientos uint64 (8 bytes por fila) y un archivo con los
+  textos UTF-8 concatenados
+
+Los tipos se deducen de las primeras filas al importar. Si después llega
+un valor que no cabe (decimales en una columna int, texto en una numérica),
+la columna se amplía a float o a str reescribiendo sus filas: nunca se
+trunca ni se guarda un 0 en su lugar. Los números aceptan coma decimal
+("1,5") igual que utils.importer.
+
+La lectura se hace sobre mmap, de modo que leer las últimas 50 filas o
+sumar una columna cuesta O(resultado) y no O(archivo). El CSV sigue siendo
+la fuente de verdad: las filas nuevas se importan de forma incremental
+desde el último byte leído.
+
+Varios procesos del bot (polling y webhook, importar.py) pueden usar el
+mismo data/: cada escritura toma un bloqueo de archivo (fcntl.flock en
+data/<registro>.ledger.lock, ver ledger_lock), el mismo que toman quienes
+anexan filas al CSV, y antes de escribir vuelve a leer schema.json por si
+otro proceso anexó filas o cambió el esquema.
+
+Cada registro mantiene además índices secundarios que se actualizan al
+anexar: la columna de fecha ordenada (rangos por búsqueda binaria) y las
+columnas de agrupación (proveedor, cliente, estado...) con sus filas y
+totales por valor. Así "ventas entre D1 y D2" o "inventario por estado"
+cuestan O(resultado) y no dependen de los años de historial.
+
+Uso desde la línea de comandos (importación inicial):
+    python -m utils.ledger import data/compras.csv data/ventas.csv
+"""
+
+import argparse
+import codecs
+import csv
+import json
+import logging
+import math
+import mmap
+import os
+import pickle
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: el bloqueo solo excluye a los hilos del mismo proceso
+    fcntl = None
+
+from config import COMPRAS_FILE, PROCESO_FILE, VENTAS_FILE, GASTOS_FILE
+from utils import metrics
+
+# Registros del bot por nombre (el del CSV sin extensión)
+LEDGER_FILES = {
+    "compras": COMPRAS_FILE,
+    "proceso": PROCESO_FILE,
+    "ventas": VENTAS_FILE,
+    "gastos": GASTOS_FILE,
+}
+
+# Columnas que se buscan en cada registro. Se aceptan varios nombres para
+# tolerar las distintas versiones de los encabezados de los CSV; los
+# agregados, los reportes y los índices usan las mismas listas.
+DATE_FIELDS = ("fecha", "fecha_registro", "date")
+AMOUNT_FIELDS = ("total", "preciototal", "precio_total", "monto", "importe")
+QUANTITY_FIELDS = ("cantidad", "kg", "peso")
+PRICE_FIELDS = ("precio", "precio_kg", "precio_unitario")
+
+# Columnas de agrupación de cada registro, en orden de preferencia: se
+# indexan todas las que existan y los agregados agrupan por la primera
+GROUP_FIELDS = {
+    "compras": ("proveedor", "estado"),
+    "proceso": ("destino", "estado", "tipo"),
+    "ventas": ("cliente",),
+    "gastos": ("categoria", "tipo"),
+}
+
+TYPE_CODES = {"float": "d", "int": "q", "date": "q", "str": "Q"}
+NUMERIC_TYPES = ("float", "int")
+
+# Filas que se examinan para deducir el tipo de cada columna al importar
+TYPE_SAMPLE_ROWS = 1000
+
+# Filas que se convierten y escriben de una vez al importar un CSV
+IMPORT_BATCH_ROWS = 10000
+
+# Filas nuevas a partir de las cuales se vuelve a guardar la copia de los índices
+INDEX_SNAPSHOT_ROWS = 50000
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_INTEGER = re.compile(r"^-?\d+$")
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+OPERATION_SECONDS = metrics.histogram(
+    "ledger_operation_seconds", "Duración de las lecturas y sincronizaciones de los registros locales",
+    ("ledger", "operation")
+)
+
+def parse_date(value: Any) -> Optional[date]:
+    """Interpreta las fechas de los registros (AAAA-MM-DD o DD/MM/AAAA, con o sin hora)"""
+    if not value:
+        return None
+    text = str(value).strip()[:10]
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in ("%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def parse_number(value: Any) -> Optional[float]:
+    """
+    Interpreta un número de una hoja de cálculo, con separador decimal "." o ","
+
+    "1,500" y "1.500.000" llevan separador de miles; "50,5" y "1.234,56",
+    coma decimal (exportaciones con configuración regional en español).
+
+    Args:
+        value: Texto o número de la celda
+
+    Returns:
+        El número, o None si no es válido
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value or "").strip().replace("$", "").replace(" ", "")
+    if not text:
+        return None
+    if "," in text and "." in text:
+        thousands = "." if text.rfind(",") > text.rfind(".") else ","
+        text = text.replace(thousands, "").replace(",", ".")
+    elif "," in text:
+        text = text.replace(",", "") if re.fullmatch(r"-?\d{1,3}(,\d{3})+", text) else text.replace(",", ".")
+    elif text.count(".") > 1:
+        text = text.replace(".", "")
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def read_csv_records(path: str, offset: int = 0) -> Tuple[List[List[str]], int]:
+    """
+    Lee los registros completos de un CSV a partir de un byte
+
+    El archivo se lee en binario y las líneas solo se cortan en "\\n"
+    (csv.writer termina cada registro en "\\r\\n"), así que \\x0b, \\x1c o
+    \\u2028 dentro de un campo no parten el registro, y csv.reader une los
+    campos entre comillas que contienen saltos de línea. Un registro a medio
+    escribir al final del archivo (sin su salto de línea o con comillas sin
+    cerrar) se deja para la próxima lectura.
+
+    Args:
+        path: Archivo CSV
+        offset: Byte en el que empieza un registro (0 para leer desde el encabezado)
+
+    Returns:
+        (registros, byte siguiente al último registro completo)
+    """
+    end = consumed = offset
+    exhausted = False
+    records = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+
+        def lines():
+            nonlocal consumed, exhausted
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if consumed == 0 and line.startswith(codecs.BOM_UTF8):
+                    consumed += len(codecs.BOM_UTF8)
+                    line = line[len(codecs.BOM_UTF8):]
+                consumed += len(line)
+                yield line.decode("utf-8")
+            exhausted = True
+
+        for values in csv.reader(lines()):
+            # El lector devuelve el registro pendiente al agotarse las líneas: está incompleto
+            if exhausted:
+                break
+            records.append(values)
+            end = consumed
+    return records, end
+
+def ledger_path_for(file_path: str) -> str:
+    """Directorio columnar asociado a un registro CSV"""
+    return os.path.splitext(file_path)[0] + ".ledger"
+
+def ledger_name(file_path: str) -> str:
+    """Nombre de un registro: el de su CSV sin extensión (p. ej. "ventas")"""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+class FileLock:
+    """
+    Bloqueo exclusivo entre procesos (fcntl.flock) y entre hilos
+
+    Es reentrante en el mismo hilo: sync_from_csv lo toma y después anexa al
+    registro, que vuelve a tomarlo. Hay un único objeto por archivo y
+    proceso (ver file_lock), porque flock sobre dos descriptores del mismo
+    proceso también se bloquea.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, "ab")
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            # Cerrar el descriptor libera el flock
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+_file_locks: Dict[str, FileLock] = {}
+_file_locks_lock = threading.Lock()
+
+def file_lock(path: str) -> FileLock:
+    """Bloqueo de un archivo, compartido por todos los hilos del proceso"""
+    path = os.path.abspath(path)
+    with _file_locks_lock:
+        lock = _file_locks.get(path)
+        if lock is None:
+            lock = _file_locks[path] = FileLock(path)
+        return lock
+
+def ledger_lock(file_path: str) -> FileLock:
+    """
+    Bloqueo de un registro CSV y de su registro columnar
+
+    Lo toman la importación al registro columnar y quien anexa filas al CSV
+    (p. ej. utils.importer), en este o en otro proceso.
+    """
+    return file_lock(ledger_path_for(file_path) + ".lock")
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_-]", "_", name) or "columna"
+
+class _MappedArray:
+    """Vista de solo lectura sobre un archivo binario, remapeada cuando crece"""
+
+    def __init__(self, path: str, code: str):
+        self.path = path
+        self.code = code
+        self.itemsize = array(code).itemsize
+        self._mm: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        self._length = 0
+
+    def view(self, items: int) -> memoryview:
+        """Vista con al menos `items` elementos"""
+        size = items * self.itemsize
+        if self._view is None or self._length < size:
+            self.close()
+            # Se proyecta el archivo entero para no remapear en cada lectura secuencial
+            file_size = os.path.getsize(self.path) if size else 0
+            size = max(size, file_size - file_size % self.itemsize)
+            if size:
+                with open(self.path, "rb") as f:
+                    self._mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._mm).cast(self.code) if self.code != "B" else memoryview(self._mm)
+            else:
+                self._view = memoryview(b"").cast(self.code) if self.code != "B" else memoryview(b"")
+            self._length = size
+        return self._view
+
+    def close(self) -> None:
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._length = 0
+
+class _WrongType(Exception):
+    """Un valor no cabe en el tipo de su columna: hay que ampliarla a `type`"""
+
+    def __init__(self, type_: str):
+        super().__init__(type_)
+        self.type = type_
+
+class _Column:
+    """Archivos de una columna y su lectura/escritura"""
+
+    def __init__(self, directory: str, name: str, type_: str, file: Optional[str] = None):
+        self.name = name
+        self.type = type_
+        # Las columnas ampliadas de tipo se escriben en archivos nuevos (ver ColumnarLedger._widen)
+        base = os.path.join(directory, file or _safe_name(name))
+        self.values_path = base + (".off" if type_ == "str" else ".bin")
+        self.data_path = base + ".dat" if type_ == "str" else None
+        self.sum_path = base + ".sum" if type_ in NUMERIC_TYPES else None
+        self.values = _MappedArray(self.values_path, TYPE_CODES[type_])
+        self.data = _MappedArray(self.data_path, "B") if self.data_path else None
+        self.sums = _MappedArray(self.sum_path, "d") if self.sum_path else None
+        self.last_offset = 0
+        self.last_sum = 0.0
+
+    def encode(self, raw: Any) -> Any:
+        """
+        Convierte un valor del CSV al tipo de la columna
+
+        Raises:
+            _WrongType: Si el valor no cabe en la columna sin perder información
+                (decimales en una columna int, texto en una numérica o de fecha)
+        """
+        if self.type == "str":
+            return "" if raw is None else str(raw)
+        if raw is None or (isinstance(raw, str) and not raw.strip()):
+            return math.nan if self.type == "float" else 0
+        if self.type == "date":
+            if isinstance(raw, date):
+                return raw.toordinal()
+            parsed = parse_date(raw)
+            if parsed is None:
+                raise _WrongType("str")
+            return parsed.toordinal()
+        try:
+            number = parse_number(raw)
+        except (TypeError, ValueError):
+            number = None
+        if number is None:
+            raise _WrongType("str")
+        if self.type == "float":
+            return number
+        if not number.is_integer():
+            raise _WrongType("float")
+        return int(number)
+
+    def decode(self, row: int) -> Any:
+        value = self.values.view(row + 1)[row]
+        if self.type == "str":
+            start = self.values.view(row + 1)[row - 1] if row else 0
+            return bytes(self.data.view(value)[start:value]).decode("utf-8")
+        if self.type == "date":
+            return date.fromordinal(value).isoformat() if value > 0 else None
+        if self.type == "float" and math.isnan(value):
+            return None
+        return value
+
+    def write(self, values: Sequence[Any]) -> None:
+        """Anexa valores ya convertidos al final de los archivos de la columna"""
+        if self.type == "str":
+            encoded = [value.encode("utf-8") for value in values]
+            offsets = array("Q")
+            for item in encoded:
+                self.last_offset += len(item)
+                offsets.append(self.last_offset)
+            # Primero los datos y luego los desplazamientos, para no apuntar nunca a datos inexistentes
+            with open(self.data_path, "ab") as f:
+                f.write(b"".join(encoded))
+            with open(self.values_path, "ab") as f:
+                f.write(offsets.tobytes())
+            return
+
+        with open(self.values_path, "ab") as f:
+            f.write(array(TYPE_CODES[self.type], values).tobytes())
+        if self.sum_path:
+            sums = array("d")
+            for value in values:
+                if not (isinstance(value, float) and math.isnan(value)):
+                    self.last_sum += value
+                sums.append(self.last_sum)
+            with open(self.sum_path, "ab") as f:
+                f.write(sums.tobytes())
+
+    def repair(self, rows: int) -> None:
+        """Recorta los archivos a `rows` filas (descarta una escritura interrumpida)"""
+        self.close()
+        for path in (self.values_path, self.sum_path):
+            if path:
+                _truncate(path, rows * 8)
+        self.last_offset = self.values.view(rows)[rows - 1] if rows and self.type == "str" else 0
+        self.last_sum = self.sums.view(rows)[rows - 1] if rows and self.sums else 0.0
+        if self.data_path:
+            self.close()
+            _truncate(self.data_path, self.last_offset)
+        self.close()
+
+    def close(self) -> None:
+        for mapped in (self.values, self.data, self.sums):
+            if mapped:
+                mapped.close()
+
+def _format_value(value: Any) -> str:
+    """Texto de un valor numérico o de fecha al pasar su columna a str"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _truncate(path: str, size: int) -> None:
+    if not os.path.exists(path):
+        open(path, "wb").close()
+    if os.path.getsize(path) != size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
+
+def _to_ordinal(value: Union[str, date, None]) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, date):
+        return value.toordinal()
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"Fecha no válida: {value}")
+    return parsed.toordinal()
+
+class _DateIndex:
+    """Filas ordenadas por fecha para responder rangos con búsqueda binaria"""
+
+    def __init__(self, column: str):
+        self.column = column
+        self.days = array("q")
+        self.rows = array("q")
+
+    def add(self, row: int, day: int) -> None:
+        # Lo habitual es anexar en orden cronológico; una fecha atrasada se inserta en su sitio
+        if not self.days or day >= self.days[-1]:
+            self.days.append(day)
+            self.rows.append(row)
+        else:
+            position = bisect_right(self.days, day)
+            self.days.insert(position, day)
+            self.rows.insert(position, row)
+
+    def between(self, start: Optional[int], end: Optional[int]) -> array:
+        low = bisect_left(self.days, start) if start is not None else bisect_right(self.days, 0)
+        high = bisect_right(self.days, end) if end is not None else len(self.days)
+        return self.rows[low:high]
+
+class _KeyIndex:
+    """Filas y totales de las columnas numéricas por cada valor de una columna"""
+
+    def __init__(self, column: str):
+        self.column = column
+        self.rows: Dict[str, array] = {}
+        self.totals: Dict[str, Dict[str, float]] = {}
+
+    def add(self, row: int, key: str, numbers: Dict[str, Any]) -> None:
+        rows = self.rows.get(key)
+        if rows is None:
+            rows = self.rows[key] = array("q")
+            self.totals[key] = {"registros": 0}
+        rows.append(row)
+        totals = self.totals[key]
+        totals["registros"] += 1
+        for name, value in numbers.items():
+            if not (isinstance(value, float) and math.isnan(value)):
+                totals[name] = totals.get(name, 0) + value
+
+class ColumnarLedger:
+    """Registro columnar de solo anexado con lectura sobre mmap"""
+
+    def __init__(self, path: str, columns: Optional[Sequence[Dict[str, str]]] = None):
+        """
+        Abre (o crea) un registro columnar
+
+        Args:
+            path: Directorio del registro
+            columns: Esquema [{"name": ..., "type": ...}], obligatorio al crear
+        """
+        self.path = path
+        self.meta_path = os.path.join(path, "schema.json")
+        self.index_path = os.path.join(path, "indexes.pickle")
+        self._lock = threading.RLock()
+        # Otros procesos pueden escribir el mismo registro (ver ledger_lock)
+        self.file_lock = file_lock(path + ".lock")
+        # Filas escritas con commit=False que aún no están en schema.json
+        self._pending = False
+        # Archivos de columnas ampliadas que se borran al confirmar el nuevo esquema
+        self._obsolete: List[str] = []
+        self.columns: Dict[str, _Column] = {}
+
+        with self.file_lock:
+            if os.path.exists(self.meta_path):
+                self.meta = self._read_meta()
+            else:
+                if not columns:
+                    raise ValueError(f"El registro {path} no existe y no se indicó su esquema")
+                os.makedirs(path, exist_ok=True)
+                self.meta = {"columns": list(columns), "rows": 0, "source": None}
+                self._save_meta()
+            self._open_columns()
+
+    def _read_meta(self) -> Dict[str, Any]:
+        with open(self.meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _open_columns(self) -> None:
+        """Abre las columnas de self.meta y carga los índices (con el bloqueo de archivo tomado)"""
+        for column in self.columns.values():
+            column.close()
+        self.columns = {
+            spec["name"]: _Column(self.path, spec["name"], spec["type"], spec.get("file"))
+            for spec in self.meta["columns"]
+        }
+        # El número de filas de schema.json es el confirmado: lo que haya de más viene de una escritura interrumpida
+        for column in self.columns.values():
+            column.repair(self.rows)
+
+        self._date_index: Optional[_DateIndex] = None
+        self._key_indexes: Dict[str, _KeyIndex] = {}
+        self._snapshot_rows = 0
+        if self.meta.get("indexes"):
+            self._load_indexes()
+
+    def reload(self) -> None:
+        """
+        Vuelve a leer schema.json por si otro proceso anexó filas o cambió el esquema
+
+        Se llama con el bloqueo de archivo tomado, antes de escribir. Las
+        filas nuevas se indexan sin volver a leer el resto.
+        """
+        with self.file_lock, self._lock:
+            if self._pending or not os.path.exists(self.meta_path):
+                return
+            meta = self._read_meta()
+            if meta == self.meta:
+                return
+            rows = self.rows
+            same_layout = (meta["columns"] == self.meta["columns"]
+                           and meta.get("indexes") == self.meta.get("indexes") and meta["rows"] >= rows)
+            self.meta = meta
+            if not same_layout:
+                self._open_columns()
+                return
+            # Recalcula el último desplazamiento y la última suma de cada columna
+            for column in self.columns.values():
+                column.repair(self.rows)
+            self._index_range(rows, self.rows)
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _save_meta(self) -> None:
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+
+    def append_many(self, records: Iterable[Dict[str, Any]], source: Optional[Dict[str, Any]] = None,
+                    commit: bool = True) -> int:
+        """
+        Anexa registros al final
+
+        Args:
+            records: Diccionarios con los valores de cada columna
+            source: Posición de lectura del CSV de origen, que se confirma junto con las filas
+            commit: Si es False, las filas no se confirman en schema.json hasta la
+                siguiente llamada con commit=True (útil para importar varios lotes
+                de forma atómica); quien llama debe tener tomado file_lock hasta entonces
+
+        Returns:
+            Número de filas añadidas
+        """
+        records = list(records)
+        with self.file_lock, self._lock:
+            self.reload()
+            if records:
+                encoded: Dict[str, List[Any]] = {}
+                for name in list(self.columns):
+                    while name not in encoded:
+                        try:
+                            encoded[name] = [self.columns[name].encode(record.get(name)) for record in records]
+                        except _WrongType as e:
+                            self._widen(name, e.type)
+                for name, column in self.columns.items():
+                    column.write(encoded[name])
+                first = self.rows
+                self.meta["rows"] += len(records)
+                self._index_values(first, encoded)
+            if source is not None:
+                self.meta["source"] = source
+            self._pending = not commit and (self._pending or bool(records))
+            if commit and (records or source is not None or self._obsolete):
+                self._save_meta()
+                if self._obsolete or self.rows - self._snapshot_rows >= INDEX_SNAPSHOT_ROWS:
+                    self._save_indexes()
+                for path in self._obsolete:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                self._obsolete = []
+        return len(records)
+
+    def _widen(self, name: str, type_: str) -> None:
+        """
+        Cambia el tipo de una columna reescribiendo sus filas en archivos nuevos
+
+        Se usa cuando llega un valor que no cabe en el tipo deducido al
+        importar (p. ej. 12.5 en una columna int): nunca se trunca ni se
+        descarta. El nuevo esquema se confirma en schema.json junto con las
+        filas que se están anexando; hasta entonces los archivos anteriores
+        siguen intactos y son los que ve cualquier otro proceso.
+        """
+        old = self.columns[name]
+        values = [old.decode(row) for row in range(self.rows)]
+        if type_ == "str":
+            values = ["" if value is None else _format_value(value) for value in values]
+        else:
+            values = [math.nan if value is None else float(value) for value in values]
+        file = f"{_safe_name(name)}.{type_}"
+        column = _Column(self.path, name, type_, file)
+        # Puede haber restos de una ampliación interrumpida con el mismo nombre
+        column.repair(0)
+        column.write(values)
+        old.close()
+        self._obsolete.extend(path for path in (old.values_path, old.data_path, old.sum_path) if path)
+        self.columns[name] = column
+        self.meta["columns"] = [
+            dict(spec, type=type_, file=file) if spec["name"] == name else spec for spec in self.meta["columns"]
+        ]
+        indexes = self.meta.get("indexes")
+        if indexes and indexes.get("date") == name:
+            self.meta["indexes"] = dict(indexes, date=None)
+        # Los totales de los índices incluyen las columnas numéricas: se recalculan
+        self._reset_indexes()
+        self._index_range(0, self.rows)
+        logger.warning(f"La columna {name} de {self.path} pasa de {old.type} a {type_}")
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Anexa un único registro"""
+        self.append_many([record])
+
+    def get_records(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Lee un rango de filas
+
+        Args:
+            start: Primera fila (incluida)
+            stop: Última fila (excluida); por defecto, el final
+
+        Returns:
+            Lista de diccionarios con valores tipados
+        """
+        with self._lock:
+            start, stop, _ = slice(start, stop).indices(self.rows)
+            names = list(self.columns)
+            return [
+                {name: self.columns[name].decode(row) for name in names}
+                for row in range(start, stop)
+            ]
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        """Últimas n filas sin recorrer el resto del registro"""
+        return self.get_records(max(0, self.rows - n))
+
+    def get_all_records(self) -> List[Dict[str, Any]]:
+        """Todas las filas (equivalente a utils.db.get_all_records)"""
+        return self.get_records(0)
+
+    def column(self, name: str, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        """Valores de una columna en un rango de filas"""
+        with self._lock:
+            column = self.columns[name]
+            start, stop, _ = slice(start, stop).indices(self.rows)
+            if column.type in NUMERIC_TYPES:
+                return column.values.view(stop)[start:stop].tolist()
+            return [column.decode(row) for row in range(start, stop)]
+
+    def column_bytes(self, name: str, start: int = 0, stop: Optional[int] = None) -> bytes:
+        """
+        Valores de una columna en un rango de filas tal como están en disco
+
+        Returns:
+            float64 o int64 nativos (las fechas, como ordinales; los textos,
+            como el desplazamiento uint64 en que acaba cada uno), para array o NumPy
+        """
+        with self._lock:
+            column = self.columns[name]
+            start, stop, _ = slice(start, stop).indices(self.rows)
+            return column.values.view(stop)[start:stop].tobytes()
+
+    def text_bytes(self, name: str, start: int = 0, stop: Optional[int] = None) -> Tuple[int, bytes]:
+        """
+        Textos UTF-8 concatenados de una columna de texto en un rango de filas
+
+        Returns:
+            (desplazamiento en que empieza el primero, bytes); los límites de
+            cada texto salen de column_bytes
+        """
+        with self._lock:
+            column = self.columns[name]
+            start, stop, _ = slice(start, stop).indices(self.rows)
+            offsets = column.values.view(stop)
+            base = offsets[start - 1] if start else 0
+            end = offsets[stop - 1] if stop > start else base
+            return base, column.data.view(end)[base:end].tobytes()
+
+    def sum(self, name: str, start: int = 0, stop: Optional[int] = None) -> float:
+        """
+        Suma una columna numérica en O(1) usando las sumas acumuladas
+
+        Args:
+            name: Columna
+            start: Primera fila (incluida)
+            stop: Última fila (excluida)
+
+        Returns:
+            Suma de los valores (los vacíos cuentan como 0)
+        """
+        with self._lock:
+            column = self.columns[name]
+            if column.sums is None:
+                raise ValueError(f"La columna {name} no es numérica")
+            start, stop, _ = slice(start, stop).indices(self.rows)
+            if stop <= start:
+                return 0.0
+            sums = column.sums.view(stop)
+            return sums[stop - 1] - (sums[start - 1] if start else 0.0)
+
+    def set_indexes(self, date_column: Optional[str] = None, key_columns: Sequence[str] = ()) -> None:
+        """
+        Define los índices secundarios del registro y los construye con las filas existentes
+
+        Si los índices ya están definidos igual no se reconstruyen.
+
+        Args:
+            date_column: Columna de tipo date que se indexa por rangos
+            key_columns: Columnas de texto que se indexan por valor
+        """
+        with self.file_lock, self._lock:
+            self.reload()
+            if self.meta.get("indexes") == {"date": date_column, "keys": list(key_columns)}:
+                return
+            if date_column is not None and self.columns[date_column].type != "date":
+                raise ValueError(f"La columna {date_column} no es de tipo fecha")
+            for name in key_columns:
+                if self.columns[name].type != "str":
+                    raise ValueError(f"La columna {name} no es de texto")
+            self.meta["indexes"] = {"date": date_column, "keys": list(key_columns)}
+            self._save_meta()
+            self._reset_indexes()
+            self._index_range(0, self.rows)
+            self._save_indexes()
+
+    def _reset_indexes(self) -> None:
+        spec = self.meta.get("indexes") or {}
+        self._date_index = _DateIndex(spec["date"]) if spec.get("date") else None
+        self._key_indexes = {name: _KeyIndex(name) for name in spec.get("keys", [])}
+        self._snapshot_rows = 0
+
+    def _load_indexes(self) -> None:
+        """Carga la copia guardada de los índices y añade las filas posteriores a ella"""
+        self._reset_indexes()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "rb") as f:
+                    state = pickle.load(f)
+                # Una copia con más filas que las confirmadas incluye una escritura interrumpida
+                if (state["spec"] == self.meta["indexes"] and state.get("columns") == self.meta["columns"]
+                        and state["rows"] <= self.rows):
+                    self._date_index = state["date"]
+                    self._key_indexes = state["keys"]
+                    self._snapshot_rows = state["rows"]
+            except Exception as e:
+                logger.warning(f"No se pudo cargar la copia de los índices de {self.path}; se reconstruyen: {e}")
+                self._reset_indexes()
+        self._index_range(self._snapshot_rows, self.rows)
+
+    def _save_indexes(self) -> None:
+        if not self.meta.get("indexes"):
+            return
+        state = {"spec": self.meta["indexes"], "columns": self.meta["columns"], "rows": self.rows,
+                 "date": self._date_index, "keys": self._key_indexes}
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+        self._snapshot_rows = self.rows
+
+    def _index_range(self, start: int, stop: int) -> None:
+        """Indexa filas ya escritas en disco"""
+        needed = {name for name, column in self.columns.items() if column.type in NUMERIC_TYPES}
+        needed.update(self._key_indexes)
+        if self._date_index:
+            needed.add(self._date_index.column)
+        for batch_start in range(start, stop, IMPORT_BATCH_ROWS):
+            batch_stop = min(stop, batch_start + IMPORT_BATCH_ROWS)
+            encoded = {}
+            for name in needed:
+                column = self.columns[name]
+                if column.type == "str":
+                    encoded[name] = [column.decode(row) for row in range(batch_start, batch_stop)]
+                else:
+                    encoded[name] = column.values.view(batch_stop)[batch_start:batch_stop].tolist()
+            self._index_values(batch_start, encoded)
+
+    def _index_values(self, first: int, encoded: Dict[str, List[Any]]) -> None:
+        if self._date_index:
+            for offset, day in enumerate(encoded[self._date_index.column]):
+                self._date_index.add(first + offset, day)
+        if not self._key_indexes:
+            return
+        numeric = [name for name, column in self.columns.items() if column.type in NUMERIC_TYPES]
+        for name, index in self._key_indexes.items():
+            for offset, key in enumerate(encoded[name]):
+                index.add(first + offset, key.strip(), {column: encoded[column][offset] for column in numeric})
+
+    @property
+    def indexes(self) -> Dict[str, Any]:
+        """Columnas indexadas: {"date": ..., "keys": [...]}"""
+        return self.meta.get("indexes") or {"date": None, "keys": []}
+
+    def rows_between(self, desde: Union[str, date, None] = None,
+                     hasta: Union[str, date, None] = None) -> List[int]:
+        """
+        Filas con fecha dentro de un rango, ordenadas por fecha
+
+        Args:
+            desde: Primera fecha (incluida); None para no acotar
+            hasta: Última fecha (incluida); None para no acotar
+
+        Returns:
+            Números de fila
+        """
+        with self._lock:
+            if self._date_index is None:
+                raise ValueError(f"El registro {self.path} no tiene índice de fechas")
+            return self._date_index.between(_to_ordinal(desde), _to_ordinal(hasta)).tolist()
+
+    def rows_where(self, column: str, value: str) -> List[int]:
+        """Filas cuyo valor en `column` es `value`, usando el índice de la columna"""
+        with self._lock:
+            index = self._key_indexes.get(column)
+            if index is None:
+                raise ValueError(f"La columna {column} no está indexada")
+            return index.rows.get(value.strip(), array("q")).tolist()
+
+    def key_rows(self, column: str) -> Dict[str, bytes]:
+        """
+        Filas de cada valor de una columna indexada, sin decodificar ningún texto
+
+        Returns:
+            {valor: números de fila como int64 nativos (para array("q") o NumPy)}
+        """
+        with self._lock:
+            index = self._key_indexes.get(column)
+            if index is None:
+                raise ValueError(f"La columna {column} no está indexada")
+            return {key: rows.tobytes() for key, rows in index.rows.items()}
+
+    def query(self, desde: Union[str, date, None] = None, hasta: Union[str, date, None] = None,
+              **filtros: str) -> List[Dict[str, Any]]:
+        """
+        Registros filtrados por rango de fechas y por valores de columnas indexadas
+
+        Args:
+            desde: Primera fecha (incluida)
+            hasta: Última fecha (incluida)
+            **filtros: Columna indexada = valor (p. ej. cliente="Café Sol")
+
+        Returns:
+            Registros en orden de fecha (o de llegada si no se filtra por fecha)
+        """
+        with self._lock:
+            rows = self._select(desde, hasta, filtros)
+            names = list(self.columns)
+            return [{name: self.columns[name].decode(row) for name in names} for row in rows]
+
+    def _select(self, desde, hasta, filtros: Dict[str, str]) -> Sequence[int]:
+        candidates: Optional[Sequence[int]] = None
+        if desde is not None or hasta is not None:
+            candidates = self.rows_between(desde, hasta)
+        # Se parte del conjunto más pequeño y se descartan las filas que no cumplen el resto
+        postings = sorted((self.rows_where(column, value) for column, value in filtros.items()), key=len)
+        if candidates is None and postings:
+            candidates = postings.pop(0)
+        if candidates is None:
+            return range(self.rows)
+        for rows in postings:
+            allowed = set(rows)
+            candidates = [row for row in candidates if row in allowed]
+        return candidates
+
+    def totals_by(self, column: str, desde: Union[str, date, None] = None,
+                  hasta: Union[str, date, None] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Número de registros y suma de cada columna numérica por valor de `column`
+
+        Sin rango de fechas se responde directamente con los totales del
+        índice, en O(valores distintos).
+
+        Args:
+            column: Columna indexada por la que se agrupa
+            desde: Primera fecha (incluida)
+            hasta: Última fecha (incluida)
+
+        Returns:
+            {valor: {"registros": n, columna_numérica: suma, ...}}
+        """
+        with self._lock:
+            index = self._key_indexes.get(column)
+            if index is None:
+                raise ValueError(f"La columna {column} no está indexada")
+            if desde is None and hasta is None:
+                return {key: dict(totals) for key, totals in index.totals.items()}
+
+            numeric = [name for name, spec in self.columns.items() if spec.type in NUMERIC_TYPES]
+            result: Dict[str, Dict[str, float]] = {}
+            for row in self.rows_between(desde, hasta):
+                totals = result.setdefault(self.columns[column].decode(row).strip(), {"registros": 0})
+                totals["registros"] += 1
+                for name in numeric:
+                    value = self.columns[name].values.view(row + 1)[row]
+                    if not (isinstance(value, float) and math.isnan(value)):
+                        totals[name] = totals.get(name, 0) + value
+            return result
+
+    def sum_between(self, name: str, desde: Union[str, date, None] = None,
+                    hasta: Union[str, date, None] = None) -> float:
+        """
+        Suma una columna numérica en un rango de fechas
+
+        Si las filas del rango son contiguas (registros anexados en orden
+        cronológico) se usan las sumas acumuladas sin leer los valores.
+        """
+        with self._lock:
+            rows = self._date_index.between(_to_ordinal(desde), _to_ordinal(hasta)) \
+                if self._date_index else None
+            if rows is None:
+                raise ValueError(f"El registro {self.path} no tiene índice de fechas")
+            if not rows:
+                return 0.0
+            first, last = min(rows), max(rows)
+            if last - first + 1 == len(rows):
+                return self.sum(name, first, last + 1)
+            values = self.columns[name].values.view(last + 1)
+            return sum(values[row] for row in rows if not math.isnan(values[row]))
+
+    def close(self) -> None:
+        with self.file_lock, self._lock:
+            if self.meta.get("indexes") and self._snapshot_rows != self.rows:
+                self._save_indexes()
+            for column in self.columns.values():
+                column.close()
+
+def infer_columns(header: Sequence[str], sample: Sequence[Sequence[str]]) -> List[Dict[str, str]]:
+    """
+    Deduce el tipo de cada columna a partir de una muestra de filas
+
+    Args:
+        header: Nombres de las columnas
+        sample: Filas de muestra
+
+    Returns:
+        Esquema [{"name": ..., "type": ...}]
+    """
+    columns = []
+    for index, name in enumerate(header):
+        values = [row[index].strip() for row in sample if index < len(row) and row[index].strip()]
+        type_ = "str"
+        if values and all(_ISO_DATE.match(value) for value in values):
+            type_ = "date"
+        elif values:
+            numbers = [parse_number(value) for value in values]
+            if None in numbers:
+                type_ = "str"
+            elif all(_INTEGER.match(value) for value in values):
+                type_ = "int"
+            else:
+                type_ = "float"
+        columns.append({"name": name, "type": type_})
+    return columns
+
+def default_indexes(csv_path: str, columns: Sequence[Dict[str, str]]) -> Tuple[Optional[str], List[str]]:
+    """
+    Índices que se mantienen para un registro según su nombre y su esquema
+
+    Args:
+        csv_path: Registro CSV (p. ej. data/ventas.csv)
+        columns: Esquema del registro columnar
+
+    Returns:
+        (columna de fecha o None, columnas de agrupación)
+    """
+    types = {spec["name"]: spec["type"] for spec in columns}
+    date_column = next((name for name in DATE_FIELDS if types.get(name) == "date"), None)
+    keys = [field for field in GROUP_FIELDS.get(ledger_name(csv_path), ()) if types.get(field) == "str"]
+    return date_column, keys
+
+def sync_from_csv(csv_path: str, ledger: Optional[ColumnarLedger] = None) -> ColumnarLedger:
+    """
+    Importa al registro columnar las filas del CSV que aún no se han importado
+
+    La primera vez crea el registro deduciendo los tipos; después solo lee
+    desde el último byte importado. Todo se hace con el bloqueo del registro
+    tomado (ver ledger_lock) y releyendo schema.json, de modo que dos
+    procesos no importan dos veces las mismas filas ni leen una fila del CSV
+    a medio escribir.
+
+    Args:
+        csv_path: Registro CSV de origen
+        ledger: Registro columnar ya abierto (opcional)
+
+    Returns:
+        El registro columnar actualizado
+    """
+    with ledger_lock(csv_path):
+        return _sync_locked(csv_path, ledger)
+
+def _sync_locked(csv_path: str, ledger: Optional[ColumnarLedger]) -> ColumnarLedger:
+    path = ledger_path_for(csv_path)
+    if ledger is None and os.path.exists(os.path.join(path, "schema.json")):
+        ledger = ColumnarLedger(path)
+    if ledger is not None:
+        # Otro proceso puede haber importado ya parte del CSV: se parte de su posición
+        ledger.reload()
+    # Los registros importados antes de existir los índices los reciben aquí
+    if ledger is not None and "indexes" not in ledger.meta:
+        ledger.set_indexes(*default_indexes(csv_path, ledger.meta["columns"]))
+
+    source = ledger.meta.get("source") if ledger else None
+    offset = source["offset"] if source else 0
+    header = source["header"] if source else None
+
+    size = os.path.getsize(csv_path) if os.path.exists(csv_path) else 0
+    if ledger is not None and offset == size:
+        return ledger
+    if size < offset:
+        raise ValueError(f"{csv_path} es más pequeño que lo ya importado; vuelve a importarlo desde cero")
+
+    # Solo registros completos: uno a medio escribir se importa en la siguiente sincronización
+    rows, offset = read_csv_records(csv_path, offset)
+
+    if header is None:
+        header = [column.strip().lower() for column in rows[0]] if rows else []
+        rows = rows[1:]
+        if ledger is None:
+            ledger = ColumnarLedger(path, infer_columns(header, rows[:TYPE_SAMPLE_ROWS]))
+            ledger.set_indexes(*default_indexes(csv_path, ledger.meta["columns"]))
+    else:
+        ledger.set_indexes(*default_indexes(csv_path, ledger.meta["columns"]))
+
+    for start in range(0, max(len(rows), 1), IMPORT_BATCH_ROWS):
+        batch = rows[start:start + IMPORT_BATCH_ROWS]
+        is_last = start + IMPORT_BATCH_ROWS >= len(rows)
+        # Todo se confirma con el último lote: si el proceso se interrumpe antes,
+        # las filas escritas se descartan al reabrir y el CSV se vuelve a leer
+        ledger.append_many(
+            (dict(zip(header, values)) for values in batch if values),
+            source={"path": csv_path, "offset": offset, "header": header} if is_last else None,
+            commit=is_last
+        )
+
+    return ledger
+
+_ledgers: Dict[str, ColumnarLedger] = {}
+_ledgers_lock = threading.Lock()
+
+def open_ledger(file_path: str) -> Optional[ColumnarLedger]:
+    """
+    Devuelve el registro columnar de un CSV, sincronizado con sus filas nuevas
+
+    Args:
+        file_path: Ruta del CSV (p. ej. COMPRAS_FILE)
+
+    Returns:
+        El registro columnar, o None si el CSV todavía no se ha importado
+    """
+    with _ledgers_lock:
+        ledger = _ledgers.get(file_path)
+        if ledger is None:
+            if not os.path.exists(os.path.join(ledger_path_for(file_path), "schema.json")):
+                return None
+            ledger = _ledgers[file_path] = ColumnarLedger(ledger_path_for(file_path))
+        with OPERATION_SECONDS.labels(ledger=ledger_name(file_path), operation="sync").time():
+            return sync_from_csv(file_path, ledger)
+
+def load_ledger(file_path: str) -> Optional[ColumnarLedger]:
+    """
+    Como open_ledger, pero la primera vez importa el CSV al formato columnar
+
+    Args:
+        file_path: Ruta del CSV (p. ej. COMPRAS_FILE)
+
+    Returns:
+        El registro columnar, o None si el CSV no existe
+    """
+    ledger = open_ledger(file_path)
+    if ledger is None and os.path.exists(file_path):
+        sync_from_csv(file_path).close()
+        ledger = open_ledger(file_path)
+    return ledger
+
+def get_all_records(file_path: str) -> List[Dict[str, Any]]:
+    """
+    Obtiene todos los registros de un archivo, como utils.db.get_all_records
+
+    Si existe el registro columnar se lee de él; si no, se lee el CSV.
+
+    Args:
+        file_path: Ruta del CSV
+
+    Returns:
+        Lista de diccionarios
+    """
+    ledger = open_ledger(file_path)
+    if ledger is not None:
+        return ledger.get_all_records()
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def get_last_records(file_path: str, n: int) -> List[Dict[str, Any]]:
+    """Últimos n registros de un archivo"""
+    ledger = open_ledger(file_path)
+    if ledger is not None:
+        return ledger.tail(n)
+    return get_all_records(file_path)[-n:]
+
+def sum_column(file_path: str, column: str) -> float:
+    """Suma de una columna numérica de un archivo"""
+    ledger = open_ledger(file_path)
+    if ledger is not None:
+        return ledger.sum(column)
+    total = 0.0
+    for record in get_all_records(file_path):
+        try:
+            total += float(record.get(column) or 0)
+        except ValueError:
+            continue
+    return total
+
+def _matches(record: Dict[str, Any], start: Optional[int], end: Optional[int],
+             filtros: Dict[str, str]) -> bool:
+    if start is not None or end is not None:
+        day = next((parse_date(record[field]) for field in DATE_FIELDS if record.get(field)), None)
+        if day is None:
+            return False
+        if (start is not None and day.toordinal() < start) or (end is not None and day.toordinal() > end):
+            return False
+    return all(str(record.get(column) or "").strip() == value.strip() for column, value in filtros.items())
+
+def query_records(file_path: str, desde: Union[str, date, None] = None,
+                  hasta: Union[str, date, None] = None, **filtros: str) -> List[Dict[str, Any]]:
+    """
+    Registros de un archivo en un rango de fechas y con valores concretos
+
+    Con el registro columnar se responde con los índices; si el CSV aún no
+    se ha importado, se recorre completo.
+
+    Args:
+        file_path: Ruta del CSV (p. ej. VENTAS_FILE)
+        desde: Primera fecha (incluida)
+        hasta: Última fecha (incluida)
+        **filtros: Columna = valor (p. ej. proveedor="Finca El Roble")
+
+    Returns:
+        Lista de diccionarios
+    """
+    with OPERATION_SECONDS.labels(ledger=ledger_name(file_path), operation="query").time():
+        ledger = open_ledger(file_path)
+        if ledger is not None:
+            indexed = set(ledger.indexes["keys"])
+            if all(column in indexed for column in filtros) and (
+                    (desde is None and hasta is None) or ledger.indexes["date"]):
+                return ledger.query(desde, hasta, **filtros)
+        start, end = _to_ordinal(desde), _to_ordinal(hasta)
+        return [record for record in get_all_records(file_path) if _matches(record, start, end, filtros)]
+
+def totals_by(file_path: str, column: str, desde: Union[str, date, None] = None,
+              hasta: Union[str, date, None] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Número de registros y sumas numéricas agrupadas por una columna
+
+    Args:
+        file_path: Ruta del CSV
+        column: Columna por la que se agrupa (p. ej. "cliente")
+        desde: Primera fecha (incluida)
+        hasta: Última fecha (incluida)
+
+    Returns:
+        {valor: {"registros": n, columna: suma, ...}}
+    """
+    with OPERATION_SECONDS.labels(ledger=ledger_name(file_path), operation="totals_by").time():
+        ledger = open_ledger(file_path)
+        if ledger is not None and column in ledger.indexes["keys"] and (
+                (desde is None and hasta is None) or ledger.indexes["date"]):
+            return ledger.totals_by(column, desde, hasta)
+
+        result: Dict[str, Dict[str, float]] = {}
+        for record in query_records(file_path, desde, hasta):
+            totals = result.setdefault(str(record.get(column) or "").strip(), {"registros": 0})
+            totals["registros"] += 1
+            for name, value in record.items():
+                if name == column or name in DATE_FIELDS:
+                    continue
+                try:
+                    number = float(str(value).replace(",", "").replace("$", ""))
+                except (TypeError, ValueError):
+                    continue
+                if not math.isnan(number):
+                    totals[name] = totals.get(name, 0) + number
+        return result
+
+def inventory_by_state(file_path: str = PROCESO_FILE) -> Dict[str, float]:
+    """
+    Cantidad de café por estado
+
+    Args:
+        file_path: Registro con columna "estado" (por defecto, el de procesos)
+
+    Returns:
+        {estado: cantidad}
+    """
+    totals = totals_by(file_path, "estado")
+    return {
+        state: round(next((values[field] for field in QUANTITY_FIELDS if field in values), 0.0), 2)
+        for state, values in totals.items()
+    }
+
+def _import_command(paths: Sequence[str]) -> None:
+    for csv_path in paths:
+        if os.path.exists(os.path.join(ledger_path_for(csv_path), "schema.json")):
+            print(f"{csv_path}: ya importado, se añaden solo las filas nuevas")
+        ledger = sync_from_csv(csv_path)
+        types = ", ".join(f"{spec['name']}:{spec['type']}" for spec in ledger.meta["columns"])
+        print(f"{csv_path} -> {ledger.path}: {len(ledger)} filas ({types})")
+        indexes = ledger.indexes
+        print(f"  índices: fecha={indexes['date'] or '-'}, columnas={', '.join(indexes['keys']) or '-'}")
+        ledger.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa registros CSV al formato columnar")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Importa uno o más CSV")
+    import_parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+    if args.command == "import":
+        _import_command(args.paths)
@@ -0,0 +1,276 @@
+"""
+Memoria de las consultas de IA con resumen progresivo
+
+Cada chat guarda sus últimas MEMORY_TURNS preguntas y respuestas tal cual;
+los turnos anteriores se condensan, en bloques de MEMORY_TURNS, en un
+resumen que se actualiza en segundo plano con el propio modelo. El historial
+que se envía a OpenAI (resumen más turnos recientes) nunca supera
+MEMORY_MAX_TOKENS, así que el tamaño del prompt y la latencia no crecen por
+mucho que dure la conversación.
+
+Las conversaciones viven solo en memoria del proceso: las que llevan más de
+MEMORY_IDLE_TTL segundos sin uso se olvidan y, si hay más de
+MEMORY_MAX_CONVERSATIONS, se descartan las menos usadas recientemente.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set
+
+from config import (
+    MEMORY_ENABLED, MEMORY_TURNS, MEMORY_MAX_TOKENS, MEMORY_SUMMARY_TOKENS,
+    MEMORY_MAX_CONVERSATIONS, MEMORY_IDLE_TTL
+)
+from utils import metrics
+from utils.prompts import count_tokens
+
+# Tokens que añade cada mensaje por su rol y separadores
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+COMPACTIONS = metrics.counter(
+    "memory_compactions_total", "Resúmenes de turnos antiguos de las consultas de IA", ("result",)
+)
+HISTORY_TOKENS = metrics.histogram(
+    "memory_history_tokens", "Tokens de historial enviados con cada consulta de IA",
+    buckets=(0, 100, 250, 500, 1000, 1500, 2000, 4000, 8000)
+)
+
+class Turn(NamedTuple):
+    """Una pregunta del usuario y la respuesta del asistente"""
+    question: str
+    answer: str
+    tokens: int
+
+class ConversationMemory:
+    """Resumen de los turnos antiguos y turnos recientes de un chat"""
+
+    def __init__(self):
+        self.summary = ""
+        self.summary_tokens = 0
+        self.turns: List[Turn] = []
+        self.last_used = time.monotonic()
+        self.compacting = False
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Recorta un texto para que no supere un número de tokens
+
+    Args:
+        text: Texto original
+        max_tokens: Tokens máximos
+
+    Returns:
+        El texto completo si cabe; si no, su comienzo seguido de "…"
+    """
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    # Recorte proporcional y, si aún sobra, un poco más cada vez
+    length = int(len(text) * max_tokens / tokens)
+    while length > 0 and count_tokens(text[:length]) >= max_tokens:
+        length = int(length * 0.9)
+    return text[:length].rstrip() + "…"
+
+async def summarize_turns(summary: str, turns: List[Turn]) -> str:
+    """Actualiza el resumen de una conversación con turnos que dejan de enviarse literalmente"""
+    # Import local: utils.openai crea el cliente y la caché al importarse
+    from utils.openai import generate_response
+
+    system_prompt = """
+    Resumes conversaciones entre un usuario y un asistente experto en café.
+    Conserva los datos concretos (cifras, productos, lotes, decisiones y preferencias del usuario)
+    y omite saludos y repeticiones. Responde solo con el resumen, en texto plano y en español.
+    """
+    dialogue = "\n".join(f"Usuario: {turn.question}\nAsistente: {turn.answer}" for turn in turns)
+    prompt = (
+        f"Resumen hasta ahora:\n{summary or '(vacío)'}\n\n"
+        f"Nuevos turnos:\n{dialogue}\n\n"
+        f"Escribe el resumen actualizado en menos de {MEMORY_SUMMARY_TOKENS * 3 // 4} palabras."
+    )
+    return await generate_response(
+        prompt, system_prompt, temperature=0.2, use_cache=False, call_site="resumen",
+        max_tokens=MEMORY_SUMMARY_TOKENS, raise_errors=True
+    )
+
+class ConversationStore:
+    """Memorias por chat con tope de tokens y desalojo LRU de las inactivas"""
+
+    def __init__(self, keep_turns: int = MEMORY_TURNS, max_tokens: int = MEMORY_MAX_TOKENS,
+                 summary_tokens: int = MEMORY_SUMMARY_TOKENS, max_conversations: int = MEMORY_MAX_CONVERSATIONS,
+                 idle_ttl: float = MEMORY_IDLE_TTL,
+                 summarizer: Callable[[str, List[Turn]], Awaitable[str]] = summarize_turns):
+        """
+        Args:
+            keep_turns: Turnos recientes que se conservan literalmente
+            max_tokens: Tokens máximos de historial (resumen y turnos) por consulta
+            summary_tokens: Tokens máximos del resumen
+            max_conversations: Conversaciones en memoria antes de descartar las menos usadas
+            idle_ttl: Segundos sin uso tras los que se olvida una conversación
+            summarizer: Función que condensa el resumen anterior y los turnos antiguos
+        """
+        self.keep_turns = keep_turns
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.max_conversations = max_conversations
+        self.idle_ttl = idle_ttl
+        self.summarizer = summarizer
+        self.evictions = 0
+        self._conversations: "OrderedDict[int, ConversationMemory]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def _get(self, chat_id: int) -> Optional[ConversationMemory]:
+        memory = self._conversations.get(chat_id)
+        if memory is None:
+            return None
+        if time.monotonic() - memory.last_used > self.idle_ttl:
+            del self._conversations[chat_id]
+            self.evictions += 1
+            return None
+        return memory
+
+    def _evict(self) -> None:
+        """Olvida las conversaciones inactivas y, si siguen sobrando, las menos usadas"""
+        now = time.monotonic()
+        # El diccionario está ordenado por último uso: las inactivas están al principio
+        while self._conversations:
+            chat_id, memory = next(iter(self._conversations.items()))
+            if len(self._conversations) <= self.max_conversations and now - memory.last_used <= self.idle_ttl:
+                break
+            del self._conversations[chat_id]
+            self.evictions += 1
+
+    def history(self, chat_id: int) -> List[Dict[str, str]]:
+        """
+        Mensajes de historial para la próxima consulta de un chat
+
+        Se incluyen el resumen y los turnos más recientes que quepan en
+        max_tokens, empezando por el último.
+
+        Args:
+            chat_id: Chat de Telegram
+
+        Returns:
+            Lista de mensajes con el formato de la API de chat (vacía si no hay historial)
+        """
+        memory = self._get(chat_id)
+        if memory is None:
+            return []
+
+        budget = self.max_tokens - memory.summary_tokens
+        recent: List[Turn] = []
+        for turn in reversed(memory.turns):
+            if turn.tokens > budget:
+                break
+            budget -= turn.tokens
+            recent.append(turn)
+
+        messages = []
+        if memory.summary:
+            messages.append({"role": "system", "content": f"Resumen de la conversación anterior:\n{memory.summary}"})
+        for turn in reversed(recent):
+            messages.append({"role": "user", "content": turn.question})
+            messages.append({"role": "assistant", "content": turn.answer})
+        HISTORY_TOKENS.observe(self.max_tokens - budget if messages else 0)
+        return messages
+
+    def record(self, chat_id: int, question: str, answer: str) -> None:
+        """
+        Guarda un turno y, cuando sobran keep_turns turnos, los resume en segundo plano
+
+        Args:
+            chat_id: Chat de Telegram
+            question: Pregunta del usuario
+            answer: Respuesta mostrada al usuario
+        """
+        memory = self._get(chat_id)
+        if memory is None:
+            memory = self._conversations[chat_id] = ConversationMemory()
+        memory.last_used = time.monotonic()
+        self._conversations.move_to_end(chat_id)
+
+        # Un solo turno no puede ocupar todo el historial: se recortan las respuestas muy largas
+        turn_budget = max(1, (self.max_tokens - self.summary_tokens) // 2)
+        question = truncate_tokens(question, turn_budget // 4)
+        answer = truncate_tokens(answer, turn_budget - count_tokens(question) - 2 * MESSAGE_OVERHEAD_TOKENS)
+        tokens = count_tokens(question) + count_tokens(answer) + 2 * MESSAGE_OVERHEAD_TOKENS
+        memory.turns.append(Turn(question, answer, tokens))
+
+        # Si el resumen va con retraso, los turnos más antiguos se descartan sin resumir
+        overflow = len(memory.turns) - 3 * self.keep_turns
+        if overflow > 0 and not memory.compacting:
+            del memory.turns[:overflow]
+
+        self._evict()
+
+        # Se resume por bloques de keep_turns turnos: una llamada extra cada keep_turns consultas
+        if len(memory.turns) >= max(1, 2 * self.keep_turns) and not memory.compacting:
+            task = asyncio.get_running_loop().create_task(self.compact(chat_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def compact(self, chat_id: int) -> None:
+        """Condensa en el resumen los turnos que exceden keep_turns"""
+        memory = self._conversations.get(chat_id)
+        if memory is None or memory.compacting or len(memory.turns) <= self.keep_turns:
+            return
+        memory.compacting = True
+        old = memory.turns[:-self.keep_turns] if self.keep_turns else list(memory.turns)
+        try:
+            summary = truncate_tokens((await self.summarizer(memory.summary, old)).strip(), self.summary_tokens)
+            memory.summary = summary
+            memory.summary_tokens = count_tokens(summary) + MESSAGE_OVERHEAD_TOKENS
+            COMPACTIONS.labels(result="ok").inc()
+        except Exception as e:
+            # Se conservan los turnos y se reintenta con el siguiente; record() los acota a 3 × keep_turns
+            COMPACTIONS.labels(result="error").inc()
+            logger.warning(f"No se pudo resumir la conversación del chat {chat_id}: {e}")
+        else:
+            # Solo se han añadido turnos al final mientras se resumía
+            del memory.turns[:len(old)]
+        finally:
+            memory.compacting = False
+
+    def forget(self, chat_id: int) -> None:
+        """Olvida la conversación de un chat (p. ej. al terminar o cancelar)"""
+        self._conversations.pop(chat_id, None)
+
+    async def wait_idle(self) -> None:
+        """Espera a que terminen los resúmenes en curso"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Conversaciones en memoria, turnos guardados y conversaciones descartadas"""
+        return {
+            "conversations": len(self._conversations),
+            "turns": sum(len(memory.turns) for memory in self._conversations.values()),
+            "evictions": self.evictions,
+        }
+
+# Memoria compartida por los manejadores de IA
+conversation_memory = ConversationStore()
+
+metrics.gauge("memory_conversations", "Conversaciones de IA con historial en memoria").set_function(
+    lambda: len(conversation_memory)
+)
+
+def chat_history(chat_id: int) -> List[Dict[str, str]]:
+    """Historial de un chat para la próxima consulta (vacío si la memoria está desactivada)"""
+    return conversation_memory.history(chat_id) if MEMORY_ENABLED else []
+
+def remember(chat_id: int, question: str, answer: str) -> None:
+    """Guarda un turno si la memoria está activada"""
+    if MEMORY_ENABLED:
+        conversation_memory.record(chat_id, question, answer)
+
+def forget(chat_id: int) -> None:
+    """Olvida la conversación de un chat"""
+    conversation_memory.forget(chat_id)
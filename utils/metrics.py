@@ -0,0 +1,442 @@
+"""
+Métricas del bot en formato de texto de Prometheus
+
+Contadores, indicadores (gauges) e histogramas con etiquetas, sin
+dependencias externas, y un servidor HTTP local que los publica en
+/metrics para que Prometheus (o un simple curl) los lea:
+
+- Latencia y errores de cada manejador de Telegram y actualizaciones en curso.
+- Latencia de cada llamada a OpenAI por punto de llamada y modelo, tokens
+  por modelo y aciertos de la caché de respuestas.
+- Tiempos de Google Sheets, de los registros locales y de la persistencia.
+
+Con METRICS_ENABLED=false las funciones counter/gauge/histogram devuelven
+una métrica vacía cuyas operaciones no hacen nada, los manejadores no se
+envuelven y no se abre ningún puerto.
+"""
+
+import asyncio
+import bisect
+import functools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from config import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+# Límites (en segundos) de los cubos de los histogramas de latencia
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _escape_help(text: str) -> str:
+    # En HELP solo se escapan la barra invertida y el salto de línea; las comillas van tal cual
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Timer:
+    """Mide la duración de un bloque `with` y la registra en un histograma"""
+
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: "_HistogramChild"):
+        self._child = child
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._child.observe(time.perf_counter() - self._start)
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+class _GaugeChild:
+    __slots__ = ("_lock", "value", "_function")
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """El valor se calcula al leer las métricas (p. ej. el tamaño de una cola)"""
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is None:
+            return self.value
+        try:
+            return float(self._function())
+        except Exception as e:
+            logger.debug(f"No se pudo calcular una métrica: {e}")
+            return float("nan")
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_bounds", "counts", "sum", "count")
+
+    def __init__(self, lock: threading.Lock, bounds: Tuple[float, ...]):
+        self._lock = lock
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        """Context manager que registra la duración del bloque"""
+        return _Timer(self)
+
+class _Metric:
+    """Métrica con (o sin) etiquetas; cada combinación de valores es un hijo"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any, **kwargs: Any) -> Any:
+        """Devuelve el hijo de una combinación de etiquetas (se crea la primera vez)"""
+        if kwargs:
+            values = [kwargs[name] for name in self.labelnames]
+        key = tuple(map(str, values))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {_escape_help(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild(self._lock)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild(self._lock)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._default.set_function(function)
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}"
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self._lock, self.bounds)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            with self._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+class _NullMetric:
+    """Métrica desactivada: todas las operaciones son no-ops"""
+
+    __slots__ = ()
+
+    def labels(self, *values: Any, **kwargs: Any) -> "_NullMetric":
+        return self
+
+    def inc(self, amount: float = 1.0) -> None:
+        pass
+
+    def dec(self, amount: float = 1.0) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def time(self) -> "_NullMetric":
+        return self
+
+    def __enter__(self) -> "_NullMetric":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+_NULL = _NullMetric()
+
+class Registry:
+    """Conjunto de métricas que se publican juntas"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Se reutiliza si el módulo se importa de nuevo
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        """Texto de todas las métricas en el formato de exposición de Prometheus"""
+        return "\n".join(metric.render() for metric in list(self._metrics.values())) + "\n"
+
+# Registro compartido por todo el bot
+registry = Registry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Any:
+    """Crea (o reutiliza) un contador; si las métricas están desactivadas devuelve uno vacío"""
+    if not METRICS_ENABLED:
+        return _NULL
+    return registry.register(Counter(name, documentation, labelnames))
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Any:
+    """Crea (o reutiliza) un indicador; si las métricas están desactivadas devuelve uno vacío"""
+    if not METRICS_ENABLED:
+        return _NULL
+    return registry.register(Gauge(name, documentation, labelnames))
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Any:
+    """Crea (o reutiliza) un histograma; si las métricas están desactivadas devuelve uno vacío"""
+    if not METRICS_ENABLED:
+        return _NULL
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+def render() -> str:
+    return registry.render()
+
+# --- Manejadores de Telegram -----------------------------------------------------
+
+HANDLER_SECONDS = histogram(
+    "bot_handler_seconds", "Duración de cada manejador de Telegram", ("handler",)
+)
+HANDLER_ERRORS = counter(
+    "bot_handler_errors_total", "Excepciones no capturadas en los manejadores", ("handler",)
+)
+HANDLER_IN_FLIGHT = gauge(
+    "bot_handler_in_flight", "Manejadores ejecutándose en este momento", ("handler",)
+)
+UPDATES_IN_FLIGHT = gauge(
+    "bot_updates_in_flight", "Actualizaciones de Telegram que se están procesando"
+)
+
+def _instrument(callback: Callable) -> Callable:
+    name = getattr(callback, "__name__", type(callback).__name__)
+    seconds = HANDLER_SECONDS.labels(handler=name)
+    errors = HANDLER_ERRORS.labels(handler=name)
+    in_flight = HANDLER_IN_FLIGHT.labels(handler=name)
+
+    @functools.wraps(callback)
+    async def wrapper(update: object, context: Any) -> Any:
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - start)
+            in_flight.dec()
+
+    return wrapper
+
+def _wrap_handler(handler: Any, wrap: Callable[[Callable], Callable], marker: str) -> int:
+    # Import local: este módulo lo usan utilidades que no dependen de python-telegram-bot
+    from telegram.ext import ConversationHandler
+
+    if isinstance(handler, ConversationHandler):
+        children = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            children.extend(state_handlers)
+        return sum(_wrap_handler(child, wrap, marker) for child in children)
+    callback = getattr(handler, "callback", None)
+    if callback is None or getattr(callback, marker, False):
+        return 0
+    handler.callback = wrap(callback)
+    setattr(handler.callback, marker, True)
+    return 1
+
+def wrap_handlers(application: Any, wrap: Callable[[Callable], Callable], marker: str) -> int:
+    """
+    Envuelve los callbacks de todos los manejadores registrados (también los de las conversaciones)
+
+    Args:
+        application: Aplicación de python-telegram-bot
+        wrap: Recibe un callback y devuelve el que lo sustituye
+        marker: Atributo que marca los callbacks ya envueltos (para no envolverlos dos veces)
+
+    Returns:
+        Callbacks envueltos
+    """
+    return sum(
+        _wrap_handler(handler, wrap, marker)
+        for group in application.handlers.values()
+        for handler in group
+    )
+
+def instrument_handlers(application: Any) -> None:
+    """
+    Envuelve los callbacks de todos los manejadores registrados para medir su duración
+
+    Se llama una vez, después de registrar los manejadores. No hace nada si las
+    métricas están desactivadas.
+
+    Args:
+        application: Aplicación de python-telegram-bot
+    """
+    if not METRICS_ENABLED:
+        return
+    count = wrap_handlers(application, _instrument, "__metrics_wrapped__")
+    UPDATES_IN_FLIGHT.set_function(lambda: application.update_processor.current_concurrent_updates)
+    logger.info(f"Métricas activadas para {count} manejadores")
+
+# --- Servidor HTTP local ---------------------------------------------------------
+
+_server: Optional[asyncio.AbstractServer] = None
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await reader.readline()
+        # Se descartan las cabeceras; las peticiones a /metrics no llevan cuerpo
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        path = parts[1].split("?", 1)[0] if len(parts) > 1 else ""
+        if len(parts) > 1 and parts[0] == "GET" and path == "/metrics":
+            status, body = "200 OK", render().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            status, body, content_type = "404 Not Found", b"No encontrado\n", "text/plain; charset=utf-8"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(application: Any = None) -> None:
+    """Publica /metrics en METRICS_HOST:METRICS_PORT (se usa en el post_init de la aplicación)"""
+    global _server
+    if not METRICS_ENABLED or _server is not None:
+        return
+    try:
+        _server = await asyncio.start_server(_handle_connection, METRICS_HOST, METRICS_PORT)
+    except OSError as e:
+        logger.error(f"No se pudo abrir el puerto de métricas {METRICS_HOST}:{METRICS_PORT}: {e}")
+        return
+    logger.info(f"Métricas disponibles en http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+async def stop_metrics_server(application: Any = None) -> None:
+    """Cierra el servidor de métricas (se usa en el post_shutdown de la aplicación)"""
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
@@ -2,19 +2,138 @@
 Utilidades para interactuar con la API de OpenAI
 """
 
+import asyncio
 import logging
 import json
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
-from config import OPENAI_API_KEY, OPENAI_MODEL
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable, Tuple
+from config import (
+    OPENAI_API_KEY, OPENAI_MODEL, OPENAI_BASE_URL, OPENAI_MAX_CONCURRENCY,
+    OPENAI_CACHE_ENABLED, OPENAI_CACHE_TTL, OPENAI_CACHE_MAX_ENTRIES, OPENAI_CACHE_SQLITE, OPENAI_CACHE_FILE,
+    OPENAI_PRICING_CHUNK_SIZE, OPENAI_PRICING_ATTEMPTS,
+    OPENAI_FALLBACK_MODEL, OPENAI_TIMEOUT, OPENAI_TOTAL_TIMEOUT, OPENAI_MAX_RETRIES,
+    OPENAI_RETRY_BASE_DELAY, OPENAI_RETRY_MAX_DELAY, OPENAI_HEDGE_AFTER,
+    OPENAI_BREAKER_THRESHOLD, OPENAI_BREAKER_COOLDOWN
+)
+from utils.cache import ResponseCache, make_cache_key
+from utils import metrics
+from utils.prompts import serialize_data
+from utils.resilience import CircuitBreaker, ResiliencePolicy
+from utils.workers import worker_pool
 
-# Inicializar cliente de OpenAI
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Cliente asíncrono de OpenAI; se crea en el primer uso (ver get_client)
+_client = None
+
+# Plazos, reintentos y modelo de respaldo de todas las llamadas
+resilience = ResiliencePolicy(
+    attempt_timeout=OPENAI_TIMEOUT,
+    total_timeout=OPENAI_TOTAL_TIMEOUT,
+    max_retries=OPENAI_MAX_RETRIES,
+    base_delay=OPENAI_RETRY_BASE_DELAY,
+    max_delay=OPENAI_RETRY_MAX_DELAY,
+    hedge_after=OPENAI_HEDGE_AFTER,
+    breaker=CircuitBreaker(OPENAI_BREAKER_THRESHOLD, OPENAI_BREAKER_COOLDOWN)
+)
+
+# Limita las llamadas simultáneas para no agotar la cuota de OpenAI
+_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+# Caché de respuestas para preguntas repetidas
+response_cache = ResponseCache(
+    max_entries=OPENAI_CACHE_MAX_ENTRIES,
+    ttl=OPENAI_CACHE_TTL,
+    sqlite_path=OPENAI_CACHE_FILE if OPENAI_CACHE_SQLITE else None
+)
+
+# Comienzo del texto que se muestra al usuario cuando falla una llamada
+ERROR_REPLY = "Lo siento, no pude generar una respuesta en este momento."
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
 
-def generate_response(prompt: str, system_prompt: Optional[str] = None, temperature: float = 0.7) -> str:
+def get_client():
+    """
+    Cliente asíncrono de OpenAI, creado en la primera llamada
+
+    Importar el SDK de openai tarda casi un segundo; así el bot arranca y
+    responde sin esperarlo y solo lo paga la primera consulta de IA. Los
+    reintentos los gestiona `resilience` y las conexiones, utils.http.
+    """
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        from utils.http import openai_http_client
+        _client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0, http_client=openai_http_client()
+        )
+    return _client
+
+def __getattr__(name: str) -> Any:
+    # `from utils.openai import client` sigue funcionando y crea el cliente al pedirlo
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def close_client() -> None:
+    """Cierra el cliente de OpenAI si llegó a crearse y guarda en disco lo pendiente de la caché"""
+    global _client
+    await response_cache.flush()
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+# Métricas de las llamadas a OpenAI
+REQUEST_SECONDS = metrics.histogram(
+    "openai_request_seconds", "Duración de las llamadas a OpenAI (incluida la espera del semáforo)",
+    ("call_site", "model")
+)
+FIRST_TOKEN_SECONDS = metrics.histogram(
+    "openai_first_token_seconds", "Tiempo hasta el primer fragmento en modo streaming", ("call_site", "model")
+)
+REQUESTS_IN_FLIGHT = metrics.gauge("openai_requests_in_flight", "Llamadas a OpenAI en curso")
+REQUEST_ERRORS = metrics.counter("openai_errors_total", "Llamadas a OpenAI fallidas", ("call_site",))
+TOKENS = metrics.counter("openai_tokens_total", "Tokens consumidos por modelo", ("model", "type"))
+CACHE_REQUESTS = metrics.counter(
+    "openai_cache_requests_total", "Consultas a la caché de respuestas", ("call_site", "result")
+)
+metrics.gauge("openai_cache_hit_ratio", "Proporción de aciertos de la caché de respuestas").set_function(
+    lambda: response_cache.stats()["hit_ratio"]
+)
+metrics.gauge("openai_cache_entries", "Respuestas guardadas en memoria").set_function(
+    lambda: response_cache.stats()["entries"]
+)
+
+def _log_usage(usage, model: str = OPENAI_MODEL) -> None:
+    """Registra los tokens de entrada y salida de una llamada"""
+    if usage is None:
+        return
+    TOKENS.labels(model=model, type="prompt").inc(usage.prompt_tokens)
+    TOKENS.labels(model=model, type="completion").inc(usage.completion_tokens)
+    logger.info(
+        f"OpenAI ({model}): {usage.prompt_tokens} tokens de entrada, "
+        f"{usage.completion_tokens} tokens de salida"
+    )
+
+async def _create_completion(**kwargs) -> Tuple[Any, str]:
+    """
+    Llama a chat.completions.create con plazos, reintentos y modelo de respaldo
+
+    Returns:
+        (respuesta o stream, modelo que respondió)
+    """
+    async def request(model: str, timeout: float) -> Any:
+        return await get_client().chat.completions.create(model=model, timeout=timeout, **kwargs)
+
+    async def discard(result: Any) -> None:
+        if kwargs.get("stream"):
+            await result.close()
+
+    return await resilience.call(request, OPENAI_MODEL, OPENAI_FALLBACK_MODEL or None, discard)
+
+async def generate_response(prompt: str, system_prompt: Optional[str] = None, temperature: float = 0.7,
+                            use_cache: bool = True, json_mode: bool = False, call_site: str = "general",
+                            max_tokens: int = 1000, raise_errors: bool = False,
+                            validate: Optional[Callable[[str], Awaitable[Any]]] = None) -> Any:
     """
     Genera una respuesta usando OpenAI
     
@@ -22,10 +141,32 @@ def generate_response(prompt: str, system_prompt: Optional[str] = None, temperat
         prompt: El mensaje del usuario
         system_prompt: Mensaje de sistema para dirigir el comportamiento del modelo
         temperature: Controla la aleatoriedad de las respuestas (0-1)
+        use_cache: Si es False, se ignora la caché y se consulta siempre a OpenAI
+        json_mode: Si es True, se pide al modelo que devuelva un objeto JSON válido
+        call_site: Nombre de la funcionalidad que hace la llamada (para las métricas)
+        max_tokens: Tokens máximos de la respuesta
+        raise_errors: Si es True, los errores se propagan en lugar de devolver un mensaje para el usuario
+        validate: Corrutina que recibe el texto y devuelve el resultado validado (o lanza
+            una excepción). La respuesta solo se guarda en caché si la supera, y sus
+            errores se propagan siempre
         
     Returns:
-        Respuesta generada por OpenAI
+        Respuesta generada por OpenAI, o el resultado de validate si se indicó
     """
+    cache_key = None
+    if OPENAI_CACHE_ENABLED and use_cache:
+        cache_key = make_cache_key(OPENAI_MODEL, system_prompt, prompt, temperature, json_mode, max_tokens)
+        cached = response_cache.get(cache_key)
+        CACHE_REQUESTS.labels(call_site=call_site, result="miss" if cached is None else "hit").inc()
+        if cached is not None:
+            if validate is None:
+                return cached
+            try:
+                return await validate(cached)
+            except Exception as e:
+                # Entrada guardada antes de validar las respuestas: se vuelve a consultar
+                logger.warning(f"Respuesta en caché inválida para {call_site}, se consulta de nuevo: {e}")
+    
     try:
         messages = []
         
@@ -36,27 +177,138 @@ def generate_response(prompt: str, system_prompt: Optional[str] = None, temperat
         # Agregar mensaje del usuario
         messages.append({"role": "user", "content": prompt})
         
-        # Llamar a la API de OpenAI
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=1000
-        )
+        extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+        
+        # Llamar a la API de OpenAI sin bloquear el bucle de eventos
+        start = time.perf_counter()
+        model = OPENAI_MODEL
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            async with _semaphore:
+                response, model = await _create_completion(
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **extra
+                )
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_SECONDS.labels(call_site=call_site, model=model).observe(time.perf_counter() - start)
         
-        return response.choices[0].message.content.strip()
+        _log_usage(response.usage, model)
+        content = response.choices[0].message.content.strip()
     
     except Exception as e:
+        REQUEST_ERRORS.labels(call_site=call_site).inc()
         logger.error(f"Error al generar respuesta con OpenAI: {e}")
-        return f"Lo siento, no pude generar una respuesta en este momento. Error: {str(e)}"
+        if raise_errors:
+            raise
+        content = f"{ERROR_REPLY} Error: {str(e)}"
+        return content if validate is None else await validate(content)
+    
+    # Los errores de validación se propagan sin pasar por la caché
+    result = content if validate is None else await validate(content)
+    
+    # Solo se guardan las respuestas válidas del modelo principal, nunca los mensajes de error
+    if cache_key and model == OPENAI_MODEL:
+        response_cache.set(cache_key, content)
+    
+    return result
 
-def analyze_coffee_data(data: Dict[str, Any]) -> str:
+async def stream_response(prompt: str, system_prompt: Optional[str] = None, temperature: float = 0.7,
+                          use_cache: bool = True, call_site: str = "general",
+                          history: Optional[List[Dict[str, str]]] = None) -> AsyncIterator[str]:
     """
-    Analiza datos de café usando OpenAI
+    Genera una respuesta usando OpenAI en modo streaming
     
     Args:
-        data: Diccionario con datos de café
+        prompt: El mensaje del usuario
+        system_prompt: Mensaje de sistema para dirigir el comportamiento del modelo
+        temperature: Controla la aleatoriedad de las respuestas (0-1)
+        use_cache: Si es False, se ignora la caché y se consulta siempre a OpenAI
+        call_site: Nombre de la funcionalidad que hace la llamada (para las métricas)
+        history: Mensajes anteriores de la conversación (ver utils.memory); con
+            historial la respuesta depende del contexto y no se usa la caché
+        
+    Yields:
+        Fragmentos de texto a medida que el modelo los genera
+        
+    Raises:
+        Exception: El error de OpenAI, también a mitad de la respuesta; nunca se
+            entrega como texto, y lo ya entregado queda incompleto
+    """
+    max_tokens = 1000
+    cache_key = None
+    if OPENAI_CACHE_ENABLED and use_cache and not history:
+        cache_key = make_cache_key(OPENAI_MODEL, system_prompt, prompt, temperature, False, max_tokens)
+        cached = response_cache.get(cache_key)
+        CACHE_REQUESTS.labels(call_site=call_site, result="miss" if cached is None else "hit").inc()
+        if cached is not None:
+            yield cached
+            return
+    
+    messages = []
+    
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    
+    # Resumen y turnos recientes de la conversación, antes de la pregunta actual
+    messages.extend(history or [])
+        
+    messages.append({"role": "user", "content": prompt})
+    
+    start = time.perf_counter()
+    first_token = True
+    model = OPENAI_MODEL
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+        async with _semaphore:
+            # Los reintentos solo cubren hasta el primer token: después ya se mostró texto
+            stream, model = await _create_completion(
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            
+            parts = []
+            async for chunk in stream:
+                # El último fragmento no trae texto, solo el uso de tokens
+                if getattr(chunk, "usage", None):
+                    _log_usage(chunk.usage, model)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token:
+                        first_token = False
+                        FIRST_TOKEN_SECONDS.labels(call_site=call_site, model=model).observe(
+                            time.perf_counter() - start
+                        )
+                    parts.append(delta)
+                    yield delta
         
+        if cache_key and parts and model == OPENAI_MODEL:
+            response_cache.set(cache_key, "".join(parts).strip())
+    
+    except Exception as e:
+        REQUEST_ERRORS.labels(call_site=call_site).inc()
+        logger.error(f"Error al generar respuesta en streaming con OpenAI: {e}")
+        raise
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        REQUEST_SECONDS.labels(call_site=call_site, model=model).observe(time.perf_counter() - start)
+
+async def analyze_coffee_data(data: Dict[str, Any], use_cache: bool = True, raise_errors: bool = False) -> str:
+    """
+    Analiza datos de café usando OpenAI
+
+    Args:
+        data: Diccionario con el resumen de cada registro (ver utils.aggregates)
+        use_cache: Si es False, se pide un análisis nuevo aunque los datos no hayan cambiado
+        raise_errors: Si es True, los errores se propagan en lugar de devolver un mensaje para el usuario
+
     Returns:
         Análisis del café
     """
@@ -68,8 +320,11 @@ def analyze_coffee_data(data: Dict[str, Any]) -> str:
         """
         
         prompt = f"""
-        Por favor, analiza los siguientes datos de operaciones de café:
-        {json.dumps(data, indent=2, ensure_ascii=False)}
+        Por favor, analiza el siguiente resumen de operaciones de café. Para cada registro
+        se incluyen totales, agregados por proveedor, cliente o estado, por día, semana y mes,
+        y las operaciones más recientes; en "indicadores", costos por kg, rendimientos del
+        proceso y ganancia de las ventas (tablas con una fila de encabezado separada por "|"):
+        {serialize_data(data)}
         
         Proporciona:
         1. Un resumen de los principales hallazgos
@@ -78,13 +333,16 @@ def analyze_coffee_data(data: Dict[str, Any]) -> str:
         4. Recomendaciones específicas
         """
         
-        return generate_response(prompt, system_prompt, temperature=0.3)
-    
+        return await generate_response(prompt, system_prompt, temperature=0.3, use_cache=use_cache,
+                                       call_site="analisis", raise_errors=raise_errors)
+
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(f"Error al analizar datos de café: {e}")
         return f"Lo siento, no pude analizar los datos en este momento. Error: {str(e)}"
 
-def generate_coffee_recommendation(preferences: Dict[str, Any]) -> str:
+async def generate_coffee_recommendation(preferences: Dict[str, Any]) -> str:
     """
     Genera recomendaciones de café basadas en preferencias
     
@@ -111,47 +369,227 @@ def generate_coffee_recommendation(preferences: Dict[str, Any]) -> str:
     4. Posibles maridajes
     """
     
-    return generate_response(prompt, system_prompt, temperature=0.6)
+    return await generate_response(prompt, system_prompt, temperature=0.6, call_site="recomendacion")
 
-def optimize_coffee_pricing(data: Dict[str, Any]) -> Dict[str, Any]:
+def extract_json(response: str) -> Any:
+    """
+    Extrae JSON de una respuesta, esté o no entre bloques de código Markdown
+    
+    Args:
+        response: Texto devuelto por el modelo
+        
+    Returns:
+        Objeto JSON decodificado
+    """
+    # Buscar contenido entre tres backticks si está en ese formato
+    if "```json" in response and "```" in response.split("```json", 1)[1]:
+        json_str = response.split("```json", 1)[1].split("```", 1)[0].strip()
+    elif "```" in response and "```" in response.split("```", 1)[1]:
+        json_str = response.split("```", 1)[1].split("```", 1)[0].strip()
+    else:
+        json_str = response
+        
+    return json.loads(json_str)
+
+def parse_pricing_text(text: str) -> List[Dict[str, Any]]:
+    """
+    Extrae los productos de una lista de precios escrita por el usuario
+
+    Formato, repetido por producto: "Producto: ...", "Precio actual: ...",
+    "Costo: ..." y "Margen deseado: ...%". Los números que no se entienden
+    se omiten.
+
+    Args:
+        text: Mensaje del usuario
+
+    Returns:
+        Lista de productos con producto, precio_actual, costo y margen
+
+    Raises:
+        ValueError: Si no se encontró ningún producto
+    """
+    # Conversión básica (podría mejorarse con regex para una estructura más precisa)
+    products = []
+    current_product = {}
+
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith("Producto:"):
+            if current_product and "producto" in current_product:
+                products.append(current_product)
+            current_product = {}
+            current_product["producto"] = line.replace("Producto:", "").strip()
+        elif line.startswith("Precio actual:"):
+            try:
+                current_product["precio_actual"] = float(line.replace("Precio actual:", "").strip())
+            except ValueError:
+                pass
+        elif line.startswith("Costo:"):
+            try:
+                current_product["costo"] = float(line.replace("Costo:", "").strip())
+            except ValueError:
+                pass
+        elif line.startswith("Margen deseado:"):
+            try:
+                current_product["margen"] = float(line.replace("Margen deseado:", "").replace("%", "").strip())
+            except ValueError:
+                pass
+
+    # Añadir el último producto
+    if current_product and "producto" in current_product:
+        products.append(current_product)
+
+    # Si no hay productos, lanzar excepción
+    if not products:
+        raise ValueError("No se pudieron extraer datos de productos del texto proporcionado")
+
+    return products
+
+def _to_price(value: Any, field: str) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"'{field}' debe ser numérico")
+    return float(str(value).replace("$", "").replace(",", "").strip())
+
+def validate_pricing(payload: Any, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Valida las recomendaciones de precios de un bloque contra el esquema esperado
+    
+    Esquema: {"recomendaciones": [{"producto": str, "precio_actual": número|null,
+    "precio_recomendado": número, "justificacion": str}, ...]} con una entrada
+    por cada producto enviado.
+    
+    Args:
+        payload: JSON devuelto por el modelo
+        products: Productos que se enviaron en el bloque
+        
+    Returns:
+        Recomendaciones normalizadas, en el orden de los productos
+        
+    Raises:
+        ValueError: Si la respuesta no cumple el esquema
+    """
+    if isinstance(payload, dict) and "recomendaciones" in payload:
+        items = payload["recomendaciones"]
+    elif isinstance(payload, list):
+        items = payload
+    else:
+        raise ValueError("La respuesta no contiene la lista 'recomendaciones'")
+    
+    if not isinstance(items, list):
+        raise ValueError("'recomendaciones' debe ser una lista")
+    
+    by_name = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("producto"), str):
+            raise ValueError("Cada recomendación debe tener un 'producto'")
+        recommended = _to_price(item.get("precio_recomendado"), "precio_recomendado")
+        if recommended is None:
+            raise ValueError(f"Falta 'precio_recomendado' para {item['producto']}")
+        by_name[item["producto"].strip().lower()] = {
+            "producto": item["producto"].strip(),
+            "precio_actual": _to_price(item.get("precio_actual"), "precio_actual"),
+            "precio_recomendado": recommended,
+            "justificacion": str(item.get("justificacion", "")).strip() or "No disponible",
+        }
+    
+    missing = [p["producto"] for p in products if p["producto"].strip().lower() not in by_name]
+    if missing:
+        raise ValueError(f"Faltan recomendaciones para: {', '.join(missing)}")
+    
+    return [by_name[p["producto"].strip().lower()] for p in products]
+
+def parse_pricing_response(response: str, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Extrae y valida el JSON de un bloque de precios (se ejecuta en el pool de "json")"""
+    return validate_pricing(extract_json(response), products)
+
+async def _price_chunk(products: List[Dict[str, Any]], system_prompt: str) -> List[Dict[str, Any]]:
+    """Obtiene y valida las recomendaciones de un bloque, reintentando solo ese bloque si falla"""
+    prompt = f"""
+    Analiza los siguientes datos de precios y costos de café (tablas con una fila de
+    encabezado separada por "|"):
+    {serialize_data({"productos": products})}
+    
+    Proporciona un precio optimizado para cada producto de la tabla, con su justificación.
+    Devuelve únicamente un objeto JSON con la estructura:
+    {{"recomendaciones": [{{"producto": "nombre", "precio_actual": x, "precio_recomendado": y, "justificacion": "razón"}}]}}
+    """
+    
+    async def validate(response: str) -> List[Dict[str, Any]]:
+        return await worker_pool.run("json", parse_pricing_response, response, products)
+    
+    last_error = None
+    for attempt in range(1, OPENAI_PRICING_ATTEMPTS + 1):
+        # Solo se guarda en caché la respuesta que supera la validación
+        try:
+            return await generate_response(
+                prompt, system_prompt, temperature=0.2, use_cache=attempt == 1, json_mode=True,
+                call_site="precios", validate=validate
+            )
+        except Exception as e:
+            last_error = e
+            logger.warning(
+                f"Respuesta de precios inválida (intento {attempt}/{OPENAI_PRICING_ATTEMPTS}, "
+                f"{len(products)} productos): {e}"
+            )
+    
+    raise ValueError(f"No se obtuvieron precios válidos: {last_error}")
+
+async def optimize_coffee_pricing(data: Dict[str, Any], chunk_size: Optional[int] = None) -> Any:
     """
     Optimiza precios de café usando IA
     
+    Los productos se dividen en bloques que se consultan en paralelo con
+    salida JSON. Cada bloque se valida por separado y solo se reintentan los
+    bloques que fallan.
+    
     Args:
-        data: Datos históricos y actuales de precios y costos
+        data: Datos de precios y costos, con la lista de productos en "productos"
+        chunk_size: Productos por llamada (por defecto OPENAI_PRICING_CHUNK_SIZE)
         
     Returns:
-        Recomendaciones de precios optimizados
+        Lista de recomendaciones de precios optimizados, o un diccionario con
+        "error" si no se pudo obtener ninguna
     """
     system_prompt = """
     Eres un analista de datos especializado en la optimización de precios para productos de café.
     Tu objetivo es maximizar la rentabilidad manteniendo precios competitivos.
     Proporciona recomendaciones específicas con valores numéricos precisos.
+    Responde siempre en JSON.
     """
     
-    prompt = f"""
-    Analiza los siguientes datos de precios y costos de café:
-    {json.dumps(data, indent=2, ensure_ascii=False)}
-    
-    Proporciona recomendaciones detalladas de precios optimizados para cada tipo de café
-    y presentación. Incluye el precio recomendado y la justificación para cada uno.
-    Devuelve tus recomendaciones en formato JSON con la estructura: 
-    {{"producto": "nombre", "precio_actual": x, "precio_recomendado": y, "justificacion": "razón"}}
-    """
+    products = data.get("productos", [])
+    if not products:
+        return {"error": "No hay productos para optimizar"}
     
-    response = generate_response(prompt, system_prompt, temperature=0.2)
+    size = chunk_size or OPENAI_PRICING_CHUNK_SIZE
+    chunks = [products[i:i + size] for i in range(0, len(products), size)]
+    results = await asyncio.gather(
+        *(_price_chunk(chunk, system_prompt) for chunk in chunks),
+        return_exceptions=True
+    )
     
-    try:
-        # Intentar extraer JSON de la respuesta
-        # Buscar contenido entre tres backticks si está en ese formato
-        if "```json" in response and "```" in response.split("```json", 1)[1]:
-            json_str = response.split("```json", 1)[1].split("```", 1)[0].strip()
-        elif "```" in response and "```" in response.split("```", 1)[1]:
-            json_str = response.split("```", 1)[1].split("```", 1)[0].strip()
+    recommendations = []
+    errors = []
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error al optimizar precios de {len(chunk)} productos: {result}")
+            errors.append(str(result))
+            # Se conservan los productos del bloque fallido para que el usuario sepa cuáles faltan
+            recommendations.extend({
+                "producto": product["producto"],
+                "precio_actual": product.get("precio_actual"),
+                "precio_recomendado": None,
+                "justificacion": "No se pudo calcular una recomendación"
+            } for product in chunk)
         else:
-            json_str = response
-            
-        return json.loads(json_str)
-    except Exception as e:
-        logger.error(f"Error al parsear JSON de respuesta de OpenAI: {e}")
-        return {"error": str(e), "raw_response": response}
+            recommendations.extend(result)
+    
+    if len(errors) == len(chunks):
+        return {"error": errors[0]}
+    
+    return recommendations
@@ -0,0 +1,357 @@
+"""
+Cola de salida de los mensajes hacia Telegram
+
+La Bot API limita los envíos (unos 30 mensajes por segundo en total, uno
+por segundo en un chat privado con ráfagas cortas y 20 por minuto en un
+grupo) y responde RetryAfter a quien los supera. Dos piezas:
+
+- TelegramRateLimiter: limitador de python-telegram-bot
+  (Application.builder().rate_limiter(...)) por el que pasan todas las
+  llamadas del bot dirigidas a un chat (envíos, ediciones, documentos...).
+  Cada llamada espera ficha en el cubo de su chat y en el global (ver
+  utils.admission.TokenBucket); ante un RetryAfter se pausa ese chat el
+  tiempo indicado y se reintenta hasta TELEGRAM_MAX_RETRIES veces. Las
+  ediciones provisionales del streaming (PREVIEW_RATE_LIMIT_ARGS) no
+  esperan ni se reintentan: si no hay ficha reciben RetryAfter al momento.
+- Outbox: cola por chat para los textos de los manejadores. Mientras un
+  mensaje de un chat espera turno, los siguientes de ese chat se unen en
+  uno solo (si caben y tienen el mismo formato), y los textos de más de
+  4096 caracteres se cortan sin romper el Markdown (ver
+  utils.telegram.split_message).
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Deque, Dict, Hashable, List, NamedTuple, Optional, Union
+
+from telegram import Bot, InlineKeyboardMarkup, Message
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import (
+    TELEGRAM_RATE_LIMIT_ENABLED, TELEGRAM_GLOBAL_PER_SECOND, TELEGRAM_CHAT_PER_SECOND, TELEGRAM_CHAT_BURST,
+    TELEGRAM_GROUP_PER_MINUTE, TELEGRAM_MAX_RETRIES
+)
+from utils import metrics
+from utils.admission import TokenBucket
+from utils.telegram import MAX_MESSAGE_LENGTH, PREVIEW_RATE_LIMIT_ARGS, retry_after_seconds, split_message
+
+# Cada cuántas llamadas se eliminan los cubos de chats inactivos
+PRUNE_EVERY = 1000
+
+# Separador entre los textos que se unen en un mensaje
+JOIN_SEPARATOR = "\n\n"
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_WAIT = metrics.histogram(
+    "telegram_rate_limit_wait_seconds", "Espera de cada llamada a la Bot API por los límites de envío",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+)
+RETRY_AFTER = metrics.counter(
+    "telegram_retry_after_total", "Respuestas RetryAfter (control de flujo) de la Bot API", ("method",)
+)
+COALESCED = metrics.counter(
+    "telegram_messages_coalesced_total", "Textos unidos a otro mensaje pendiente del mismo chat"
+)
+
+class TelegramRateLimiter(BaseRateLimiter[int]):
+    """
+    Límites de envío de la Bot API por chat y globales, con reintentos tras RetryAfter
+
+    rate_limit_args (el argumento adicional de los métodos de ExtBot) es el
+    número de reintentos de esa llamada, si no vale el predeterminado. Un
+    valor negativo (PREVIEW_RATE_LIMIT_ARGS) marca una llamada prescindible:
+    solo se hace si el chat tiene ficha en ese momento y le queda otra para
+    las llamadas que sí esperan (la edición final, los envíos); si no, o si
+    Telegram responde RetryAfter, se lanza RetryAfter sin esperar ni
+    reintentar y quien llama decide cuándo volver a intentarlo.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float, group_rate: float,
+                 max_retries: int = 3):
+        """
+        Args:
+            global_rate: Llamadas por segundo entre todos los chats
+            chat_rate: Llamadas por segundo a un chat privado
+            chat_burst: Llamadas seguidas a un mismo chat
+            group_rate: Llamadas por segundo a un grupo o canal
+            max_retries: Reintentos de una llamada tras un RetryAfter
+        """
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, max(global_rate, 1.0))
+        self._chats: Dict[Hashable, TokenBucket] = {}
+        # Chats pausados por un RetryAfter, hasta el instante (monotonic) indicado
+        self._paused: Dict[Hashable, float] = {}
+        self._requests = 0
+
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.retries = 0
+
+    async def initialize(self) -> None:
+        """No hace nada: los cubos se crean con la primera llamada a cada chat"""
+
+    async def shutdown(self) -> None:
+        """No hace nada"""
+
+    def _bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Los grupos y canales tienen ids negativos o un @nombre
+            group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(self.group_rate if group else self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        """Elimina los cubos llenos y las pausas vencidas de los chats inactivos"""
+        for chat_id in [chat_id for chat_id, until in self._paused.items() if until <= now]:
+            del self._paused[chat_id]
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items()
+                        if chat_id not in self._paused and bucket.is_full(now)]:
+            del self._chats[chat_id]
+
+    async def acquire(self, chat_id: Hashable) -> float:
+        """
+        Espera a que el chat y el cupo global tengan ficha y las gasta
+
+        Returns:
+            Segundos de espera
+        """
+        start = time.monotonic()
+        self._requests += 1
+        if self._requests % PRUNE_EVERY == 0:
+            self._prune(start)
+
+        now = start
+        while True:
+            bucket = self._bucket(chat_id)
+            wait = max(self._paused.get(chat_id, 0.0) - now, bucket.wait_time(1, now), self._global.wait_time(1, now))
+            if wait <= 0:
+                # Sin await entre la comprobación y el gasto: ninguna otra llamada se cuela
+                bucket.consume(1, now)
+                self._global.consume(1, now)
+                break
+            await asyncio.sleep(wait)
+            now = time.monotonic()
+
+        waited = now - start
+        if waited > 0:
+            self.waited += 1
+            self.wait_seconds += waited
+        RATE_LIMIT_WAIT.observe(waited)
+        return waited
+
+    def try_acquire(self, chat_id: Hashable, reserve: float = 1.0) -> float:
+        """
+        Gasta ficha sin esperar si el chat y el cupo global la tienen
+
+        Args:
+            chat_id: Chat de la llamada
+            reserve: Fichas que deben quedar en el cubo del chat después
+
+        Returns:
+            0 si se gastó la ficha; si no, segundos hasta que la habría
+        """
+        now = time.monotonic()
+        bucket = self._bucket(chat_id)
+        reserve = min(reserve, max(0.0, bucket.capacity - 1))
+        wait = max(self._paused.get(chat_id, 0.0) - now, bucket.wait_time(1 + reserve, now),
+                   self._global.wait_time(1, now))
+        if wait > 0:
+            return wait
+        bucket.consume(1, now)
+        self._global.consume(1, now)
+        return 0.0
+
+    def _pause(self, chat_id: Hashable, endpoint: str, error: RetryAfter) -> float:
+        """Pausa el chat el tiempo que pide un RetryAfter y devuelve esa espera"""
+        RETRY_AFTER.labels(method=endpoint).inc()
+        wait = retry_after_seconds(error)
+        self._paused[chat_id] = max(self._paused.get(chat_id, 0.0), time.monotonic() + wait)
+        return wait
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        """Hace la llamada cuando el chat tiene turno; tras un RetryAfter, pausa el chat y reintenta"""
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            # Llamadas que no van a un chat (answerCallbackQuery, getMe, setWebhook...)
+            return await callback(*args, **kwargs)
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+
+        if rate_limit_args is not None and rate_limit_args < 0:
+            # Llamada prescindible: sin esperar turno ni reintentar
+            wait = self.try_acquire(chat_id)
+            if wait > 0:
+                raise RetryAfter(timedelta(seconds=wait))
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self._pause(chat_id, endpoint, e)
+                raise
+
+        max_retries = self.max_retries if rate_limit_args is None else rate_limit_args
+        attempt = 0
+        while True:
+            await self.acquire(chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                wait = self._pause(chat_id, endpoint, e)
+                if attempt >= max_retries:
+                    logger.warning(f"{endpoint} al chat {chat_id}: RetryAfter de {wait:.0f} s tras {attempt} reintentos")
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.info(f"{endpoint} al chat {chat_id}: Telegram pide esperar {wait:.0f} s (reintento {attempt})")
+
+class _Outgoing(NamedTuple):
+    """Texto pendiente de enviar y el futuro de quien lo envía"""
+    text: str
+    parse_mode: Optional[str]
+    reply_markup: Optional[InlineKeyboardMarkup]
+    future: asyncio.Future
+
+class Outbox:
+    """Cola de salida por chat que une los textos pendientes y corta los largos"""
+
+    def __init__(self, limit: int = MAX_MESSAGE_LENGTH):
+        """
+        Args:
+            limit: Caracteres máximos por mensaje
+        """
+        self.limit = limit
+        self._queues: Dict[Hashable, Deque[_Outgoing]] = {}
+        self._senders: Dict[Hashable, asyncio.Task] = {}
+
+        self.requested = 0
+        self.sent = 0
+        self.coalesced = 0
+
+    async def send(self, bot: Bot, chat_id: Hashable, text: str, parse_mode: Optional[str] = None,
+                   reply_markup: Optional[InlineKeyboardMarkup] = None) -> Message:
+        """
+        Envía un texto a un chat por la cola de salida
+
+        Los textos de un chat se envían en orden. Si se cancela la espera
+        antes de que le toque, el texto no se envía.
+
+        Args:
+            bot: Bot con el que se envía
+            chat_id: Chat de destino
+            text: Texto del mensaje (se corta si supera el límite)
+            parse_mode: Formato del texto ("Markdown" o None)
+            reply_markup: Teclado; va en el último mensaje y cierra la unión con los siguientes
+
+        Returns:
+            Último mensaje enviado con el texto (puede incluir otros textos del chat)
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(chat_id, deque()).append(_Outgoing(text, parse_mode, reply_markup, future))
+        self.requested += 1
+        if chat_id not in self._senders:
+            self._senders[chat_id] = asyncio.create_task(self._drain(bot, chat_id))
+        return await future
+
+    def _take(self, queue: Deque[_Outgoing]) -> List[_Outgoing]:
+        """Saca el siguiente texto y los que se le pueden unir"""
+        batch: List[_Outgoing] = []
+        length = 0
+        while queue:
+            item = queue[0]
+            if item.future.done():
+                # Quien lo envió dejó de esperar (p. ej. /cancelar)
+                queue.popleft()
+                continue
+            if batch and (item.parse_mode != batch[0].parse_mode
+                          or length + len(JOIN_SEPARATOR) + len(item.text) > self.limit):
+                break
+            batch.append(queue.popleft())
+            length += len(item.text) + (len(JOIN_SEPARATOR) if len(batch) > 1 else 0)
+            if item.reply_markup is not None:
+                break
+        return batch
+
+    async def _drain(self, bot: Bot, chat_id: Hashable) -> None:
+        """Envía los textos del chat mientras haya pendientes"""
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                batch = self._take(queue)
+                if batch:
+                    await self._deliver(bot, chat_id, batch)
+        finally:
+            for item in queue:
+                item.future.cancel()
+            del self._senders[chat_id]
+            del self._queues[chat_id]
+
+    async def _deliver(self, bot: Bot, chat_id: Hashable, batch: List[_Outgoing]) -> None:
+        if len(batch) > 1:
+            self.coalesced += len(batch) - 1
+            COALESCED.inc(len(batch) - 1)
+        text = JOIN_SEPARATOR.join(item.text for item in batch)
+        try:
+            message = await self._send_parts(bot, chat_id, text, batch[0].parse_mode, batch[-1].reply_markup)
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        for item in batch:
+            if not item.future.done():
+                item.future.set_result(message)
+
+    async def _send_parts(self, bot: Bot, chat_id: Hashable, text: str, parse_mode: Optional[str],
+                          reply_markup: Optional[InlineKeyboardMarkup]) -> Message:
+        parts = split_message(text, self.limit, markdown=parse_mode == "Markdown")
+        message = None
+        for number, part in enumerate(parts, start=1):
+            markup = reply_markup if number == len(parts) else None
+            try:
+                message = await bot.send_message(chat_id, part, parse_mode=parse_mode, reply_markup=markup)
+            except BadRequest:
+                if parse_mode is None:
+                    raise
+                # Markdown mal balanceado (p. ej. en una respuesta del modelo): se envía sin formato
+                message = await bot.send_message(chat_id, part, reply_markup=markup)
+            self.sent += 1
+        return message
+
+def telegram_rate_limiter() -> Optional[TelegramRateLimiter]:
+    """Limitador para Application.builder().rate_limiter() (None si TELEGRAM_RATE_LIMIT_ENABLED=false)"""
+    if not TELEGRAM_RATE_LIMIT_ENABLED:
+        return None
+    return TelegramRateLimiter(
+        global_rate=TELEGRAM_GLOBAL_PER_SECOND,
+        chat_rate=TELEGRAM_CHAT_PER_SECOND,
+        chat_burst=TELEGRAM_CHAT_BURST,
+        group_rate=TELEGRAM_GROUP_PER_MINUTE / 60,
+        max_retries=TELEGRAM_MAX_RETRIES
+    )
+
+async def reply(message: Message, text: str, parse_mode: Optional[str] = None,
+                reply_markup: Optional[InlineKeyboardMarkup] = None) -> Message:
+    """Responde en el chat de un mensaje por la cola de salida (ver Outbox.send)"""
+    return await outbox.send(message.get_bot(), message.chat_id, text, parse_mode, reply_markup)
+
+# Cola compartida por los manejadores
+outbox = Outbox()
@@ -0,0 +1,312 @@
+"""
+Persistencia del estado del bot en SQLite
+
+Guarda los estados de las conversaciones (ConversationHandler con
+persistent=True) y user_data/chat_data/bot_data, de modo que un reinicio
+no corta las conversaciones en curso y varios procesos del bot pueden
+compartir el mismo archivo:
+
+- Cada valor es una fila (tipo, clave) serializada en JSON compacto; si
+  el valor no sobrevive intacto a JSON (tuplas, claves numéricas...), se
+  guarda con pickle.
+- Las escrituras se acumulan en memoria y se confirman en una sola
+  transacción por ciclo de Application.update_persistence, con la base en
+  modo WAL y synchronous=NORMAL: no hay un fsync por actualización.
+- Cada fila lleva una versión. Antes de procesar cada actualización se
+  releen las filas de ese chat y usuario si otro proceso las cambió, de
+  modo que la conversación sigue aunque el siguiente mensaje lo atienda
+  otro proceso.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import (
+    Application, BasePersistence, ContextTypes, ConversationHandler, PersistenceInput, TypeHandler
+)
+
+from utils import metrics
+
+# Formatos de serialización de la columna "format"
+FORMAT_JSON = 0
+FORMAT_PICKLE = 1
+
+# Segundos que se espera tras la primera escritura para confirmar las demás del mismo ciclo
+COMMIT_DELAY = 0.05
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+COMMIT_SECONDS = metrics.histogram("persistence_commit_seconds", "Duración de cada transacción de estado")
+COMMIT_ROWS = metrics.counter("persistence_rows_written_total", "Filas de estado escritas o borradas")
+
+def _dumps(value: Any) -> Tuple[int, bytes]:
+    """Serializa en JSON compacto si el valor se recupera idéntico; si no, con pickle"""
+    try:
+        text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        if json.loads(text) == value:
+            return FORMAT_JSON, text.encode("utf-8")
+    except (TypeError, ValueError):
+        pass
+    return FORMAT_PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _loads(format_: int, blob: bytes) -> Any:
+    if format_ == FORMAT_JSON:
+        return json.loads(blob)
+    return pickle.loads(blob)
+
+def _conversation_key(key: Tuple[Any, ...]) -> str:
+    return json.dumps(list(key), separators=(",", ":"))
+
+class SQLitePersistence(BasePersistence):
+    """Persistencia de python-telegram-bot sobre un archivo SQLite compartible entre procesos"""
+
+    def __init__(self, path: str, update_interval: float = 1.0,
+                 store_data: Optional[PersistenceInput] = None):
+        """
+        Args:
+            path: Archivo SQLite
+            update_interval: Segundos entre ciclos de escritura (las escrituras de un
+                ciclo se confirman juntas)
+            store_data: Qué datos se guardan (por defecto, todos)
+        """
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.path = path
+        self.commits = 0
+        # Versión de cada fila que este proceso leyó o escribió por última vez
+        self._versions: Dict[Tuple[str, str], Optional[int]] = {}
+        # Escrituras aún sin confirmar (y las que se están confirmando); None significa borrar la fila
+        self._pending: Dict[Tuple[str, str], Optional[Tuple[int, bytes, int]]] = {}
+        self._committing: Dict[Tuple[str, str], Optional[Tuple[int, bytes, int]]] = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._commit_task: Optional[asyncio.Task] = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Las escrituras van en un hilo aparte con su propia conexión; en modo WAL
+        # las lecturas del bucle de eventos no esperan a las escrituras
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._reader = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "kind TEXT NOT NULL, key TEXT NOT NULL, version INTEGER NOT NULL, "
+            "format INTEGER NOT NULL, value BLOB NOT NULL, PRIMARY KEY (kind, key)) WITHOUT ROWID"
+        )
+
+    # --- Lectura ---------------------------------------------------------------
+
+    def _load_kind(self, kind: str) -> Dict[str, Any]:
+        rows = self._reader.execute(
+            "SELECT key, version, format, value FROM state WHERE kind = ?", (kind,)
+        ).fetchall()
+        result = {}
+        for key, version, format_, value in rows:
+            self._versions[(kind, key)] = version
+            result[key] = _loads(format_, value)
+        return result
+
+    def _load_changed(self, kind: str, key: str) -> Tuple[bool, Any]:
+        """
+        Relee una fila si otro proceso la cambió desde la última vez que este la vio
+
+        Returns:
+            (cambió, valor); el valor es None si la fila se borró
+        """
+        if (kind, key) in self._pending or (kind, key) in self._committing:
+            # Este proceso tiene un cambio más reciente que aún no se ha confirmado
+            return False, None
+        row = self._reader.execute(
+            "SELECT version, format, value FROM state WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        version = row[0] if row else None
+        if version == self._versions.get((kind, key)):
+            return False, None
+        self._versions[(kind, key)] = version
+        return True, (_loads(row[1], row[2]) if row else None)
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {int(key): value for key, value in self._load_kind("user").items()}
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {int(key): value for key, value in self._load_kind("chat").items()}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return self._load_kind("bot").get("", {})
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return self._load_kind("callback").get("")
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[Any, ...], object]:
+        return {
+            tuple(json.loads(key)): state
+            for key, state in self._load_kind(f"conversation:{name}").items()
+        }
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        self._refresh_dict("user", str(user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        self._refresh_dict("chat", str(chat_id), chat_data)
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        self._refresh_dict("bot", "", bot_data)
+
+    def _refresh_dict(self, kind: str, key: str, target: Dict[Any, Any]) -> None:
+        changed, value = self._load_changed(kind, key)
+        if changed:
+            target.clear()
+            target.update(value or {})
+
+    # --- Escritura -------------------------------------------------------------
+
+    def _write(self, kind: str, key: str, value: Any) -> None:
+        version = time.time_ns()
+        entry = None if value is None else (*_dumps(value), version)
+        with self._pending_lock:
+            self._versions[(kind, key)] = None if value is None else version
+            self._pending[(kind, key)] = entry
+        if self._commit_task is None or self._commit_task.done():
+            self._commit_task = asyncio.get_running_loop().create_task(self._commit_soon())
+
+    async def _commit_soon(self) -> None:
+        # Application.update_persistence lanza todas las escrituras del ciclo a la vez
+        await asyncio.sleep(COMMIT_DELAY)
+        # Lo que llegue mientras se confirma un lote se confirma en la siguiente vuelta
+        while self._pending:
+            try:
+                await asyncio.to_thread(self._commit)
+            except sqlite3.Error as e:
+                logger.error(f"Error al guardar el estado del bot en {self.path}: {e}")
+                break
+
+    def _commit(self) -> None:
+        """Confirma todas las escrituras pendientes en una transacción"""
+        with self._write_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+                self._committing = pending
+            if not pending:
+                return
+            start = time.perf_counter()
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                for (kind, key), entry in pending.items():
+                    if entry is None:
+                        self._db.execute("DELETE FROM state WHERE kind = ? AND key = ?", (kind, key))
+                    else:
+                        format_, value, version = entry
+                        self._db.execute(
+                            "INSERT INTO state (kind, key, version, format, value) VALUES (?, ?, ?, ?, ?) "
+                            "ON CONFLICT (kind, key) DO UPDATE SET "
+                            "version = excluded.version, format = excluded.format, value = excluded.value",
+                            (kind, key, version, format_, value)
+                        )
+                self._db.execute("COMMIT")
+                self.commits += 1
+                COMMIT_SECONDS.observe(time.perf_counter() - start)
+                COMMIT_ROWS.inc(len(pending))
+            except sqlite3.Error:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                # Se conservan para el próximo intento, salvo que haya algo más reciente
+                with self._pending_lock:
+                    for item, entry in pending.items():
+                        self._pending.setdefault(item, entry)
+                raise
+            finally:
+                self._committing = {}
+
+    async def update_conversation(self, name: str, key: Tuple[Any, ...], new_state: Optional[object]) -> None:
+        self._write(f"conversation:{name}", _conversation_key(key), new_state)
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        self._write("user", str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        self._write("chat", str(chat_id), data)
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        self._write("bot", "", data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        self._write("callback", "", data)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._write("chat", str(chat_id), None)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._write("user", str(user_id), None)
+
+    async def flush(self) -> None:
+        """Confirma lo pendiente (se llama al detener la aplicación)"""
+        if self._commit_task is not None and not self._commit_task.done():
+            self._commit_task.cancel()
+        await asyncio.to_thread(self._commit)
+
+    def close(self) -> None:
+        self._commit()
+        with self._write_lock:
+            self._db.close()
+        self._reader.close()
+
+    # --- Conversaciones compartidas entre procesos -----------------------------
+
+    def sync_conversations(self, application: Application) -> None:
+        """
+        Relee, antes de cada actualización, el estado de las conversaciones persistentes
+        que otro proceso haya cambiado
+
+        Se llama una vez, después de registrar todos los manejadores.
+
+        Args:
+            application: Aplicación que usa esta persistencia
+        """
+        handlers = [
+            handler
+            for group in application.handlers.values()
+            for handler in group
+            if isinstance(handler, ConversationHandler) and handler.persistent and handler.name
+        ]
+        if not handlers:
+            return
+
+        async def refresh(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+            if not isinstance(update, Update):
+                return
+            for handler in handlers:
+                self._refresh_conversation(handler, update)
+
+        # Grupo anterior al de los manejadores, para que vean el estado actualizado
+        application.add_handler(TypeHandler(Update, refresh), group=-1)
+        logger.info(f"Estado compartido entre procesos para {len(handlers)} conversaciones")
+
+    def _refresh_conversation(self, handler: ConversationHandler, update: Update) -> None:
+        # _get_key y _conversations son internos de python-telegram-bot (requirements.txt fija
+        # la versión; tests/test_persistence.py falla si cambian)
+        try:
+            key = handler._get_key(update)
+        except RuntimeError:
+            # Actualización sin chat o usuario: esta conversación no la atiende
+            return
+        changed, state = self._load_changed(f"conversation:{handler.name}", _conversation_key(key))
+        if not changed:
+            return
+        # Se modifica el diccionario de la conversación sin marcarlo como escrito,
+        # igual que hace ConversationHandler al cargar la persistencia
+        conversations = handler._conversations
+        if state is None:
+            conversations.data.pop(key, None)
+        else:
+            conversations.update_no_track({key: state})
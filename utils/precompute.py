@@ -0,0 +1,214 @@
+"""
+Análisis de datos precalculado en segundo plano
+
+El botón "📊 Análisis de datos" sirve al instante el último análisis
+guardado en lugar de recalcular los agregados y llamar al modelo en cada
+clic. Dos tareas de la JobQueue de python-telegram-bot lo mantienen al día:
+
+- Una diaria, a la hora PRECOMPUTE_TIME (UTC), que lo recalcula si los
+  registros cambiaron desde el último análisis.
+- Una periódica, cada PRECOMPUTE_CHECK_INTERVAL segundos, que lo recalcula
+  antes en cuanto hay PRECOMPUTE_CHANGE_THRESHOLD filas nuevas.
+
+Cada resultado lleva una versión: las filas de cada registro con las que se
+calculó. Se guarda en PRECOMPUTE_FILE, así que sobrevive a los reinicios y
+lo ven todos los procesos del bot. El botón "🔄 Actualizar análisis" lo
+recalcula a petición sin mirar lo guardado.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import time as dtime, timezone
+from typing import Any, Dict, Optional
+
+from config import (
+    PRECOMPUTE_ENABLED, PRECOMPUTE_TIME, PRECOMPUTE_CHECK_INTERVAL, PRECOMPUTE_CHANGE_THRESHOLD,
+    PRECOMPUTE_FILE
+)
+from utils import metrics
+from utils.aggregates import AggregationStore, ledger_store
+from utils.openai import analyze_coffee_data
+from utils.workers import worker_pool
+
+# Segundos tras el arranque hasta la primera revisión (no compite con las primeras actualizaciones)
+FIRST_CHECK_DELAY = 30
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_RUNS = metrics.counter(
+    "analysis_precompute_total", "Análisis de datos calculados por motivo y resultado", ("trigger", "result")
+)
+
+def analysis_data(store: AggregationStore = ledger_store, engine: Any = None) -> Dict[str, Any]:
+    """
+    Datos que recibe el modelo: agregados de los registros e indicadores
+
+    Args:
+        store: Agregados de los registros
+        engine: Motor de reportes (por defecto, el compartido de utils.reports)
+
+    Returns:
+        Resumen de cada registro y, si hay datos, los indicadores de utils.reports
+    """
+    # Los agregados se actualizan de forma incremental: solo se leen las filas nuevas
+    data = store.snapshot()
+    if engine is None:
+        # Import local: NumPy se carga con el primer análisis, no al arrancar el bot
+        from utils.reports import report_engine as engine
+    # Rentabilidad y rendimientos calculados sobre las columnas de los registros
+    indicators = engine.indicators()
+    if indicators:
+        data = {**data, "indicadores": indicators}
+    return data
+
+def data_version(rows: Dict[str, int]) -> str:
+    """Versión de los datos a partir de las filas de cada registro (p. ej. "compras=120,ventas=80")"""
+    return ",".join(f"{name}={count}" for name, count in sorted(rows.items()))
+
+def changed_rows(before: Dict[str, int], after: Dict[str, int]) -> int:
+    """Filas añadidas o eliminadas entre dos versiones"""
+    return sum(abs(after.get(name, 0) - before.get(name, 0)) for name in set(before) | set(after))
+
+class AnalysisStore:
+    """Último análisis de datos calculado, en memoria y en disco"""
+
+    def __init__(self, path: str = PRECOMPUTE_FILE, store: AggregationStore = ledger_store, engine: Any = None):
+        """
+        Args:
+            path: Archivo JSON donde se guarda el último análisis
+            store: Agregados de los registros
+            engine: Motor de reportes (por defecto, el compartido de utils.reports)
+        """
+        self.path = path
+        self.store = store
+        self.engine = engine
+        self._result: Optional[Dict[str, Any]] = None
+        self._mtime: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el último análisis guardado
+
+        Si otro proceso guardó uno más reciente, se lee del archivo.
+
+        Returns:
+            Diccionario con version, filas, calculado, datos y analisis, o None si aún no hay ninguno
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return self._result
+        if mtime != self._mtime:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._result = json.load(f)
+                self._mtime = mtime
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo leer el análisis guardado en {self.path}: {e}")
+        return self._result
+
+    async def refresh(self, min_changes: int = 1, force: bool = False,
+                      trigger: str = "demanda") -> Optional[Dict[str, Any]]:
+        """
+        Recalcula el análisis si los registros cambiaron lo suficiente
+
+        Solo se calcula un análisis a la vez; quien llega mientras otro se
+        calcula recibe ese mismo resultado.
+
+        Args:
+            min_changes: Filas nuevas desde el último análisis necesarias para recalcularlo
+            force: Si es True, se recalcula siempre (sin el análisis guardado ni la caché de respuestas)
+            trigger: Motivo del cálculo (para las métricas y los logs)
+
+        Returns:
+            El análisis actual (recalculado o no), o None si no hay ninguno
+
+        Raises:
+            Exception: Si falla el cálculo; lo guardado no se modifica
+        """
+        requested = time.time()
+        async with self._lock:
+            current = self.latest()
+            if current is not None and current["calculado"] >= requested:
+                # Se calculó mientras esperábamos el turno
+                return current
+            rows = await asyncio.to_thread(self.store.row_counts)
+            if current is not None and not force and changed_rows(current["filas"], rows) < max(1, min_changes):
+                return current
+
+            try:
+                # Agregados e indicadores sobre los registros completos, fuera del bucle de eventos
+                data = await worker_pool.run("reportes", analysis_data, self.store, self.engine)
+                analysis = await analyze_coffee_data(data, use_cache=not force, raise_errors=True)
+            except Exception:
+                PRECOMPUTE_RUNS.labels(trigger=trigger, result="error").inc()
+                raise
+            result = {
+                "version": data_version(rows),
+                "filas": rows,
+                "calculado": time.time(),
+                "datos": data,
+                "analisis": analysis,
+            }
+            await asyncio.to_thread(self._save, result)
+            PRECOMPUTE_RUNS.labels(trigger=trigger, result="ok").inc()
+            logger.info(f"Análisis de datos calculado ({trigger}, versión {result['version']})")
+            return result
+
+    def _save(self, result: Dict[str, Any]) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.path)
+        self._result = result
+        self._mtime = os.stat(self.path).st_mtime
+
+# Análisis compartido por los manejadores y las tareas programadas
+analysis_store = AnalysisStore()
+
+async def _run_job(min_changes: int, trigger: str) -> None:
+    try:
+        await analysis_store.refresh(min_changes=min_changes, trigger=trigger)
+    except Exception as e:
+        logger.warning(f"No se pudo precalcular el análisis de datos: {e}")
+
+async def daily_analysis_job(context) -> None:
+    """Tarea diaria: recalcula el análisis si hubo cualquier cambio"""
+    await _run_job(1, "diario")
+
+async def changes_analysis_job(context) -> None:
+    """Tarea periódica: recalcula el análisis cuando hay PRECOMPUTE_CHANGE_THRESHOLD filas nuevas"""
+    await _run_job(PRECOMPUTE_CHANGE_THRESHOLD, "cambios")
+
+def schedule_precompute(application) -> bool:
+    """
+    Programa las tareas del análisis en la JobQueue de la aplicación
+
+    Args:
+        application: Aplicación de python-telegram-bot
+
+    Returns:
+        True si se programaron; False si están desactivadas o no hay JobQueue
+        (en ese caso el análisis se calcula con el primer clic y se reutiliza hasta "Actualizar")
+    """
+    if not PRECOMPUTE_ENABLED:
+        return False
+    job_queue = application.job_queue
+    if job_queue is None:
+        logger.warning("JobQueue no disponible (instala python-telegram-bot[job-queue]); "
+                       "el análisis de datos no se precalculará")
+        return False
+
+    hour, minute = (int(part) for part in PRECOMPUTE_TIME.split(":"))
+    job_queue.run_daily(daily_analysis_job, time=dtime(hour, minute, tzinfo=timezone.utc),
+                        name="analisis_diario")
+    job_queue.run_repeating(changes_analysis_job, interval=PRECOMPUTE_CHECK_INTERVAL,
+                            first=FIRST_CHECK_DELAY, name="analisis_cambios")
+    logger.info(f"Análisis de datos programado a las {PRECOMPUTE_TIME} UTC y cada "
+                f"{PRECOMPUTE_CHECK_INTERVAL:.0f} s si hay {PRECOMPUTE_CHANGE_THRESHOLD} filas nuevas")
+    return True
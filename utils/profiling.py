@@ -0,0 +1,390 @@
+"""
+Perfilado del bucle de eventos y de las actualizaciones de Telegram
+
+Cuando el bot va lento, distingue una llamada que bloquea el bucle (E/S
+síncrona o un cálculo largo dentro de un manejador) de una red lenta:
+
+- Retraso del bucle: una tarea se despierta cada PROFILING_LAG_INTERVAL
+  segundos y anota cuánto tarda de más (event_loop_lag_seconds).
+- Bloqueos: un hilo vigía comprueba esos latidos. Si el bucle no late en
+  PROFILING_BLOCK_THRESHOLD segundos, toma una muestra de la pila del hilo
+  del bucle y la guarda con el manejador que se estaba ejecutando.
+- Actualizaciones: una capa previa y posterior alrededor de todos los
+  manejadores mide cada actualización por nombre de manejador y conserva
+  las PROFILING_SLOWEST más lentas, con el tiempo que bloquearon el bucle.
+- Perfilador por muestreo, que se activa y desactiva con /perf perfil: un
+  hilo toma la pila del bucle cada PROFILING_SAMPLE_INTERVAL segundos y
+  cuenta las funciones en las que se encuentra.
+
+Una actualización lenta sin bloqueos estuvo esperando (red, OpenAI, Sheets);
+una con bloqueos retuvo el bucle y retrasó a todos los demás chats.
+
+Con PROFILING_ENABLED=false no se envuelve ningún manejador ni se inicia
+ninguna tarea o hilo.
+"""
+
+import asyncio
+import collections
+import functools
+import heapq
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Counter, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from config import (
+    PROFILING_ENABLED, PROFILING_LAG_INTERVAL, PROFILING_BLOCK_THRESHOLD,
+    PROFILING_SLOWEST, PROFILING_SAMPLE_INTERVAL
+)
+from utils import metrics
+
+# Mediciones del retraso que se conservan (unos 10 minutos con el intervalo predeterminado)
+MAX_LAG_SAMPLES = 6000
+
+# Bloqueos que se conservan con su pila, y marcos de cada pila
+MAX_BLOCKS = 50
+STACK_DEPTH = 15
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = metrics.histogram(
+    "event_loop_lag_seconds", "Retraso del bucle de eventos al despertar una tarea",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_BLOCKS = metrics.counter(
+    "event_loop_blocks_total", "Veces que un manejador bloqueó el bucle más que el umbral", ("handler",)
+)
+
+class UpdateTiming(NamedTuple):
+    """Duración de una actualización en un manejador (blocked: su bloqueo del bucle más largo)"""
+    seconds: float
+    handler: str
+    kind: str
+    chat_id: Optional[int]
+    at: float
+    blocked: float
+
+class BlockSample(NamedTuple):
+    """Bloqueo del bucle con la pila tomada mientras duraba"""
+    seconds: float
+    handler: str
+    at: float
+    stack: str
+
+def describe_update(update: Any) -> str:
+    """Tipo de actualización para los informes: el comando, "texto", "documento" o el botón pulsado"""
+    query = getattr(update, "callback_query", None)
+    if query is not None:
+        return f"botón {query.data}"
+    message = getattr(update, "effective_message", None)
+    if message is None:
+        return type(update).__name__
+    if message.text:
+        return message.text.split()[0].split("@")[0] if message.text.startswith("/") else "texto"
+    if message.document:
+        return "documento"
+    return "mensaje"
+
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    try:
+        relative = os.path.relpath(path)
+        path = path if relative.startswith("..") else relative
+    except ValueError:
+        pass
+    if os.sep + "site-packages" + os.sep in path or os.sep + "lib" + os.sep + "python" in path:
+        path = os.path.basename(path)
+    return f"{path}:{code.co_firstlineno} {code.co_name}"
+
+def _is_idle(frame: Any) -> bool:
+    """El bucle está esperando eventos (en el select del selector), no trabajando"""
+    return frame.f_code.co_name in ("select", "poll") and frame.f_code.co_filename.endswith("selectors.py")
+
+class LoopProfiler:
+    """Retraso y bloqueos del bucle, duración de las actualizaciones y perfilador por muestreo"""
+
+    def __init__(self, lag_interval: float = PROFILING_LAG_INTERVAL,
+                 block_threshold: float = PROFILING_BLOCK_THRESHOLD,
+                 slowest: int = PROFILING_SLOWEST, sample_interval: float = PROFILING_SAMPLE_INTERVAL):
+        """
+        Args:
+            lag_interval: Segundos entre mediciones del retraso del bucle
+            block_threshold: Segundos sin latir a partir de los cuales el bucle se da por bloqueado
+            slowest: Actualizaciones más lentas que se conservan
+            sample_interval: Segundos entre muestras del perfilador
+        """
+        self.lag_interval = lag_interval
+        self.block_threshold = block_threshold
+        self.slowest = slowest
+        self.sample_interval = sample_interval
+
+        self._lags: Deque[float] = collections.deque(maxlen=MAX_LAG_SAMPLES)
+        self._blocks: Deque[BlockSample] = collections.deque(maxlen=MAX_BLOCKS)
+        # Montículo de mínimos: la raíz es la más rápida de las más lentas
+        self._slowest: List[Tuple[float, int, UpdateTiming]] = []
+        self._order = itertools.count()
+        # Por manejador: [actualizaciones, segundos totales, máximo, bloqueo del bucle más largo]
+        self._handlers: Dict[str, List[float]] = {}
+        self._running: Dict[asyncio.Task, str] = {}
+        self._blocked: Dict[asyncio.Task, float] = {}
+        self._lock = threading.Lock()
+        self.since = time.time()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._beat = time.monotonic()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+        self._sampler: Optional[threading.Thread] = None
+        self._sampling_stop = threading.Event()
+        self._sampling_since = 0.0
+        self._samples = 0
+        self._idle_samples = 0
+        self._self_counts: Counter[str] = collections.Counter()
+        self._total_counts: Counter[str] = collections.Counter()
+
+    # --- Capa alrededor de los manejadores ---------------------------------------
+
+    def wrap(self, callback: Callable) -> Callable:
+        """Envuelve un callback de manejador para medir cada actualización"""
+        name = getattr(callback, "__name__", type(callback).__name__)
+
+        @functools.wraps(callback)
+        async def wrapper(update: object, context: Any) -> Any:
+            task = asyncio.current_task()
+            self._running[task] = name
+            start = time.perf_counter()
+            try:
+                return await callback(update, context)
+            finally:
+                self._running.pop(task, None)
+                self.record(name, update, time.perf_counter() - start, self._blocked.pop(task, 0.0))
+
+        return wrapper
+
+    def record(self, handler: str, update: Any, seconds: float, blocked: float = 0.0) -> None:
+        """Anota la duración de una actualización en un manejador"""
+        chat = getattr(update, "effective_chat", None)
+        timing = UpdateTiming(seconds, handler, describe_update(update), getattr(chat, "id", None), time.time(), blocked)
+        with self._lock:
+            stats = self._handlers.setdefault(handler, [0, 0.0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            stats[3] = max(stats[3], blocked)
+            entry = (seconds, next(self._order), timing)
+            if len(self._slowest) < self.slowest:
+                heapq.heappush(self._slowest, entry)
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    # --- Retraso y bloqueos del bucle --------------------------------------------
+
+    def start(self) -> None:
+        """Empieza a medir el bucle en ejecución (desde una corrutina del propio bucle)"""
+        if self._heartbeat is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = asyncio.create_task(self._run_heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="profiling-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        """Detiene la medición y el perfilador por muestreo"""
+        self.stop_sampling()
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _run_heartbeat(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, time.perf_counter() - start - self.lag_interval)
+            self._beat = time.monotonic()
+            self._lags.append(lag)
+            LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        """Hilo vigía: si el bucle deja de latir, toma la pila del hilo del bucle"""
+        reported_beat = None
+        while not self._stop.wait(self.block_threshold / 4):
+            beat = self._beat
+            silent = time.monotonic() - beat - self.lag_interval
+            if silent < self.block_threshold:
+                continue
+            # current_task con el bucle explícito se puede consultar desde otro hilo
+            task = asyncio.current_task(self._loop)
+            handler = self._running.get(task)
+            if handler is None:
+                handler = "(fuera de los manejadores)"
+            else:
+                self._blocked[task] = max(self._blocked.get(task, 0.0), silent)
+            with self._lock:
+                if reported_beat == beat and self._blocks:
+                    # El mismo bloqueo sigue: se actualiza su duración
+                    self._blocks[-1] = self._blocks[-1]._replace(seconds=silent)
+                    continue
+                reported_beat = beat
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = "".join(traceback.format_stack(frame, limit=STACK_DEPTH)) if frame is not None else ""
+                self._blocks.append(BlockSample(silent, handler, time.time(), stack))
+            LOOP_BLOCKS.labels(handler=handler).inc()
+            logger.warning(
+                f"El bucle de eventos lleva {silent * 1000:.0f} ms bloqueado en {handler}:\n{stack}"
+            )
+
+    # --- Perfilador por muestreo -------------------------------------------------
+
+    @property
+    def sampling(self) -> bool:
+        """El perfilador por muestreo está activo"""
+        return self._sampler is not None
+
+    def start_sampling(self) -> None:
+        """Activa el perfilador por muestreo (borra las muestras anteriores)"""
+        if self._sampler is not None or self._loop_thread is None:
+            return
+        with self._lock:
+            self._samples = self._idle_samples = 0
+            self._self_counts.clear()
+            self._total_counts.clear()
+        self._sampling_since = time.time()
+        self._sampling_stop.clear()
+        self._sampler = threading.Thread(target=self._sample, name="profiling-sampler", daemon=True)
+        self._sampler.start()
+        logger.info(f"Perfilador por muestreo activado (cada {self.sample_interval * 1000:.0f} ms)")
+
+    def stop_sampling(self) -> None:
+        """Desactiva el perfilador por muestreo (las muestras se conservan para el informe)"""
+        if self._sampler is None:
+            return
+        self._sampling_stop.set()
+        self._sampler.join(timeout=1)
+        self._sampler = None
+        logger.info(f"Perfilador por muestreo desactivado tras {self._samples} muestras")
+
+    def _sample(self) -> None:
+        while not self._sampling_stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            with self._lock:
+                self._samples += 1
+                if _is_idle(frame):
+                    self._idle_samples += 1
+                    continue
+                self._self_counts[_frame_name(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    name = _frame_name(frame)
+                    if name not in seen:
+                        seen.add(name)
+                        self._total_counts[name] += 1
+                    frame = frame.f_back
+
+    def profile(self, top: int = 15) -> Dict[str, Any]:
+        """
+        Resultado del perfilador por muestreo
+
+        Args:
+            top: Funciones que se devuelven
+
+        Returns:
+            Muestras, muestras con el bucle inactivo, segundos de muestreo y las
+            funciones con más muestras propias y acumuladas (con sus llamadas)
+        """
+        with self._lock:
+            return {
+                "muestras": self._samples,
+                "inactivo": self._idle_samples,
+                "segundos": (time.time() - self._sampling_since) if self._sampling_since else 0.0,
+                "propias": self._self_counts.most_common(top),
+                "acumuladas": self._total_counts.most_common(top),
+            }
+
+    # --- Informes ----------------------------------------------------------------
+
+    def lag_stats(self) -> Dict[str, float]:
+        """Retraso del bucle en las mediciones recientes: p50, p95, p99 y máximo"""
+        lags = sorted(self._lags)
+        if not lags:
+            return {"mediciones": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+        def pick(fraction: float) -> float:
+            return lags[min(len(lags) - 1, int(len(lags) * fraction))]
+
+        return {"mediciones": len(lags), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": lags[-1]}
+
+    def slowest_updates(self) -> List[UpdateTiming]:
+        """Actualizaciones más lentas, de la más lenta a la más rápida"""
+        with self._lock:
+            return [timing for _, _, timing in sorted(self._slowest, reverse=True)]
+
+    def handler_stats(self) -> List[Tuple[str, int, float, float, float]]:
+        """Por manejador: (nombre, actualizaciones, media, máximo, bloqueo más largo), ordenados por máximo"""
+        with self._lock:
+            rows = [(name, int(count), total / count, worst, blocked)
+                    for name, (count, total, worst, blocked) in self._handlers.items() if count]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def blocks(self) -> List[BlockSample]:
+        """Bloqueos recientes, del más reciente al más antiguo"""
+        with self._lock:
+            return list(reversed(self._blocks))
+
+    def reset(self) -> None:
+        """Borra las mediciones acumuladas"""
+        with self._lock:
+            self._lags.clear()
+            self._blocks.clear()
+            self._slowest.clear()
+            self._handlers.clear()
+            self.since = time.time()
+
+# Perfilador compartido por la aplicación
+profiler = LoopProfiler()
+
+def install_profiling(application: Any) -> None:
+    """
+    Añade la capa de perfilado alrededor de todos los manejadores registrados
+
+    Se llama una vez, después de registrar los manejadores. No hace nada si el
+    perfilado está desactivado.
+
+    Args:
+        application: Aplicación de python-telegram-bot
+    """
+    if not PROFILING_ENABLED:
+        return
+    count = metrics.wrap_handlers(application, profiler.wrap, "__profiling_wrapped__")
+    logger.info(f"Perfilado activado para {count} manejadores")
+
+async def start_profiling(application: Any = None) -> None:
+    """Empieza a medir el bucle de eventos (se usa en el post_init de la aplicación)"""
+    if PROFILING_ENABLED:
+        profiler.start()
+
+async def stop_profiling(application: Any = None) -> None:
+    """Detiene la medición del bucle (se usa en el post_shutdown de la aplicación)"""
+    if PROFILING_ENABLED:
+        await profiler.stop()
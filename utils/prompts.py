@@ -0,0 +1,282 @@
+"""
+Construcción de prompts con presupuesto de tokens
+
+Serializa los registros tabulares de forma compacta (una fila de encabezado
+y una fila de valores por registro, en lugar de JSON indentado que repite
+las claves) y recorta los datos para no superar el presupuesto de tokens
+del modelo configurado: las filas recientes se conservan íntegras y las
+antiguas se muestrean o se resumen.
+
+Los tokens se miden con tiktoken una vez cargado su codificador (en
+segundo plano al arrancar); hasta entonces, o si no se puede cargar, se
+estiman y el presupuesto es aproximado.
+"""
+
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import OPENAI_MODEL, OPENAI_PROMPT_BUDGET
+
+# Ventana de contexto aproximada de cada familia de modelos (tokens)
+MODEL_CONTEXT = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4.1": 1000000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT = 8192
+
+# Tokens reservados para la respuesta (max_tokens) y para el texto fijo del prompt
+RESPONSE_TOKENS = 1000
+PROMPT_OVERHEAD_TOKENS = 500
+
+# Presupuesto máximo de datos aunque el modelo admita más: más tokens, más latencia y más coste
+MAX_DATA_BUDGET = 6000
+
+# Separador de columnas de las tablas compactas
+SEPARATOR = "|"
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+_encoders: Dict[str, Any] = {}
+_encoders_lock = threading.Lock()
+
+def load_encoder(model: str = OPENAI_MODEL) -> bool:
+    """
+    Carga el codificador de tiktoken del modelo
+
+    La primera vez tiktoken descarga sus tablas de la red, así que se llama
+    en un hilo al arrancar el bot (ver bot.py) y nunca desde count_tokens.
+
+    Args:
+        model: Modelo cuyo tokenizador se carga
+
+    Returns:
+        True si count_tokens pasa a medir los tokens exactos
+    """
+    with _encoders_lock:
+        if model not in _encoders:
+            try:
+                import tiktoken
+                try:
+                    _encoders[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encoders[model] = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"No se pudo cargar tiktoken para {model}, se estimarán los tokens: {e}")
+                _encoders[model] = None
+        return _encoders[model] is not None
+
+def count_tokens(text: str, model: str = OPENAI_MODEL) -> int:
+    """
+    Cuenta los tokens de un texto
+
+    Usa tiktoken si su codificador ya se cargó (ver load_encoder). Mientras
+    tanto, o si no está disponible, estima unos 4 caracteres por token: en
+    ese caso los presupuestos de tokens son aproximados.
+
+    Args:
+        text: Texto a medir
+        model: Modelo cuyo tokenizador se usa
+
+    Returns:
+        Número de tokens
+    """
+    encoder = _encoders.get(model)
+    if encoder is not None:
+        return len(encoder.encode(text))
+    return math.ceil(len(text) / 4)
+
+def token_budget(model: str = OPENAI_MODEL) -> int:
+    """
+    Presupuesto de tokens para los datos incluidos en un prompt
+
+    Args:
+        model: Modelo que recibirá el prompt
+
+    Returns:
+        OPENAI_PROMPT_BUDGET si está configurado; si no, lo que permita la
+        ventana de contexto del modelo, hasta MAX_DATA_BUDGET
+    """
+    if OPENAI_PROMPT_BUDGET:
+        return OPENAI_PROMPT_BUDGET
+    context = DEFAULT_CONTEXT
+    # Se busca el prefijo más largo para que "gpt-4-turbo" no caiga en "gpt-4"
+    for prefix in sorted(MODEL_CONTEXT, key=len, reverse=True):
+        if model.startswith(prefix):
+            context = MODEL_CONTEXT[prefix]
+            break
+    return max(0, min(MAX_DATA_BUDGET, context - RESPONSE_TOKENS - PROMPT_OVERHEAD_TOKENS))
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return str(value).replace(SEPARATOR, "/").replace("\n", " ")
+
+def _columns(records: Sequence[Dict[str, Any]]) -> List[str]:
+    columns: Dict[str, None] = {}
+    for record in records:
+        for key in record:
+            columns.setdefault(key, None)
+    return list(columns)
+
+def serialize_table(records: Sequence[Dict[str, Any]], columns: Optional[List[str]] = None) -> str:
+    """
+    Serializa registros como una fila de encabezado y una fila de valores por registro
+
+    Args:
+        records: Lista de diccionarios
+        columns: Columnas a incluir (por defecto, todas las que aparecen)
+
+    Returns:
+        Texto tabular compacto
+    """
+    columns = columns or _columns(records)
+    lines = [SEPARATOR.join(columns)]
+    for record in records:
+        lines.append(SEPARATOR.join(_format_value(record.get(column)) for column in columns))
+    return "\n".join(lines)
+
+def _to_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+def summarize_records(records: Sequence[Dict[str, Any]]) -> str:
+    """
+    Resume un bloque de registros en una línea con totales, mínimos y máximos numéricos
+
+    Args:
+        records: Registros a resumir
+
+    Returns:
+        Línea de texto con el resumen
+    """
+    stats: Dict[str, List[float]] = {}
+    for record in records:
+        for key, value in record.items():
+            number = _to_number(value)
+            if number is not None:
+                stats.setdefault(key, []).append(number)
+
+    parts = [f"{len(records)} registros"]
+    for key, values in stats.items():
+        parts.append(
+            f"{key}: suma {_format_value(sum(values))}, "
+            f"mín {_format_value(min(values))}, máx {_format_value(max(values))}"
+        )
+    return "; ".join(parts)
+
+def fit_records(records: Sequence[Dict[str, Any]], budget: int, model: str = OPENAI_MODEL) -> str:
+    """
+    Serializa registros dentro de un presupuesto de tokens
+
+    Si la tabla completa no cabe, se conservan las filas más recientes (al
+    final de la lista), se muestrean las anteriores a intervalos regulares y
+    el resto se describe con un resumen numérico.
+
+    Args:
+        records: Registros en orden cronológico
+        budget: Tokens disponibles
+        model: Modelo cuyo tokenizador se usa
+
+    Returns:
+        Texto tabular que cabe en el presupuesto
+    """
+    if not records:
+        return "(sin registros)"
+
+    columns = _columns(records)
+    text = serialize_table(records, columns)
+    tokens = count_tokens(text, model)
+    if tokens <= budget:
+        return text
+
+    # Estimar cuántas filas caben a partir del tamaño medio por fila
+    per_row = max(1.0, tokens / (len(records) + 1))
+    capacity = max(1, int(budget / per_row) - 2)
+
+    while capacity > 0:
+        recent_count = max(1, capacity * 2 // 3)
+        recent = list(records[-recent_count:])
+        older = list(records[:-recent_count])
+        sample_count = capacity - recent_count
+        step = max(1, math.ceil(len(older) / sample_count)) if sample_count else 0
+        sample = older[::step] if step else []
+
+        lines = []
+        if older:
+            lines.append(f"Registros anteriores resumidos: {summarize_records(older)}")
+        if sample:
+            lines.append(f"Muestra de registros anteriores (1 de cada {step}):")
+            lines.append(serialize_table(sample, columns))
+        lines.append(f"Últimos {len(recent)} registros:")
+        lines.append(serialize_table(recent, columns))
+        text = "\n".join(lines)
+
+        if count_tokens(text, model) <= budget:
+            return text
+        capacity = int(capacity * 0.8)
+
+    return f"Registros resumidos: {summarize_records(records)}"
+
+def _is_table(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+def _is_keyed_table(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(isinstance(item, dict) for item in value.values())
+
+def _flatten(data: Any, path: str, scalars: List[str], tables: List[Tuple[str, List[Dict[str, Any]]]]) -> None:
+    if _is_table(data):
+        tables.append((path, data))
+    elif _is_keyed_table(data):
+        # {"2024-01": {"total": 10}, ...} -> filas con la clave como primera columna
+        tables.append((path, [{"clave": key, **value} for key, value in data.items()]))
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            _flatten(value, f"{path}.{key}" if path else str(key), scalars, tables)
+    else:
+        scalars.append(f"{path}: {_format_value(data)}")
+
+def serialize_data(data: Dict[str, Any], budget: Optional[int] = None, model: str = OPENAI_MODEL) -> str:
+    """
+    Serializa datos anidados de forma compacta dentro de un presupuesto de tokens
+
+    Los valores simples se escriben como "ruta: valor" y las listas de
+    registros como tablas compactas. Cada tabla recibe una parte del
+    presupuesto proporcional a su tamaño.
+
+    Args:
+        data: Datos a incluir en el prompt
+        budget: Tokens disponibles (por defecto, token_budget(model))
+        model: Modelo que recibirá el prompt
+
+    Returns:
+        Texto listo para insertar en el prompt
+    """
+    budget = token_budget(model) if budget is None else budget
+    scalars: List[str] = []
+    tables: List[Tuple[str, List[Dict[str, Any]]]] = []
+    _flatten(data, "", scalars, tables)
+
+    sections = ["\n".join(scalars)] if scalars else []
+    remaining = budget - count_tokens(sections[0], model) if scalars else budget
+
+    sizes = [count_tokens(serialize_table(rows), model) for _, rows in tables]
+    total_size = sum(sizes) or 1
+    for (path, rows), size in zip(tables, sizes):
+        share = size if total_size <= remaining else max(20, remaining * size // total_size)
+        sections.append(f"[{path}]\n{fit_records(rows, share, model)}")
+
+    return "\n\n".join(sections)
@@ -0,0 +1,536 @@
+"""
+Motor de reportes vectorizado sobre los registros columnares
+
+Las columnas de cada registro (data/*.ledger) se cargan una sola vez en
+arrays NumPy y después solo se anexan las filas nuevas. Los textos
+(proveedor, cliente, estado...) se guardan como códigos enteros, de modo que
+las agrupaciones por día, semana, mes, proveedor o cliente son un
+np.bincount en lugar de un bucle de Python sobre listas de diccionarios.
+
+Además de totales por periodo y por columna, calcula:
+- Costo por kg de las compras (por proveedor, mes, etc.)
+- Rendimientos de cada paso del proceso (cereza → pergamino → oro) a
+  partir de la cantidad de entrada y la merma (o la cantidad resultante)
+- Ganancia de cada venta: ingreso menos los kg vendidos al costo por kg
+  del estado vendido, que se deduce de las compras y los rendimientos
+
+Uso desde la línea de comandos:
+    python -m utils.reports ventas --por mes
+    python -m utils.reports ganancia --por cliente --desde 2024-01-01
+    python -m utils.reports rendimientos
+"""
+
+import argparse
+import json
+import logging
+import threading
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.ledger import (
+    AMOUNT_FIELDS, DATE_FIELDS, LEDGER_FILES, NUMERIC_TYPES, PRICE_FIELDS, QUANTITY_FIELDS, _to_ordinal, load_ledger
+)
+from utils import metrics
+
+REPORT_FILES = LEDGER_FILES
+
+# Periodos por los que se puede agrupar, además de cualquier columna de texto
+PERIODS = ("dia", "semana", "mes")
+
+# Estados del café en orden de proceso
+COFFEE_STATES = ("cereza", "pergamino", "oro")
+
+# Estado en que se compra el café cuando el registro de compras no lo indica
+DEFAULT_PURCHASE_STATE = "cereza"
+
+# Columnas donde se busca el estado del café comprado o vendido
+STATE_FIELDS = ("tipo_cafe", "estado_cafe", "tipo", "estado")
+
+# Columnas de la cantidad resultante de un paso del proceso y de su merma
+RESULT_FIELDS = ("cantidad_resultante", "resultado", "cantidad_final")
+LOSS_FIELDS = ("merma", "perdida")
+
+# Ordinal de 1970-01-01, origen de datetime64
+_EPOCH = date(1970, 1, 1).toordinal()
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+REPORT_SECONDS = metrics.histogram(
+    "reports_seconds", "Duración de los reportes vectorizados", ("report",)
+)
+
+def _first(names: Sequence[str], candidates: Sequence[str]) -> Optional[str]:
+    return next((name for name in candidates if name in names), None)
+
+def coffee_state(label: str) -> Optional[str]:
+    """Estado del café (cereza, pergamino u oro) que menciona un texto, o None"""
+    text = label.strip().lower()
+    return next((state for state in COFFEE_STATES if state in text), None)
+
+class LedgerFrame:
+    """Columnas de un registro en arrays NumPy, actualizadas solo con las filas nuevas"""
+
+    def __init__(self, file_path: str):
+        """
+        Args:
+            file_path: Registro CSV (su registro columnar se crea si aún no existe)
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.rows = 0
+        self.types: Dict[str, str] = {}
+        self.numbers: Dict[str, np.ndarray] = {}
+        self.days = np.zeros(0, dtype=np.int64)
+        self.codes: Dict[str, np.ndarray] = {}
+        self.labels: Dict[str, List[str]] = {}
+        self._lookup: Dict[str, Dict[str, int]] = {}
+        self.date_field: Optional[str] = None
+
+    def refresh(self) -> bool:
+        """
+        Carga las filas añadidas al registro desde la última vez
+
+        Returns:
+            True si hubo filas nuevas
+        """
+        ledger = load_ledger(self.file_path)
+        with self._lock:
+            if ledger is None:
+                changed = self.rows > 0
+                self._reset()
+                return changed
+            stop = ledger.rows
+            types = {spec["name"]: spec["type"] for spec in ledger.meta["columns"]}
+            if stop < self.rows or types != self.types:
+                # El registro se volvió a importar desde cero
+                self._reset()
+                self.types = types
+                self.date_field = _first(
+                    [name for name, type_ in types.items() if type_ == "date"], DATE_FIELDS
+                )
+            start = self.rows
+            if stop == start:
+                return False
+
+            for name, type_ in types.items():
+                if type_ in NUMERIC_TYPES or type_ == "date":
+                    values = np.frombuffer(
+                        ledger.column_bytes(name, start, stop), dtype=np.float64 if type_ == "float" else np.int64
+                    )
+                    if type_ == "date":
+                        if name == self.date_field:
+                            self.days = np.concatenate([self.days, values])
+                        continue
+                    # Los vacíos cuentan como 0, igual que en los agregados
+                    values = np.nan_to_num(values.astype(np.float64, copy=False), nan=0.0)
+                    self.numbers[name] = np.concatenate([self.numbers.get(name, values[:0]), values])
+                else:
+                    self._load_codes(ledger, name, start, stop)
+            self.rows = stop
+            return True
+
+    def _load_codes(self, ledger, name: str, start: int, stop: int) -> None:
+        """Convierte los textos de las filas nuevas en códigos enteros"""
+        lookup = self._lookup.setdefault(name, {})
+        labels = self.labels.setdefault(name, [])
+        if start == 0 and name in ledger.indexes["keys"]:
+            # Columna indexada: los códigos salen del índice sin decodificar ningún texto
+            codes = np.zeros(stop, dtype=np.int32)
+            for key, rows in ledger.key_rows(name).items():
+                rows = np.frombuffer(rows, dtype=np.int64)
+                rows = rows[rows < stop]
+                if len(rows):
+                    lookup[key] = len(labels)
+                    labels.append(key)
+                    codes[rows] = lookup[key]
+        else:
+            # Se leen de una vez los desplazamientos y los bytes de las filas nuevas;
+            # cada texto distinto se decodifica una sola vez
+            base, data = ledger.text_bytes(name, start, stop)
+            ends = [base] + np.frombuffer(ledger.column_bytes(name, start, stop), dtype=np.uint64).tolist()
+            by_bytes: Dict[bytes, int] = {}
+
+            def code(raw: bytes) -> int:
+                value = by_bytes.get(raw)
+                if value is None:
+                    value = by_bytes[raw] = lookup.setdefault(raw.decode("utf-8").strip(), len(lookup))
+                return value
+
+            new = np.fromiter(
+                (code(data[begin - base:end - base]) for begin, end in zip(ends[:-1], ends[1:])),
+                dtype=np.int32, count=stop - start
+            )
+            labels.extend(sorted(lookup, key=lookup.get)[len(labels):])
+            codes = np.concatenate([self.codes.get(name, new[:0]), new])
+        self.codes[name] = codes
+
+    def column(self, candidates: Sequence[str]) -> Optional[np.ndarray]:
+        """Primera columna numérica que exista entre varios nombres posibles"""
+        name = _first(list(self.numbers), candidates)
+        return self.numbers[name] if name else None
+
+    def quantity(self) -> np.ndarray:
+        values = self.column(QUANTITY_FIELDS)
+        return values if values is not None else np.zeros(self.rows)
+
+    def amount(self) -> np.ndarray:
+        """Importe de cada fila: la columna de total o, si falta, precio × cantidad"""
+        values = self.column(AMOUNT_FIELDS)
+        if values is not None:
+            return values
+        price = self.column(PRICE_FIELDS)
+        return price * self.quantity() if price is not None else np.zeros(self.rows)
+
+    def mask(self, desde: Union[str, date, None] = None, hasta: Union[str, date, None] = None) -> np.ndarray:
+        """Filas con fecha dentro del rango (todas si no se acota)"""
+        start, end = _to_ordinal(desde), _to_ordinal(hasta)
+        if (start is None and end is None) or not self.rows:
+            return np.ones(self.rows, dtype=bool)
+        if self.date_field is None:
+            raise ValueError(f"{self.file_path} no tiene columna de fecha")
+        mask = self.days > 0
+        if start is not None:
+            mask &= self.days >= start
+        if end is not None:
+            mask &= self.days <= end
+        return mask
+
+    def group_keys(self, by: str) -> Tuple[np.ndarray, List[str]]:
+        """
+        Clave entera de cada fila para agrupar y la etiqueta de cada clave
+
+        Args:
+            by: "dia", "semana", "mes" o el nombre de una columna de texto
+
+        Returns:
+            (claves de 0 a n-1, con -1 en las filas sin dato; etiquetas)
+        """
+        if not self.rows:
+            return np.zeros(0, dtype=np.int64), []
+        if by in PERIODS:
+            if self.date_field is None:
+                raise ValueError(f"{self.file_path} no tiene columna de fecha")
+            days = self.days
+            if by == "dia":
+                keys = days
+            elif by == "semana":
+                # El ordinal 1 (0001-01-01) es lunes: se agrupa por el lunes de cada semana
+                keys = days - (days - 1) % 7
+            else:
+                keys = (days - _EPOCH).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+            valid = days > 0
+            if not valid.any():
+                return np.full(self.rows, -1, dtype=np.int64), []
+            low = keys[valid].min()
+            step = 7 if by == "semana" else 1
+            dense = np.where(valid, (keys - low) // step, -1)
+            present = np.flatnonzero(np.bincount(dense[valid]))
+            remap = np.full(present[-1] + 1, -1, dtype=np.int64)
+            remap[present] = np.arange(len(present))
+            dense = np.where(valid, remap[np.maximum(dense, 0)], -1)
+            return dense, [_period_label(by, int(low + key * step)) for key in present]
+
+        if by not in self.codes:
+            raise ValueError(f"{self.file_path} no tiene la columna de texto {by}")
+        labels = self.labels[by]
+        codes = self.codes[by].astype(np.int64)
+        if "" in self._lookup[by]:
+            codes = np.where(codes == self._lookup[by][""], -1, codes)
+        return codes, labels
+
+def _period_label(period: str, key: int) -> str:
+    if period == "mes":
+        return f"{1970 + key // 12}-{key % 12 + 1:02d}"
+    day = date.fromordinal(key)
+    if period == "semana":
+        iso_year, iso_week, _ = day.isocalendar()
+        return f"{iso_year}-S{iso_week:02d}"
+    return day.isoformat()
+
+def group_sums(keys: np.ndarray, labels: Sequence[str], mask: np.ndarray,
+               values: Dict[str, np.ndarray]) -> Dict[str, Dict[str, float]]:
+    """
+    Número de filas y sumas de varias columnas por clave, con np.bincount
+
+    Args:
+        keys: Clave de 0 a len(labels)-1 de cada fila (-1 = sin dato)
+        labels: Etiqueta de cada clave
+        mask: Filas que se incluyen
+        values: {nombre: array por fila}
+
+    Returns:
+        {etiqueta: {"registros": n, nombre: suma, ...}} solo con las claves presentes
+    """
+    selected = mask & (keys >= 0)
+    keys = keys[selected]
+    counts = np.bincount(keys, minlength=len(labels))
+    sums = {name: np.bincount(keys, weights=array[selected], minlength=len(labels)) for name, array in values.items()}
+    result = {}
+    for key in np.flatnonzero(counts):
+        entry = {"registros": int(counts[key])}
+        entry.update({name: float(total[key]) for name, total in sums.items()})
+        result[labels[key]] = entry
+    return result
+
+def _per_kg(amount: float, quantity: float) -> Optional[float]:
+    return round(amount / quantity, 2) if quantity else None
+
+def _rounded(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: round(value, 2) if isinstance(value, float) else value for key, value in entry.items()}
+
+class ReportEngine:
+    """Reportes de compras, procesos, ventas y gastos sobre columnas NumPy en caché"""
+
+    def __init__(self, files: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            files: {nombre: CSV} de los registros (por defecto, los de config)
+        """
+        self.frames = {name: LedgerFrame(path) for name, path in (files or REPORT_FILES).items()}
+        # Un reporte lee varias columnas del mismo registro: no pueden cambiar a mitad
+        self._lock = threading.RLock()
+
+    def frame(self, name: str) -> LedgerFrame:
+        """Columnas de un registro, con sus filas nuevas ya cargadas"""
+        with self._lock:
+            frame = self.frames[name]
+            frame.refresh()
+            return frame
+
+    def totals(self, name: str, by: str, desde: Union[str, date, None] = None,
+               hasta: Union[str, date, None] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Registros, importe total, cantidad e importe por kg agrupados
+
+        Args:
+            name: Registro ("compras", "proceso", "ventas" o "gastos")
+            by: "dia", "semana", "mes" o una columna de texto (proveedor, cliente, estado...)
+            desde: Primera fecha (incluida)
+            hasta: Última fecha (incluida)
+
+        Returns:
+            {grupo: {"registros", "total", "cantidad", "por_kg"}}
+        """
+        with self._lock, REPORT_SECONDS.labels(report="totales").time():
+            frame = self.frame(name)
+            keys, labels = frame.group_keys(by)
+            groups = group_sums(keys, labels, frame.mask(desde, hasta),
+                                {"total": frame.amount(), "cantidad": frame.quantity()})
+            for entry in groups.values():
+                entry["por_kg"] = _per_kg(entry["total"], entry["cantidad"])
+            return {key: _rounded(entry) for key, entry in groups.items()}
+
+    def cost_per_kg(self, by: str = "proveedor", desde: Union[str, date, None] = None,
+                    hasta: Union[str, date, None] = None) -> Dict[str, Optional[float]]:
+        """Costo medio por kg de las compras (ponderado por cantidad) agrupado"""
+        return {key: entry["por_kg"] for key, entry in self.totals("compras", by, desde, hasta).items()}
+
+    def inventory_by_state(self) -> Dict[str, float]:
+        """Cantidad de café por estado en el registro de procesos"""
+        return {key: entry["cantidad"] for key, entry in self.totals("proceso", "estado").items()}
+
+    def yields(self, desde: Union[str, date, None] = None,
+               hasta: Union[str, date, None] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Rendimiento de cada paso del proceso (kg obtenidos por kg de entrada)
+
+        La cantidad obtenida es la columna de resultado si existe o, si no,
+        la cantidad de entrada menos la merma. Si no hay procesos directos de
+        cereza a oro, ese rendimiento se obtiene encadenando los pasos.
+
+        Returns:
+            {"cereza→pergamino": {"entrada", "salida", "rendimiento", "registros"}, ...}
+        """
+        with self._lock, REPORT_SECONDS.labels(report="rendimientos").time():
+            frame = self.frame("proceso")
+            if "origen" not in frame.codes or "destino" not in frame.codes:
+                return {}
+            quantity = frame.quantity()
+            result = frame.column(RESULT_FIELDS)
+            if result is None:
+                loss = frame.column(LOSS_FIELDS)
+                result = quantity - loss if loss is not None else None
+            if result is None:
+                return {}
+
+            # Clave combinada origen × destino para agrupar los pasos de una vez
+            origins, origin_labels = frame.group_keys("origen")
+            targets, target_labels = frame.group_keys("destino")
+            width = max(1, len(target_labels))
+            keys = np.where((origins >= 0) & (targets >= 0), origins * width + targets, -1)
+            labels = [f"{origin}→{target}" for origin in origin_labels for target in target_labels]
+            steps = group_sums(keys, labels, frame.mask(desde, hasta), {"entrada": quantity, "salida": result})
+
+        yields = {}
+        for step, entry in steps.items():
+            origin, target = step.split("→", 1)
+            states = coffee_state(origin), coffee_state(target)
+            if not entry["entrada"] or None in states:
+                continue
+            key = f"{states[0]}→{states[1]}"
+            total = yields.setdefault(key, {"registros": 0, "entrada": 0.0, "salida": 0.0})
+            for field in total:
+                total[field] += entry[field]
+        for entry in yields.values():
+            entry["rendimiento"] = entry["salida"] / entry["entrada"] if entry["entrada"] else None
+
+        # Pasos que faltan, encadenando los que hay (p. ej. cereza→oro = cereza→pergamino × pergamino→oro)
+        for i, origin in enumerate(COFFEE_STATES):
+            for j in range(i + 2, len(COFFEE_STATES)):
+                key = f"{origin}→{COFFEE_STATES[j]}"
+                chain = [yields.get(f"{COFFEE_STATES[k]}→{COFFEE_STATES[k + 1]}") for k in range(i, j)]
+                if key not in yields and all(step and step["rendimiento"] for step in chain):
+                    yields[key] = {"rendimiento": float(np.prod([step["rendimiento"] for step in chain])),
+                                   "encadenado": True}
+        return {key: {field: round(value, 4) if isinstance(value, float) else value
+                      for field, value in entry.items()} for key, entry in yields.items()}
+
+    def cost_by_state(self) -> Dict[str, float]:
+        """
+        Costo por kg de cada estado del café
+
+        El de los estados comprados sale de las compras; el de los siguientes,
+        de dividir el costo del estado anterior por el rendimiento del paso.
+        """
+        with self._lock:
+            frame = self.frame("compras")
+            state_field = _first(list(frame.codes), STATE_FIELDS)
+            amount, quantity = frame.amount(), frame.quantity()
+            costs = {}
+            if state_field:
+                keys, labels = frame.group_keys(state_field)
+                # Las compras sin estado reconocible (o sin dato, clave -1, el último) van a DEFAULT_PURCHASE_STATE
+                state_of = np.array([COFFEE_STATES.index(coffee_state(label) or DEFAULT_PURCHASE_STATE)
+                                     for label in labels] + [COFFEE_STATES.index(DEFAULT_PURCHASE_STATE)])
+                states = state_of[keys]
+            else:
+                states = np.full(frame.rows, COFFEE_STATES.index(DEFAULT_PURCHASE_STATE))
+            totals = np.bincount(states, weights=amount, minlength=len(COFFEE_STATES))
+            kilos = np.bincount(states, weights=quantity, minlength=len(COFFEE_STATES))
+            for index, state in enumerate(COFFEE_STATES):
+                if kilos[index]:
+                    costs[state] = float(totals[index] / kilos[index])
+
+        yields = self.yields()
+        for previous, state in zip(COFFEE_STATES, COFFEE_STATES[1:]):
+            step = yields.get(f"{previous}→{state}")
+            if state not in costs and previous in costs and step and step.get("rendimiento"):
+                costs[state] = costs[previous] / step["rendimiento"]
+        return {state: round(cost, 2) for state, cost in costs.items()}
+
+    def sale_profits(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ingreso y costo del café vendido de cada venta
+
+        El costo es la cantidad vendida por el costo por kg del estado vendido
+        (columna tipo_cafe o similar); si no se reconoce, el de DEFAULT_PURCHASE_STATE.
+
+        Returns:
+            (ingresos, costos), un valor por fila del registro de ventas
+        """
+        costs = self.cost_by_state()
+        with self._lock:
+            frame = self.frame("ventas")
+            fallback = costs.get(DEFAULT_PURCHASE_STATE, next(iter(costs.values()), 0.0))
+            state_field = _first(list(frame.codes), STATE_FIELDS)
+            if state_field:
+                keys, labels = frame.group_keys(state_field)
+                # Las ventas sin dato (clave -1) toman el último valor: el costo por defecto
+                by_label = np.array([costs.get(coffee_state(label) or "", fallback) for label in labels] + [fallback])
+                cost_per_kg = by_label[keys]
+            else:
+                cost_per_kg = np.full(frame.rows, fallback)
+            return frame.amount(), frame.quantity() * cost_per_kg
+
+    def profit(self, by: str = "mes", desde: Union[str, date, None] = None,
+               hasta: Union[str, date, None] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Ingresos, costo del café vendido, ganancia y margen de las ventas agrupados
+
+        Args:
+            by: "dia", "semana", "mes" o una columna de texto de ventas (p. ej. "cliente")
+            desde: Primera fecha (incluida)
+            hasta: Última fecha (incluida)
+
+        Returns:
+            {grupo: {"registros", "ingresos", "costo", "ganancia", "margen"}}
+        """
+        with self._lock, REPORT_SECONDS.labels(report="ganancia").time():
+            revenue, cost = self.sale_profits()
+            frame = self.frames["ventas"]
+            keys, labels = frame.group_keys(by)
+            groups = group_sums(keys, labels, frame.mask(desde, hasta),
+                                {"ingresos": revenue, "costo": cost, "ganancia": revenue - cost})
+        for entry in groups.values():
+            entry["margen"] = round(100 * entry["ganancia"] / entry["ingresos"], 1) if entry["ingresos"] else None
+        return {key: _rounded(entry) for key, entry in groups.items()}
+
+    def indicators(self, limit: int = 12) -> Dict[str, Any]:
+        """
+        Indicadores de rentabilidad y rendimiento para el análisis de IA
+
+        Args:
+            limit: Grupos máximos de cada tabla (los más recientes o los de más importe)
+
+        Returns:
+            Diccionario con costos por kg, rendimientos y ganancia por mes y por cliente
+        """
+        data: Dict[str, Any] = {}
+        try:
+            data["rendimientos"] = self.yields()
+            data["costo_kg_por_estado"] = self.cost_by_state()
+            if "proveedor" in self.frame("compras").codes:
+                by_supplier = self.totals("compras", "proveedor")
+                top = sorted(by_supplier.items(), key=lambda item: item[1]["total"], reverse=True)[:limit]
+                data["costo_kg_por_proveedor"] = {key: entry["por_kg"] for key, entry in top}
+            if self.frame("ventas").rows:
+                by_month = self.profit("mes")
+                data["ganancia_por_mes"] = {key: by_month[key] for key in sorted(by_month)[-limit:]}
+                if "cliente" in self.frame("ventas").codes:
+                    by_client = self.profit("cliente")
+                    top = sorted(by_client.items(), key=lambda item: item[1]["ganancia"], reverse=True)[:limit]
+                    data["ganancia_por_cliente"] = dict(top)
+        except (ValueError, KeyError) as e:
+            logger.warning(f"No se pudieron calcular todos los indicadores: {e}")
+        return data
+
+# Motor compartido por los manejadores; las columnas se cargan la primera vez que se usan
+report_engine = ReportEngine()
+
+def _print_table(groups: Dict[str, Dict[str, Any]]) -> None:
+    if not groups:
+        print("(sin datos)")
+        return
+    fields = list(next(iter(groups.values())))
+    width = max(len(key) for key in groups)
+    print(" " * width + "  " + "  ".join(f"{field:>12}" for field in fields))
+    for key, entry in groups.items():
+        print(f"{key:<{width}}  " + "  ".join(
+            f"{entry[field]:>12}" if entry.get(field) is not None else f"{'-':>12}" for field in fields
+        ))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reportes de los registros de café")
+    parser.add_argument("reporte", choices=["compras", "proceso", "ventas", "gastos", "ganancia", "rendimientos",
+                                            "costos", "inventario"])
+    parser.add_argument("--por", default="mes", help="dia, semana, mes o una columna (proveedor, cliente...)")
+    parser.add_argument("--desde")
+    parser.add_argument("--hasta")
+    args = parser.parse_args()
+
+    if args.reporte == "ganancia":
+        _print_table(report_engine.profit(args.por, args.desde, args.hasta))
+    elif args.reporte == "rendimientos":
+        print(json.dumps(report_engine.yields(args.desde, args.hasta), ensure_ascii=False, indent=2))
+    elif args.reporte == "costos":
+        print(json.dumps(report_engine.cost_by_state(), ensure_ascii=False, indent=2))
+    elif args.reporte == "inventario":
+        print(json.dumps(report_engine.inventory_by_state(), ensure_ascii=False, indent=2))
+    else:
+        _print_table(report_engine.totals(args.reporte, args.por, args.desde, args.hasta))
@@ -0,0 +1,267 @@
+"""
+Llamadas resilientes a OpenAI: reintentos, peticiones de cobertura y
+cortacircuitos con modelo de respaldo
+
+- Cada intento tiene su propio plazo y todos juntos un presupuesto total,
+  de modo que la latencia de cola queda acotada.
+- Los errores transitorios (429, 5xx, tiempos agotados, conexión) se
+  reintentan con espera exponencial con jitter, respetando Retry-After.
+- Opcionalmente, si un intento tarda más de OPENAI_HEDGE_AFTER segundos se
+  lanza una segunda petición idéntica y se usa la primera que termine.
+- Un cortacircuitos sigue los fallos del modelo principal: tras varios
+  seguidos se abre y las llamadas van al modelo de respaldo (más barato y
+  rápido) hasta que, pasado un tiempo, una llamada de prueba al principal
+  sale bien.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from utils import metrics
+
+# Códigos HTTP que indican un error transitorio
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+RETRIES = metrics.counter("openai_retries_total", "Reintentos de llamadas a OpenAI", ("reason",))
+HEDGES = metrics.counter(
+    "openai_hedged_requests_total", "Peticiones de cobertura que resolvieron la llamada, según cuál respondió antes",
+    ("winner",)
+)
+FALLBACKS = metrics.counter("openai_fallback_calls_total", "Intentos enviados al modelo de respaldo")
+BREAKER_OPEN = metrics.gauge("openai_circuit_open", "1 si el cortacircuitos del modelo principal está abierto")
+
+class CircuitOpenError(Exception):
+    """El modelo principal está marcado como caído y no hay modelo de respaldo"""
+
+def is_retryable(error: BaseException) -> bool:
+    """Indica si un error de OpenAI es transitorio y merece otro intento"""
+    # Import local: el SDK de openai solo se carga con la primera consulta de IA
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(error, (asyncio.TimeoutError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+def error_reason(error: BaseException) -> str:
+    """Etiqueta corta del error para los registros y las métricas"""
+    from openai import APIStatusError
+
+    if isinstance(error, APIStatusError):
+        return str(error.status_code)
+    if isinstance(error, asyncio.TimeoutError):
+        return "plazo"
+    return type(error).__name__
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Segundos indicados por las cabeceras retry-after-ms o Retry-After de la respuesta"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """Cortacircuitos por fallos consecutivos con una llamada de prueba tras el enfriamiento"""
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        """
+        Args:
+            failure_threshold: Fallos seguidos que abren el circuito
+            cooldown: Segundos que permanece abierto antes de probar de nuevo
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        self.times_opened = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Indica si la llamada puede ir al modelo principal"""
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.cooldown:
+            return False
+        # Medio abierto: una sola llamada de prueba (otra si la anterior no informó a tiempo)
+        if self._probe_started is None or now - self._probe_started >= self.cooldown:
+            self._probe_started = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("El modelo principal de OpenAI respondió de nuevo; se cierra el cortacircuitos")
+            BREAKER_OPEN.set(0)
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.opened_at is not None:
+            # Falló la llamada de prueba: otro periodo de enfriamiento
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+        elif self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            BREAKER_OPEN.set(1)
+            logger.warning(
+                f"{self.failures} fallos seguidos del modelo principal de OpenAI; "
+                f"se usa el de respaldo durante {self.cooldown:.0f} s"
+            )
+
+class ResiliencePolicy:
+    """Plazos, reintentos, peticiones de cobertura y modelo de respaldo para una llamada"""
+
+    def __init__(self, attempt_timeout: float = 30.0, total_timeout: float = 60.0, max_retries: int = 2,
+                 base_delay: float = 0.5, max_delay: float = 8.0, hedge_after: float = 0.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            attempt_timeout: Segundos máximos de cada intento
+            total_timeout: Segundos máximos de la llamada con todos sus intentos
+            max_retries: Reintentos tras el primer intento
+            base_delay: Espera antes del primer reintento (se duplica en cada uno)
+            max_delay: Espera máxima entre reintentos
+            hedge_after: Segundos tras los que se lanza una petición de cobertura (0 = nunca)
+            breaker: Cortacircuitos del modelo principal (None = sin cortacircuitos)
+        """
+        self.attempt_timeout = attempt_timeout
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_after = hedge_after
+        self.breaker = breaker
+
+    def backoff(self, attempt: int) -> float:
+        """Espera exponencial con jitter completo antes del reintento número `attempt` (desde 1)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    async def call(self, request: Callable[[str, float], Awaitable[Any]], model: str,
+                   fallback_model: Optional[str] = None,
+                   discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> Tuple[Any, str]:
+        """
+        Ejecuta una petición con la política
+
+        Args:
+            request: Función que lanza la petición para un modelo con un plazo en segundos
+            model: Modelo principal
+            fallback_model: Modelo de respaldo mientras el principal falla (opcional)
+            discard: Función para liberar el resultado de una petición de cobertura que
+                terminó pero no se usó (p. ej. cerrar un stream)
+
+        Returns:
+            (resultado, modelo que respondió)
+
+        Raises:
+            La última excepción si se agotan los intentos o el presupuesto de tiempo,
+            o CircuitOpenError si el principal está caído y no hay respaldo
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.total_timeout
+        force_fallback = False
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(self.max_retries + 1):
+            use_primary = not force_fallback and (self.breaker is None or self.breaker.allow())
+            if not use_primary and not fallback_model:
+                raise CircuitOpenError(f"El modelo {model} no está disponible en este momento")
+            current = model if use_primary else fallback_model
+            if not use_primary:
+                FALLBACKS.inc()
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                result = await self._attempt(request, current, min(self.attempt_timeout, remaining), discard)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                if use_primary and self.breaker is not None:
+                    self.breaker.record_failure()
+            else:
+                if use_primary and self.breaker is not None:
+                    self.breaker.record_success()
+                return result, current
+
+            if attempt == self.max_retries:
+                break
+            retry_after = retry_after_seconds(last_error)
+            delay = retry_after if retry_after is not None else self.backoff(attempt + 1)
+            if loop.time() + delay >= deadline:
+                if not (use_primary and fallback_model):
+                    break
+                # El principal pide esperar más de lo que queda: se prueba el respaldo ya
+                delay, force_fallback = 0.0, True
+            reason = error_reason(last_error)
+            RETRIES.labels(reason=reason).inc()
+            logger.warning(
+                f"Llamada a OpenAI ({current}) fallida ({reason}); "
+                f"reintento {attempt + 1}/{self.max_retries} en {delay:.2f} s"
+            )
+            await asyncio.sleep(delay)
+
+        raise last_error if last_error is not None else asyncio.TimeoutError()
+
+    async def _attempt(self, request: Callable[[str, float], Awaitable[Any]], model: str, timeout: float,
+                       discard: Optional[Callable[[Any], Awaitable[None]]]) -> Any:
+        if not self.hedge_after or self.hedge_after >= timeout:
+            return await asyncio.wait_for(request(model, timeout), timeout)
+        return await asyncio.wait_for(self._hedged(request, model, timeout, discard), timeout)
+
+    async def _hedged(self, request: Callable[[str, float], Awaitable[Any]], model: str, timeout: float,
+                      discard: Optional[Callable[[Any], Awaitable[None]]]) -> Any:
+        """Lanza una segunda petición si la primera tarda; devuelve la primera que termine bien"""
+        first = asyncio.ensure_future(request(model, timeout))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future(request(model, timeout - self.hedge_after))
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if not task.cancelled() and task.exception() is None]
+                for task in done:
+                    if task not in winners and not task.cancelled():
+                        error = task.exception()
+                if winners:
+                    HEDGES.labels(winner="cobertura" if winners[0] is second else "original").inc()
+                    # Si ambas terminaron a la vez, se libera la que no se usa
+                    for extra in winners[1:]:
+                        if discard is not None:
+                            await discard(extra.result())
+                    return winners[0].result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,337 @@
+"""
+Cola de escritura diferida (write-behind) hacia Google Sheets
+
+Cada fila se guarda primero en un diario local (una línea JSON por fila,
+con fsync) y el usuario recibe la confirmación de inmediato. Una tarea en
+segundo plano envía las filas pendientes a Google Sheets en lotes, con una
+llamada values.append por hoja, cada cierto tiempo o cuando se acumulan
+suficientes filas. Los errores de cuota (429) y de servidor (5xx) se
+reintentan con espera exponencial.
+
+Tras un reinicio o una caída, las filas que no se confirmaron en Sheets se
+recuperan del diario y se envían en el mismo orden en que se registraron.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import (
+    SPREADSHEET_ID, GOOGLE_CREDENTIALS, SHEETS_JOURNAL_FILE,
+    SHEETS_BATCH_SIZE, SHEETS_FLUSH_INTERVAL, sheets_configured
+)
+from utils import metrics
+
+# Códigos HTTP que indican un error transitorio (cuota o servidor)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Filas máximas por llamada a values.append (la cuota es de 60 escrituras por minuto:
+# una importación de 100k filas cabe en 20 llamadas)
+MAX_ROWS_PER_CALL = 5000
+
+# Tamaño a partir del cual el diario se compacta cuando no queda nada pendiente
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Métricas de las escrituras en Google Sheets
+APPEND_SECONDS = metrics.histogram("sheets_append_seconds", "Duración de cada llamada values.append", ("sheet",))
+APPEND_ROWS = metrics.counter("sheets_rows_total", "Filas enviadas a Google Sheets", ("sheet", "result"))
+JOURNAL_SECONDS = metrics.histogram(
+    "sheets_journal_write_seconds", "Duración de la escritura (con fsync) de una fila o un lote en el diario local"
+)
+
+def build_sheets_service():
+    """Crea el cliente de la API de Google Sheets a partir de GOOGLE_CREDENTIALS"""
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+    from utils.http import sheets_http
+
+    credentials = service_account.Credentials.from_service_account_info(
+        json.loads(GOOGLE_CREDENTIALS),
+        scopes=["https://www.googleapis.com/auth/spreadsheets"]
+    )
+    return build("sheets", "v4", http=sheets_http(credentials), cache_discovery=False)
+
+def _status_code(error: Exception) -> Optional[int]:
+    resp = getattr(error, "resp", None)
+    status = getattr(resp, "status", None) or getattr(error, "status_code", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+class SheetsWriteQueue:
+    """Cola duradera que agrupa las filas y las envía a Google Sheets en lotes"""
+
+    def __init__(self, service_factory: Callable[[], Any], spreadsheet_id: str, journal_path: str,
+                 batch_size: int = 100, flush_interval: float = 2.0,
+                 max_attempts: int = 6, max_backoff: float = 60.0):
+        self.service_factory = service_factory
+        self.spreadsheet_id = spreadsheet_id
+        self.journal_path = journal_path
+        self.checkpoint_path = journal_path + ".checkpoint"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+
+        self._pending: List[Tuple[int, str, List[Any]]] = []
+        self._committed: Dict[str, int] = {}
+        self._next_seq = 1
+        self._service = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self._recover()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    @property
+    def pending(self) -> int:
+        """Filas registradas localmente que aún no están en Sheets"""
+        return len(self._pending)
+
+    def _recover(self) -> None:
+        """Carga el punto de control y recupera las filas no confirmadas del diario"""
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            self._committed = checkpoint.get("committed", {})
+            self._next_seq = checkpoint.get("next_seq", 1)
+
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Línea a medio escribir durante una caída: nunca se confirmó al usuario
+                    logger.warning("Se ignoró una línea incompleta del diario de Google Sheets")
+                    continue
+                seq, sheet = entry["seq"], entry["sheet"]
+                self._next_seq = max(self._next_seq, seq + 1)
+                if seq > self._committed.get(sheet, 0):
+                    self._pending.append((seq, sheet, entry["row"]))
+
+        if self._pending:
+            logger.info(f"Recuperadas {len(self._pending)} filas pendientes para Google Sheets")
+
+    def append(self, sheet: str, row: List[Any]) -> None:
+        """
+        Registra una fila de forma duradera y la deja pendiente de envío
+
+        Cuando la función termina, la fila ya está en disco: se puede
+        confirmar al usuario aunque todavía no esté en Google Sheets.
+
+        Args:
+            sheet: Nombre de la hoja (p. ej. "compras")
+            row: Valores de la fila
+        """
+        self.append_many(sheet, [row])
+
+    def append_many(self, sheet: str, rows: List[List[Any]]) -> None:
+        """
+        Registra varias filas de una hoja con una sola escritura (y un solo fsync) en el diario
+
+        Args:
+            sheet: Nombre de la hoja
+            rows: Valores de cada fila, en orden
+        """
+        if not rows:
+            return
+        first = self._next_seq
+        self._next_seq += len(rows)
+        with JOURNAL_SECONDS.time():
+            self._journal.write("".join(
+                json.dumps({"seq": first + i, "sheet": sheet, "row": row}, ensure_ascii=False) + "\n"
+                for i, row in enumerate(rows)
+            ))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+        self._pending.extend((first + i, sheet, row) for i, row in enumerate(rows))
+        if len(self._pending) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    async def wait_pending(self, max_rows: int) -> bool:
+        """
+        Espera a que queden como mucho max_rows filas sin enviar
+
+        Contrapresión para las importaciones masivas: sin ella, las filas
+        pendientes de un historial completo se acumularían en memoria.
+
+        Args:
+            max_rows: Filas pendientes admitidas
+
+        Returns:
+            False si Google Sheets no acepta filas (siguen a salvo en el diario)
+        """
+        while len(self._pending) > max_rows:
+            before = len(self._pending)
+            await self.flush()
+            if len(self._pending) >= before:
+                return False
+        return True
+
+    async def start(self) -> None:
+        """Inicia la tarea que vacía la cola periódicamente"""
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        if self._pending:
+            self._wake.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Detiene la tarea en segundo plano e intenta enviar lo pendiente"""
+        if self._task:
+            # La tarea termina el envío en curso y sale sola: cancelarla a mitad de
+            # una llamada dejaría filas ya enviadas sin confirmar, y se enviarían dos veces
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        self._journal.close()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._pending and not self._stopping:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"Error al vaciar la cola de Google Sheets: {e}")
+
+    async def flush(self) -> None:
+        """Envía a Google Sheets todas las filas pendientes, agrupadas por hoja"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            self._drop_committed()
+            by_sheet: Dict[str, List[Tuple[int, List[Any]]]] = {}
+            for seq, sheet, row in self._pending:
+                by_sheet.setdefault(sheet, []).append((seq, row))
+
+            for sheet, entries in by_sheet.items():
+                for start in range(0, len(entries), MAX_ROWS_PER_CALL):
+                    batch = entries[start:start + MAX_ROWS_PER_CALL]
+                    if not await self._append_with_retry(sheet, [row for _, row in batch]):
+                        # Se conserva el orden: lo que sigue de esta hoja espera al próximo intento
+                        break
+                    self._commit(sheet, batch[-1][0])
+
+            self._drop_committed()
+            if not self._pending and self._journal.tell() > JOURNAL_COMPACT_BYTES:
+                self._compact()
+
+    def _commit(self, sheet: str, seq: int) -> None:
+        self._committed[sheet] = seq
+        self._save_checkpoint()
+
+    def _drop_committed(self) -> None:
+        # Una sola pasada por vaciado: tras una importación puede haber decenas de miles de filas pendientes
+        self._pending = [entry for entry in self._pending if entry[0] > self._committed.get(entry[1], 0)]
+
+    def _save_checkpoint(self) -> None:
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"next_seq": self._next_seq, "committed": self._committed}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _compact(self) -> None:
+        """Vacía el diario; el punto de control ya guarda el siguiente número de secuencia"""
+        self._journal.close()
+        self._journal = open(self.journal_path, "w", encoding="utf-8")
+
+    async def _append_with_retry(self, sheet: str, rows: List[List[Any]]) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with APPEND_SECONDS.labels(sheet=sheet).time():
+                    await asyncio.to_thread(self._append_rows, sheet, rows)
+                APPEND_ROWS.labels(sheet=sheet, result="ok").inc(len(rows))
+                return True
+            except Exception as e:
+                status = _status_code(e)
+                if status not in RETRYABLE_STATUS or attempt == self.max_attempts:
+                    APPEND_ROWS.labels(sheet=sheet, result="error").inc(len(rows))
+                    logger.error(f"No se pudieron enviar {len(rows)} filas a la hoja {sheet}: {e}")
+                    return False
+                delay = min(self.max_backoff, 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                logger.warning(
+                    f"Google Sheets respondió {status} al enviar {len(rows)} filas a {sheet}; "
+                    f"reintento {attempt}/{self.max_attempts - 1} en {delay:.1f} s"
+                )
+                await asyncio.sleep(delay)
+        return False
+
+    def _append_rows(self, sheet: str, rows: List[List[Any]]) -> None:
+        if self._service is None:
+            self._service = self.service_factory()
+        self._service.spreadsheets().values().append(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{sheet}!A1",
+            valueInputOption="USER_ENTERED",
+            insertDataOption="INSERT_ROWS",
+            body={"values": rows}
+        ).execute()
+
+# Cola compartida; se crea al iniciar el bot si Google Sheets está configurado
+write_queue: Optional[SheetsWriteQueue] = None
+
+metrics.gauge("sheets_pending_rows", "Filas en el diario local pendientes de enviar").set_function(
+    lambda: write_queue.pending if write_queue is not None else 0
+)
+
+def append_row(sheet: str, row: List[Any]) -> bool:
+    """
+    Registra una fila para Google Sheets sin esperar a la API
+
+    Args:
+        sheet: Nombre de la hoja
+        row: Valores de la fila
+
+    Returns:
+        True si la fila quedó en la cola, False si Google Sheets no está configurado
+    """
+    if write_queue is None:
+        logger.debug(f"Google Sheets no está configurado; no se encola la fila de {sheet}")
+        return False
+    write_queue.append(sheet, row)
+    return True
+
+async def start_write_queue(application=None) -> None:
+    """Crea e inicia la cola compartida (se usa como post_init de la aplicación)"""
+    global write_queue
+    if not sheets_configured:
+        return
+    write_queue = SheetsWriteQueue(
+        build_sheets_service,
+        SPREADSHEET_ID,
+        SHEETS_JOURNAL_FILE,
+        batch_size=SHEETS_BATCH_SIZE,
+        flush_interval=SHEETS_FLUSH_INTERVAL
+    )
+    await write_queue.start()
+    logger.info("Cola de escritura de Google Sheets iniciada")
+
+async def stop_write_queue(application=None) -> None:
+    """Envía lo pendiente y detiene la cola (se usa como post_shutdown de la aplicación)"""
+    global write_queue
+    if write_queue is not None:
+        await write_queue.stop()
+        write_queue = None
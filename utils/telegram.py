@@ -0,0 +1,263 @@
+"""
+Utilidades para enviar y editar mensajes de Telegram
+"""
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import AsyncIterator, List, Optional, Tuple
+
+from telegram import InlineKeyboardMarkup, Message
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import ExtBot
+
+from config import STREAM_EDIT_INTERVAL
+
+# Límite de caracteres de un mensaje de Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Delimitador de los bloques de código en Markdown
+PRE = "```"
+
+# Aviso que cierra una respuesta en streaming que se cortó por un error
+INTERRUPTED = "⚠️ Respuesta interrumpida"
+
+# rate_limit_args de las ediciones provisionales del streaming: el limitador
+# (utils.outbox.TelegramRateLimiter) no las hace esperar ni las reintenta
+PREVIEW_RATE_LIMIT_ARGS = -1
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Devuelve la espera indicada por un error RetryAfter en segundos"""
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+def _markdown_entities(text: str) -> List[Tuple[int, int, str]]:
+    """
+    Entidades del texto según el parse_mode="Markdown" de la Bot API
+
+    *negrita*, _cursiva_, `código`, ```bloque``` y [enlace](url), sin anidar;
+    fuera de una entidad, "\\" escapa el delimitador siguiente.
+
+    Returns:
+        Lista de (inicio, fin, delimitador); fin es len(text) si la entidad
+        queda abierta
+    """
+    entities = []
+    i, n = 0, len(text)
+    while i < n:
+        char = text[i]
+        if char == "\\" and i + 1 < n and text[i + 1] in "*_`[":
+            i += 2
+            continue
+        if text.startswith(PRE, i):
+            end = text.find(PRE, i + len(PRE))
+            end = n if end < 0 else end + len(PRE)
+        elif char in "*_`":
+            end = text.find(char, i + 1)
+            end = n if end < 0 else end + 1
+        elif char == "[":
+            end = text.find("]", i + 1)
+            if end >= 0 and text.startswith("(", end + 1):
+                end = text.find(")", end + 2)
+            end = n if end < 0 else end + 1
+        else:
+            i += 1
+            continue
+        entities.append((i, end, PRE if text.startswith(PRE, i) else char))
+        i = end
+    return entities
+
+def _opening(text: str, entity: Tuple[int, int, str]) -> str:
+    """Apertura de una entidad; la de un bloque de código, con su lenguaje si lo indica (```python)"""
+    if entity[2] != PRE:
+        return entity[2]
+    line_end = text.find("\n", entity[0])
+    language = text[entity[0] + len(PRE):line_end] if line_end >= 0 else ""
+    if language.isalnum():
+        return f"{PRE}{language}\n"
+    return PRE
+
+def _closing(entity: Tuple[int, int, str]) -> str:
+    """Cierre de una entidad que se corta entre dos mensajes"""
+    return "\n" + PRE if entity[2] == PRE else entity[2]
+
+def _find_cut(text: str, limit: int, entities: List[Tuple[int, int, str]]) -> Tuple[int, int, Optional[Tuple[int, int, str]]]:
+    """
+    Posición donde cortar un texto de más de `limit` caracteres
+
+    Returns:
+        (corte, caracteres del separador que se descartan, entidad que queda
+        abierta en el corte y se cierra y reabre, o None)
+    """
+    def entity_at(position: int) -> Optional[Tuple[int, int, str]]:
+        for entity in entities:
+            if entity[0] < position < entity[1]:
+                return entity
+        return None
+
+    def reopenable(entity: Tuple[int, int, str], position: int, inline: bool) -> bool:
+        # Los enlaces no se pueden partir; el formato en línea, solo si no hay otro corte
+        if entity[2] == "[" or (entity[2] != PRE and not inline):
+            return False
+        return position + len(_closing(entity)) <= limit and position > entity[0] + len(_opening(text, entity))
+
+    # Un bloque de código se corta por líneas (se cierra aquí y se reabre en el siguiente
+    # mensaje); la negrita, cursiva o código en línea, solo si no queda otro remedio
+    for inline in (False, True):
+        # Un salto de párrafo o de línea solo si deja un mensaje de al menos la mitad del límite
+        for separator, minimum in (("\n\n", limit // 2), ("\n", limit // 2), (" ", 0)):
+            position = text.rfind(separator, 0, limit)
+            while position > minimum:
+                entity = entity_at(position)
+                if entity is None and not inline:
+                    return position, len(separator), None
+                if entity is not None and reopenable(entity, position, inline):
+                    return position, len(separator), entity
+                position = text.rfind(separator, 0, position)
+
+    # Sin separadores utilizables: se corta en el límite
+    entity = entity_at(limit)
+    if entity is None:
+        return limit, 0, None
+    position = limit - len(_closing(entity))
+    if reopenable(entity, position, True):
+        return position, 0, entity
+    return (entity[0], 0, None) if entity[0] > 0 else (limit, 0, None)
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH, markdown: bool = False) -> List[str]:
+    """
+    Divide un texto largo en mensajes de como mucho `limit` caracteres
+
+    Corta por párrafos, después por líneas y por último por espacios. Con
+    markdown=True evita cortar dentro de *negrita*, _cursiva_, `código` o un
+    enlace; un bloque ``` que no cabe en un mensaje (o un formato en línea
+    más largo que el límite) se cierra al final de ese mensaje y se vuelve a
+    abrir al principio del siguiente.
+
+    Args:
+        text: Texto a enviar
+        limit: Caracteres máximos por mensaje
+        markdown: Si el texto se envía con parse_mode="Markdown"
+
+    Returns:
+        Partes del texto en orden (una sola si ya cabe)
+    """
+    parts = []
+    while len(text) > limit:
+        entities = _markdown_entities(text) if markdown else []
+        cut, skip, entity = _find_cut(text, limit, entities)
+        head, rest = text[:cut], text[cut + skip:]
+        if entity is not None:
+            head += _closing(entity)
+            rest = _opening(text, entity) + rest
+        parts.append(head)
+        text = rest
+    parts.append(text)
+    return parts
+
+async def _edit_preview(message: Message, text: str) -> None:
+    """
+    Edición provisional: si el chat no tiene turno, lanza RetryAfter sin esperar
+
+    Raises:
+        RetryAfter: Si el limitador o Telegram piden esperar
+    """
+    bot = message.get_bot()
+    if isinstance(bot, ExtBot):
+        await bot.edit_message_text(text, chat_id=message.chat_id, message_id=message.message_id,
+                                    rate_limit_args=PREVIEW_RATE_LIMIT_ARGS)
+    else:
+        await message.edit_text(text)
+
+async def _edit_final(message: Message, text: str, parse_mode: Optional[str] = None,
+                      reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
+    """La edición final no se puede omitir: si Telegram pide esperar, se espera y se reintenta"""
+    try:
+        await message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+    except RetryAfter as e:
+        await asyncio.sleep(retry_after_seconds(e))
+        await message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+
+async def stream_to_message(message: Message, chunks: AsyncIterator[str], title: str, footer: str = "",
+                            reply_markup: Optional[InlineKeyboardMarkup] = None) -> str:
+    """
+    Edita progresivamente un mensaje con el texto que llega en streaming
+
+    Las ediciones se espacian al menos STREAM_EDIT_INTERVAL segundos para no
+    superar los límites de edición de Telegram, y las provisionales no
+    esperan turno en el limitador: si el chat no lo tiene, se omiten hasta
+    que lo tenga. Los fragmentos intermedios se
+    muestran sin formato, porque un Markdown a medias no es válido; la versión
+    final se envía con parse_mode="Markdown". Si no cabe en un mensaje, el
+    resto se envía por la cola de salida, cortado sin romper el Markdown.
+    
+    Si el iterador falla, el mensaje se deja con lo recibido y el aviso
+    INTERRUPTED, sin pie ni teclado, y el error se propaga para que quien
+    llama lo comunique aparte.
+
+    Args:
+        message: Mensaje provisional (p. ej. "Procesando...") que se irá editando
+        chunks: Iterador asíncrono de fragmentos de texto
+        title: Título que encabeza la respuesta
+        footer: Texto que se añade al final de la versión final
+        reply_markup: Teclado del último mensaje de la respuesta
+
+    Returns:
+        Texto completo recibido
+        
+    Raises:
+        Exception: El error del iterador de fragmentos
+    """
+    # Import local: utils.outbox usa split_message de este módulo
+    from utils.outbox import reply
+
+    text = ""
+    next_edit = 0.0
+
+    try:
+        async for delta in chunks:
+            text += delta
+            now = time.monotonic()
+            if now < next_edit or not text.strip():
+                continue
+
+            preview = f"{title}\n\n{text} ▌"
+            try:
+                await _edit_preview(message, preview[:MAX_MESSAGE_LENGTH])
+                next_edit = now + STREAM_EDIT_INTERVAL
+            except RetryAfter as e:
+                # No hay turno o Telegram pide esperar: se omiten ediciones hasta entonces
+                next_edit = now + retry_after_seconds(e)
+            except BadRequest as e:
+                logger.debug(f"No se pudo editar el mensaje en streaming: {e}")
+                next_edit = now + STREAM_EDIT_INTERVAL
+    except Exception:
+        # Se quita el cursor y se marca el texto como incompleto; el error lo comunica quien llama
+        received = text.strip()[:MAX_MESSAGE_LENGTH - len(title) - len(INTERRUPTED) - 4]
+        try:
+            await _edit_final(message, "\n\n".join(filter(None, (title, received, INTERRUPTED))))
+        except BadRequest as e:
+            logger.debug(f"No se pudo marcar la respuesta interrumpida: {e}")
+        raise
+
+    parse_mode = "Markdown"
+    parts = split_message(f"*{title}*\n\n{text}{footer}", markdown=True)
+    try:
+        await _edit_final(message, parts[0], parse_mode=parse_mode, reply_markup=reply_markup if len(parts) == 1 else None)
+    except BadRequest:
+        # El modelo puede devolver Markdown mal balanceado: se envía sin formato
+        parse_mode = None
+        parts = split_message(f"{title}\n\n{text}{footer}")
+        await _edit_final(message, parts[0], reply_markup=reply_markup if len(parts) == 1 else None)
+
+    # Si la respuesta no cabe en un mensaje, se envía el resto por separado (el teclado, en el último)
+    for number, part in enumerate(parts[1:], start=2):
+        await reply(message, part, parse_mode=parse_mode, reply_markup=reply_markup if number == len(parts) else None)
+
+    return text
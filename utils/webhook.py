@@ -0,0 +1,211 @@
+"""
+Modo webhook: servidor ASGI que recibe las actualizaciones de Telegram
+
+Alternativa a run_polling para desplegar el bot detrás de un balanceador:
+Telegram envía cada actualización por POST a WEBHOOK_PATH, el servidor la
+deja en la cola de la aplicación y responde de inmediato. Las
+actualizaciones se procesan en paralelo según CONCURRENT_UPDATES.
+
+Rutas:
+- POST WEBHOOK_PATH: actualización de Telegram (se comprueba WEBHOOK_SECRET)
+- GET /health: estado del proceso; responde 503 mientras se detiene
+
+Al detenerse (SIGTERM), el servidor deja de aceptar actualizaciones y
+espera a que terminen las que están en curso, incluidas las llamadas a
+OpenAI, durante SHUTDOWN_TIMEOUT segundos como máximo.
+
+La aplicación ASGI no depende de ningún framework; para servirla se usa
+uvicorn, que solo se importa en este modo.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+# Nombre de la cabecera con la que Telegram envía el secret_token del webhook
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+class TelegramWebhookApp:
+    """Aplicación ASGI que entrega las actualizaciones a una Application de python-telegram-bot"""
+
+    def __init__(self, application: Application, path: str = "/telegram",
+                 webhook_url: Optional[str] = None, secret_token: Optional[str] = None,
+                 drain_timeout: float = 30.0):
+        """
+        Args:
+            application: Aplicación ya construida, con sus manejadores registrados
+            path: Ruta en la que se reciben las actualizaciones
+            webhook_url: URL pública base; si se indica, se registra el webhook en Telegram al iniciar
+            secret_token: Valor esperado en la cabecera X-Telegram-Bot-Api-Secret-Token
+            drain_timeout: Segundos máximos de espera por las actualizaciones en curso al detenerse
+        """
+        self.application = application
+        self.path = "/" + path.strip("/")
+        self.webhook_url = webhook_url.rstrip("/") + self.path if webhook_url else None
+        self.secret_token = secret_token
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.received = 0
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[[], Awaitable[dict]],
+                       send: Callable[[dict], Awaitable[None]]) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.error(f"Error al iniciar el modo webhook: {e}")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self) -> None:
+        """Inicia la aplicación (con su post_init) y registra el webhook"""
+        application = self.application
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        if self.webhook_url:
+            await application.bot.set_webhook(
+                url=self.webhook_url,
+                secret_token=self.secret_token,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=max(1, min(100, application.update_processor.max_concurrent_updates))
+            )
+            logger.info(f"Webhook registrado en {self.webhook_url}")
+        logger.info(
+            f"Modo webhook activo en {self.path} "
+            f"({application.update_processor.max_concurrent_updates} actualizaciones simultáneas)"
+        )
+
+    async def shutdown(self) -> None:
+        """Deja de aceptar actualizaciones, espera a las que están en curso y detiene la aplicación"""
+        application = self.application
+        self.draining = True
+        in_flight = application.update_processor.current_concurrent_updates + application.update_queue.qsize()
+        logger.info(f"Deteniendo el modo webhook; actualizaciones en curso: {in_flight}")
+
+        # El webhook no se elimina: otra instancia (o esta misma al reiniciar) seguirá recibiendo
+        if application.running:
+            try:
+                # stop() procesa lo que queda en la cola y espera a los manejadores en curso
+                await asyncio.wait_for(application.stop(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Quedaron actualizaciones sin terminar tras {self.drain_timeout:.0f} s de espera"
+                )
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+    async def _http(self, scope, receive, send) -> None:
+        method, path = scope["method"], scope["path"]
+        if path == "/health" and method in ("GET", "HEAD"):
+            await self._health(send)
+        elif path == self.path and method == "POST":
+            await self._update(scope, receive, send)
+        else:
+            await _respond(send, 404, {"ok": False, "error": "Ruta no encontrada"})
+
+    async def _health(self, send) -> None:
+        application = self.application
+        status = {
+            "status": "draining" if self.draining else ("ok" if application.running else "starting"),
+            "recibidas": self.received,
+            "en_cola": application.update_queue.qsize(),
+            "en_curso": application.update_processor.current_concurrent_updates,
+        }
+        await _respond(send, 200 if status["status"] == "ok" else 503, status)
+
+    async def _update(self, scope, receive, send) -> None:
+        if self.secret_token:
+            headers = dict(scope.get("headers") or [])
+            if headers.get(SECRET_HEADER, b"").decode("latin-1") != self.secret_token:
+                await _respond(send, 403, {"ok": False, "error": "Token secreto no válido"})
+                return
+        if self.draining or not self.application.running:
+            # Telegram reintenta la entrega, posiblemente en otra instancia
+            await _respond(send, 503, {"ok": False, "error": "El bot se está deteniendo"})
+            return
+
+        body = await _read_body(receive)
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception as e:
+            logger.warning(f"Actualización de Telegram no válida: {e}")
+            await _respond(send, 400, {"ok": False, "error": "Actualización no válida"})
+            return
+
+        self.received += 1
+        await self.application.update_queue.put(update)
+        await _respond(send, 200, {"ok": True})
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+async def _respond(send, status: int, data: Dict[str, Any]) -> None:
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+def run_webhook(application: Application, host: str, port: int, path: str,
+                webhook_url: Optional[str] = None, secret_token: Optional[str] = None,
+                drain_timeout: float = 30.0) -> None:
+    """
+    Sirve la aplicación en modo webhook con uvicorn hasta recibir SIGINT/SIGTERM
+
+    Args:
+        application: Aplicación con sus manejadores registrados
+        host: Interfaz en la que escuchar
+        port: Puerto HTTP
+        path: Ruta del webhook
+        webhook_url: URL pública base con la que registrar el webhook en Telegram
+        secret_token: Token secreto del webhook
+        drain_timeout: Segundos de espera por las actualizaciones en curso al detenerse
+    """
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise RuntimeError("El modo webhook necesita uvicorn: pip install uvicorn") from e
+
+    app = TelegramWebhookApp(application, path, webhook_url, secret_token, drain_timeout)
+    config = uvicorn.Config(
+        app,
+        host=host,
+        port=port,
+        lifespan="on",
+        log_level="warning",
+        # Las peticiones HTTP terminan enseguida; la espera larga está en el cierre de la aplicación
+        timeout_graceful_shutdown=5
+    )
+    uvicorn.Server(config).run()
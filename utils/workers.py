@@ -0,0 +1,186 @@
+"""
+Ejecutores para el trabajo de CPU fuera del bucle de eventos
+
+Todo el bot corre en un único bucle de asyncio: un cálculo largo dentro de
+un manejador (validar un archivo importado, validar el JSON de OpenAI o
+recorrer los registros completos para un reporte) congela las
+respuestas de todos los demás chats. Los manejadores lo envían aquí según
+su tipo de tarea:
+
+- Pool de hilos (WORKER_THREADS): tareas cortas o que liberan el GIL
+  (NumPy). Los reportes siempre van aquí: comparten las columnas en memoria
+  y solo un proceso escribe los registros columnares.
+- Pool de procesos (WORKER_PROCESSES): tareas largas de Python puro que
+  retienen el GIL, para los tipos listados en WORKER_PROCESS_TASKS. Las
+  funciones y sus argumentos deben poder serializarse con pickle, y cada
+  tarea paga esa serialización (y la primera, el arranque del proceso):
+  lo que tarda milisegundos va más rápido en el bucle o en hilos.
+
+Con /cancelar se cancela el trabajo en curso de un chat (ver cancellable):
+las tareas en cola no llegan a ejecutarse y el manejador deja de esperar
+las que ya empezaron, cuyo resultado se descarta.
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set
+
+from config import WORKER_THREADS, WORKER_PROCESSES, WORKER_PROCESS_TASKS
+from utils import metrics
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+TASK_SECONDS = metrics.histogram(
+    "worker_task_seconds", "Duración de las tareas enviadas a los ejecutores, con la espera en cola",
+    ("task", "pool")
+)
+CANCELLATIONS = metrics.counter(
+    "worker_cancellations_total", "Trabajos cancelados con /cancelar", ("task",)
+)
+
+class TaskCancelled(Exception):
+    """El usuario canceló el trabajo en curso de su chat"""
+
+class WorkerPool:
+    """Pools de hilos y de procesos, elegidos por tipo de tarea"""
+
+    def __init__(self, threads: int = WORKER_THREADS, processes: int = WORKER_PROCESSES,
+                 process_tasks: Iterable[str] = WORKER_PROCESS_TASKS):
+        """
+        Args:
+            threads: Hilos del pool de hilos
+            processes: Procesos del pool de procesos (0 = todo en hilos)
+            process_tasks: Tipos de tarea que se ejecutan en el pool de procesos
+        """
+        self.threads = threads
+        self.processes = processes
+        self.process_tasks = set(process_tasks) if processes > 0 else set()
+        # Los pools se crean con la primera tarea (arrancar procesos retrasaría el inicio del bot)
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._scopes: Dict[int, Set[asyncio.Task]] = {}
+        self._cancelled: Set[asyncio.Task] = set()
+
+    def pool_for(self, task: str) -> str:
+        """Pool de un tipo de tarea: "procesos" o "hilos" """
+        return "procesos" if task in self.process_tasks else "hilos"
+
+    def executor(self, task: str) -> Executor:
+        """Ejecutor de un tipo de tarea (se crea la primera vez)"""
+        if self.pool_for(task) == "procesos":
+            if self._process_pool is None:
+                # spawn: los procesos no heredan los hilos ni los sockets del bot
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="worker")
+        return self._thread_pool
+
+    async def run(self, task: str, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Ejecuta una función en el pool de su tipo de tarea sin bloquear el bucle
+
+        Args:
+            task: Tipo de tarea (p. ej. "importacion", "json" o "reportes")
+            function: Función a ejecutar (de nivel de módulo si va a un proceso)
+            *args: Argumentos posicionales
+            **kwargs: Argumentos con nombre
+
+        Returns:
+            El resultado de la función
+        """
+        pool = self.pool_for(task)
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        # Si quien espera se cancela, la tarea se retira de la cola si aún no empezó
+        result = await loop.run_in_executor(self.executor(task), functools.partial(function, *args, **kwargs))
+        TASK_SECONDS.labels(task=task, pool=pool).observe(time.perf_counter() - start)
+        return result
+
+    async def map(self, task: str, function: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """
+        Aplica una función a cada elemento en el pool de su tipo de tarea
+
+        Al dividir un trabajo largo en partes, cancelarlo detiene las que aún
+        no empezaron.
+
+        Args:
+            task: Tipo de tarea
+            function: Función que recibe cada elemento
+            items: Elementos (p. ej. bloques de filas)
+
+        Returns:
+            Resultados en el orden de los elementos
+        """
+        return list(await asyncio.gather(*(self.run(task, function, item) for item in items)))
+
+    @asynccontextmanager
+    async def cancellable(self, chat_id: int, task: str = "chat") -> AsyncIterator[None]:
+        """
+        Permite cancelar con cancel(chat_id) todo lo que se espera dentro del bloque
+
+        Args:
+            chat_id: Chat al que pertenece el trabajo
+            task: Tipo de trabajo (para las métricas)
+
+        Raises:
+            TaskCancelled: Si el usuario canceló el trabajo
+        """
+        current = asyncio.current_task()
+        scope = self._scopes.setdefault(chat_id, set())
+        scope.add(current)
+        try:
+            yield
+        except asyncio.CancelledError:
+            if current not in self._cancelled:
+                raise
+            self._cancelled.discard(current)
+            if hasattr(current, "uncancel"):
+                current.uncancel()
+            CANCELLATIONS.labels(task=task).inc()
+            raise TaskCancelled("Operación cancelada por el usuario") from None
+        finally:
+            self._cancelled.discard(current)
+            scope.discard(current)
+            if not scope:
+                self._scopes.pop(chat_id, None)
+
+    def cancel(self, chat_id: int) -> int:
+        """
+        Cancela el trabajo en curso de un chat
+
+        Args:
+            chat_id: Chat que envió /cancelar
+
+        Returns:
+            Trabajos cancelados
+        """
+        tasks = [task for task in self._scopes.get(chat_id, ()) if not task.done()]
+        for task in tasks:
+            self._cancelled.add(task)
+            task.cancel()
+        if tasks:
+            logger.info(f"Cancelados {len(tasks)} trabajos del chat {chat_id}")
+        return len(tasks)
+
+    def shutdown(self) -> None:
+        """Detiene los pools sin esperar a las tareas pendientes"""
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._thread_pool = self._process_pool = None
+
+# Ejecutores compartidos por los manejadores
+worker_pool = WorkerPool()
+
+async def shutdown_workers(application=None) -> None:
+    """Detiene los ejecutores (se usa en el post_shutdown de la aplicación)"""
+    worker_pool.shutdown()